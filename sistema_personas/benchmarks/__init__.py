@@ -0,0 +1,7 @@
+"""
+Benchmarks de rendimiento del sistema de personas.
+
+No forman parte de la aplicación: ni personas ni sus pruebas los importan.
+Se ejecutan desde la carpeta de manage.py con python -m benchmarks (ver
+__main__); los casos están en benchmarks.casos.
+"""
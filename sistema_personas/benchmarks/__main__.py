@@ -0,0 +1,117 @@
+"""
+Ejecuta los benchmarks desde la carpeta de manage.py:
+
+    python -m benchmarks ejecutar busqueda_huella --tamanos 100 1000
+    python -m benchmarks suite --salida base.json
+    python -m benchmarks suite --base base.json
+
+Ninguno modifica la base de datos; la suite termina con código 1 si alguna
+métrica empeora más que --tolerancia respecto de la línea base.
+"""
+import os
+import ast
+import sys
+import json
+import inspect
+import argparse
+
+import django
+
+
+def _parametros(opciones, parser):
+    parametros = {}
+    if opciones.tamanos:
+        parametros['tamanos'] = opciones.tamanos
+    if opciones.consultas:
+        parametros['consultas'] = opciones.consultas
+    for param in opciones.param:
+        nombre, _, valor = param.partition('=')
+        if not valor:
+            parser.error(f'Parámetro no válido: {param} (use NOMBRE=VALOR)')
+        try:
+            parametros[nombre] = ast.literal_eval(valor)
+        except (ValueError, SyntaxError):
+            parametros[nombre] = valor
+    return parametros
+
+
+def ejecutar(opciones, parser):
+    from .casos import BENCHMARKS
+
+    if opciones.nombre not in BENCHMARKS:
+        parser.error(f'Benchmark desconocido: {opciones.nombre} (opciones: {", ".join(sorted(BENCHMARKS))})')
+    parametros = _parametros(opciones, parser)
+    benchmark = BENCHMARKS[opciones.nombre]
+    try:
+        inspect.signature(benchmark).bind(**parametros)
+    except TypeError as e:
+        parser.error(f'Parámetros no válidos para {opciones.nombre}: {e}')
+
+    print(json.dumps(benchmark(**parametros), indent=2, ensure_ascii=False))
+    return 0
+
+
+def suite(opciones, parser):
+    from .casos import SUITE, comparar_con_base, ejecutar_suite
+
+    desconocidos = set(opciones.solo or ()) - set(SUITE)
+    if desconocidos:
+        parser.error(f'No están en la suite: {", ".join(sorted(desconocidos))}')
+    base = None
+    if opciones.base:
+        try:
+            with open(opciones.base, encoding='utf-8') as archivo:
+                base = json.load(archivo)
+        except (OSError, ValueError) as e:
+            parser.error(f'No se pudo leer la línea base: {e}')
+
+    resultado = ejecutar_suite(opciones.solo, progreso=lambda nombre: print(f'Ejecutando {nombre}...', file=sys.stderr))
+
+    if opciones.salida:
+        with open(opciones.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        print(f'Resultados guardados en {opciones.salida}')
+    elif base is None:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    if base is None:
+        return 0
+    comparacion = comparar_con_base(resultado, base, opciones.tolerancia)
+    for fila in comparacion:
+        marca = {'regresion': '!', 'mejora': '+'}.get(fila['estado'], ' ')
+        print(f'{marca} {fila["metrica"]:<70} {fila["base"]:>12g} {fila["actual"]:>12g} {fila["cambio"]:>+8.1%}')
+    regresiones = sum(1 for fila in comparacion if fila['estado'] == 'regresion')
+    mejoras = sum(1 for fila in comparacion if fila['estado'] == 'mejora')
+    print(f'{len(comparacion)} métricas comparadas: {regresiones} regresiones, {mejoras} mejoras')
+    return 1 if regresiones else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmarks de rendimiento sin modificar la base de datos')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    uno = comandos.add_parser('ejecutar', help='Ejecuta un benchmark y muestra sus resultados en JSON')
+    uno.add_argument('nombre', help='Benchmark a ejecutar')
+    uno.add_argument('--tamanos', type=int, nargs='+', help='Cantidades de personas sintéticas a evaluar')
+    uno.add_argument('--consultas', type=int, help='Número de consultas por medición')
+    uno.add_argument('--param', action='append', default=[], metavar='NOMBRE=VALOR',
+                     help='Parámetro adicional del benchmark (se puede repetir)')
+    uno.set_defaults(funcion=ejecutar, parser=uno)
+
+    todos = comandos.add_parser('suite', help='Ejecuta la suite y la compara con una línea base guardada')
+    todos.add_argument('--solo', nargs='+', metavar='BENCHMARK', help='Ejecutar solo estos benchmarks de la suite')
+    todos.add_argument('--salida', help='Archivo JSON donde guardar los resultados (p. ej. la nueva línea base)')
+    todos.add_argument('--base', help='Archivo JSON de una ejecución anterior con el que comparar')
+    todos.add_argument('--tolerancia', type=float, default=0.2,
+                       help='Aumento relativo del costo que se considera regresión (0.2 = 20%%)')
+    todos.set_defaults(funcion=suite, parser=todos)
+
+    opciones = parser.parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_personas.settings')
+    django.setup()
+    return opciones.funcion(opciones, opciones.parser)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1662 @@
+"""
+Benchmarks de rendimiento para el sistema de personas.
+
+Cada benchmark recibe sus parámetros como argumentos con nombre y devuelve un
+diccionario serializable a JSON con los resultados. Los datos sintéticos se
+crean dentro de una transacción que se revierte al terminar, por lo que la
+base de datos queda intacta; los que escriben archivos usan un MEDIA_ROOT
+temporal (media_temporal).
+
+Los benchmarks carga_* recorren las vistas con el cliente de pruebas de
+Django (registro, búsqueda por huella y listados). SUITE agrupa los
+principales con parámetros reducidos; python -m benchmarks suite la
+ejecuta, guarda los resultados en JSON y los compara con una línea base
+anterior (comparar_con_base).
+"""
+import io
+import os
+import json
+import time
+import base64
+import hashlib
+import statistics
+import tracemalloc
+from io import BytesIO
+from types import SimpleNamespace
+from contextlib import contextmanager
+
+import numpy as np
+import qrcode
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from personas import qr
+from personas.biometrics import encode_template
+from personas.listado import fila_de
+from personas.matching import FingerprintIndex
+from personas.models import Persona, PersonaLista, ajustar_contador_personas
+from personas.tests.ayudantes import foto_sintetica, imagen_huella, media_temporal
+
+
+@contextmanager
+def transaccion_revertida():
+    """Ejecuta el bloque dentro de una transacción que siempre se revierte"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def medir(func, repeticiones=100):
+    """Ejecuta func varias veces y devuelve estadísticas en milisegundos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        func()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'repeticiones': repeticiones,
+        'min_ms': round(tiempos[0], 4),
+        'media_ms': round(statistics.fmean(tiempos), 4),
+        'p50_ms': round(tiempos[len(tiempos) // 2], 4),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 4),
+    }
+
+
+def huella_sintetica(indice):
+    """Hash SHA-256 determinista para la persona sintética número indice"""
+    return hashlib.sha256(f'huella-{indice}'.encode()).hexdigest()
+
+
+def crear_personas_sinteticas(desde, hasta, batch_size=5000):
+    """Inserta personas sintéticas con índices en [desde, hasta) usando bulk_create"""
+    for inicio in range(desde, hasta, batch_size):
+        lote = []
+        for i in range(inicio, min(inicio + batch_size, hasta)):
+            huella_hex = huella_sintetica(i)
+            lote.append(Persona(
+                nombre=f'Nombre{i}',
+                apellidos=f'Apellido{i} Prueba',
+                sexo=bool(i % 2),
+                telefono=f'{5500000000 + i}',
+                correo=f'persona{i}@ejemplo.com',
+                direccion=f'Calle {i}, Colonia Centro',
+                huella_hex=huella_hex,
+                huella_digest=huella_hex,
+            ))
+        Persona.objects.bulk_create(lote, batch_size=batch_size)
+        PersonaLista.objects.bulk_create([fila_de(persona) for persona in lote], batch_size=batch_size)
+        ajustar_contador_personas(len(lote))
+
+
+def bench_busqueda_huella(tamanos=(10_000, 100_000, 1_000_000), consultas=200):
+    """
+    Latencia de búsqueda exacta por huella al crecer la tabla.
+
+    Compara la búsqueda indexada por huella_digest contra el recorrido
+    completo que hacía la versión anterior sobre huella_hex.
+    """
+    resultados = []
+    with transaccion_revertida():
+        existentes = 0
+        for tamano in sorted(tamanos):
+            crear_personas_sinteticas(existentes, tamano)
+            existentes = tamano
+            objetivos = [huella_sintetica(int(i * tamano / consultas)) for i in range(consultas)]
+            objetivos_iter = iter(objetivos * 2)
+
+            def por_digest():
+                Persona.objects.filter(huella_digest=next(objetivos_iter)).first()
+
+            ausente = hashlib.sha256(os.urandom(16)).hexdigest()
+
+            def por_hex_sin_indice():
+                Persona.objects.filter(huella_hex=ausente).first()
+
+            resultados.append({
+                'personas': tamano,
+                'huella_digest': medir(por_digest, consultas),
+                'huella_hex': medir(por_hex_sin_indice, max(1, consultas // 20)),
+            })
+    return {'benchmark': 'busqueda_huella', 'resultados': resultados}
+
+
+def plantillas_aleatorias(cantidad, semilla=0):
+    """Plantillas (encode_template) de minucias al azar, entre 30 y 60 por huella"""
+    rng = np.random.default_rng(semilla)
+    plantillas = []
+    for _ in range(cantidad):
+        n = int(rng.integers(30, 61))
+        minucias = np.column_stack([rng.uniform(0, 250, n), rng.uniform(0, 300, n), rng.uniform(0, np.pi, n)])
+        plantillas.append(encode_template(minucias))
+    return plantillas
+
+
+def bench_indice_huellas(tamanos=(10_000, 100_000), consultas=20):
+    """
+    Tiempo de búsqueda 1:N en FingerprintIndex según el número de plantillas:
+    preselección por histograma sobre todas y comparación de minucias de las
+    HUELLA_CANDIDATOS preseleccionadas
+    """
+    resultados = []
+    for tamano in sorted(tamanos):
+        plantillas = plantillas_aleatorias(tamano)
+        indice = FingerprintIndex(capacity=tamano)
+        inicio = time.perf_counter()
+        for persona_id, plantilla in enumerate(plantillas, start=1):
+            indice.add(persona_id, plantilla)
+        carga_ms = (time.perf_counter() - inicio) * 1000
+
+        objetivos = iter(np.linspace(0, tamano - 1, consultas * 2).astype(int))
+
+        def buscar():
+            indice.search(plantillas[next(objetivos)])
+
+        resultados.append({
+            'plantillas': tamano,
+            'memoria_mb': round((indice._matrix.nbytes + sum(m.nbytes for m in indice._minutiae)) / 2**20, 1),
+            'carga_ms': round(carga_ms, 1),
+            'busqueda': medir(buscar, consultas),
+        })
+    return {'benchmark': 'indice_huellas', 'resultados': resultados}
+
+
+def bench_precision_huellas(dedos=60, capturas=4, desconocidos=10, ruido=10):
+    """
+    Precisión de la identificación con capturas sintéticas (imagen_huella):
+    FNMR (pares del mismo dedo por debajo del umbral) y FMR (pares de dedos
+    distintos que lo alcanzan) de match_minutiae, y resultados 1:N de
+    FingerprintIndex.search con la primera captura de cada dedo registrada:
+    identificaciones correctas, erróneas y sin resultado, y dedos no
+    registrados ('desconocidos') que se identifican con alguien.
+    """
+    from personas.biometrics import decode_template, extract_fingerprint_template, get_match_threshold, match_minutiae
+
+    inicio = time.perf_counter()
+    plantillas, fallidas = {}, 0
+    for dedo in range(dedos + desconocidos):
+        for captura in range(capturas):
+            try:
+                plantillas[dedo, captura] = extract_fingerprint_template(
+                    BytesIO(imagen_huella(1_000_000 + dedo, captura=captura + 1, ruido=ruido))
+                )
+            except ValueError:
+                fallidas += 1
+    extraccion_ms = (time.perf_counter() - inicio) * 1000 / (len(plantillas) + fallidas)
+    minucias = {clave: decode_template(plantilla)[1] for clave, plantilla in plantillas.items()}
+
+    genuinos = [
+        match_minutiae(minucias[dedo, a], minucias[dedo, b])
+        for dedo in range(dedos) for a in range(capturas) for b in range(a + 1, capturas)
+        if (dedo, a) in minucias and (dedo, b) in minucias
+    ]
+    inicio = time.perf_counter()
+    impostores = [
+        match_minutiae(minucias[a, 0], minucias[b, 1])
+        for a in range(dedos) for b in range(a + 1, dedos)
+        if (a, 0) in minucias and (b, 1) in minucias
+    ]
+    comparacion_ms = (time.perf_counter() - inicio) * 1000 / max(len(impostores), 1)
+    genuinos, impostores = np.array(genuinos), np.array(impostores)
+    umbral = get_match_threshold()
+
+    indice = FingerprintIndex.from_templates((dedo, plantillas.get((dedo, 0))) for dedo in range(dedos))
+    identificacion = {'correctas': 0, 'erroneas': 0, 'sin_resultado': 0, 'desconocidos_identificados': 0}
+    for (dedo, captura), plantilla in plantillas.items():
+        encontradas = indice.search(plantilla)
+        if dedo >= dedos:
+            identificacion['desconocidos_identificados'] += bool(encontradas)
+        elif captura == 0:
+            continue
+        elif not encontradas:
+            identificacion['sin_resultado'] += 1
+        elif encontradas[0][0] == dedo:
+            identificacion['correctas'] += 1
+        else:
+            identificacion['erroneas'] += 1
+    return {
+        'benchmark': 'precision_huellas',
+        'umbral': umbral,
+        'plantillas': len(plantillas),
+        'sin_minucias_suficientes': fallidas,
+        'extraccion_ms': round(extraccion_ms, 2),
+        'comparacion_ms': round(comparacion_ms, 3),
+        'pares_genuinos': len(genuinos),
+        'pares_impostores': len(impostores),
+        'fnmr': round(float((genuinos < umbral).mean()), 4) if len(genuinos) else None,
+        'fmr': round(float((impostores >= umbral).mean()), 6) if len(impostores) else None,
+        'genuinos_min': round(float(genuinos.min()), 3) if len(genuinos) else None,
+        'genuinos_p5': round(float(np.percentile(genuinos, 5)), 3) if len(genuinos) else None,
+        'impostores_max': round(float(impostores.max()), 3) if len(impostores) else None,
+        'identificacion': identificacion,
+    }
+
+
+def _qr_sin_cache(hash_value):
+    """Generación de QR como se hacía antes del servicio personas.qr"""
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    qr.add_data(hash_value)
+    qr.make(fit=True)
+    buffer = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def bench_qr(consultas=200):
+    """Generación de QR: pipeline anterior, en frío y desde memoria"""
+    hashes = [huella_sintetica(i) for i in range(consultas)]
+    resultados = {}
+
+    siguiente = iter(hashes)
+    resultados['sin_cache'] = medir(lambda: _qr_sin_cache(next(siguiente)), consultas)
+
+    qr.clear_cache()
+    siguiente = iter(hashes)
+    resultados['png_frio'] = medir(lambda: qr.qr_png(next(siguiente)), consultas)
+
+    siguiente = iter(hashes)
+    resultados['png_memoria'] = medir(lambda: qr.qr_png(next(siguiente)), consultas)
+
+    qr.clear_cache()
+    siguiente = iter(hashes)
+    resultados['svg_frio'] = medir(lambda: qr.qr_svg(next(siguiente)), consultas)
+
+    qr.clear_cache()
+    return {'benchmark': 'qr', 'resultados': resultados}
+
+
+def bench_memoria_captura(tamano_kb=1024, repeticiones=5):
+    """
+    Pico de memoria y tiempo de capturar_huella según el formato de envío.
+
+    El cuerpo de la petición se construye antes de medir, así que el pico
+    refleja solo lo que el endpoint reserva al procesarlo. La imagen es
+    aleatoria, así que se mide sin el control de calidad de huellas.
+    """
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+    from personas.views import capturar_huella
+
+    imagen = os.urandom(tamano_kb * 1024)
+    factory = RequestFactory()
+    formatos = {
+        'json_base64': lambda: factory.post(
+            '/api/capturar-huella/',
+            data=json.dumps({'imagen': 'data:image/png;base64,' + base64.b64encode(imagen).decode()}),
+            content_type='application/json',
+        ),
+        'octet_stream': lambda: factory.post(
+            '/api/capturar-huella/', data=imagen, content_type='application/octet-stream',
+        ),
+        'multipart': lambda: factory.post(
+            '/api/capturar-huella/', data={'imagen': ContentFile(imagen, name='huella.png')},
+        ),
+    }
+    resultados = {}
+    for nombre, crear_peticion in formatos.items():
+        picos = []
+        tiempos = []
+        for _ in range(repeticiones):
+            peticion = crear_peticion()
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            with override_settings(HUELLA_CALIDAD_MINIMA=0):
+                respuesta = capturar_huella(peticion)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            picos.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            assert respuesta.status_code == 200, respuesta.content
+        resultados[nombre] = {
+            'pico_kb': round(max(picos) / 1024, 1),
+            'media_ms': round(statistics.fmean(tiempos), 3),
+        }
+    return {'benchmark': 'memoria_captura', 'tamano_kb': tamano_kb, 'resultados': resultados}
+
+
+def bench_paginacion(personas=100_000, pagina=10_000, consultas=20):
+    """
+    Costo de pedir una página profunda del listado de personas.
+
+    'offset' reproduce la paginación anterior (PageNumberPagination: COUNT(*)
+    más OFFSET y filas completas); 'cursor' pide la misma página por la API
+    actual con el cursor que apunta a esa posición.
+    """
+    from urllib.parse import urlencode
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from personas.serializers import PersonaListSerializer
+
+    tamano_pagina = 10
+    desplazamiento = (pagina - 1) * tamano_pagina
+    with transaccion_revertida():
+        crear_personas_sinteticas(0, personas)
+        usuario = User.objects.create_user('benchmark-paginacion')
+        cliente = APIClient()
+        cliente.force_authenticate(usuario)
+
+        def por_offset():
+            Persona.objects.count()
+            filas = Persona.objects.order_by('-fecha_registro', '-id')[desplazamiento:desplazamiento + tamano_pagina]
+            PersonaListSerializer([
+                SimpleNamespace(**{campo: getattr(p, campo) for campo in ('id', 'nombre', 'apellidos', 'sexo',
+                                                                         'telefono', 'correo', 'foto')},
+                                sexo_display='Hombre' if p.sexo else 'Mujer')
+                for p in filas
+            ], many=True).data
+
+        anterior = Persona.objects.order_by('-fecha_registro', '-id').values_list(
+            'fecha_registro', flat=True)[desplazamiento - 1]
+        cursor = base64.b64encode(urlencode({'p': str(anterior)}).encode()).decode()
+
+        def por_cursor():
+            respuesta = cliente.get('/api/personas/', {'cursor': cursor})
+            assert respuesta.status_code == 200, respuesta.content
+
+        def primera_pagina():
+            cliente.get('/api/personas/')
+
+        resultados = {
+            'offset': medir(por_offset, consultas),
+            'cursor': medir(por_cursor, consultas),
+            'cursor_primera_pagina': medir(primera_pagina, consultas),
+        }
+    return {'benchmark': 'paginacion', 'personas': personas, 'pagina': pagina, 'resultados': resultados}
+
+
+
+def bench_listado_proyeccion(personas=20_000, tamanos=(10, 100, 1000), consultas=50):
+    """
+    Páginas de 'tamanos' filas del listado: instancias de Persona con
+    Persona.objects.para_lista() (los listados anteriores) frente a las filas
+    de .values() de la proyección PersonaLista, solo la consulta y consulta
+    más PersonaListSerializer; con API, la primera página de /api/personas/
+    (máximo 100 filas por página). Personas sin foto, para no medir las
+    miniaturas.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from personas.listado import filas_lista
+    from personas.serializers import PersonaListSerializer
+
+    resultados = {}
+    with override_settings(CACHE_RESPUESTAS={'detalle': 0, 'lista': 0}), transaccion_revertida():
+        crear_personas_sinteticas(0, personas)
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('benchmark-proyeccion'))
+        for tamano in tamanos:
+            fila = {
+                'consulta_modelos': medir(lambda: list(Persona.objects.para_lista()[:tamano]), consultas),
+                'consulta_proyeccion': medir(lambda: list(filas_lista()[:tamano]), consultas),
+                'serializado_modelos': medir(
+                    lambda: PersonaListSerializer(Persona.objects.para_lista()[:tamano], many=True).data, consultas),
+                'serializado_proyeccion': medir(
+                    lambda: PersonaListSerializer(filas_lista()[:tamano], many=True).data, consultas),
+            }
+            if tamano <= 100:
+                fila['api'] = medir(lambda: cliente.get('/api/personas/', {'page_size': tamano}), consultas)
+            resultados[f'pagina_{tamano}'] = fila
+    return {'benchmark': 'listado_proyeccion', 'personas': personas, 'resultados': resultados}
+
+
+def bench_feed_cambios(personas=20_000, modificadas=100, eliminadas=20, repeticiones=5):
+    """
+    Sincronización de un consumidor tras 'modificadas' modificaciones y
+    'eliminadas' bajas: recorrer todas las páginas de /api/personas/ (100
+    filas, sin caché de respuestas) frente a /api/personas/cambios/ desde el
+    cursor de la sincronización anterior. Tiempo y bytes transferidos.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    def recorrer_api():
+        total = 0
+        url = '/api/personas/?page_size=100'
+        while url:
+            respuesta = cliente.get(url)
+            total += len(respuesta.content)
+            url = respuesta.json()['next']
+        return total
+
+    def leer_feed(desde):
+        respuesta = cliente.get('/api/personas/cambios/', {'desde': desde, 'limite': 10_000})
+        contenido = b''.join(respuesta.streaming_content)
+        return contenido, json.loads(contenido.splitlines()[-1])
+
+    with override_settings(CACHE_RESPUESTAS={'detalle': 0, 'lista': 0}, CAMBIOS_MARGEN_SEGUNDOS=0), \
+            transaccion_revertida():
+        crear_personas_sinteticas(0, personas)
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('benchmark-cambios'))
+
+        # Sincronización inicial por el feed, por páginas de 10.000 cambios
+        inicio = time.perf_counter()
+        cursor, bytes_inicial = '', 0
+        while True:
+            contenido, fin = leer_feed(cursor)
+            bytes_inicial += len(contenido)
+            cursor = fin['cursor']
+            if not fin['mas']:
+                break
+        inicial_ms = (time.perf_counter() - inicio) * 1000
+
+        for persona in Persona.objects.order_by('id')[:modificadas]:
+            persona.telefono = '5500000000'
+            persona.save()
+        for persona in Persona.objects.order_by('-id')[:eliminadas]:
+            persona.delete()
+
+        bytes_api = recorrer_api()
+        bytes_feed = len(leer_feed(cursor)[0])
+        return {
+            'benchmark': 'feed_cambios', 'personas': personas,
+            'modificadas': modificadas, 'eliminadas': eliminadas,
+            'resultados': {
+                'sincronizacion_inicial_feed': {'ms': round(inicial_ms, 1), 'kb': round(bytes_inicial / 1024, 1)},
+                'paginas_api': dict(medir(recorrer_api, repeticiones), kb=round(bytes_api / 1024, 1)),
+                'feed_incremental': dict(medir(lambda: leer_feed(cursor), repeticiones * 10),
+                                         kb=round(bytes_feed / 1024, 1)),
+            },
+        }
+
+
+def bench_busqueda_texto(tamanos=(100_000, 1_000_000), consultas=50):
+    """
+    Latencia de búsqueda por texto: los cuatro icontains anteriores contra
+    el índice de texto completo (personas.search), primera página de 10.
+    """
+    from django.db.models import Q
+    from personas.search import buscar, indexar_personas
+
+    terminos = ['nombre12345', 'apellido9 prueba', 'persona77', '55000001', 'inexistente']
+    resultados = []
+    with transaccion_revertida():
+        existentes = 0
+        for tamano in sorted(tamanos):
+            crear_personas_sinteticas(existentes, tamano)
+            indexar_personas(Persona.objects.filter(pk__gt=existentes_pk(existentes)))
+            existentes = tamano
+            siguiente = iter(terminos * consultas)
+
+            def icontains():
+                termino = next(siguiente)
+                list(Persona.objects.filter(
+                    Q(nombre__icontains=termino) | Q(apellidos__icontains=termino) |
+                    Q(correo__icontains=termino) | Q(telefono__icontains=termino)
+                )[:10])
+
+            def indice():
+                list(buscar(Persona.objects.all(), next(siguiente))[:10])
+
+            resultados.append({
+                'personas': tamano,
+                'icontains': medir(icontains, max(1, consultas // 5)),
+                'indice_texto': medir(indice, consultas),
+            })
+    return {'benchmark': 'busqueda_texto', 'resultados': resultados}
+
+
+def existentes_pk(cantidad):
+    """Mayor id entre las primeras `cantidad` personas sintéticas (0 si no hay)"""
+    if not cantidad:
+        return 0
+    return Persona.objects.order_by('id').values_list('id', flat=True)[cantidad - 1]
+
+
+def _csv_sintetico(desde, hasta, con_huella=False):
+    import csv as csv_module
+    buffer = io.StringIO()
+    escritor = csv_module.writer(buffer)
+    escritor.writerow(['nombre', 'apellidos', 'sexo', 'telefono', 'correo', 'direccion', 'huella_digital'])
+    for i in range(desde, hasta):
+        escritor.writerow([f'Nombre{i}', f'Apellido{i} Prueba', i % 2, f'{5500000000 + i}',
+                           f'persona{i}@ejemplo.com', f'Calle {i}', f'huellas/{i}.png' if con_huella else ''])
+    return io.BytesIO(buffer.getvalue().encode())
+
+
+def _zip_huellas(desde, hasta, lado=300):
+    import zipfile
+    from PIL import Image
+    rng = np.random.default_rng(desde)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as adjuntos:
+        for i in range(desde, hasta):
+            imagen = BytesIO()
+            Image.fromarray(rng.integers(0, 256, (lado, lado), dtype=np.uint8)).save(imagen, format='PNG')
+            adjuntos.writestr(f'huellas/{i}.png', imagen.getvalue())
+    buffer.seek(0)
+    return buffer
+
+
+def bench_importacion(personas=5000, huellas=200, workers=(1, 4)):
+    """
+    Importación masiva (personas.bulk) contra crear las personas una a una
+    con save(), como lo hacen el asistente de registro y la API.
+    """
+    from personas.bulk import importar_personas
+
+    resultados = {}
+    with transaccion_revertida():
+        inicio = time.perf_counter()
+        for i in range(personas):
+            Persona.objects.create(nombre=f'Nombre{i}', apellidos=f'Apellido{i} Prueba', sexo=bool(i % 2),
+                                   telefono=f'{5500000000 + i}', correo=f'persona{i}@ejemplo.com',
+                                   direccion=f'Calle {i}')
+        resultados['save_por_fila_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+
+        archivo = _csv_sintetico(personas, 2 * personas)
+        inicio = time.perf_counter()
+        importar_personas(archivo, 'csv')
+        resultados['bulk_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+
+        desde = 2 * personas
+        for cantidad_workers in workers:
+            archivo = _csv_sintetico(desde, desde + huellas, con_huella=True)
+            adjuntos = _zip_huellas(desde, desde + huellas)
+            inicio = time.perf_counter()
+            resultado = importar_personas(archivo, 'csv', adjuntos=adjuntos, workers=cantidad_workers)
+            assert resultado.creadas == huellas, resultado.como_dict()
+            resultados[f'huellas_{cantidad_workers}_workers_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+            desde += huellas
+    return {'benchmark': 'importacion', 'personas': personas, 'huellas': huellas, 'resultados': resultados}
+
+
+def bench_escrituras_sesion(recorridos=50):
+    """
+    Escrituras en la base de datos por petición al navegar y usar el
+    asistente de registro, con la sesión guardada en cada petición
+    (configuración anterior) y solo cuando cambia (actual).
+    """
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    datos_paso1 = {'nombre': 'Ana', 'apellidos': 'López', 'sexo': '0', 'telefono': '5512345678',
+                   'correo': 'ana@ejemplo.com', 'direccion': 'Calle 1'}
+    resultados = {}
+    with transaccion_revertida():
+        crear_personas_sinteticas(0, 20)
+        persona_id = Persona.objects.values_list('id', flat=True).first()
+        usuario = User.objects.create_user('benchmark-sesion')
+        recorrido = [
+            ('get', '/', None),
+            ('get', '/personas/', None),
+            ('get', f'/personas/{persona_id}/', None),
+            ('get', '/registro/paso1/', None),
+            ('post', '/registro/paso1/', datos_paso1),
+            ('get', '/registro/paso2/', None),
+        ]
+        for nombre, guardar_siempre in (('sesion_cada_peticion', True), ('solo_cambios', False)):
+            with override_settings(SESSION_SAVE_EVERY_REQUEST=guardar_siempre):
+                cliente = Client()
+                cliente.force_login(usuario)
+                peticiones = escrituras = 0
+                with CaptureQueriesContext(connection) as consultas:
+                    for _ in range(recorridos):
+                        for metodo, url, datos in recorrido:
+                            getattr(cliente, metodo)(url, datos)
+                            peticiones += 1
+                escrituras = sum(
+                    1 for consulta in consultas.captured_queries
+                    if consulta['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+                )
+                resultados[nombre] = {
+                    'peticiones': peticiones,
+                    'escrituras': escrituras,
+                    'escrituras_por_peticion': round(escrituras / peticiones, 3),
+                }
+    return {'benchmark': 'escrituras_sesion', 'resultados': resultados}
+
+
+def _crear_archivos(directorio, cantidad, antiguos, tamano=512, por_carpeta=10_000):
+    """Crea archivos de prueba repartidos en subcarpetas; la fracción 'antiguos' con fecha de hace dos días"""
+    contenido = os.urandom(tamano)
+    viejo = time.time() - 48 * 3600
+    for indice in range(cantidad):
+        carpeta = os.path.join(directorio, f'{indice // por_carpeta:04d}')
+        if indice % por_carpeta == 0:
+            os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, f'temp_{indice}.jpg')
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido)
+        if indice % 100 < antiguos * 100:
+            os.utime(ruta, (viejo, viejo))
+
+
+def bench_limpieza(archivos=1_000_000, antiguos=0.5, batch_size=1000):
+    """
+    Tiempo de la limpieza de temporales (limpiar_temporales) sobre un
+    directorio con 'archivos' fotos temporales, de las que la fracción
+    'antiguos' supera el límite de 24 horas. Se ejecuta en un MEDIA_ROOT
+    temporal que se elimina al terminar.
+    """
+    import shutil
+    import tempfile
+    from django.test.utils import override_settings
+
+    from personas.limpieza import limpiar
+
+    raiz = tempfile.mkdtemp(prefix='bench_limpieza_')
+    try:
+        inicio = time.perf_counter()
+        _crear_archivos(os.path.join(raiz, 'fotos'), archivos, antiguos)
+        creacion = time.perf_counter() - inicio
+        with override_settings(MEDIA_ROOT=raiz):
+            with transaccion_revertida():
+                simulacion = limpiar(batch_size=batch_size, dry_run=True)
+                resultado = limpiar(batch_size=batch_size)
+        restantes = sum(len(os.listdir(os.path.join(raiz, 'fotos', carpeta)))
+                        for carpeta in os.listdir(os.path.join(raiz, 'fotos')))
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+    return {
+        'benchmark': 'limpieza',
+        'archivos': archivos,
+        'creacion_s': round(creacion, 1),
+        'recorrido_s': round(simulacion.segundos, 2),
+        'limpieza_s': round(resultado.segundos, 2),
+        'eliminados': resultado.archivos,
+        'bytes_liberados': resultado.bytes,
+        'archivos_por_s': round(resultado.archivos / resultado.segundos) if resultado.segundos else None,
+        'restantes': restantes,
+    }
+
+
+def _crear_personas_con_archivos(cantidad, storage):
+    """Personas confirmadas con foto (y sus miniaturas), huella y QR propios"""
+    from personas.imagenes import FORMATOS_MINIATURA, MINIATURAS, nombre_miniatura
+
+    crear_personas_sinteticas(0, cantidad)
+    personas = list(Persona.objects.filter(huella_digest__in=[huella_sintetica(i) for i in range(cantidad)]))
+    for persona in personas:
+        contenido = f'{persona.pk}-'.encode() * 20
+        persona.foto.name = storage.save('fotos/foto.jpg', ContentFile(b'f' + contenido))
+        for tamano in MINIATURAS:
+            for formato in FORMATOS_MINIATURA:
+                storage.save_derived(nombre_miniatura(persona.foto.name, tamano, formato), ContentFile(contenido))
+        persona.huella_digital.name = storage.save('huellas/huella.png', ContentFile(b'h' + contenido))
+        persona.qr_code.name = storage.save('qr/qr.png', ContentFile(b'q' + contenido))
+    Persona.objects.bulk_update(personas, ['foto', 'huella_digital', 'qr_code'], batch_size=1000)
+    return [persona.pk for persona in personas]
+
+
+def bench_eliminacion(personas=2000):
+    """
+    Tiempo de eliminar 'personas' con sus archivos (foto con 4 miniaturas,
+    huella y QR) de tres formas:
+
+      - sincrono: queryset.delete() liberando cada archivo dentro del
+        receptor post_delete, como antes de personas.eliminacion
+      - diferido: queryset.delete() con el receptor actual, que encola
+      - purga: purgar_personas (comando purgar_personas)
+
+    'respuesta_s' es lo que tarda delete() en volver y 'total_s' hasta que
+    los archivos quedan borrados. Usa un MEDIA_ROOT temporal y confirma las
+    transacciones (los datos creados se eliminan en cada medición).
+    """
+    import shutil
+    import tempfile
+    from django.core.files.storage import default_storage
+    from django.db.models.signals import post_delete
+    from django.test.utils import override_settings
+
+    from personas.eliminacion import cola_eliminacion, purgar_personas
+    from personas.models import delete_persona_files
+
+    def liberar_sincrono(sender, instance, **kwargs):
+        for campo in (instance.foto, instance.huella_digital, instance.qr_code):
+            if campo:
+                campo.storage.delete(campo.name)
+
+    resultados = {}
+    raiz = tempfile.mkdtemp(prefix='bench_eliminacion_')
+    try:
+        with override_settings(MEDIA_ROOT=raiz):
+            for modo in ('sincrono', 'diferido', 'purga'):
+                ids = _crear_personas_con_archivos(personas, default_storage)
+                archivos = sum(len(archivos) for _, _, archivos in os.walk(raiz))
+                queryset = Persona.objects.filter(pk__in=ids)
+                if modo == 'sincrono':
+                    post_delete.disconnect(delete_persona_files, sender=Persona)
+                    post_delete.connect(liberar_sincrono, sender=Persona)
+                inicio = time.perf_counter()
+                try:
+                    if modo == 'purga':
+                        purgar_personas(queryset)
+                    else:
+                        queryset.delete()
+                finally:
+                    if modo == 'sincrono':
+                        post_delete.disconnect(liberar_sincrono, sender=Persona)
+                        post_delete.connect(delete_persona_files, sender=Persona)
+                respuesta = time.perf_counter() - inicio
+                cola_eliminacion.esperar()
+                total = time.perf_counter() - inicio
+                resultados[modo] = {
+                    'archivos': archivos,
+                    'respuesta_s': round(respuesta, 3),
+                    'total_s': round(total, 3),
+                    'restantes': sum(len(archivos) for _, _, archivos in os.walk(raiz)),
+                }
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+    return {'benchmark': 'eliminacion', 'personas': personas, 'resultados': resultados}
+
+
+def bench_cache_respuestas(personas=100_000, consultas=200):
+    """
+    Latencia del detalle y la primera página del listado de la API sin y con
+    la caché de respuestas (solo aciertos tras la primera petición), y del
+    total de personas con COUNT(*) frente al contador mantenido.
+    """
+    from django.contrib.auth.models import User
+    from django.db.models import QuerySet
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from personas.cache import estadisticas
+
+    resultados = {}
+    with transaccion_revertida():
+        crear_personas_sinteticas(0, personas)
+        usuario = User.objects.create_user('benchmark-cache')
+        cliente = Client()
+        cliente.force_login(usuario)
+        ids = list(Persona.objects.order_by('id').values_list('id', flat=True)[:consultas])
+        for nombre, segundos in (('sin_cache', 0), ('con_cache', 300)):
+            with override_settings(CACHE_RESPUESTAS={'detalle': segundos, 'lista': segundos}):
+                for persona_id in ids:
+                    cliente.get(f'/api/personas/{persona_id}/')
+                indice = iter(ids * 2)
+                resultados[nombre] = {
+                    'detalle': medir(lambda: cliente.get(f'/api/personas/{next(indice)}/'), consultas),
+                    'lista': medir(lambda: cliente.get('/api/personas/'), consultas),
+                }
+        resultados['total'] = {
+            'count_sql': medir(lambda: QuerySet(Persona).count(), 20),
+            'contador': medir(lambda: Persona.objects.count(), 20),
+        }
+    resultados['aciertos'] = estadisticas()
+    return {'benchmark': 'cache_respuestas', 'personas': personas, 'resultados': resultados}
+
+
+def bench_concurrencia_huellas(concurrentes=200, huellas=50, hilos=16):
+    """
+    Latencia y rendimiento de capturar_huella, busqueda_huella y
+    buscar_por_huella con 'concurrentes' peticiones simultáneas:
+
+      - wsgi: vistas de views.py con el manejador WSGI de Django en un pool
+        de 'hilos' hilos (como un worker gthread de gunicorn)
+      - asgi: vistas de views_async.py con el manejador ASGI en un solo
+        bucle de eventos y settings.ASYNC_CPU_WORKERS hilos de CPU
+
+    La latencia incluye la espera en cola. Las 'huellas' personas de prueba
+    se confirman en la base de datos (los hilos usan otras conexiones) y se
+    purgan al terminar.
+    """
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from types import ModuleType
+
+    from asgiref.sync import async_to_sync
+    from django.contrib.auth.models import User
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.db import close_old_connections
+    from django.test import AsyncClient, Client
+    from django.test.utils import override_settings
+    from django.urls import include, path
+
+    from personas import views, views_async
+    from personas.eliminacion import purgar_personas
+
+    def urlconf(modulo, buscar):
+        conf = ModuleType(f'urls_{modulo.__name__}')
+        conf.urlpatterns = [
+            path('api/personas/buscar_por_huella/', buscar),
+            path('api/capturar-huella/', modulo.capturar_huella),
+            path('busqueda/', modulo.busqueda_huella),
+            path('', include('sistema_personas.urls')),
+        ]
+        return conf
+
+    urlconfs = {
+        'wsgi': urlconf(views, views.PersonaViewSet.as_view({'post': 'buscar_por_huella'})),
+        'asgi': urlconf(views_async, views_async.buscar_por_huella),
+    }
+    imagenes = [imagen_huella(semilla) for semilla in range(huellas)]
+    peticiones = {
+        'capturar_huella': lambda imagen: ('/api/capturar-huella/', {'data': imagen, 'content_type': 'application/octet-stream'}),
+        'busqueda_huella': lambda imagen: ('/busqueda/', {'data': {'huella': SimpleUploadedFile('h.png', imagen, 'image/png')}}),
+        'buscar_por_huella': lambda imagen: ('/api/personas/buscar_por_huella/',
+                                             {'data': {'huella': SimpleUploadedFile('h.png', imagen, 'image/png')}}),
+    }
+
+    def resumen(latencias, total):
+        latencias.sort()
+        return {
+            'p50_ms': round(latencias[len(latencias) // 2] * 1000, 1),
+            'p95_ms': round(latencias[int(len(latencias) * 0.95)] * 1000, 1),
+            'peticiones_s': round(len(latencias) / total, 1),
+        }
+
+    def wsgi(usuario, endpoint):
+        locales = threading.local()
+
+        def peticion(imagen, enviada):
+            if not hasattr(locales, 'cliente'):
+                locales.cliente = Client()
+                locales.cliente.force_login(usuario)
+            url, kwargs = peticiones[endpoint](imagen)
+            respuesta = locales.cliente.post(url, **kwargs)
+            return respuesta.status_code, time.perf_counter() - enviada
+
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            inicio = time.perf_counter()
+            futuros = [pool.submit(peticion, imagenes[i % huellas], time.perf_counter()) for i in range(concurrentes)]
+            resultados = [futuro.result() for futuro in futuros]
+            total = time.perf_counter() - inicio
+            pool.map(lambda _: close_old_connections(), range(hilos))
+        return resultados, total
+
+    async def asgi(usuario, endpoint):
+        cliente = AsyncClient()
+        await cliente.aforce_login(usuario)
+
+        async def peticion(imagen):
+            enviada = time.perf_counter()
+            url, kwargs = peticiones[endpoint](imagen)
+            respuesta = await cliente.post(url, **kwargs)
+            return respuesta.status_code, time.perf_counter() - enviada
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(peticion(imagenes[i % huellas]) for i in range(concurrentes)))
+        return resultados, time.perf_counter() - inicio
+
+    resultados = {}
+    crear_personas_sinteticas(10_000_000, 10_000_000 + huellas)
+    desde = Persona.objects.order_by('-id').values_list('id', flat=True)[huellas - 1]
+    personas = Persona.objects.filter(pk__gte=desde)
+    for persona, imagen in zip(personas.order_by('id'), imagenes):
+        persona.huella_hex = hashlib.sha256(imagen).hexdigest()
+        persona.save(update_fields=['huella_hex', 'huella_digest'])
+    usuario, _ = User.objects.get_or_create(username='benchmark-concurrencia')
+    try:
+        # Calentamiento: caché de plantillas y de QR iguales para ambos modos
+        cliente = Client()
+        cliente.force_login(usuario)
+        with override_settings(ROOT_URLCONF=urlconfs['wsgi']):
+            for endpoint in peticiones:
+                for imagen in imagenes:
+                    url, kwargs = peticiones[endpoint](imagen)
+                    cliente.post(url, **kwargs)
+        for endpoint in peticiones:
+            resultados[endpoint] = {}
+            for modo in ('wsgi', 'asgi'):
+                with override_settings(ROOT_URLCONF=urlconfs[modo]):
+                    if modo == 'wsgi':
+                        respuestas, total = wsgi(usuario, endpoint)
+                    else:
+                        respuestas, total = async_to_sync(asgi)(usuario, endpoint)
+                estados = sorted({estado for estado, _ in respuestas})
+                resultados[endpoint][modo] = {**resumen([t for _, t in respuestas], total), 'estados': estados}
+    finally:
+        purgar_personas(personas)
+        usuario.delete()
+    return {
+        'benchmark': 'concurrencia_huellas',
+        'concurrentes': concurrentes,
+        'hilos_wsgi': hilos,
+        'resultados': resultados,
+    }
+
+
+def crear_personas_con_imagenes(desde, hasta, storage=None):
+    """
+    Personas sintéticas [desde, hasta) completas como las deja el registro:
+    foto con miniaturas, imagen de huella (imagen_huella(i)) con su hash y
+    plantilla, y código QR, guardados en storage (default_storage).
+
+    Returns:
+        list: Ids de las personas creadas
+    """
+    from django.core.files.storage import default_storage
+
+    from personas.biometrics import extract_fingerprint_template, generate_qr_from_hash
+    from personas.imagenes import generar_miniaturas
+
+    storage = storage or default_storage
+    personas = []
+    for i in range(desde, hasta):
+        huella = imagen_huella(i)
+        huella_hex = hashlib.sha256(huella).hexdigest()
+        personas.append(Persona(
+            nombre=f'Nombre{i}',
+            apellidos=f'Apellido{i} Prueba',
+            sexo=bool(i % 2),
+            telefono=f'{5500000000 + i}',
+            correo=f'persona{i}@ejemplo.com',
+            direccion=f'Calle {i}, Colonia Centro',
+            foto=storage.save('fotos/foto.jpg', ContentFile(foto_sintetica(i, lado=(400, 300)))),
+            huella_digital=storage.save('huellas/huella.png', ContentFile(huella)),
+            huella_hex=huella_hex,
+            huella_digest=huella_hex,
+            huella_template=extract_fingerprint_template(BytesIO(huella)),
+            qr_code=storage.save('qr/qr.png', generate_qr_from_hash(huella_hex)),
+        ))
+    personas = Persona.objects.bulk_create(personas, batch_size=1000)
+    PersonaLista.objects.bulk_create([fila_de(persona) for persona in personas], batch_size=1000)
+    ajustar_contador_personas(len(personas))
+    for persona in personas:
+        generar_miniaturas(persona.foto)
+    return [persona.pk for persona in personas]
+
+
+def bench_micro_imagenes(repeticiones=50, foto_mb=5):
+    """
+    Micro-benchmarks del trabajo de imágenes por registro: hash SHA-256 de
+    una huella y de una foto de 'foto_mb' MB, generación del QR (sin caché
+    y desde la caché en memoria), optimize_image de una foto de cámara y
+    extracción de la plantilla de huella.
+    """
+    from personas.biometrics import extract_fingerprint_template, generate_qr_from_hash, generate_sha256_from_image
+    from personas.utils import optimize_image
+
+    huella = ContentFile(imagen_huella(0), name='huella.png')
+    foto_grande = ContentFile(os.urandom(foto_mb * 2**20), name='foto.jpg')
+    foto = foto_sintetica(0, lado=(1500, 2000))
+    hashes = [huella_sintetica(i) for i in range(repeticiones)]
+
+    qr.clear_cache()
+    siguiente = iter(hashes)
+    qr_frio = medir(lambda: (qr.qr_matrix.cache_clear(), qr.qr_png.cache_clear(),
+                             generate_qr_from_hash(next(siguiente))), repeticiones)
+    siguiente = iter(hashes)
+    qr_cache = medir(lambda: generate_qr_from_hash(next(siguiente)), repeticiones)
+    qr.clear_cache()
+
+    return {
+        'benchmark': 'micro_imagenes',
+        'resultados': {
+            'sha256_huella': medir(lambda: generate_sha256_from_image(huella), repeticiones),
+            f'sha256_foto_{foto_mb}mb': medir(lambda: generate_sha256_from_image(foto_grande), max(1, repeticiones // 5)),
+            'qr_sin_cache': qr_frio,
+            'qr_cache': qr_cache,
+            'optimize_image_2000x1500': medir(lambda: optimize_image(BytesIO(foto)), max(1, repeticiones // 5)),
+            'plantilla_huella': medir(lambda: extract_fingerprint_template(huella), repeticiones),
+        },
+    }
+
+
+def bench_carga_registro(registros=20):
+    """
+    Recorrido completo del asistente de registro con el cliente de pruebas
+    (paso 1 con los datos, paso 2 con una foto de cámara de 1600x1200 y
+    paso 3 con la huella), procesando el registro dentro de la petición.
+    Archivos en un MEDIA_ROOT temporal; la base de datos se revierte.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    datos_paso1 = {'nombre': 'Ana', 'apellidos': 'López', 'sexo': '0', 'telefono': '5512345678',
+                   'correo': 'ana@ejemplo.com', 'direccion': 'Calle 1'}
+    fotos = [foto_sintetica(i) for i in range(registros)]
+    huellas = [imagen_huella(i) for i in range(registros)]
+    tiempos = {'paso1': [], 'paso2': [], 'paso3': []}
+
+    def cronometrar(paso, func):
+        inicio = time.perf_counter()
+        respuesta = func()
+        tiempos[paso].append((time.perf_counter() - inicio) * 1000)
+        assert respuesta.status_code == 302, (paso, respuesta.status_code)
+
+    with media_temporal('bench_media_'), override_settings(REGISTRO_PROCESAMIENTO_ASINCRONO=False), transaccion_revertida():
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('benchmark-registro'))
+        inicio = time.perf_counter()
+        for foto, huella in zip(fotos, huellas):
+            cronometrar('paso1', lambda: cliente.post('/registro/paso1/', datos_paso1))
+            cronometrar('paso2', lambda: cliente.post('/registro/paso2/', {'foto': ContentFile(foto, name='foto.jpg')}))
+            cronometrar('paso3', lambda: cliente.post('/registro/paso3/', {'huella': ContentFile(huella, name='huella.png')}))
+        total = time.perf_counter() - inicio
+        completados = Persona.objects.filter(estado_procesamiento=Persona.PROCESAMIENTO_COMPLETADO,
+                                             correo=datos_paso1['correo']).count()
+    return {
+        'benchmark': 'carga_registro',
+        'registros': registros,
+        'completados': completados,
+        'registros_por_s': round(registros / total, 2),
+        'resultados': {paso: _resumen_ms(valores) for paso, valores in tiempos.items()},
+    }
+
+
+
+def _io_proceso():
+    """(bytes, llamadas) de escritura de este proceso según /proc/self/io, o None fuera de Linux"""
+    try:
+        with open('/proc/self/io') as archivo:
+            campos = dict(linea.split(': ') for linea in archivo.read().splitlines())
+    except OSError:
+        return None
+    return int(campos['wchar']), int(campos['syscw'])
+
+
+def bench_escritura_registro(registros=10, lado=(1200, 1600)):
+    """
+    Bytes escritos por registro completo (pasos 2 y 3 del asistente, con el
+    registro procesado dentro de la petición), medidos con los contadores
+    wchar/syscw de /proc/self/io. Incluyen las escrituras de SQLite, que son
+    las mismas con o sin archivos preparados.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    if _io_proceso() is None:
+        return {'benchmark': 'escritura_registro', 'error': 'Requiere /proc/self/io (Linux)'}
+
+    datos_paso1 = {'nombre': 'Ana', 'apellidos': 'López', 'sexo': '0', 'telefono': '5512345678',
+                   'correo': 'ana@ejemplo.com', 'direccion': 'Calle 1'}
+    fotos = [foto_sintetica(i, lado=lado) for i in range(registros)]
+    huellas = [imagen_huella(i) for i in range(registros)]
+    escrito = {'paso2': [0, 0], 'paso3': [0, 0]}
+
+    def contar(paso, func):
+        antes = _io_proceso()
+        respuesta = func()
+        despues = _io_proceso()
+        assert respuesta.status_code == 302, (paso, respuesta.status_code)
+        escrito[paso][0] += despues[0] - antes[0]
+        escrito[paso][1] += despues[1] - antes[1]
+
+    with media_temporal('bench_media_') as raiz, override_settings(REGISTRO_PROCESAMIENTO_ASINCRONO=False), transaccion_revertida():
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('benchmark-escritura'))
+        for foto, huella in zip(fotos, huellas):
+            cliente.post('/registro/paso1/', datos_paso1)
+            contar('paso2', lambda: cliente.post('/registro/paso2/', {'foto': ContentFile(foto, name='foto.jpg')}))
+            contar('paso3', lambda: cliente.post('/registro/paso3/', {'huella': ContentFile(huella, name='huella.png')}))
+        # Tamaño final en MEDIA_ROOT, contando una vez cada archivo enlazado
+        inodos = {}
+        for carpeta, _, archivos in os.walk(raiz):
+            for archivo in archivos:
+                stat = os.stat(os.path.join(carpeta, archivo))
+                inodos[stat.st_ino] = stat.st_size
+        completados = Persona.objects.filter(estado_procesamiento=Persona.PROCESAMIENTO_COMPLETADO,
+                                             correo=datos_paso1['correo']).count()
+    resultados = {
+        paso: {'kb_por_registro': round(total / registros / 1024, 1), 'escrituras_por_registro': round(llamadas / registros, 1)}
+        for paso, (total, llamadas) in escrito.items()
+    }
+    total = sum(bytes_ for bytes_, _ in escrito.values())
+    return {
+        'benchmark': 'escritura_registro',
+        'registros': registros,
+        'completados': completados,
+        'foto_kb': round(statistics.fmean(len(foto) for foto in fotos) / 1024, 1),
+        'huella_kb': round(statistics.fmean(len(huella) for huella in huellas) / 1024, 1),
+        'media_guardada_kb_por_registro': round(sum(inodos.values()) / registros / 1024, 1),
+        'escrito_kb_por_registro': round(total / registros / 1024, 1),
+        'resultados': resultados,
+    }
+
+
+def _resumen_ms(tiempos):
+    tiempos = sorted(tiempos)
+    return {
+        'repeticiones': len(tiempos),
+        'media_ms': round(statistics.fmean(tiempos), 4),
+        'p50_ms': round(tiempos[len(tiempos) // 2], 4),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 4),
+    }
+
+
+def bench_carga_busqueda_huella(personas=200, consultas=100):
+    """
+    Búsqueda por huella de extremo a extremo (API buscar_por_huella y vista
+    web de búsqueda) sobre 'personas' registradas con imágenes: la misma
+    captura (coincidencia exacta por hash), otra captura del mismo dedo
+    (coincidencia por plantilla) y un dedo desconocido.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from personas.matching import template_cache
+
+    semillas = [int(i * personas / consultas) for i in range(consultas)]
+    capturas = {
+        'exacta': [imagen_huella(s) for s in semillas],
+        'otra_captura': [imagen_huella(s, captura=1, ruido=10) for s in semillas],
+        'desconocida': [imagen_huella(10_000_000 + s) for s in semillas],
+    }
+    resultados = {}
+    with media_temporal('bench_media_'), transaccion_revertida():
+        crear_personas_con_imagenes(0, personas)
+        template_cache.clear()
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('benchmark-busqueda'))
+        for nombre, imagenes in capturas.items():
+            resultados[nombre] = {}
+            for url, clave in (('/api/personas/buscar_por_huella/', 'api'), ('/busqueda/', 'web')):
+                siguiente = iter(imagenes)
+                estados = []
+
+                def buscar():
+                    respuesta = cliente.post(url, {'huella': ContentFile(next(siguiente), name='huella.png')})
+                    estados.append(respuesta.status_code)
+
+                resultados[nombre][clave] = {**medir(buscar, consultas), 'estados': sorted(set(estados))}
+    template_cache.clear()
+    return {'benchmark': 'carga_busqueda_huella', 'personas': personas, 'resultados': resultados}
+
+
+
+def bench_identificacion_lote(personas=200, lotes=(1, 10, 50), repeticiones=5):
+    """
+    Identificación de 'lote' huellas con una petición a buscar_por_huellas
+    frente a 'lote' peticiones seguidas a buscar_por_huella. Cada lote mezcla
+    capturas exactas, otras capturas del mismo dedo y dedos desconocidos.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from personas.matching import template_cache
+
+    def capturas(lote):
+        imagenes = []
+        for i in range(lote):
+            semilla = (i * 7) % personas
+            if i % 3 == 0:
+                imagenes.append(imagen_huella(semilla))
+            elif i % 3 == 1:
+                imagenes.append(imagen_huella(semilla, captura=1, ruido=10))
+            else:
+                imagenes.append(imagen_huella(10_000_000 + i))
+        return imagenes
+
+    resultados = {}
+    with media_temporal('bench_media_'), transaccion_revertida():
+        crear_personas_con_imagenes(0, personas)
+        template_cache.clear()
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('benchmark-lote'))
+        # Carga la caché de plantillas antes de medir
+        cliente.post('/api/personas/buscar_por_huella/', {'huella': ContentFile(imagen_huella(0), name='huella.png')})
+        for lote in lotes:
+            imagenes = capturas(lote)
+            encontradas = []
+
+            def secuencial():
+                total = 0
+                for imagen in imagenes:
+                    respuesta = cliente.post('/api/personas/buscar_por_huella/',
+                                             {'huella': ContentFile(imagen, name='huella.png')})
+                    total += respuesta.status_code == 200
+                encontradas.append(total)
+
+            def por_lote():
+                archivos = [ContentFile(imagen, name=f'huella{i}.png') for i, imagen in enumerate(imagenes)]
+                respuesta = cliente.post('/api/personas/buscar_por_huellas/', {'huellas': archivos})
+                encontradas.append(respuesta.json()['encontradas'])
+
+            fila = {}
+            for nombre, func in (('secuencial', secuencial), ('lote', por_lote)):
+                encontradas.clear()
+                tiempos = medir(func, repeticiones)
+                fila[nombre] = {
+                    **tiempos,
+                    'huellas_por_s': round(lote / (tiempos['media_ms'] / 1000), 1),
+                    'encontradas': encontradas[0],
+                }
+            fila['aceleracion'] = round(fila['secuencial']['media_ms'] / fila['lote']['media_ms'], 2)
+            resultados[f'lote_{lote}'] = fila
+    template_cache.clear()
+    return {'benchmark': 'identificacion_lote', 'personas': personas, 'resultados': resultados}
+
+
+def bench_carga_listado(personas=20_000, paginas=20, consultas=50):
+    """
+    Navegación de listados con el cliente de pruebas: 'paginas' páginas
+    seguidas de la API (cursor), de la lista web y de búsquedas por texto en
+    ambas, con la caché de respuestas desactivada.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from personas.search import indexar_personas
+
+    terminos = ['nombre12345', 'apellido9 prueba', 'persona77', '55000001', 'inexistente']
+    resultados = {}
+    with override_settings(CACHE_RESPUESTAS={'detalle': 0, 'lista': 0}), transaccion_revertida():
+        crear_personas_sinteticas(0, personas)
+        indexar_personas(Persona.objects.all())
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('benchmark-listado'))
+
+        def recorrer_api():
+            url = '/api/personas/'
+            for _ in range(paginas):
+                url = cliente.get(url).json()['next']
+                if not url:
+                    break
+
+        def recorrer_web():
+            for pagina in range(1, paginas + 1):
+                cliente.get(f'/personas/?page={pagina}')
+
+        siguiente = iter(terminos * consultas * 2)
+        resultados = {
+            'api_paginas': medir(recorrer_api, max(1, consultas // paginas)),
+            'web_paginas': medir(recorrer_web, max(1, consultas // paginas)),
+            'api_busqueda': medir(lambda: cliente.get('/api/personas/', {'search': next(siguiente)}), consultas),
+            'web_busqueda': medir(lambda: cliente.get('/personas/', {'q': next(siguiente)}), consultas),
+        }
+    return {'benchmark': 'carga_listado', 'personas': personas, 'paginas': paginas, 'resultados': resultados}
+
+
+@contextmanager
+def base_datos_temporal(alias, config):
+    """Registra config como django.db.connections[alias] mientras dura el bloque"""
+    from django.db import connections
+
+    connections.settings[alias] = connections.configure_settings({'default': config})['default']
+    try:
+        yield connections[alias]
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+def bench_conexiones(peticiones=2000, transacciones=200, hilos=4, urls=()):
+    """
+    Costo de la conexión a la base de datos por petición según la
+    configuración (sistema_personas.basedatos), con el ciclo de Django:
+    close_if_unusable_or_obsolete al empezar y al terminar cada petición.
+
+      - lectura: una consulta por clave primaria por petición
+      - escritura: una transacción (lectura y actualización) por petición
+      - concurrencia: 'hilos' hilos con 'transacciones' escrituras cada
+        uno; cuenta los errores "database is locked"
+
+    Los modos de SQLite usan un archivo temporal: 'anterior' es la
+    configuración previa (una conexión por petición, journal DELETE,
+    synchronous FULL, transacciones DEFERRED). 'urls' agrega otras bases de
+    datos (p. ej. mysql://... o postgres://...) para los modos de lectura y
+    escritura, en una tabla que se crea y se borra.
+    """
+    import random
+    import shutil
+    import tempfile
+    import threading
+
+    from django.db import OperationalError, transaction
+
+    from sistema_personas.basedatos import configuracion_base_datos, pragmas_sqlite
+
+    directorio = tempfile.mkdtemp(prefix='bench_conexiones_')
+    sqlite = os.path.join(directorio, 'bench.sqlite3')
+    anterior = dict(conn_max_age=0, health_checks=False, sqlite_pragmas=None, sqlite_timeout=5,
+                    sqlite_transaction_mode=None)
+    modos = {
+        'sqlite_anterior': configuracion_base_datos(None, sqlite, **anterior),
+        'sqlite_persistente': configuracion_base_datos(None, sqlite, conn_max_age=600, health_checks=False,
+                                                       sqlite_pragmas=None, sqlite_transaction_mode=None),
+        'sqlite_persistente_verificada': configuracion_base_datos(None, sqlite, conn_max_age=600,
+                                                                  sqlite_pragmas=None, sqlite_transaction_mode=None),
+        'sqlite_actual': configuracion_base_datos(None, sqlite, conn_max_age=600, sqlite_pragmas=pragmas_sqlite()),
+    }
+    for indice, url in enumerate(urls):
+        modos[f'url{indice}_por_peticion'] = configuracion_base_datos(url, conn_max_age=0, health_checks=False)
+        modos[f'url{indice}_persistente'] = configuracion_base_datos(url, conn_max_age=600)
+    filas = 1000
+
+    def preparar(conexion):
+        with conexion.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS bench_conexiones')
+            cursor.execute('CREATE TABLE bench_conexiones (id INTEGER PRIMARY KEY, valor INTEGER NOT NULL)')
+            cursor.executemany('INSERT INTO bench_conexiones (id, valor) VALUES (%s, %s)',
+                               [(i, 0) for i in range(1, filas + 1)])
+
+    def peticion(conexion, trabajo):
+        conexion.close_if_unusable_or_obsolete()
+        try:
+            trabajo(conexion)
+        finally:
+            conexion.close_if_unusable_or_obsolete()
+
+    def leer(conexion):
+        with conexion.cursor() as cursor:
+            cursor.execute('SELECT valor FROM bench_conexiones WHERE id = %s', [random.randint(1, filas)])
+            cursor.fetchone()
+
+    def escribir(conexion):
+        with transaction.atomic(using=conexion.alias), conexion.cursor() as cursor:
+            fila = random.randint(1, filas)
+            cursor.execute('SELECT valor FROM bench_conexiones WHERE id = %s', [fila])
+            valor = cursor.fetchone()[0]
+            cursor.execute('UPDATE bench_conexiones SET valor = %s WHERE id = %s', [valor + 1, fila])
+
+    resultados = {}
+    try:
+        for nombre, config in modos.items():
+            with base_datos_temporal(f'bench_{nombre}', config) as conexion:
+                preparar(conexion)
+                conexion.close()
+                resultados[nombre] = {
+                    'lectura': medir(lambda: peticion(conexion, leer), peticiones),
+                    'escritura': medir(lambda: peticion(conexion, escribir), max(1, peticiones // 4)),
+                }
+                if nombre.startswith('url'):
+                    with conexion.cursor() as cursor:
+                        cursor.execute('DROP TABLE bench_conexiones')
+
+        for nombre in ('sqlite_anterior', 'sqlite_actual'):
+            alias = f'bench_{nombre}'
+            with base_datos_temporal(alias, modos[nombre]):
+                from django.db import connections
+                errores = []
+
+                def trabajador():
+                    conexion = connections[alias]
+                    for _ in range(transacciones):
+                        try:
+                            peticion(conexion, escribir)
+                        except OperationalError as e:
+                            errores.append(str(e))
+                    conexion.close()
+
+                inicio = time.perf_counter()
+                grupo = [threading.Thread(target=trabajador) for _ in range(hilos)]
+                for hilo in grupo:
+                    hilo.start()
+                for hilo in grupo:
+                    hilo.join()
+                total = time.perf_counter() - inicio
+                resultados[nombre]['concurrencia'] = {
+                    'transacciones': hilos * transacciones,
+                    'errores': len(errores),
+                    'errores_tipo': sorted(set(errores)),
+                    'transacciones_por_s': round((hilos * transacciones - len(errores)) / total, 1),
+                }
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    return {'benchmark': 'conexiones', 'peticiones': peticiones, 'resultados': resultados}
+
+
+def bench_calidad_huella(repeticiones=50):
+    """
+    Control de calidad de capturas (biometrics.preprocess_fingerprint):
+    tiempo por tamaño y formato de imagen, y calidad medida y decisión para
+    capturas buenas, con ruido, recomprimidas, borrosas, parciales, de bajo
+    contraste, en blanco y de ruido puro.
+    """
+    from PIL import Image, ImageFilter
+
+    from personas.biometrics import get_min_quality, preprocess_fingerprint
+
+    def png(pixeles):
+        buffer = BytesIO()
+        Image.fromarray(np.clip(pixeles, 0, 255).astype(np.uint8)).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def pixeles(datos):
+        return np.asarray(Image.open(BytesIO(datos)).convert('L'), dtype=np.float32)
+
+    def recodificar(datos, formato, **opciones):
+        buffer = BytesIO()
+        Image.open(BytesIO(datos)).save(buffer, format=formato, **opciones)
+        return buffer.getvalue()
+
+    def borrosa(datos, radio):
+        buffer = BytesIO()
+        Image.open(BytesIO(datos)).filter(ImageFilter.GaussianBlur(radio)).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    tamanos = {
+        'png_300x400': imagen_huella(1),
+        'png_450x500': imagen_huella(1, lado=(500, 450)),
+        'jpg_450x500': recodificar(imagen_huella(1, lado=(500, 450)), 'JPEG', quality=90),
+        'png_1000x1000': imagen_huella(1, lado=(1000, 1000)),
+        'jpg_2000x2000': recodificar(imagen_huella(1, lado=(2000, 2000)), 'JPEG', quality=90),
+    }
+    tiempos = {nombre: medir(lambda datos=datos: preprocess_fingerprint(BytesIO(datos)), repeticiones)
+               for nombre, datos in tamanos.items()}
+
+    buena = imagen_huella(1)
+    alto, ancho = pixeles(buena).shape
+    casos = {
+        'buena': buena,
+        'ruido_sensor': imagen_huella(1, ruido=30),
+        'jpeg_calidad_5': recodificar(buena, 'JPEG', quality=5),
+        'borrosa': borrosa(buena, 4),
+        'bajo_contraste': png(pixeles(buena) * 0.08 + 100),
+        'parcial': png(np.where(np.arange(ancho)[None, :] < ancho // 6, pixeles(buena), 220)),
+        'en_blanco': png(np.full((alto, ancho), 200)),
+        'ruido_puro': png(np.random.default_rng(0).integers(0, 256, (alto, ancho))),
+    }
+    minima = get_min_quality()
+    calidades = {}
+    for nombre, datos in casos.items():
+        _, calidad = preprocess_fingerprint(BytesIO(datos))
+        calidades[nombre] = {**calidad.as_dict(), 'aceptada': calidad.score >= minima}
+    return {'benchmark': 'calidad_huella', 'calidad_minima': minima, 'tiempos': tiempos, 'casos': calidades}
+
+
+def _microsegundos(func, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        func()
+    return (time.perf_counter() - inicio) / repeticiones * 1_000_000
+
+
+def bench_metricas(repeticiones=100_000, consultas=10, peticiones=500):
+    """
+    Costo de personas.metricas en microsegundos: el middleware alrededor de
+    una vista vacía, el execute_wrapper por consulta, el decorador
+    medir_imagen y una petición real al detalle de la API (en caché, con
+    'consultas' SELECT 1 adicionales) con y sin el middleware.
+    """
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.http import HttpResponse
+    from django.test import Client, RequestFactory
+    from django.test.utils import override_settings
+    from django.urls import resolve
+
+    from personas.metricas import MetricasMiddleware, _Peticion, _peticion_actual, medir_imagen, registro
+
+    request = RequestFactory().get('/api/personas/1/')
+    request.resolver_match = resolve('/api/personas/1/')
+    respuesta = HttpResponse(b'{}')
+    vista = lambda r: respuesta  # noqa: E731
+    middleware = MetricasMiddleware(vista)
+
+    connection.ensure_connection()
+    cursor = connection.cursor()
+    consulta = lambda: cursor.execute('SELECT 1')  # noqa: E731
+    # Fuera de una petición el wrapper solo consulta el contextvar
+    fuera_de_peticion = _microsegundos(consulta, repeticiones)
+    token = _peticion_actual.set(_Peticion())
+    en_peticion = _microsegundos(consulta, repeticiones)
+    _peticion_actual.reset(token)
+
+    def trivial():
+        return None
+
+    resultados = {
+        'middleware_us': round(_microsegundos(lambda: middleware(request), repeticiones)
+                               - _microsegundos(lambda: vista(request), repeticiones), 2),
+        'consulta_us': {
+            'fuera_de_peticion': round(fuera_de_peticion, 2),
+            'en_peticion': round(en_peticion, 2),
+        },
+        'medir_imagen_us': round(_microsegundos(medir_imagen(trivial), repeticiones)
+                                 - _microsegundos(trivial, repeticiones), 2),
+    }
+
+    with transaccion_revertida():
+        crear_personas_sinteticas(0, 10)
+        usuario = User.objects.create_user('benchmark-metricas')
+        persona_id = existentes_pk(1)
+
+        def peticion_completa(cliente):
+            cliente.get(f'/api/personas/{persona_id}/')
+            for _ in range(consultas):
+                consulta()
+
+        from django.conf import settings
+        sin_middleware = [m for m in settings.MIDDLEWARE if m != 'personas.metricas.MetricasMiddleware']
+        for nombre, lista in (('sin_metricas', sin_middleware), ('con_metricas', settings.MIDDLEWARE)):
+            with override_settings(MIDDLEWARE=lista):
+                cliente = Client()
+                cliente.force_login(usuario)
+                peticion_completa(cliente)
+                resultados[nombre] = medir(lambda: peticion_completa(cliente), peticiones)
+    registro.reiniciar()
+    return {'benchmark': 'metricas', 'repeticiones': repeticiones, 'resultados': resultados}
+
+
+BENCHMARKS = {
+    'busqueda_huella': bench_busqueda_huella,
+    'indice_huellas': bench_indice_huellas,
+    'precision_huellas': bench_precision_huellas,
+    'qr': bench_qr,
+    'memoria_captura': bench_memoria_captura,
+    'paginacion': bench_paginacion,
+    'listado_proyeccion': bench_listado_proyeccion,
+    'feed_cambios': bench_feed_cambios,
+    'busqueda_texto': bench_busqueda_texto,
+    'importacion': bench_importacion,
+    'escrituras_sesion': bench_escrituras_sesion,
+    'limpieza': bench_limpieza,
+    'eliminacion': bench_eliminacion,
+    'cache_respuestas': bench_cache_respuestas,
+    'concurrencia_huellas': bench_concurrencia_huellas,
+    'metricas': bench_metricas,
+    'micro_imagenes': bench_micro_imagenes,
+    'carga_registro': bench_carga_registro,
+    'escritura_registro': bench_escritura_registro,
+    'carga_busqueda_huella': bench_carga_busqueda_huella,
+    'identificacion_lote': bench_identificacion_lote,
+    'carga_listado': bench_carga_listado,
+    'conexiones': bench_conexiones,
+    'calidad_huella': bench_calidad_huella,
+}
+
+
+# Benchmarks de la suite (python -m benchmarks suite) con parámetros que terminan en
+# pocos minutos; las comparaciones solo tienen sentido en la misma máquina
+SUITE = {
+    'micro_imagenes': {'repeticiones': 30},
+    'carga_registro': {'registros': 10},
+    'escritura_registro': {'registros': 10},
+    'carga_busqueda_huella': {'personas': 100, 'consultas': 50},
+    'identificacion_lote': {'personas': 100, 'lotes': (10, 50), 'repeticiones': 3},
+    'carga_listado': {'personas': 5000, 'paginas': 10, 'consultas': 20},
+    'listado_proyeccion': {'personas': 5000, 'consultas': 20},
+    'feed_cambios': {'personas': 5000, 'repeticiones': 3},
+    'busqueda_huella': {'tamanos': (10_000,), 'consultas': 100},
+    'busqueda_texto': {'tamanos': (10_000,), 'consultas': 20},
+    'cache_respuestas': {'personas': 10_000, 'consultas': 100},
+    'metricas': {'repeticiones': 20_000, 'peticiones': 100},
+    'conexiones': {'peticiones': 1000, 'transacciones': 100},
+    'calidad_huella': {'repeticiones': 30},
+    'precision_huellas': {'dedos': 30, 'capturas': 3, 'desconocidos': 5},
+}
+
+# Sufijos de las métricas que se comparan contra la línea base
+MENOR_ES_MEJOR = ('p50_ms', 'media_ms', '_us', 'pico_kb', 'kb_por_registro')
+MAYOR_ES_MEJOR = ('_por_s', 'peticiones_s')
+
+
+def ejecutar_suite(nombres=None, progreso=None):
+    """
+    Ejecuta los benchmarks de SUITE (o solo 'nombres') y devuelve un
+    documento JSON con el entorno, los parámetros y los resultados.
+    """
+    import sys
+    import sqlite3
+    import platform
+
+    import django
+
+    nombres = list(nombres or SUITE)
+    resultados = {}
+    for nombre in nombres:
+        if progreso:
+            progreso(nombre)
+        inicio = time.perf_counter()
+        resultados[nombre] = BENCHMARKS[nombre](**SUITE.get(nombre, {}))
+        resultados[nombre]['duracion_s'] = round(time.perf_counter() - inicio, 1)
+    return {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'entorno': {
+            'python': sys.version.split()[0],
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'parametros': {nombre: SUITE.get(nombre, {}) for nombre in nombres},
+        'benchmarks': resultados,
+    }
+
+
+def metricas_comparables(valor, ruta=''):
+    """{ruta.de.la.metrica: valor} de las métricas con un sufijo comparable"""
+    metricas = {}
+    if isinstance(valor, dict):
+        for clave, subvalor in valor.items():
+            metricas.update(metricas_comparables(subvalor, f'{ruta}.{clave}' if ruta else str(clave)))
+    elif isinstance(valor, list):
+        for indice, subvalor in enumerate(valor):
+            metricas.update(metricas_comparables(subvalor, f'{ruta}[{indice}]'))
+    elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        if ruta.endswith(MENOR_ES_MEJOR + MAYOR_ES_MEJOR):
+            metricas[ruta] = valor
+    return metricas
+
+
+def comparar_con_base(actual, base, tolerancia=0.2, umbral_ms=0.1):
+    """
+    Compara dos documentos de ejecutar_suite métrica por métrica.
+
+    'cambio' es el aumento relativo del costo (positivo = más lento o menos
+    rendimiento). Es una regresión si supera 'tolerancia' y, en métricas de
+    tiempo, la diferencia absoluta supera 'umbral_ms' (ruido de medición).
+
+    Returns:
+        list: Un diccionario por métrica presente en ambos documentos
+    """
+    actuales = metricas_comparables(actual['benchmarks'])
+    bases = metricas_comparables(base['benchmarks'])
+    comparacion = []
+    for metrica in sorted(actuales.keys() & bases.keys()):
+        valor, referencia = actuales[metrica], bases[metrica]
+        if not valor or not referencia:
+            continue
+        if metrica.endswith(MAYOR_ES_MEJOR):
+            cambio = referencia / valor - 1
+        else:
+            cambio = valor / referencia - 1
+        significativo = not metrica.endswith('_ms') or abs(valor - referencia) >= umbral_ms
+        if significativo and cambio > tolerancia:
+            estado = 'regresion'
+        elif significativo and cambio < -tolerancia:
+            estado = 'mejora'
+        else:
+            estado = 'igual'
+        comparacion.append({
+            'metrica': metrica,
+            'base': referencia,
+            'actual': valor,
+            'cambio': round(cambio, 4),
+            'estado': estado,
+        })
+    return comparacion
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Persona
+from .models import Persona, TareaRegistro
 # Register your models here.
 
 
@@ -8,7 +8,7 @@ class PersonaAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'apellidos', 'sexo', 'telefono', 'correo', 'fecha_registro')
     list_filter = ('sexo', 'fecha_registro')
     search_fields = ('nombre', 'apellidos', 'correo', 'telefono', 'huella_hex')
-    readonly_fields = ('fecha_registro', 'fecha_actualizacion')
+    readonly_fields = ('estado_procesamiento', 'fecha_registro', 'fecha_actualizacion')
     fieldsets = (
         ('Información Personal', {
             'fields': ('nombre', 'apellidos', 'sexo', 'telefono', 'correo', 'direccion')
@@ -17,6 +17,12 @@ class PersonaAdmin(admin.ModelAdmin):
             'fields': ('foto', 'huella_digital', 'huella_hex', 'qr_code')
         }),
         ('Información del Sistema', {
-            'fields': ('fecha_registro', 'fecha_actualizacion')
+            'fields': ('estado_procesamiento', 'fecha_registro', 'fecha_actualizacion')
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(TareaRegistro)
+class TareaRegistroAdmin(admin.ModelAdmin):
+    list_display = ('persona', 'estado', 'intentos', 'fecha_creacion', 'fecha_actualizacion')
+    list_filter = ('estado',)
+    readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
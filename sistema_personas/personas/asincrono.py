@@ -0,0 +1,38 @@
+"""
+Executor acotado para el trabajo de CPU de las vistas asíncronas.
+
+Hash, plantillas de huella, QR y PIL bloquean el bucle de eventos; las
+vistas ASGI (personas.views_async) los ejecutan aquí, en a lo sumo
+settings.ASYNC_CPU_WORKERS hilos, para que cientos de peticiones
+concurrentes no compitan por la CPU con un hilo cada una. Lo que se ejecute
+aquí no debe usar el ORM: las consultas van con el ORM asíncrono o
+sync_to_async.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_executor = None
+_lock = threading.Lock()
+
+
+def executor():
+    """ThreadPoolExecutor compartido, creado al primer uso"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'ASYNC_CPU_WORKERS', 4),
+                    thread_name_prefix='cpu',
+                )
+    return _executor
+
+
+async def en_executor(func, *args, **kwargs):
+    """Ejecuta func(*args, **kwargs) en el executor acotado y espera el resultado"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor(), functools.partial(func, *args, **kwargs))
@@ -1,10 +1,95 @@
 import os
+import re
 import qrcode
 import hashlib
+import numpy as np
+from dataclasses import dataclass
+from functools import lru_cache
 from PIL import Image
 from io import BytesIO
+from django.conf import settings
 from django.core.files.base import ContentFile
 
+from .qr import qr_png
+from .metricas import medir_imagen
+
+SHA256_HEX_RE = re.compile(r'[0-9a-f]{64}')
+
+# Plantilla de huella: minucias (terminaciones y bifurcaciones de crestas)
+# de la imagen llevada a un periodo de crestas de TEMPLATE_PERIOD píxeles,
+# más un histograma de pares de minucias (distancia y ángulo de cada minucia
+# respecto del segmento que las une), invariante a rotación y traslación,
+# con el que personas.matching preselecciona candidatas.
+TEMPLATE_VERSION = 2
+TEMPLATE_BLOCK = 16
+TEMPLATE_PERIOD = 8.0
+TEMPLATE_MIN_MINUTIAE = 8
+TEMPLATE_MAX_MINUTIAE = 80
+PAIR_DISTANCE_BINS = 8
+PAIR_ANGLE_BINS = 6
+PAIR_MAX_DISTANCE = 12 * TEMPLATE_PERIOD
+TEMPLATE_DIM = PAIR_DISTANCE_BINS * PAIR_ANGLE_BINS * PAIR_ANGLE_BINS
+TEMPLATE_DTYPE = np.float16
+
+# Comparación de minucias: rotación máxima entre capturas, vecinas de cada
+# minucia que forman su estructura local y fracción de ellas que deben
+# coincidir para emparejar dos minucias.
+MATCH_MAX_ROTATION = np.deg2rad(60)
+LOCAL_NEIGHBOURS = 8
+LOCAL_RADIUS = 6 * TEMPLATE_PERIOD
+LOCAL_MIN_SIMILARITY = 0.4
+# Tolerancias al comparar la vecina de una minucia con la de otra: distancia
+# (LOCAL_RADIAL_TOLERANCE píxeles más LOCAL_RADIAL_SLACK de la distancia),
+# dirección y orientación
+LOCAL_RADIAL_TOLERANCE = 0.4 * TEMPLATE_PERIOD
+LOCAL_RADIAL_SLACK = 0.1
+LOCAL_ANGLE_TOLERANCE = np.deg2rad(12)
+LOCAL_ORIENTATION_TOLERANCE = np.deg2rad(20)
+# Rejilla polar (distancia, dirección) de las vecinas con la que se descartan
+# rápido los pares de minucias que no pueden alcanzar LOCAL_MIN_SIMILARITY
+LOCAL_RADIAL_CELLS = 12
+LOCAL_ANGULAR_CELLS = 24
+# Similitud mínima por defecto (minucias emparejadas² / (n1 * n2))
+DEFAULT_MATCH_THRESHOLD = 0.08
+
+# Control de calidad de capturas: se evalúa la imagen en escala de grises con
+# el lado mayor en QUALITY_SIZE píxeles, por bloques de TEMPLATE_BLOCK. La
+# calidad es la coherencia media de la orientación de crestas, reducida si
+# las crestas cubren menos de QUALITY_FULL_COVERAGE de la imagen.
+QUALITY_SIZE = 256
+QUALITY_MIN_SIDE = 4 * TEMPLATE_BLOCK
+QUALITY_FULL_COVERAGE = 0.5
+QUALITY_BLOCK_MIN_STD = 8.0
+DEFAULT_MIN_QUALITY = 0.4
+
+
+class FingerprintQualityError(ValueError):
+    """La captura de huella no es una imagen válida o no alcanza la calidad mínima"""
+
+    def __init__(self, message, quality=None):
+        super().__init__(message)
+        self.quality = quality
+
+
+@dataclass
+class FingerprintQuality:
+    """Resultado del control de calidad de una captura (valores entre 0 y 1)"""
+    score: float
+    coverage: float
+    coherence: float
+    width: int
+    height: int
+
+    def as_dict(self):
+        return {
+            'calidad': round(self.score, 3),
+            'cobertura': round(self.coverage, 3),
+            'coherencia': round(self.coherence, 3),
+            'ancho': self.width,
+            'alto': self.height,
+        }
+
+@medir_imagen
 def generate_sha256_from_image(image_file):
     """Genera un hash SHA-256 a partir de un archivo de imagen"""
     hasher = hashlib.sha256()
@@ -12,29 +97,585 @@ def generate_sha256_from_image(image_file):
         hasher.update(chunk)
     return hasher.hexdigest()
 
+@medir_imagen
+def generate_sha256_from_stream(stream, chunk_size=64 * 1024, max_size=None, destination=None):
+    """
+    Genera un hash SHA-256 leyendo un flujo por fragmentos.
+
+    Nunca mantiene en memoria más de un fragmento; si se indica destination
+    (un archivo), cada fragmento también se escribe ahí. Lanza ValueError si
+    el flujo supera max_size bytes.
+
+    Returns:
+        tuple: (hash hexadecimal, bytes leídos)
+    """
+    hasher = hashlib.sha256()
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if max_size is not None and total > max_size:
+            raise ValueError(f'El archivo supera el tamaño máximo de {max_size} bytes')
+        hasher.update(chunk)
+        if destination is not None:
+            destination.write(chunk)
+    return hasher.hexdigest(), total
+
+def normalize_fingerprint_digest(huella_hex):
+    """Normaliza un hash SHA-256 hexadecimal a 64 caracteres en minúsculas.
+
+    Devuelve None si el valor no es un hash SHA-256 válido.
+    """
+    if not huella_hex:
+        return None
+    digest = huella_hex.strip().lower()
+    if not SHA256_HEX_RE.fullmatch(digest):
+        return None
+    return digest
+
+@medir_imagen
 def generate_qr_from_hash(hash_value):
-    """Genera un código QR a partir de un hash"""
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
+    """Genera un código QR a partir de un hash (con caché, ver personas.qr)"""
+    return ContentFile(qr_png(hash_value), name=f"{hash_value[:10]}.png")
+
+def get_match_threshold():
+    """Umbral de similitud configurado (settings.HUELLA_UMBRAL_SIMILITUD)"""
+    return getattr(settings, 'HUELLA_UMBRAL_SIMILITUD', DEFAULT_MATCH_THRESHOLD)
+
+def _crop_ridge_area(pixels, block=TEMPLATE_BLOCK, min_std=QUALITY_BLOCK_MIN_STD):
+    """Recorta la imagen al rectángulo de bloques con varianza de crestas"""
+    h = pixels.shape[0] - pixels.shape[0] % block
+    w = pixels.shape[1] - pixels.shape[1] % block
+    if h == 0 or w == 0:
+        return pixels
+    blocks = pixels[:h, :w].reshape(h // block, block, w // block, block)
+    mask = blocks.std(axis=(1, 3)) > min_std
+    if not mask.any():
+        return pixels
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    return pixels[rows[0] * block:(rows[-1] + 1) * block, cols[0] * block:(cols[-1] + 1) * block]
+
+def _box_mean(values, radius):
+    """Media en ventanas de (2 * radius + 1) píxeles, con la imagen integral"""
+    radius = int(radius)
+    size = 2 * radius + 1
+    padded = np.pad(values.astype(np.float64), ((radius + 1, radius), (radius + 1, radius)), mode='edge')
+    integral = padded.cumsum(axis=0).cumsum(axis=1)
+    sums = integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]
+    return sums / (size * size)
+
+def _angle_difference(angle):
+    """Diferencia entre orientaciones (módulo pi) llevada a [-pi/2, pi/2)"""
+    return (angle + np.pi / 2) % np.pi - np.pi / 2
+
+def _ridge_period(pixels):
+    """Periodo de crestas dominante en píxeles, por el pico del espectro de potencia"""
+    h, w = pixels.shape
+    window = np.outer(np.hanning(h), np.hanning(w))
+    power = np.abs(np.fft.rfft2((pixels - pixels.mean()) * window)) ** 2
+    radius = np.hypot(np.fft.fftfreq(h)[:, None], np.fft.rfftfreq(w)[None, :])
+    band = (radius > 1 / 20) & (radius < 1 / 3)
+    radius, power = radius[band], power[band]
+    if not power.any():
+        return TEMPLATE_PERIOD
+    edges = np.linspace(1 / 20, 1 / 3, 120)
+    bins = np.digitize(radius, edges)
+    profile = np.bincount(bins, weights=power, minlength=121) / np.maximum(np.bincount(bins, minlength=121), 1)
+    profile = np.convolve(profile, np.ones(5) / 5, 'same')
+    peak = edges[min(int(np.argmax(profile[1:120])), 118)]
+    # Centroide del espectro alrededor del pico: más estable que el pico solo
+    near = np.abs(radius - peak) < 0.3 * peak
+    return float(power[near].sum() / (radius[near] * power[near]).sum())
+
+@lru_cache(maxsize=4)
+def _gabor_bank(shape, orientations=16):
+    """
+    Filtros de Gabor en frecuencia (para rfft2) al periodo TEMPLATE_PERIOD,
+    uno por orientación de cresta entre 0 y pi
+    """
+    h, w = shape
+    fy = np.fft.fftfreq(h)[:, None]
+    fx = np.fft.rfftfreq(w)[None, :]
+    sigma = TEMPLATE_PERIOD * 0.55
+    f0 = 1 / TEMPLATE_PERIOD
+    bank = np.empty((orientations, h, w // 2 + 1), dtype=np.float32)
+    for k in range(orientations):
+        # La oscilación es perpendicular a la dirección de la cresta
+        theta = np.pi * k / orientations
+        nx, ny = -np.sin(theta) * f0, np.cos(theta) * f0
+        bank[k] = (np.exp(-2 * np.pi ** 2 * sigma ** 2 * ((fx - nx) ** 2 + (fy - ny) ** 2))
+                   + np.exp(-2 * np.pi ** 2 * sigma ** 2 * ((fx + nx) ** 2 + (fy + ny) ** 2)))
+    return bank
+
+def _thin(ridges):
+    """Adelgaza las crestas a líneas de un píxel de ancho (Zhang-Suen, vectorizado)"""
+    skeleton = ridges.copy()
+    while True:
+        changed = False
+        for step in (0, 1):
+            p = np.pad(skeleton, 1)
+            p2, p3, p4, p5 = p[:-2, 1:-1], p[:-2, 2:], p[1:-1, 2:], p[2:, 2:]
+            p6, p7, p8, p9 = p[2:, 1:-1], p[2:, :-2], p[1:-1, :-2], p[:-2, :-2]
+            ring = (p2, p3, p4, p5, p6, p7, p8, p9, p2)
+            neighbours = sum(x.astype(np.uint8) for x in ring[:8])
+            transitions = sum((~ring[i] & ring[i + 1]).astype(np.uint8) for i in range(8))
+            if step == 0:
+                keep = (p2 & p4 & p6) | (p4 & p6 & p8)
+            else:
+                keep = (p2 & p4 & p8) | (p2 & p6 & p8)
+            remove = skeleton & (neighbours >= 2) & (neighbours <= 6) & (transitions == 1) & ~keep
+            if remove.any():
+                skeleton &= ~remove
+                changed = True
+        if not changed:
+            return skeleton
+
+def extract_minutiae(pixels):
+    """
+    Minucias de una huella a partir de sus píxeles normalizados (ver
+    preprocess_fingerprint): se lleva la imagen al periodo de crestas
+    TEMPLATE_PERIOD, se estima el campo de orientación, se realzan las
+    crestas con filtros de Gabor orientados, se adelgazan a un píxel y se
+    toman las terminaciones y bifurcaciones del esqueleto (número de cruce)
+    lejos del borde de la huella.
+
+    Returns:
+        np.ndarray: Matriz (n, 3) float32 con x, y y la orientación de la
+        cresta en [0, pi)
+    """
+    period = TEMPLATE_PERIOD
+    scale = period / _ridge_period(pixels)
+    h, w = pixels.shape
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    pixels = np.asarray(Image.fromarray(pixels.astype(np.float32)).resize(size, Image.BILINEAR), dtype=np.float64)
+    h, w = pixels.shape
+
+    # Contraste local y campo de orientación (tensor de estructura)
+    mean = _box_mean(pixels, period)
+    std = np.sqrt(np.maximum(_box_mean(pixels * pixels, period) - mean * mean, 0))
+    normalized = (pixels - mean) / (std + 1e-3)
+    gy, gx = np.gradient(normalized)
+    gxx = _box_mean(gx * gx, period)
+    gyy = _box_mean(gy * gy, period)
+    gxy = _box_mean(gx * gy, period)
+    cos2 = _box_mean(gxx - gyy, 1.5 * period)
+    sin2 = _box_mean(2 * gxy, 1.5 * period)
+    coherence = np.hypot(cos2, sin2) / (_box_mean(gxx + gyy, 1.5 * period) + 1e-6)
+    orientation = (0.5 * np.arctan2(sin2, cos2) + np.pi / 2) % np.pi
+
+    # Área de crestas y su interior, donde las minucias son fiables
+    mask = _box_mean((std > 20) & (coherence > 0.3), period) > 0.5
+    border = int(period)
+    interior = mask.copy()
+    interior[:border] = interior[-border:] = False
+    interior[:, :border] = interior[:, -border:] = False
+    interior = _box_mean(interior, 1.5 * period) > 0.999
+
+    # Realce con el filtro de Gabor de la orientación de cada píxel
+    shape = (-(-h // 64) * 64, -(-w // 64) * 64)
+    bank = _gabor_bank(shape)
+    spectrum = np.fft.rfft2(normalized.astype(np.float32), s=shape)
+    responses = np.fft.irfft2(spectrum[None] * bank, s=shape)[:, :h, :w]
+    position = orientation / np.pi * len(bank)
+    lower = np.floor(position).astype(np.intp) % len(bank)
+    upper = (lower + 1) % len(bank)
+    weight = position - np.floor(position)
+    enhanced = (np.take_along_axis(responses, lower[None], 0)[0] * (1 - weight)
+                + np.take_along_axis(responses, upper[None], 0)[0] * weight)
+
+    # Las crestas son oscuras: respuesta negativa
+    skeleton = _thin((enhanced < 0) & mask)
+    p = np.pad(skeleton, 1).astype(np.int8)
+    ring = (p[:-2, 1:-1], p[:-2, 2:], p[1:-1, 2:], p[2:, 2:], p[2:, 1:-1], p[2:, :-2], p[1:-1, :-2], p[:-2, :-2])
+    crossings = sum(np.abs(ring[i] - ring[(i + 1) % 8]) for i in range(8)) // 2
+    ys, xs = np.nonzero(skeleton & interior & ((crossings == 1) | (crossings == 3)))
+    points = np.column_stack([xs, ys]).astype(np.float32)
+
+    if len(points) > 1:
+        # Minucias demasiado juntas suelen ser cortes o puentes espurios
+        distances = np.hypot(*(points[:, None] - points[None]).transpose(2, 0, 1))
+        np.fill_diagonal(distances, np.inf)
+        points = points[distances.min(axis=1) > 0.9 * period]
+    if len(points) > TEMPLATE_MAX_MINUTIAE:
+        # Se conservan las más cercanas al centro de la huella
+        center = points.mean(axis=0)
+        points = points[np.argsort(np.hypot(*(points - center).T))[:TEMPLATE_MAX_MINUTIAE]]
+    angles = orientation[points[:, 1].astype(np.intp), points[:, 0].astype(np.intp)]
+    return np.column_stack([points, angles]).astype(np.float32)
+
+def pair_histogram(minutiae):
+    """
+    Histograma de los pares de minucias a menos de PAIR_MAX_DISTANCE: su
+    distancia y el ángulo de cada minucia respecto del segmento que las une,
+    con asignación suave a las celdas vecinas. Raíz cuadrada y norma 1, de
+    modo que el producto punto entre dos histogramas es su similitud.
+    """
+    histogram = np.zeros((PAIR_DISTANCE_BINS, PAIR_ANGLE_BINS, PAIR_ANGLE_BINS))
+    first, second = np.triu_indices(len(minutiae), 1)
+    delta = minutiae[second, :2] - minutiae[first, :2]
+    distance = np.hypot(delta[:, 0], delta[:, 1])
+    near = (distance > TEMPLATE_PERIOD) & (distance < PAIR_MAX_DISTANCE)
+    first, second, delta, distance = first[near], second[near], delta[near], distance[near]
+    segment = np.arctan2(delta[:, 1], delta[:, 0])
+    angle_a = np.abs(_angle_difference(minutiae[first, 2] - segment))
+    angle_b = np.abs(_angle_difference(minutiae[second, 2] - segment))
+    coords = (
+        (distance - TEMPLATE_PERIOD) / (PAIR_MAX_DISTANCE - TEMPLATE_PERIOD) * PAIR_DISTANCE_BINS - 0.5,
+        np.minimum(angle_a, angle_b) / (np.pi / 2) * PAIR_ANGLE_BINS - 0.5,
+        np.maximum(angle_a, angle_b) / (np.pi / 2) * PAIR_ANGLE_BINS - 0.5,
     )
-    qr.add_data(hash_value)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    return ContentFile(buffer.getvalue(), name=f"{hash_value[:10]}.png")
-
-def compare_fingerprint(stored_hex, uploaded_image):
-    """Compara una huella digital almacenada con una imagen subida"""
-    uploaded_hex = generate_sha256_from_image(uploaded_image)
-    return stored_hex == uploaded_hex
+    for corner in np.ndindex(2, 2, 2):
+        cells, weights, inside = [], 1.0, True
+        for coord, offset, bins in zip(coords, corner, histogram.shape):
+            cell = np.floor(coord).astype(np.intp) + offset
+            weights = weights * (1 - np.abs(coord - cell))
+            inside = inside & (cell >= 0) & (cell < bins)
+            cells.append(cell)
+        np.add.at(histogram, tuple(cell[inside] for cell in cells), weights[inside])
+    vector = np.sqrt(histogram.ravel())
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.astype(np.float32)
+
+def encode_template(minutiae):
+    """
+    Serializa una plantilla: versión, número de minucias, histograma de
+    pares (TEMPLATE_DIM valores) y minucias (x, y, orientación), en float16
+    """
+    header = np.array([TEMPLATE_VERSION, len(minutiae)], dtype=np.uint8).tobytes()
+    return (header + pair_histogram(minutiae).astype(TEMPLATE_DTYPE).tobytes()
+            + np.asarray(minutiae, dtype=TEMPLATE_DTYPE).tobytes())
+
+def decode_template(template):
+    """
+    (histograma float32, minucias (n, 3) float32) de una plantilla de
+    encode_template. Lanza ValueError si tiene otro formato (p. ej. una
+    plantilla de una versión anterior).
+    """
+    template = bytes(template)
+    if len(template) < 2 or template[0] != TEMPLATE_VERSION:
+        raise ValueError('Formato de plantilla de huella no reconocido')
+    count = template[1]
+    itemsize = np.dtype(TEMPLATE_DTYPE).itemsize
+    if len(template) != 2 + (TEMPLATE_DIM + 3 * count) * itemsize:
+        raise ValueError('Formato de plantilla de huella no reconocido')
+    values = np.frombuffer(template, dtype=TEMPLATE_DTYPE, offset=2).astype(np.float32)
+    return values[:TEMPLATE_DIM], values[TEMPLATE_DIM:].reshape(count, 3)
+
+@medir_imagen
+def extract_fingerprint_template(image_file):
+    """
+    Extrae la plantilla de minucias de una huella a partir de su imagen.
+
+    Returns:
+        bytes: Plantilla de encode_template
+
+    Raises:
+        ValueError: Si el archivo no es una imagen o no tiene suficientes minucias
+    """
+    pixels, _ = preprocess_fingerprint(image_file)
+    minutiae = extract_minutiae(pixels)
+    if len(minutiae) < TEMPLATE_MIN_MINUTIAE:
+        raise ValueError(f'La huella tiene muy pocas minucias ({len(minutiae)}, mínimo {TEMPLATE_MIN_MINUTIAE})')
+    return encode_template(minutiae)
+
+def local_structures(minutiae):
+    """
+    Vecinas más cercanas (hasta LOCAL_NEIGHBOURS a menos de LOCAL_RADIUS) de
+    cada minucia, en el marco de referencia de la minucia.
+
+    Returns:
+        tuple: Posición relativa de las vecinas (cero si faltan), su
+        distancia, su orientación relativa como (cos 2a, sin 2a), cuántas
+        tiene cada minucia, la celda polar de cada vecina (fila
+        LOCAL_RADIAL_CELLS si falta) y la rejilla de celdas donde una vecina
+        de otra minucia podría coincidir con alguna de estas
+    """
+    points, angles = minutiae[:, :2], minutiae[:, 2]
+    distances = np.hypot(*(points[:, None] - points[None]).transpose(2, 0, 1))
+    np.fill_diagonal(distances, np.inf)
+    count = min(LOCAL_NEIGHBOURS, len(minutiae) - 1)
+    nearest = np.argsort(distances, axis=1)[:, :count]
+    radii = np.zeros((len(minutiae), LOCAL_NEIGHBOURS), dtype=np.float32)
+    radii[:, :count] = np.take_along_axis(distances, nearest, 1)
+    valid = radii < LOCAL_RADIUS
+    valid[:, count:] = False
+    radii[~valid] = 0
+    relative = points[nearest] - points[:, None]
+    cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+    positions = np.zeros((len(minutiae), LOCAL_NEIGHBOURS, 2), dtype=np.float32)
+    positions[:, :count, 0] = cos * relative[..., 0] + sin * relative[..., 1]
+    positions[:, :count, 1] = cos * relative[..., 1] - sin * relative[..., 0]
+    positions[~valid] = 0
+    relative_angle = 2 * (angles[nearest] - angles[:, None])
+    orientations = np.zeros((len(minutiae), LOCAL_NEIGHBOURS, 2), dtype=np.float32)
+    orientations[:, :count, 0] = np.cos(relative_angle)
+    orientations[:, :count, 1] = np.sin(relative_angle)
+
+    radial_width = LOCAL_RADIUS / LOCAL_RADIAL_CELLS
+    angular_width = 2 * np.pi / LOCAL_ANGULAR_CELLS
+    direction = np.arctan2(positions[..., 1], positions[..., 0]) % (2 * np.pi)
+    cells = np.stack([
+        np.where(valid, np.minimum(radii // radial_width, LOCAL_RADIAL_CELLS - 1), LOCAL_RADIAL_CELLS),
+        direction // angular_width % LOCAL_ANGULAR_CELLS,
+    ], axis=-1).astype(np.intp)
+    # Distancias r' que pasan |r - r'| < tolerancia + holgura * max(r, r'),
+    # con medio píxel y un grado de margen
+    low = ((1 - LOCAL_RADIAL_SLACK) * radii - LOCAL_RADIAL_TOLERANCE - 0.5) // radial_width
+    high = ((radii + LOCAL_RADIAL_TOLERANCE + 0.5) / (1 - LOCAL_RADIAL_SLACK)) // radial_width
+    first = (direction - LOCAL_ANGLE_TOLERANCE - np.deg2rad(1)) // angular_width
+    last = (direction + LOCAL_ANGLE_TOLERANCE + np.deg2rad(1)) // angular_width
+    owner = np.broadcast_to(np.arange(len(minutiae))[:, None], valid.shape)[valid]
+    low, high, first, last = (values[valid].astype(np.intp) for values in (low, high, first, last))
+    high = np.minimum(high, LOCAL_RADIAL_CELLS - 1)
+    low = np.maximum(low, 0)
+    grid = np.zeros((len(minutiae), LOCAL_RADIAL_CELLS + 1, LOCAL_ANGULAR_CELLS), dtype=bool)
+    for radial in range(int((high - low).max(initial=0)) + 1):
+        for angular in range(int((last - first).max(initial=0)) + 1):
+            inside = (low + radial <= high) & (first + angular <= last)
+            grid[owner[inside], (low + radial)[inside], (first + angular)[inside] % LOCAL_ANGULAR_CELLS] = True
+    return positions, radii, orientations, valid.sum(axis=1), cells, grid
+
+def match_minutiae(query, candidate, query_structures=None):
+    """
+    Similitud entre dos conjuntos de minucias, entre 0 y 1.
+
+    Se emparejan las minucias cuyas estructuras locales (posición y
+    orientación de sus vecinas, invariantes a rotación y traslación)
+    coinciden; esos pares votan la rotación y traslación entre las capturas,
+    que se refina con una transformación de similitud por mínimos cuadrados.
+    La similitud es k² / (n1 * n2), con k las minucias que coinciden tras
+    alinear.
+
+    Args:
+        query_structures: local_structures(query) ya calculadas, para
+            comparar una consulta con varias candidatas
+    """
+    n, m = len(query), len(candidate)
+    if n < 4 or m < 4:
+        return 0.0
+    period = TEMPLATE_PERIOD
+    raw = candidate[None, :, 2] - query[:, None, 2]
+    rotation = _angle_difference(raw)
+    qi, ci = np.nonzero(np.abs(rotation) <= MATCH_MAX_ROTATION)
+    # Las orientaciones son módulo pi: si la rotación cruza pi, el marco
+    # local de la candidata queda girado media vuelta
+    flip = np.where(np.abs(raw[qi, ci] - rotation[qi, ci]) > 1e-4, -1.0, 1.0).astype(np.float32)
+
+    q_pos, q_radii, q_ori, q_count, q_cells, _ = (
+        query_structures if query_structures is not None else local_structures(query))
+    c_pos, c_radii, c_ori, c_count, _, c_grid = local_structures(candidate)
+    # Descarte rápido: cuántas vecinas de la minucia de la consulta caen en
+    # la rejilla de la candidata (girada media vuelta si flip) es una cota
+    # superior de las que coinciden
+    half_turn = np.where(flip < 0, LOCAL_ANGULAR_CELLS // 2, 0)[:, None]
+    hits = c_grid[ci[:, None], q_cells[qi, :, 0], (q_cells[qi, :, 1] + half_turn) % LOCAL_ANGULAR_CELLS]
+    neighbours = np.maximum(np.maximum(q_count[qi], c_count[ci]), 3)
+    possible = hits.sum(axis=1) / neighbours >= LOCAL_MIN_SIMILARITY
+    qi, ci, flip, neighbours = qi[possible], ci[possible], flip[possible], neighbours[possible]
+
+    ra = q_radii[qi][:, :, None]
+    rb = c_radii[ci][:, None, :]
+    # Las vecinas que faltan tienen posición y distancia cero: el producto
+    # punto (0) nunca supera el umbral angular y no cuentan como coincidencia
+    dot = np.matmul(q_pos[qi], c_pos[ci].transpose(0, 2, 1))
+    dot *= flip[:, None, None]
+    same = dot > np.float32(np.cos(LOCAL_ANGLE_TOLERANCE)) * ra * rb
+    same &= (np.abs(ra - rb)
+             < np.float32(LOCAL_RADIAL_TOLERANCE) + np.float32(LOCAL_RADIAL_SLACK) * np.maximum(ra, rb))
+    same &= np.matmul(q_ori[qi], c_ori[ci].transpose(0, 2, 1)) > np.float32(np.cos(2 * LOCAL_ORIENTATION_TOLERANCE))
+    similarity = same.any(axis=2).sum(axis=1) / neighbours
+    keep = similarity >= LOCAL_MIN_SIMILARITY
+    qi, ci, similarity = qi[keep], ci[keep], similarity[keep]
+    if len(qi) < 2:
+        return 0.0
+
+    # Votación de (rotación, traslación) en dos rejillas desplazadas media celda
+    qp, cp = query[:, :2].astype(np.float64), candidate[:, :2].astype(np.float64)
+    angle = rotation[qi, ci]
+    cos, sin = np.cos(angle), np.sin(angle)
+    tx = cp[ci, 0] - (cos * qp[qi, 0] - sin * qp[qi, 1])
+    ty = cp[ci, 1] - (sin * qp[qi, 0] + cos * qp[qi, 1])
+    best_votes, best = 0, None
+    for offset in (0.0, 0.5):
+        # Celda (rotación, tx, ty) codificada en un entero
+        cells = ((np.floor(angle / np.deg2rad(10) + offset).astype(np.int64) + 64) << 40
+                 | (np.floor(tx / (1.5 * period) + offset).astype(np.int64) + 2**19) << 20
+                 | (np.floor(ty / (1.5 * period) + offset).astype(np.int64) + 2**19))
+        _, cell = np.unique(cells, return_inverse=True)
+        votes = np.bincount(cell, weights=similarity)
+        if votes.max() > best_votes:
+            best_votes, best = votes.max(), cell == np.argmax(votes)
+    theta, scale = np.median(angle[best]), 1.0
+    shift = np.array([np.median(tx[best]), np.median(ty[best])])
+
+    def residual(theta, scale, shift):
+        c, s = np.cos(theta), np.sin(theta)
+        aligned = scale * np.stack([c * qp[qi, 0] - s * qp[qi, 1], s * qp[qi, 0] + c * qp[qi, 1]], 1) + shift
+        return np.hypot(*(aligned - cp[ci]).T)
+
+    for tolerance in (3.0, 2.0):
+        near = residual(theta, scale, shift) < tolerance * period
+        if near.sum() < 3:
+            break
+        x, y = qp[qi[near]], cp[ci[near]]
+        x0, y0 = x - x.mean(0), y - y.mean(0)
+        dot, cross = (x0 * y0).sum(), (x0[:, 0] * y0[:, 1] - x0[:, 1] * y0[:, 0]).sum()
+        fitted = np.arctan2(cross, dot)
+        if abs(_angle_difference(fitted - theta)) > MATCH_MAX_ROTATION:
+            break
+        theta = fitted
+        # La escala absorbe el error en la estimación del periodo de crestas
+        scale = float(np.clip(np.hypot(dot, cross) / max((x0 * x0).sum(), 1e-9), 0.85, 1.18))
+        c, s = np.cos(theta), np.sin(theta)
+        shift = y.mean(0) - scale * np.array([c * x.mean(0)[0] - s * x.mean(0)[1], s * x.mean(0)[0] + c * x.mean(0)[1]])
+
+    distance = residual(theta, scale, shift)
+    aligned = (distance < 1.6 * period) & (np.abs(_angle_difference(angle - theta)) < np.deg2rad(22))
+    used_q, used_c, matched = set(), set(), 0
+    for k in np.flatnonzero(aligned)[np.argsort(distance[aligned])]:
+        if qi[k] not in used_q and ci[k] not in used_c:
+            used_q.add(qi[k])
+            used_c.add(ci[k])
+            matched += 1
+    return matched * matched / (n * m)
+
+@medir_imagen
+def compare_fingerprint(stored_template, uploaded_image, threshold=None):
+    """Compara la plantilla de una huella almacenada con una imagen subida"""
+    if not stored_template:
+        return False
+    if threshold is None:
+        threshold = get_match_threshold()
+    try:
+        _, stored = decode_template(stored_template)
+        _, uploaded = decode_template(extract_fingerprint_template(uploaded_image))
+    except (OSError, ValueError):
+        return False
+    return match_minutiae(uploaded, stored) >= threshold
+
+def get_min_quality():
+    """Calidad mínima de captura configurada (settings.HUELLA_CALIDAD_MINIMA, 0 = sin control)"""
+    return getattr(settings, 'HUELLA_CALIDAD_MINIMA', DEFAULT_MIN_QUALITY)
+
+def _block_sums(values, shape):
+    return values.reshape(shape).sum(axis=(1, 3))
+
+def _preprocessed(image_file, size):
+    """Resultado de preprocess_fingerprint ya guardado en el archivo (o en el que envuelve)"""
+    for obj in (image_file, getattr(image_file, 'file', None)):
+        cached = getattr(obj, 'preprocessed_fingerprint', None)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+    return None
+
+@medir_imagen
+def preprocess_fingerprint(image_file, size=QUALITY_SIZE):
+    """
+    Decodifica la captura una sola vez y la normaliza para evaluarla: escala
+    de grises, lado mayor en 'size' píxeles (los JPEG se decodifican ya
+    reducidos), contraste estirado entre los percentiles 1 y 99 y recorte
+    al área de crestas.
+
+    El resultado queda en el atributo preprocessed_fingerprint del archivo,
+    así el control de calidad y la extracción de la plantilla sobre el mismo
+    archivo lo decodifican una sola vez.
+
+    Returns:
+        tuple: (píxeles float32 normalizados y recortados, FingerprintQuality)
+
+    Raises:
+        FingerprintQualityError: Si el archivo no es una imagen o es demasiado pequeña
+    """
+    cached = _preprocessed(image_file, size)
+    if cached is not None:
+        return cached
+    if hasattr(image_file, 'seek'):
+        image_file.seek(0)
+    try:
+        img = Image.open(image_file)
+        width, height = img.size
+        img.draft('L', (size, size))
+        img = img.convert('L')
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise FingerprintQualityError('El archivo de huella no es una imagen válida') from e
+    if min(width, height) < QUALITY_MIN_SIDE:
+        raise FingerprintQualityError(
+            f'La imagen de huella es demasiado pequeña (mínimo {QUALITY_MIN_SIDE}x{QUALITY_MIN_SIDE} píxeles)'
+        )
+    if max(img.size) > size:
+        img.thumbnail((size, size), Image.BILINEAR)
+
+    pixels = np.asarray(img, dtype=np.float32)
+    low, high = np.percentile(pixels, (1, 99))
+    if high - low < 1:
+        pixels = np.zeros_like(pixels)
+    else:
+        pixels = np.clip((pixels - low) * (255 / (high - low)), 0, 255)
+
+    h = pixels.shape[0] - pixels.shape[0] % TEMPLATE_BLOCK
+    w = pixels.shape[1] - pixels.shape[1] % TEMPLATE_BLOCK
+    shape = (h // TEMPLATE_BLOCK, TEMPLATE_BLOCK, w // TEMPLATE_BLOCK, TEMPLATE_BLOCK)
+    area = pixels[:h, :w]
+    mask = area.reshape(shape).std(axis=(1, 3)) > QUALITY_BLOCK_MIN_STD
+    coverage = float(mask.mean())
+    coherence = 0.0
+    if mask.any():
+        gy, gx = np.gradient(area)
+        gxx = _block_sums(gx * gx, shape)
+        gyy = _block_sums(gy * gy, shape)
+        gxy = _block_sums(gx * gy, shape)
+        block_coherence = np.sqrt((gxx - gyy) ** 2 + 4 * gxy ** 2) / (gxx + gyy + 1e-6)
+        coherence = float(block_coherence[mask].mean())
+    score = min(1.0, coverage / QUALITY_FULL_COVERAGE) * coherence
+    quality = FingerprintQuality(score, coverage, coherence, width, height)
+    result = (_crop_ridge_area(pixels), quality)
+    try:
+        image_file.preprocessed_fingerprint = (size, result)
+    except AttributeError:
+        pass
+    return result
+
+def check_fingerprint_quality(image_file, min_quality=None):
+    """
+    Rechaza capturas en blanco, parciales, borrosas o con ruido antes de
+    calcular su hash o guardarlas. Deja el archivo al inicio.
+
+    Returns:
+        FingerprintQuality | None: La calidad medida (None si el control está desactivado)
+
+    Raises:
+        FingerprintQualityError: Si no alcanza min_quality (settings.HUELLA_CALIDAD_MINIMA)
+    """
+    if min_quality is None:
+        min_quality = get_min_quality()
+    if min_quality <= 0:
+        return None
+    _, quality = preprocess_fingerprint(image_file)
+    if hasattr(image_file, 'seek'):
+        image_file.seek(0)
+    if quality.score < min_quality:
+        if quality.coverage < QUALITY_FULL_COVERAGE * min_quality:
+            motivo = 'la huella está en blanco o cubre muy poca área'
+        else:
+            motivo = 'las crestas no están bien definidas (imagen borrosa o con ruido)'
+        raise FingerprintQualityError(
+            f'Captura de huella de baja calidad ({quality.score:.2f}, mínimo {min_quality:.2f}): {motivo}',
+            quality,
+        )
+    return quality
 
+@medir_imagen
 def process_fingerprint(fingerprint_image):
-    """Procesa una imagen de huella digital y devuelve el hash y el código QR"""
+    """
+    Procesa una imagen de huella digital y devuelve el hash y el código QR.
+    Lanza FingerprintQualityError si la captura no pasa el control de calidad.
+    """
+    check_fingerprint_quality(fingerprint_image)
     fingerprint_hex = generate_sha256_from_image(fingerprint_image)
     qr_image = generate_qr_from_hash(fingerprint_hex)
     return fingerprint_hex, qr_image
\ No newline at end of file
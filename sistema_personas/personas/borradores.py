@@ -0,0 +1,78 @@
+"""
+Borradores del asistente de registro.
+
+Los datos de los pasos 1 y 2 se guardaban en la sesión, que con
+SESSION_SAVE_EVERY_REQUEST se reescribía en cada petición. Ahora viven en
+RegistroBorrador, una fila por usuario que solo se escribe cuando los datos
+cambian y que vence a los settings.REGISTRO_BORRADOR_TTL segundos de la
+última modificación.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import RegistroBorrador
+
+logger = logging.getLogger(__name__)
+
+
+def _vencimiento():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'REGISTRO_BORRADOR_TTL', 3600))
+
+
+def obtener_borrador(usuario):
+    """Borrador vigente del usuario o None"""
+    return RegistroBorrador.objects.filter(usuario=usuario, expira__gt=timezone.now()).first()
+
+
+def guardar_borrador(usuario, datos=None, foto_path=None):
+    """
+    Crea o actualiza el borrador del usuario. Los datos reemplazan a los
+    anteriores; foto_path=None conserva la foto ya guardada.
+
+    Returns:
+        RegistroBorrador: Borrador guardado
+    """
+    borrador = RegistroBorrador.objects.filter(usuario=usuario).first()
+    if borrador is None or borrador.expira <= timezone.now():
+        # Al iniciar un registro se limpian los borradores abandonados
+        purgar_borradores_vencidos()
+        borrador = RegistroBorrador(usuario=usuario)
+    if datos is not None:
+        borrador.datos = datos
+    if foto_path is not None:
+        if borrador.foto_path and borrador.foto_path != foto_path:
+            _eliminar_foto(borrador.foto_path)
+        borrador.foto_path = foto_path
+    borrador.expira = _vencimiento()
+    borrador.save()
+    return borrador
+
+
+def _eliminar_foto(foto_path):
+    try:
+        # Las fotos preparadas en pendientes/ llevan cuenta de referencias
+        default_storage.delete(foto_path)
+    except OSError as e:
+        logger.warning("Error al eliminar la foto temporal %s: %s", foto_path, e)
+
+
+def eliminar_borrador(borrador, conservar_foto=False):
+    """Elimina el borrador y, salvo que se indique, su foto temporal"""
+    if borrador.foto_path and not conservar_foto:
+        _eliminar_foto(borrador.foto_path)
+    if borrador.pk:
+        borrador.delete()
+
+
+def purgar_borradores_vencidos():
+    """Elimina los borradores vencidos y sus fotos temporales"""
+    vencidos = RegistroBorrador.objects.filter(expira__lte=timezone.now())
+    total = 0
+    for borrador in vencidos.iterator():
+        eliminar_borrador(borrador)
+        total += 1
+    return total
@@ -0,0 +1,351 @@
+"""
+Importación y exportación masiva de personas.
+
+La importación lee CSV o NDJSON fila por fila (sin cargar el archivo completo),
+con un ZIP opcional de adjuntos donde las columnas foto y huella_digital
+nombran las imágenes de cada persona. Las filas se agrupan en lotes: un pool
+de hilos valida los datos y procesa las imágenes (hash, plantilla y QR de la
+huella; foto normalizada y sus miniaturas) y el hilo principal guarda los
+archivos e inserta el lote con bulk_create.
+
+bulk_create no llama a Persona.save() ni envía post_save, así que aquí se
+calculan huella_digest y huella_template y se actualizan el índice de
+búsqueda, la proyección de los listados (PersonaLista), el total de
+personas, los listados en caché y la caché de huellas de este proceso; los
+demás procesos incorporan a las nuevas personas en su siguiente
+sincronización (fecha_actualizacion). Si un lote falla, su transacción
+revierte las filas de ArchivoMedia y los archivos nuevos se borran del disco.
+
+La exportación recorre la tabla por id con iterator() y produce el archivo
+en fragmentos, pensada para StreamingHttpResponse.
+"""
+import io
+import os
+import csv
+import json
+import hashlib
+import zipfile
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+
+from .biometrics import extract_fingerprint_template, normalize_fingerprint_digest
+from .imagenes import crear_miniaturas, guardar_miniaturas, normalizar_foto
+from .cache import invalidar_listas
+from .listado import fila_de, proyectar_personas
+from .models import IndiceBusqueda, Persona, PersonaLista, ajustar_contador_personas
+from .qr import qr_png_sin_cache
+from .search import contenido_de, indexar_personas
+
+FORMATOS = ('csv', 'ndjson')
+CAMPOS_IMPORTACION = ('nombre', 'apellidos', 'sexo', 'telefono', 'correo', 'direccion', 'huella_hex')
+CAMPOS_EXPORTACION = ('id', *CAMPOS_IMPORTACION, 'foto', 'huella_digital', 'qr_code', 'fecha_registro')
+# Campos que valida clean_fields(); el resto los calcula la importación
+CAMPOS_SIN_VALIDAR = ('foto', 'huella_digital', 'huella_hex', 'huella_digest', 'huella_template', 'qr_code',
+                      'estado_procesamiento')
+VALORES_SEXO = {
+    '1': True, 'true': True, 'hombre': True, 'h': True,
+    '0': False, 'false': False, 'mujer': False, 'm': False, '': False,
+}
+MAX_ERRORES_REPORTADOS = 100
+
+
+@dataclass
+class ResultadoImportacion:
+    creadas: int = 0
+    total_errores: int = 0
+    errores: list = field(default_factory=list)
+
+    def agregar_error(self, linea, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES_REPORTADOS:
+            self.errores.append({'linea': linea, 'error': mensaje})
+
+    def como_dict(self):
+        errores = sorted(self.errores, key=lambda error: error['linea'])
+        return {'creadas': self.creadas, 'total_errores': self.total_errores, 'errores': errores}
+
+
+@dataclass
+class FilaPreparada:
+    linea: int
+    persona: Persona = None
+    error: str = ''
+    huella: bytes = None
+    huella_nombre: str = ''
+    foto: bytes = None
+    foto_nombre: str = ''
+    miniaturas: dict = None
+    qr: bytes = None
+
+
+def detectar_formato(nombre, formato=None):
+    """Formato indicado o, si no se indica, el de la extensión del archivo"""
+    formato = (formato or os.path.splitext(nombre or '')[1].lstrip('.')).lower()
+    if formato == 'json':
+        formato = 'ndjson'
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato no soportado: {formato or "desconocido"} (use csv o ndjson)')
+    return formato
+
+
+def leer_filas(archivo, formato):
+    """
+    Genera (número de línea, dict de la fila o None, error) leyendo el
+    archivo binario línea por línea.
+    """
+    texto = io.TextIOWrapper(getattr(archivo, 'file', archivo), encoding='utf-8-sig', newline='')
+    try:
+        if formato == 'csv':
+            lector = csv.DictReader(texto)
+            for fila in lector:
+                yield lector.line_num, fila, ''
+        else:
+            for linea, contenido in enumerate(texto, start=1):
+                if not contenido.strip():
+                    continue
+                try:
+                    fila = json.loads(contenido)
+                except ValueError as e:
+                    yield linea, None, f'JSON no válido: {e}'
+                    continue
+                if not isinstance(fila, dict):
+                    yield linea, None, 'Cada línea debe ser un objeto JSON'
+                    continue
+                yield linea, fila, ''
+    finally:
+        # No cerrar el archivo de quien llama
+        texto.detach()
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _leer_adjunto(adjuntos, nombre):
+    if adjuntos is None:
+        raise ValueError(f'{nombre}: la fila hace referencia a un adjunto pero no se envió el ZIP')
+    try:
+        return adjuntos.read(nombre)
+    except KeyError:
+        raise ValueError(f'{nombre}: no existe en el ZIP de adjuntos')
+
+
+def preparar_fila(linea, datos, adjuntos=None):
+    """
+    Valida una fila y procesa sus imágenes. Se ejecuta en el pool de hilos,
+    por lo que no toca la base de datos.
+    """
+    fila = FilaPreparada(linea=linea)
+    try:
+        datos = {_texto(clave).lower(): valor for clave, valor in datos.items()}
+        sexo = _texto(datos.get('sexo')).lower()
+        if sexo not in VALORES_SEXO:
+            raise ValueError(f'sexo no válido: {sexo}')
+        persona = Persona(
+            **{campo: _texto(datos.get(campo)) for campo in CAMPOS_IMPORTACION if campo != 'sexo'},
+            sexo=VALORES_SEXO[sexo],
+        )
+        persona.clean_fields(exclude=CAMPOS_SIN_VALIDAR)
+
+        huella_adjunta = _texto(datos.get('huella_digital') or datos.get('huella'))
+        if huella_adjunta:
+            fila.huella = _leer_adjunto(adjuntos, huella_adjunta)
+            fila.huella_nombre = f'huella_{persona.nombre}{os.path.splitext(huella_adjunta)[1] or ".png"}'
+            huella_hex = hashlib.sha256(fila.huella).hexdigest()
+            if persona.huella_hex and normalize_fingerprint_digest(persona.huella_hex) != huella_hex:
+                raise ValueError('huella_hex no corresponde a la imagen de huella')
+            persona.huella_hex = huella_hex
+            persona.huella_template = extract_fingerprint_template(io.BytesIO(fila.huella))
+        if persona.huella_hex:
+            persona.huella_digest = normalize_fingerprint_digest(persona.huella_hex)
+            if persona.huella_digest is None:
+                raise ValueError('huella_hex no es un hash SHA-256 válido')
+            fila.qr = qr_png_sin_cache(persona.huella_hex)
+
+        foto_adjunta = _texto(datos.get('foto'))
+        if foto_adjunta:
+            foto = normalizar_foto(io.BytesIO(_leer_adjunto(adjuntos, foto_adjunta)))
+            fila.foto = foto.read()
+            fila.miniaturas = crear_miniaturas(fila.foto)
+            apellido = persona.apellidos.split()[0] if persona.apellidos else ''
+            fila.foto_nombre = f'foto_{persona.nombre}_{apellido}.jpg'
+        fila.persona = persona
+    except ValidationError as e:
+        fila.error = '; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in e.message_dict.items())
+    except (ValueError, OSError) as e:
+        fila.error = str(e)
+    return fila
+
+
+def _insertar(filas):
+    """Guarda los archivos e inserta las personas de las filas en una transacción"""
+    from .matching import template_cache
+
+    personas = []
+    guardados = []
+    try:
+        with transaction.atomic():
+            for fila in filas:
+                persona = fila.persona
+                if fila.huella is not None:
+                    persona.huella_digital.save(fila.huella_nombre, ContentFile(fila.huella), save=False)
+                    guardados.append(persona.huella_digital.name)
+                if fila.qr is not None:
+                    persona.qr_code.save(f'qr_{persona.nombre}.png', ContentFile(fila.qr), save=False)
+                    guardados.append(persona.qr_code.name)
+                if fila.foto is not None:
+                    persona.foto.save(fila.foto_nombre, ContentFile(fila.foto), save=False)
+                    guardados.append(persona.foto.name)
+                    guardar_miniaturas(persona.foto, fila.miniaturas)
+                personas.append(persona)
+            Persona.objects.bulk_create(personas)
+            ajustar_contador_personas(len(personas))
+            transaction.on_commit(invalidar_listas)
+            if connection.features.can_return_rows_from_bulk_insert:
+                IndiceBusqueda.objects.bulk_create(
+                    [IndiceBusqueda(persona_id=p.pk, contenido=contenido_de(p)) for p in personas]
+                )
+                PersonaLista.objects.bulk_create([fila_de(p) for p in personas])
+                entradas = [(p.pk, p.huella_digest, p.huella_template) for p in personas
+                            if p.huella_digest or p.huella_template]
+
+                def actualizar_cache():
+                    for entrada in entradas:
+                        template_cache.put(*entrada)
+
+                transaction.on_commit(actualizar_cache)
+    except Exception:
+        # El rollback descartó las referencias de ArchivoMedia pero no los archivos
+        default_storage.discard_unreferenced(guardados)
+        raise
+    return len(personas)
+
+
+def _guardar_lote(filas, resultado):
+    validas = []
+    digests = set()
+    for fila in filas:
+        digest = fila.persona.huella_digest if fila.persona else None
+        if not fila.error and digest in digests:
+            fila.error = 'Huella duplicada en el archivo'
+        if fila.error:
+            resultado.agregar_error(fila.linea, fila.error)
+            continue
+        if digest:
+            digests.add(digest)
+        validas.append(fila)
+
+    registradas = set(Persona.objects.filter(huella_digest__in=digests).values_list('huella_digest', flat=True))
+    if registradas:
+        for fila in [f for f in validas if f.persona.huella_digest in registradas]:
+            resultado.agregar_error(fila.linea, 'La huella digital ya está registrada')
+            validas.remove(fila)
+    if not validas:
+        return
+
+    try:
+        resultado.creadas += _insertar(validas)
+    except IntegrityError:
+        # Otra petición registró alguna de estas huellas mientras tanto:
+        # se reintenta fila por fila para insertar las demás
+        for fila in validas:
+            fila.persona.pk = None
+            try:
+                resultado.creadas += _insertar([fila])
+            except IntegrityError:
+                resultado.agregar_error(fila.linea, 'La huella digital ya está registrada')
+
+
+def _lotes(filas, tamano):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def importar_personas(archivo, formato, adjuntos=None, batch_size=None, workers=None, progreso=None):
+    """
+    Importa personas desde un archivo CSV o NDJSON.
+
+    Args:
+        archivo: Archivo binario con una persona por fila (o por línea en NDJSON)
+        formato: 'csv' o 'ndjson'
+        adjuntos: Archivo ZIP (ruta o archivo binario con seek) con las
+            imágenes nombradas en las columnas foto y huella_digital
+        batch_size: Personas por lote (settings.IMPORTACION_LOTE)
+        workers: Hilos para procesar imágenes (settings.IMPORTACION_WORKERS)
+        progreso: Función opcional que recibe el ResultadoImportacion tras cada lote
+
+    Returns:
+        ResultadoImportacion: Personas creadas y errores por línea
+    """
+    batch_size = batch_size or getattr(settings, 'IMPORTACION_LOTE', 500)
+    workers = workers or getattr(settings, 'IMPORTACION_WORKERS', 4)
+    resultado = ResultadoImportacion()
+    ultimo_id = Persona.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    zip_adjuntos = zipfile.ZipFile(adjuntos) if adjuntos is not None else None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for lote in _lotes(leer_filas(archivo, formato), batch_size):
+                filas = list(pool.map(
+                    lambda fila: FilaPreparada(fila[0], error=fila[2]) if fila[2]
+                    else preparar_fila(fila[0], fila[1], zip_adjuntos),
+                    lote,
+                ))
+                _guardar_lote(filas, resultado)
+                if progreso:
+                    progreso(resultado)
+    finally:
+        if zip_adjuntos is not None:
+            zip_adjuntos.close()
+
+    if resultado.creadas and not connection.features.can_return_rows_from_bulk_insert:
+        # Sin ids devueltos por bulk_create se indexa al final todo lo nuevo
+        indexar_personas(Persona.objects.filter(pk__gt=ultimo_id))
+        proyectar_personas(Persona.objects.filter(pk__gt=ultimo_id))
+    return resultado
+
+
+def _valor_exportado(valor):
+    if isinstance(valor, bool):
+        return int(valor)
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return valor
+
+
+def exportar_personas(queryset, formato, chunk_size=2000):
+    """
+    Genera el contenido del archivo exportado por fragmentos de texto, sin
+    cargar la tabla completa. Las columnas de archivos llevan la ruta
+    relativa a MEDIA_ROOT.
+    """
+    filas = queryset.order_by('id').values_list(*CAMPOS_EXPORTACION).iterator(chunk_size=chunk_size)
+    buffer = io.StringIO()
+    if formato == 'csv':
+        escritor = csv.writer(buffer)
+        escritor.writerow(CAMPOS_EXPORTACION)
+    for numero, fila in enumerate(filas, start=1):
+        valores = [_valor_exportado(valor) for valor in fila]
+        if formato == 'csv':
+            escritor.writerow(['' if valor is None else valor for valor in valores])
+        else:
+            buffer.write(json.dumps(dict(zip(CAMPOS_EXPORTACION, valores)), ensure_ascii=False))
+            buffer.write('\n')
+        if numero % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
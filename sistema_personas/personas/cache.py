@@ -0,0 +1,161 @@
+"""
+Caché de las lecturas más frecuentes de personas.
+
+  - Detalle: la persona (vista web) y sus datos serializados (API) se guardan
+    bajo una clave que incluye su versión, fecha_actualizacion. La versión
+    vigente de cada persona también vive en la caché, así que un acierto no
+    consulta la base de datos.
+  - Listados de la API: cada página se guarda bajo la generación actual de
+    personas, que cambia con cualquier alta, modificación o baja.
+
+Las señales de Persona llaman a invalidar_persona al confirmarse cada
+escritura. Quien modifique personas con queryset.update() debe llamarla
+también.
+
+Se usa la caché settings.CACHE_RESPUESTAS_ALIAS. Las invalidaciones solo
+llegan a los procesos que comparten el backend: por eso, cuando el worker
+de procesar_registros guarda personas en otro proceso, el valor por
+defecto es DatabaseCache; LocMem (por proceso) solo sirve con un único
+proceso. Los segundos de cada tipo están en settings.CACHE_RESPUESTAS
+(0 = sin caché).
+"""
+import time
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Persona
+
+CLAVE_GENERACION = 'personas:generacion'
+TIPOS = ('detalle', 'lista')
+
+_FALTA = object()
+_lock = threading.Lock()
+_contadores = {tipo: {'aciertos': 0, 'fallos': 0} for tipo in TIPOS}
+
+
+def _cache():
+    return caches[getattr(settings, 'CACHE_RESPUESTAS_ALIAS', 'default')]
+
+
+def _segundos(tipo):
+    return getattr(settings, 'CACHE_RESPUESTAS', {}).get(tipo, 0)
+
+
+def _registrar(tipo, acierto):
+    with _lock:
+        _contadores[tipo]['aciertos' if acierto else 'fallos'] += 1
+
+
+def en_cache(tipo, clave, construir):
+    """
+    Valor guardado bajo clave o, si no está, el que devuelve construir()
+    (que se guarda). Las excepciones de construir no se guardan.
+    """
+    segundos = _segundos(tipo)
+    if not segundos:
+        return construir()
+    cache = _cache()
+    valor = cache.get(clave, _FALTA)
+    if valor is not _FALTA:
+        _registrar(tipo, True)
+        return valor
+    _registrar(tipo, False)
+    valor = construir()
+    cache.set(clave, valor, segundos)
+    return valor
+
+
+def _clave_version(persona_id):
+    return f'persona:{persona_id}:version'
+
+
+def version_persona(persona_id):
+    """fecha_actualizacion (en microsegundos) de la persona, o None si no existe"""
+    cache = _cache()
+    version = cache.get(_clave_version(persona_id))
+    if version is None:
+        try:
+            fecha = Persona.objects.filter(pk=persona_id).values_list('fecha_actualizacion', flat=True).first()
+        except (ValueError, TypeError):
+            return None
+        if fecha is None:
+            return None
+        version = int(fecha.timestamp() * 1_000_000)
+        cache.set(_clave_version(persona_id), version, _segundos('detalle'))
+    return version
+
+
+def generacion():
+    """Generación actual de personas, parte de la clave de los listados"""
+    cache = _cache()
+    valor = cache.get(CLAVE_GENERACION)
+    if valor is None:
+        valor = time.time_ns()
+        cache.add(CLAVE_GENERACION, valor, None)
+        valor = cache.get(CLAVE_GENERACION, valor)
+    return valor
+
+
+def invalidar_personas(ids):
+    """Descarta la versión en caché de esas personas y todos los listados"""
+    cache = _cache()
+    cache.delete_many([_clave_version(persona_id) for persona_id in ids])
+    cache.set(CLAVE_GENERACION, time.time_ns(), None)
+
+
+def invalidar_persona(persona_id):
+    invalidar_personas([persona_id])
+
+
+def invalidar_listas():
+    """Descarta todos los listados (altas masivas)"""
+    _cache().set(CLAVE_GENERACION, time.time_ns(), None)
+
+
+def obtener_persona(persona_id):
+    """Persona completa desde la caché, o None si no existe"""
+    if not _segundos('detalle'):
+        return Persona.objects.filter(pk=persona_id).first()
+    version = version_persona(persona_id)
+    if version is None:
+        return None
+    return en_cache('detalle', f'persona:{persona_id}:{version}:objeto',
+                    lambda: Persona.objects.filter(pk=persona_id).first())
+
+
+def datos_persona(persona_id, variante, construir):
+    """
+    Datos serializados de una persona para una variante (p. ej. serializer y
+    host de las URLs absolutas). Si la persona no existe no se guarda nada.
+    """
+    if not _segundos('detalle'):
+        return construir()
+    version = version_persona(persona_id)
+    if version is None:
+        return construir()
+    return en_cache('detalle', f'persona:{persona_id}:{version}:{variante}', construir)
+
+
+def datos_lista(request, construir):
+    """Página de un listado de la API, por host y URL completa"""
+    if not _segundos('lista'):
+        return construir()
+    url = hashlib.md5(f'{request.get_host()}{request.get_full_path()}'.encode()).hexdigest()
+    return en_cache('lista', f'personas:{generacion()}:lista:{url}', construir)
+
+
+def estadisticas():
+    """Aciertos, fallos y tasa de aciertos de este proceso por tipo de respuesta"""
+    with _lock:
+        resultado = {}
+        for tipo, contadores in _contadores.items():
+            total = contadores['aciertos'] + contadores['fallos']
+            resultado[tipo] = {
+                **contadores,
+                'tasa_aciertos': round(contadores['aciertos'] / total, 4) if total else None,
+                'segundos': _segundos(tipo),
+            }
+        return resultado
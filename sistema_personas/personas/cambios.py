@@ -0,0 +1,185 @@
+"""
+Feed de cambios de personas para la sincronización incremental.
+
+Los consumidores (p. ej. los controladores de acceso) guardan el cursor del
+último cambio recibido y piden solo lo posterior, en lugar de recorrer el
+listado completo. Los cambios salen de dos fuentes ordenadas por fecha:
+
+  - Altas y modificaciones: Persona por (fecha_actualizacion, id)
+  - Bajas: PersonaEliminada por (fecha_eliminacion, id), escrita por el
+    receptor post_delete de Persona y por purgar_personas
+
+El cursor es (fecha en microsegundos, fuente, id) y solo avanza. Se omiten
+los cambios de los últimos settings.CAMBIOS_MARGEN_SEGUNDOS para que una
+transacción que aún no se confirmó con una fecha anterior no quede detrás
+de un cursor ya entregado. Cuando el consumidor está al día, el cursor
+final es una marca (FUENTE_MARCA) en ese límite, aunque no haya cambios.
+
+Las bajas se conservan settings.CAMBIOS_RETENCION_DIAS. purgar_eliminaciones
+guarda la fecha de la última baja borrada (Contador.HORIZONTE_BAJAS); solo
+un cursor anterior a ella exige sincronizar desde cero.
+"""
+import json
+import heapq
+import itertools
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Contador, Persona, PersonaEliminada
+
+# Fuente de cada cambio; a igual fecha las bajas van después de las modificaciones.
+# Un cursor FUENTE_MARCA indica que ya se entregó todo hasta su fecha
+FUENTE_PERSONA = 0
+FUENTE_ELIMINADA = 1
+FUENTE_MARCA = 2
+EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSEGUNDO = timedelta(microseconds=1)
+
+
+class CursorVencido(Exception):
+    """El cursor es anterior a las bajas conservadas"""
+
+
+def _margen():
+    return timedelta(seconds=getattr(settings, 'CAMBIOS_MARGEN_SEGUNDOS', 5))
+
+
+def _retencion():
+    return timedelta(days=getattr(settings, 'CAMBIOS_RETENCION_DIAS', 30))
+
+
+def _microsegundos(fecha):
+    # Aritmética entera: el cursor debe volver exactamente a la misma fecha
+    return (fecha - EPOCA) // MICROSEGUNDO
+
+
+def horizonte_bajas():
+    """Fecha de la última baja borrada por purgar_eliminaciones, o None si nunca se borró ninguna"""
+    microsegundos = Contador.objects.filter(nombre=Contador.HORIZONTE_BAJAS).values_list('valor', flat=True).first()
+    return None if microsegundos is None else EPOCA + microsegundos * MICROSEGUNDO
+
+
+def codificar_cursor(fecha, fuente, pk):
+    """Cursor opaco para la posición (fecha, fuente, pk)"""
+    return f'{_microsegundos(fecha)}-{fuente}-{pk}'
+
+
+def decodificar_cursor(cursor):
+    """
+    (fecha, fuente, pk) de un cursor de codificar_cursor, o None si está vacío.
+    Lanza ValueError si el cursor no es válido y CursorVencido si hay bajas
+    posteriores a él que ya se purgaron.
+    """
+    if not cursor:
+        return None
+    try:
+        microsegundos, fuente, pk = (int(parte) for parte in cursor.split('-'))
+    except ValueError:
+        raise ValueError('Cursor inválido')
+    if fuente not in (FUENTE_PERSONA, FUENTE_ELIMINADA, FUENTE_MARCA):
+        raise ValueError('Cursor inválido')
+    fecha = EPOCA + microsegundos * MICROSEGUNDO
+    horizonte = horizonte_bajas()
+    if horizonte is not None and fecha <= horizonte:
+        raise CursorVencido('El cursor es anterior a las bajas conservadas; sincronice desde el inicio')
+    return fecha, fuente, pk
+
+
+def _despues(queryset, campo_fecha, fuente, cursor):
+    """Filas de una fuente posteriores al cursor, usando el índice (fecha, id)"""
+    if cursor is None:
+        return queryset
+    fecha, fuente_cursor, pk = cursor
+    if fuente > fuente_cursor:
+        return queryset.filter(**{f'{campo_fecha}__gte': fecha})
+    if fuente < fuente_cursor:
+        return queryset.filter(**{f'{campo_fecha}__gt': fecha})
+    return queryset.filter(**{f'{campo_fecha}__gte': fecha}).exclude(**{campo_fecha: fecha, 'pk__lte': pk})
+
+
+def cambios_desde(cursor=None, limite=1000, hasta=None):
+    """
+    Cambios posteriores al cursor y hasta la fecha 'hasta' (por defecto,
+    ahora menos el margen) en orden, como mucho 'limite', leídos por
+    fragmentos.
+
+    Returns:
+        iterator: Pares (clave, Persona o PersonaEliminada), donde clave es
+        (fecha, fuente, pk) y sirve para codificar_cursor
+    """
+    if hasta is None:
+        hasta = timezone.now() - _margen()
+    personas = _despues(
+        Persona.objects.filter(fecha_actualizacion__lte=hasta), 'fecha_actualizacion', FUENTE_PERSONA, cursor,
+    ).order_by('fecha_actualizacion', 'id')[:limite]
+    eliminadas = _despues(
+        PersonaEliminada.objects.filter(fecha_eliminacion__lte=hasta), 'fecha_eliminacion', FUENTE_ELIMINADA, cursor,
+    ).order_by('fecha_eliminacion', 'id')[:limite]
+    return itertools.islice(heapq.merge(
+        (((p.fecha_actualizacion, FUENTE_PERSONA, p.pk), p) for p in personas.iterator(chunk_size=500)),
+        (((e.fecha_eliminacion, FUENTE_ELIMINADA, e.pk), e) for e in eliminadas.iterator(chunk_size=500)),
+        key=lambda cambio: cambio[0],
+    ), limite)
+
+
+def generar_ndjson(cursor, limite, serializar):
+    """
+    Genera el feed como NDJSON: una línea por cambio con su cursor y una
+    línea final con el cursor desde el que continuar. Si no quedan más
+    cambios, el cursor final es la marca del límite leído (ahora menos el
+    margen), de modo que avanza aunque el registro no cambie.
+
+        {"tipo": "creada"|"actualizada", "id": 7, "cursor": "...", "persona": {...}}
+        {"tipo": "eliminada", "id": 9, "cursor": "..."}
+        {"tipo": "fin", "cursor": "...", "mas": false}
+
+    Args:
+        cursor: Posición de decodificar_cursor (None = desde el inicio)
+        serializar: Función que convierte una Persona en un diccionario
+    """
+    hasta = timezone.now() - _margen()
+    ultimo = codificar_cursor(*cursor) if cursor else ''
+    hay_mas = False
+    buffer = []
+    # Un cambio más que el límite solo para saber si hay más
+    for numero, (clave, objeto) in enumerate(cambios_desde(cursor, limite + 1, hasta)):
+        if numero == limite:
+            hay_mas = True
+            break
+        ultimo = codificar_cursor(*clave)
+        if clave[1] == FUENTE_ELIMINADA:
+            linea = {'tipo': 'eliminada', 'id': objeto.persona_id, 'cursor': ultimo}
+        else:
+            nueva = cursor is None or objeto.fecha_registro > cursor[0]
+            linea = {'tipo': 'creada' if nueva else 'actualizada', 'id': objeto.pk, 'cursor': ultimo,
+                     'persona': serializar(objeto)}
+        buffer.append(json.dumps(linea, cls=DjangoJSONEncoder, ensure_ascii=False))
+        if len(buffer) >= 100:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if not hay_mas and (cursor is None or cursor[0] < hasta):
+        ultimo = codificar_cursor(hasta, FUENTE_MARCA, 0)
+    buffer.append(json.dumps({'tipo': 'fin', 'cursor': ultimo, 'mas': hay_mas}))
+    yield '\n'.join(buffer) + '\n'
+
+
+def purgar_eliminaciones():
+    """
+    Borra las bajas más antiguas que la retención y adelanta el horizonte
+    de bajas (horizonte_bajas) hasta la más reciente borrada; devuelve cuántas
+    """
+    vencidas = PersonaEliminada.objects.filter(fecha_eliminacion__lt=timezone.now() - _retencion())
+    with transaction.atomic():
+        ultima = vencidas.order_by('-fecha_eliminacion').values_list('fecha_eliminacion', flat=True).first()
+        if ultima is None:
+            return 0
+        horizonte = horizonte_bajas()
+        if horizonte is None or ultima > horizonte:
+            Contador.objects.update_or_create(nombre=Contador.HORIZONTE_BAJAS,
+                                              defaults={'valor': _microsegundos(ultima)})
+        borradas, _ = vencidas.filter(fecha_eliminacion__lte=ultima).delete()
+    return borradas
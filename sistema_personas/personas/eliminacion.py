@@ -0,0 +1,209 @@
+"""
+Eliminación diferida de los archivos de personas borradas.
+
+Al borrar personas (una a una o con queryset.delete()) el receptor
+post_delete solo encola los nombres de sus archivos con
+programar_eliminacion; cuando la transacción se confirma, un grupo de hilos
+los libera por lotes de settings.ELIMINACION_LOTE:
+
+  - pocas consultas por lote para descontar referencias en ArchivoMedia
+    (ContentAddressedStorage.release) y
+  - un solo listado por carpeta para borrar archivos y miniaturas
+    (ContentAddressedStorage.remove).
+
+Si la transacción se revierte no se toca ningún archivo. Para vaciar la
+base de datos a gran escala está purgar_personas (comando purgar_personas),
+que borra por lotes sin emitir señales por fila.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_ARCHIVO = ('foto', 'huella_digital', 'qr_code')
+# Con SQLite la liberación puede chocar con la escritura de otra petición
+# ("database is locked"); el lote se reintenta, es una sola transacción
+REINTENTOS = 5
+
+
+def liberar_archivos(storage, nombres):
+    """
+    Libera un lote de archivos de forma síncrona.
+
+    Returns:
+        int: Archivos borrados del disco (incluidas miniaturas)
+    """
+    nombres = [nombre for nombre in nombres if nombre]
+    if not nombres:
+        return 0
+    if not hasattr(storage, 'release'):
+        # Almacenamiento sin conteo de referencias: borrado uno a uno
+        for nombre in nombres:
+            storage.delete(nombre)
+        return len(nombres)
+    for intento in range(REINTENTOS):
+        try:
+            libres = storage.release(nombres)
+            break
+        except OperationalError:
+            if intento == REINTENTOS - 1:
+                raise
+            time.sleep(0.05 * 2 ** intento)
+    return storage.remove(libres)
+
+
+class ColaEliminacion:
+    """
+    Cola de archivos por eliminar atendida por un ThreadPoolExecutor. Cada
+    hilo toma hasta 'lote' nombres a la vez, de modo que borrar miles de
+    personas se traduce en pocas transacciones y listados de carpeta.
+    """
+
+    def __init__(self, lote=None, workers=None):
+        self.lote = lote or getattr(settings, 'ELIMINACION_LOTE', 500)
+        self.workers = workers or getattr(settings, 'ELIMINACION_WORKERS', 2)
+        self._pendientes = deque()
+        self._activos = 0
+        self._condicion = threading.Condition()
+        self._executor = None
+        self.eliminados = 0
+        self.errores = 0
+
+    def agregar(self, nombres, storage=default_storage):
+        nombres = [nombre for nombre in nombres if nombre]
+        if not nombres:
+            return
+        with self._condicion:
+            self._pendientes.extend((storage, nombre) for nombre in nombres)
+            if self._activos < self.workers:
+                self._activos += 1
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='eliminacion')
+                self._executor.submit(self._atender)
+
+    def _siguiente_lote(self):
+        with self._condicion:
+            if not self._pendientes:
+                self._activos -= 1
+                self._condicion.notify_all()
+                return None
+            cantidad = min(self.lote, len(self._pendientes))
+            return [self._pendientes.popleft() for _ in range(cantidad)]
+
+    def _atender(self):
+        try:
+            while (lote := self._siguiente_lote()) is not None:
+                por_storage = {}
+                for storage, nombre in lote:
+                    por_storage.setdefault(storage, []).append(nombre)
+                for storage, nombres in por_storage.items():
+                    try:
+                        borrados = liberar_archivos(storage, nombres)
+                    except Exception:
+                        logger.exception("Error al eliminar %d archivos", len(nombres))
+                        with self._condicion:
+                            self.errores += len(nombres)
+                        continue
+                    logger.debug("Liberados %d archivos, %d borrados del disco", len(nombres), borrados)
+                    with self._condicion:
+                        self.eliminados += borrados
+        finally:
+            close_old_connections()
+
+    def esperar(self, timeout=None):
+        """Bloquea hasta que la cola quede vacía (comandos y pruebas)"""
+        with self._condicion:
+            return self._condicion.wait_for(lambda: not self._pendientes and not self._activos, timeout)
+
+
+cola_eliminacion = ColaEliminacion()
+
+
+def programar_eliminacion(nombres, storage=default_storage, using=None):
+    """Encola los archivos para eliminarlos cuando se confirme la transacción actual"""
+    nombres = [nombre for nombre in nombres if nombre]
+    if nombres:
+        transaction.on_commit(lambda: cola_eliminacion.agregar(nombres, storage), using=using)
+
+
+def _borrar_filas(modelo, ids):
+    """
+    DELETE ... WHERE pk IN (...) directo. Persona tiene receptores
+    post_delete, así que queryset.delete() cargaría cada instancia para
+    enviarle la señal; las filas que dependen de ella deben haberse borrado
+    antes, porque la base de datos no hace la cascada.
+
+    Returns:
+        int: Filas eliminadas
+    """
+    opciones = modelo._meta
+    marcadores = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(opciones.db_table)} '
+            f'WHERE {connection.ops.quote_name(opciones.pk.column)} IN ({marcadores})',
+            ids,
+        )
+        return cursor.rowcount
+
+
+def purgar_personas(queryset, lote=1000, progreso=None):
+    """
+    Elimina personas y sus archivos a gran escala.
+
+    Borra por lotes de ids sin cargar instancias ni emitir señales por fila:
+    primero las tablas dependientes con queryset.delete() (no tienen
+    receptores, así que es un solo DELETE) y luego las personas con
+    _borrar_filas. Hace a mano lo que harían los receptores post_delete:
+    registra las bajas para el feed de cambios, ajusta el contador de
+    personas, descarta sus respuestas en caché y encola los archivos del
+    lote (incluidos los temporales de tareas sin procesar) para después del
+    commit.
+
+    Args:
+        queryset: Personas a eliminar
+        lote: Filas por transacción
+        progreso: Función opcional llamada con el total eliminado tras cada lote
+
+    Returns:
+        int: Personas eliminadas
+    """
+    from .cache import invalidar_personas
+    from .matching import template_cache
+    from .models import IndiceBusqueda, Persona, PersonaEliminada, PersonaLista, TareaRegistro, ajustar_contador_personas
+
+    eliminadas = 0
+    ultimo_id = 0
+    ids_qs = queryset.order_by('pk').values_list('pk', *CAMPOS_ARCHIVO)
+    while True:
+        filas = list(ids_qs.filter(pk__gt=ultimo_id)[:lote])
+        if not filas:
+            break
+        ultimo_id = filas[-1][0]
+        ids = [fila[0] for fila in filas]
+        archivos = [nombre for fila in filas for nombre in fila[1:] if nombre]
+        with transaction.atomic():
+            # Archivos temporales de registros que no llegaron a procesarse
+            for temporales in TareaRegistro.objects.filter(persona_id__in=ids).values_list('huella_temp', 'foto_temp'):
+                archivos.extend(nombre for nombre in temporales if nombre)
+            for modelo in (IndiceBusqueda, PersonaLista, TareaRegistro):
+                modelo.objects.filter(persona_id__in=ids).delete()
+            borradas = _borrar_filas(Persona, ids)
+            PersonaEliminada.objects.bulk_create([PersonaEliminada(persona_id=pk) for pk in ids])
+            ajustar_contador_personas(-borradas)
+            programar_eliminacion(archivos)
+            transaction.on_commit(lambda ids=ids: [template_cache.discard(pk) for pk in ids])
+            transaction.on_commit(lambda ids=ids: invalidar_personas(ids))
+        eliminadas += len(ids)
+        if progreso:
+            progreso(eliminadas)
+    logger.info("Purgadas %d personas", eliminadas)
+    return eliminadas
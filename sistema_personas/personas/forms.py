@@ -1,5 +1,6 @@
 from django import forms
 from django.core.validators import RegexValidator
+from .biometrics import FingerprintQualityError, check_fingerprint_quality
 from .models import Persona
 #cambio de rama
 class PersonaForm(forms.ModelForm):
@@ -74,5 +75,11 @@ class HuellaDigitalForm(forms.Form):
             # Validar formato (solo PNG y JPG)
             if not huella.name.endswith(('.png', '.jpg', '.jpeg')):
                 raise forms.ValidationError('Formato no soportado. Use PNG o JPG.')
+
+            # Validar calidad de la captura (ver biometrics.check_fingerprint_quality)
+            try:
+                check_fingerprint_quality(huella)
+            except FingerprintQualityError as e:
+                raise forms.ValidationError(str(e))
                 
         return huella
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Fotografías normalizadas y miniaturas pregeneradas.
+
+Al guardarse, la foto de una persona se normaliza (orientación EXIF
+aplicada, máximo 800x800, JPEG) con utils.optimize_image y se generan
+miniaturas de cada tamaño de MINIATURAS en JPEG y WebP junto al archivo:
+
+    fotos/ab/<sha256>.jpg  ->  fotos/ab/<sha256>_80.jpg, fotos/ab/<sha256>_80.webp, ...
+
+Las miniaturas se guardan como derivados del archivo principal
+(ContentAddressedStorage.save_derived) y se borran con él. Como se generan
+al guardar la foto, sus URLs se derivan del nombre sin consultar el disco;
+las fotos con nombres anteriores al almacenamiento por contenido no tienen
+miniaturas hasta que optimizar_fotos las migra y muestran la foto completa.
+Los listados no derivan nada por fila: PersonaLista guarda los nombres de
+las miniaturas (nombres_miniaturas) al escribirse.
+"""
+import os
+import posixpath
+from io import BytesIO
+
+from PIL import Image, ImageOps, features
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .metricas import medir_imagen
+from .storage import ContentAddressedStorage
+from .utils import optimize_image
+
+TAMANO_PRINCIPAL = (800, 800)
+CALIDAD = 85
+# Lado mayor en píxeles: pequena para listados (40px a 2x), mediana para el detalle
+MINIATURAS = {
+    'pequena': 80,
+    'mediana': 400,
+}
+FORMATOS_MINIATURA = ('webp', 'jpg') if features.check('webp') else ('jpg',)
+FORMATOS_PIL = {'jpg': 'JPEG', 'webp': 'WEBP'}
+
+
+def normalizar_foto(archivo):
+    """
+    Foto lista para guardarse: orientada, reducida y en JPEG.
+
+    Returns:
+        ContentFile: Imagen normalizada con extensión .jpg
+    """
+    contenido = optimize_image(archivo, max_size=TAMANO_PRINCIPAL, quality=CALIDAD)
+    nombre = os.path.basename(getattr(archivo, 'name', '') or 'foto')
+    contenido.name = f'{os.path.splitext(nombre)[0]}.jpg'
+    return contenido
+
+
+def nombre_miniatura(nombre, tamano, formato):
+    """Ruta de la miniatura de una foto guardada"""
+    base = posixpath.splitext(nombre)[0]
+    return f'{base}_{MINIATURAS[tamano]}.{formato}'
+
+
+@medir_imagen
+def crear_miniaturas(imagen):
+    """
+    Genera todas las miniaturas de una imagen.
+
+    Args:
+        imagen: Archivo o bytes de la imagen (normalmente ya normalizada)
+
+    Returns:
+        dict: {(tamaño, formato): bytes}
+    """
+    if isinstance(imagen, bytes):
+        imagen = BytesIO(imagen)
+    elif hasattr(imagen, 'seek'):
+        imagen.seek(0)
+    original = ImageOps.exif_transpose(Image.open(imagen))
+    if original.mode not in ('L', 'RGB'):
+        original = original.convert('RGB')
+
+    miniaturas = {}
+    for tamano, lado in MINIATURAS.items():
+        img = original.copy()
+        img.thumbnail((lado, lado), Image.LANCZOS)
+        for formato in FORMATOS_MINIATURA:
+            buffer = BytesIO()
+            img.save(buffer, format=FORMATOS_PIL[formato], quality=CALIDAD, optimize=True)
+            miniaturas[(tamano, formato)] = buffer.getvalue()
+    return miniaturas
+
+
+def guardar_miniaturas(foto, miniaturas):
+    """Guarda las miniaturas ya generadas de un FieldFile de foto"""
+    for (tamano, formato), contenido in miniaturas.items():
+        foto.storage.save_derived(nombre_miniatura(foto.name, tamano, formato), ContentFile(contenido))
+
+
+def faltan_miniaturas(foto):
+    return any(
+        not foto.storage.exists(nombre_miniatura(foto.name, tamano, formato))
+        for tamano in MINIATURAS
+        for formato in FORMATOS_MINIATURA
+    )
+
+
+def generar_miniaturas(foto, forzar=False):
+    """
+    Genera y guarda las miniaturas de una foto si aún no existen.
+
+    Returns:
+        bool: True si se generaron
+    """
+    if not foto or not (forzar or faltan_miniaturas(foto)):
+        return False
+    with foto.storage.open(foto.name, 'rb') as archivo:
+        guardar_miniaturas(foto, crear_miniaturas(archivo))
+    return True
+
+
+def tiene_miniaturas(nombre_foto):
+    """True si la foto está direccionada por contenido y por tanto tiene miniaturas"""
+    return bool(nombre_foto) and ContentAddressedStorage.content_digest(nombre_foto) is not None
+
+
+def nombres_miniaturas(nombre_foto):
+    """{tamaño: {formato: nombre}} de las miniaturas de una foto; vacío si no tiene"""
+    if not tiene_miniaturas(nombre_foto):
+        return {}
+    return {
+        tamano: {formato: nombre_miniatura(nombre_foto, tamano, formato) for formato in FORMATOS_MINIATURA}
+        for tamano in MINIATURAS
+    }
+
+
+def _storage_y_nombre(foto):
+    # foto es el campo del modelo o el nombre del archivo (filas de personas.listado)
+    if isinstance(foto, str):
+        return default_storage, foto
+    return foto.storage, foto.name
+
+
+def url_miniatura(foto, tamano='pequena', formato='jpg', miniaturas=None):
+    """
+    URL de la miniatura, o de la foto completa si no tiene miniaturas
+    (fotos anteriores a optimizar_fotos). miniaturas son los nombres ya
+    calculados (PersonaLista.miniaturas); sin ellos se derivan del nombre.
+    """
+    if not foto:
+        return ''
+    storage, nombre_foto = _storage_y_nombre(foto)
+    if miniaturas is None:
+        miniaturas = nombres_miniaturas(nombre_foto)
+    nombre = miniaturas.get(tamano, {}).get(formato) if miniaturas else None
+    return storage.url(nombre or nombre_foto)
+
+
+def urls_miniaturas(foto, miniaturas=None):
+    """{tamaño: {formato: url}} de todas las miniaturas de una foto (ver url_miniatura)"""
+    if not foto:
+        return None
+    storage, nombre_foto = _storage_y_nombre(foto)
+    if miniaturas is None:
+        miniaturas = nombres_miniaturas(nombre_foto)
+    if not miniaturas:
+        url = storage.url(nombre_foto)
+        return {tamano: dict.fromkeys(FORMATOS_MINIATURA, url) for tamano in MINIATURAS}
+    return {
+        tamano: {formato: storage.url(nombre) for formato, nombre in formatos.items()}
+        for tamano, formatos in miniaturas.items()
+    }
@@ -0,0 +1,338 @@
+"""
+Limpieza de archivos temporales y huérfanos de MEDIA_ROOT.
+
+  - Temporales: fotos del paso 2 del registro y huellas en cola
+    (pendientes/, y fotos/temp_* de versiones anteriores) más antiguas que
+    el límite, salvo las que todavía usan un borrador vigente o una tarea
+    sin terminar. Las de pendientes/ están direccionadas por contenido: sus
+    filas de ArchivoMedia se descartan en el mismo lote que los archivos.
+  - Huérfanos (opcional): archivos de fotos/, huellas/ y qr/ que ninguna
+    persona usa. Los archivos direccionados por contenido se contrastan con
+    ArchivoMedia; los nombres anteriores a ese almacenamiento, con Persona;
+    las miniaturas se eliminan cuando ya no existe su foto.
+
+Se ejecuta con el comando limpiar_temporales o periódicamente desde el
+worker de procesar_registros (settings.LIMPIEZA_INTERVALO), que además borra
+las bajas del feed de cambios más antiguas que su retención.
+"""
+import os
+import time
+import logging
+import posixpath
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cambios import purgar_eliminaciones
+from .models import ArchivoMedia, Persona, RegistroBorrador, TareaRegistro
+from .storage import DERIVADO_RE, ContentAddressedStorage
+from .tasks import CARPETA_PENDIENTES
+
+logger = logging.getLogger(__name__)
+
+CARPETAS_MEDIA = ('fotos', 'huellas', 'qr')
+TAMANO_LOTE = 1000
+
+
+@dataclass
+class ResultadoLimpieza:
+    archivos: int = 0
+    bytes: int = 0
+    segundos: float = 0.0
+
+    def sumar(self, archivos, total_bytes):
+        self.archivos += archivos
+        self.bytes += total_bytes
+
+
+def _en_uso():
+    """Rutas temporales que todavía necesita un borrador o una tarea"""
+    rutas = set(
+        RegistroBorrador.objects.filter(expira__gt=timezone.now()).exclude(foto_path='')
+        .values_list('foto_path', flat=True)
+    )
+    for huella, foto in TareaRegistro.objects.filter(
+        estado__in=(TareaRegistro.PENDIENTE, TareaRegistro.PROCESANDO)
+    ).values_list('huella_temp', 'foto_temp'):
+        rutas.add(huella)
+        if foto:
+            rutas.add(foto)
+    return rutas
+
+
+def _liberar_pendientes(rutas):
+    """
+    Descarta las referencias de las subidas abandonadas de pendientes/; nadie
+    las usa (las de borradores y tareas vigentes no se barren), así que se
+    eliminan sus filas aunque varias subidas compartan el archivo
+    """
+    ArchivoMedia.objects.filter(ruta__in=rutas).delete()
+
+
+def _recorrer_archivos(directorio):
+    """Recorre un directorio recursivamente con os.scandir (sin listas intermedias)"""
+    try:
+        with os.scandir(directorio) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    yield from _recorrer_archivos(entrada.path)
+                elif entrada.is_file(follow_symlinks=False):
+                    yield entrada
+    except FileNotFoundError:
+        return
+
+
+def eliminar_archivos(rutas, batch_size=TAMANO_LOTE, pausa=0.0):
+    """
+    Elimina archivos por lotes, con una pausa opcional entre lotes para no
+    saturar el disco.
+
+    Args:
+        rutas: Iterable de tuplas (ruta absoluta, tamaño en bytes)
+        batch_size: Archivos por lote
+        pausa: Segundos de espera entre lotes
+
+    Returns:
+        tuple: (archivos eliminados, bytes liberados)
+    """
+    eliminados = liberados = 0
+    for ruta, tamano in rutas:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning("Error al eliminar %s: %s", ruta, e)
+            continue
+        eliminados += 1
+        liberados += tamano
+        if pausa and eliminados % batch_size == 0:
+            time.sleep(pausa)
+    return eliminados, liberados
+
+
+def _sigue_vencido(ruta, limite):
+    try:
+        return os.stat(ruta).st_mtime < limite
+    except FileNotFoundError:
+        return False
+
+
+def eliminar_temporales(carpeta, horas=24, prefijo='', excluir=(), batch_size=TAMANO_LOTE, pausa=0.0,
+                        dry_run=False, liberar=None):
+    """
+    Elimina los archivos de una carpeta de MEDIA_ROOT más antiguos que el límite.
+
+    Cada lote se borra en una transacción que bloquea sus filas de
+    ArchivoMedia y vuelve a comprobar la fecha de modificación:
+    ContentAddressedStorage._save toca el archivo al reutilizarlo con esa
+    fila bloqueada, así que un archivo que un borrador o una tarea empezó a
+    usar después del recorrido ya no se borra.
+
+    Args:
+        carpeta: Directorio relativo a MEDIA_ROOT
+        horas: Eliminar archivos más antiguos que estas horas
+        prefijo: Solo archivos cuyo nombre empieza con este prefijo
+        excluir: Rutas relativas a MEDIA_ROOT que no se deben eliminar
+        batch_size: Archivos por lote de borrado
+        pausa: Segundos de espera entre lotes
+        dry_run: Solo contar, sin eliminar
+        liberar: Función que recibe las rutas relativas de cada lote y
+            descarta lo que las registra; se llama en la misma transacción
+            en la que se borra el lote
+
+    Returns:
+        tuple: (archivos eliminados, bytes liberados)
+    """
+    raiz = os.path.join(settings.MEDIA_ROOT, carpeta)
+    limite = time.time() - horas * 3600
+    excluidas = {os.path.join(settings.MEDIA_ROOT, ruta) for ruta in excluir}
+
+    def candidatos():
+        for entrada in _recorrer_archivos(raiz):
+            if not entrada.name.startswith(prefijo) or entrada.path in excluidas:
+                continue
+            stat = entrada.stat(follow_symlinks=False)
+            if stat.st_mtime < limite:
+                yield entrada.path, stat.st_size
+
+    if dry_run:
+        archivos = total = 0
+        for _, tamano in candidatos():
+            archivos += 1
+            total += tamano
+        return archivos, total
+
+    def vaciar(lote):
+        relativas = {ruta: os.path.relpath(ruta, settings.MEDIA_ROOT).replace(os.sep, '/') for ruta, _ in lote}
+        with transaction.atomic():
+            list(ArchivoMedia.objects.select_for_update().filter(ruta__in=relativas.values()).values_list('pk'))
+            vencidos = [(ruta, tamano) for ruta, tamano in lote if _sigue_vencido(ruta, limite)]
+            if liberar is not None:
+                liberar([relativas[ruta] for ruta, _ in vencidos])
+            return eliminar_archivos(vencidos)
+
+    eliminados = liberados = 0
+    lote = []
+    for candidato in candidatos():
+        lote.append(candidato)
+        if len(lote) == batch_size:
+            archivos, total = vaciar(lote)
+            eliminados, liberados, lote = eliminados + archivos, liberados + total, []
+            if pausa:
+                time.sleep(pausa)
+    if lote:
+        archivos, total = vaciar(lote)
+        eliminados, liberados = eliminados + archivos, liberados + total
+    return eliminados, liberados
+
+
+def barrer_temporales(horas=24, batch_size=TAMANO_LOTE, pausa=0.0, dry_run=False):
+    """Elimina las fotos temporales del registro y las huellas en cola abandonadas"""
+    resultado = ResultadoLimpieza()
+    en_uso = _en_uso()
+    for carpeta, prefijo, liberar in (('fotos', 'temp_', None), (CARPETA_PENDIENTES, '', _liberar_pendientes)):
+        resultado.sumar(*eliminar_temporales(
+            carpeta, horas=horas, prefijo=prefijo, excluir=en_uso,
+            batch_size=batch_size, pausa=pausa, dry_run=dry_run, liberar=liberar,
+        ))
+    return resultado
+
+
+def _direccionado(ruta):
+    return ContentAddressedStorage.content_digest(ruta) is not None
+
+
+def _nombres_anteriores():
+    """Archivos usados por personas cuyo nombre no es direccionado por contenido"""
+    nombres = set()
+    filas = Persona.objects.values_list('foto', 'huella_digital', 'qr_code').iterator(chunk_size=5000)
+    for fila in filas:
+        for nombre in fila:
+            if nombre and not _direccionado(nombre):
+                nombres.add(nombre)
+    return nombres
+
+
+def _huerfanos_de_lote(lote, anteriores):
+    """Filtra de un lote de (ruta relativa, ruta absoluta, tamaño) los que nadie usa"""
+    direccionados = [ruta for ruta, _, _ in lote if _direccionado(ruta)]
+    registrados = set(
+        ArchivoMedia.objects.filter(ruta__in=direccionados, referencias__gt=0).values_list('ruta', flat=True)
+    )
+    for ruta, absoluta, tamano in lote:
+        if _direccionado(ruta):
+            if ruta not in registrados:
+                yield ruta, absoluta, tamano
+        elif ruta not in anteriores:
+            yield ruta, absoluta, tamano
+
+
+def _huerfanos_en(directorio, relativo, limite, anteriores):
+    """
+    Genera (ruta absoluta, tamaño) de los huérfanos de un directorio y sus
+    subdirectorios. Cada directorio se decide completo para saber qué fotos
+    sobreviven antes de revisar sus miniaturas.
+    """
+    subdirectorios = []
+    originales = []
+    derivados = []
+    sobreviven = set()
+    try:
+        with os.scandir(directorio) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    subdirectorios.append(entrada)
+                    continue
+                if not entrada.is_file(follow_symlinks=False) or entrada.name.startswith('temp_'):
+                    continue
+                stat = entrada.stat(follow_symlinks=False)
+                es_derivado = (DERIVADO_RE.fullmatch(entrada.name)
+                               and not _direccionado(posixpath.join(relativo, entrada.name)))
+                if es_derivado:
+                    if stat.st_mtime < limite:
+                        derivados.append((entrada.name, entrada.path, stat.st_size))
+                elif stat.st_mtime < limite:
+                    originales.append((posixpath.join(relativo, entrada.name), entrada.path, stat.st_size))
+                else:
+                    sobreviven.add(os.path.splitext(entrada.name)[0])
+    except FileNotFoundError:
+        return
+
+    for inicio in range(0, len(originales), TAMANO_LOTE):
+        lote = originales[inicio:inicio + TAMANO_LOTE]
+        huerfanos = {absoluta for _, absoluta, _ in _huerfanos_de_lote(lote, anteriores)}
+        for _, absoluta, tamano in lote:
+            if absoluta in huerfanos:
+                yield absoluta, tamano
+            else:
+                sobreviven.add(os.path.splitext(os.path.basename(absoluta))[0])
+    for nombre, absoluta, tamano in derivados:
+        # Un nombre anterior como foto_ana_2.jpg parece derivado pero puede estar en uso
+        if DERIVADO_RE.fullmatch(nombre)['base'] not in sobreviven and posixpath.join(relativo, nombre) not in anteriores:
+            yield absoluta, tamano
+
+    for subdirectorio in subdirectorios:
+        yield from _huerfanos_en(subdirectorio.path, posixpath.join(relativo, subdirectorio.name),
+                                 limite, anteriores)
+
+
+def _candidatos_huerfanos(horas):
+    """(ruta absoluta, tamaño) de los huérfanos de fotos/, huellas/ y qr/ más antiguos que el límite"""
+    limite = time.time() - horas * 3600
+    anteriores = _nombres_anteriores()
+    for carpeta in CARPETAS_MEDIA:
+        yield from _huerfanos_en(os.path.join(settings.MEDIA_ROOT, carpeta), carpeta, limite, anteriores)
+
+
+def reconciliar_huerfanos(horas=24, batch_size=TAMANO_LOTE, pausa=0.0, dry_run=False):
+    """Elimina los archivos de fotos, huellas y QR que ninguna persona usa"""
+    resultado = ResultadoLimpieza()
+    candidatos = _candidatos_huerfanos(horas)
+    if dry_run:
+        for _, tamano in candidatos:
+            resultado.sumar(1, tamano)
+    else:
+        resultado.sumar(*eliminar_archivos(candidatos, batch_size=batch_size, pausa=pausa))
+    return resultado
+
+
+def limpiar(horas=24, huerfanos=False, batch_size=TAMANO_LOTE, pausa=0.0, dry_run=False):
+    """Barre los temporales y, si se pide, los huérfanos; mide el tiempo total"""
+    inicio = time.perf_counter()
+    resultado = barrer_temporales(horas, batch_size, pausa, dry_run)
+    if huerfanos:
+        extra = reconciliar_huerfanos(horas, batch_size, pausa, dry_run)
+        resultado.sumar(extra.archivos, extra.bytes)
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+class LimpiezaPeriodica:
+    """
+    Para bucles de larga duración (el worker de procesar_registros): cada
+    llamada ejecuta limpiar() si pasaron settings.LIMPIEZA_INTERVALO
+    segundos desde la anterior. Con intervalo 0 no hace nada.
+    """
+
+    def __init__(self, intervalo=None):
+        if intervalo is None:
+            intervalo = getattr(settings, 'LIMPIEZA_INTERVALO', 0)
+        self.intervalo = intervalo
+        self.ultima = None
+
+    def __call__(self):
+        if not self.intervalo:
+            return None
+        ahora = time.monotonic()
+        if self.ultima is not None and ahora - self.ultima < self.intervalo:
+            return None
+        self.ultima = ahora
+        purgar_eliminaciones()
+        resultado = limpiar(huerfanos=getattr(settings, 'LIMPIEZA_HUERFANOS', False))
+        if resultado.archivos:
+            logger.info("Limpieza: %d archivos, %d bytes en %.1f s",
+                        resultado.archivos, resultado.bytes, resultado.segundos)
+        return resultado
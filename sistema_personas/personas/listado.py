@@ -0,0 +1,77 @@
+"""
+Proyección de lectura de los listados de personas.
+
+PersonaLista guarda, por persona, solo las columnas que muestran la API, la
+lista web y la búsqueda, con sexo_display ya calculado; direccion,
+huella_hex y la plantilla de huella no se leen al listar. Las señales de
+Persona la mantienen al día y las operaciones masivas (importación, purga,
+optimizar_fotos) la actualizan por su cuenta.
+
+Los listados leen con filas_lista(), un queryset de .values() que devuelve
+diccionarios sin instanciar modelos; 'foto' es el nombre del archivo en el
+almacenamiento y 'miniaturas' los nombres de sus miniaturas, calculados al
+escribir la fila para que listar no haga comprobaciones por fila.
+"""
+from django.db.models import F
+
+from .imagenes import nombres_miniaturas
+from .models import SEXO_DISPLAY, PersonaLista
+
+# Campos de Persona copiados en la proyección
+CAMPOS_PROYECTADOS = ('nombre', 'apellidos', 'sexo', 'telefono', 'correo', 'foto', 'fecha_registro')
+COLUMNAS_LISTA = ('nombre', 'apellidos', 'sexo', 'sexo_display', 'telefono', 'correo', 'foto', 'miniaturas',
+                  'fecha_registro')
+
+
+def fila_de(persona):
+    """Fila de PersonaLista (sin guardar) para una persona"""
+    sexo = bool(persona.sexo)
+    foto = persona.foto.name or ''
+    return PersonaLista(
+        persona_id=persona.pk,
+        nombre=persona.nombre,
+        apellidos=persona.apellidos,
+        sexo=sexo,
+        sexo_display=SEXO_DISPLAY[sexo],
+        telefono=persona.telefono,
+        correo=persona.correo,
+        foto=foto,
+        miniaturas=nombres_miniaturas(foto),
+        fecha_registro=persona.fecha_registro,
+    )
+
+
+def proyectar_persona(persona):
+    """Crea o actualiza la fila de listado de una persona"""
+    fila = fila_de(persona)
+    valores = {columna: getattr(fila, columna) for columna in COLUMNAS_LISTA}
+    if not PersonaLista.objects.filter(persona_id=persona.pk).update(**valores):
+        PersonaLista.objects.get_or_create(persona_id=persona.pk, defaults=valores)
+
+
+def proyectar_personas(queryset, batch_size=2000):
+    """Reconstruye las filas de listado de las personas del queryset por lotes"""
+    total = 0
+    lote = []
+    for persona in queryset.only('id', *CAMPOS_PROYECTADOS).iterator(chunk_size=batch_size):
+        lote.append(fila_de(persona))
+        if len(lote) >= batch_size:
+            total += _guardar_lote(lote)
+            lote = []
+    if lote:
+        total += _guardar_lote(lote)
+    return total
+
+
+def _guardar_lote(lote):
+    PersonaLista.objects.filter(persona_id__in=[fila.persona_id for fila in lote]).delete()
+    PersonaLista.objects.bulk_create(lote)
+    return len(lote)
+
+
+def filas_lista():
+    """
+    Filas de los listados como diccionarios con 'id' (el de la persona) y
+    COLUMNAS_LISTA, en el orden de Persona
+    """
+    return PersonaLista.objects.values(*COLUMNAS_LISTA, id=F('persona_id'))
@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from personas.bulk import exportar_personas
+from personas.models import Persona
+
+
+class Command(BaseCommand):
+    help = 'Exporta todas las personas a CSV o NDJSON sin cargar la tabla completa en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--salida', help='Archivo de salida (por defecto, la salida estándar)')
+
+    def handle(self, *args, **options):
+        salida = open(options['salida'], 'w', encoding='utf-8', newline='') if options['salida'] else sys.stdout
+        try:
+            for fragmento in exportar_personas(Persona.objects.all(), options['formato']):
+                salida.write(fragmento)
+        finally:
+            if salida is not sys.stdout:
+                salida.close()
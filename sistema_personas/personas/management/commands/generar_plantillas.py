@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from personas.biometrics import extract_fingerprint_template
+from personas.models import Persona
+
+
+class Command(BaseCommand):
+    help = 'Genera la plantilla de huella de las personas registradas que aún no la tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Regenerar también las plantillas existentes')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = Persona.objects.exclude(huella_digital='').exclude(huella_digital__isnull=True)
+        if not options['todas']:
+            queryset = queryset.filter(huella_template__isnull=True)
+
+        generadas = errores = 0
+        pendientes = []
+        for persona in queryset.only('id', 'huella_digital').iterator(chunk_size=options['batch_size']):
+            try:
+                with persona.huella_digital.open('rb') as huella:
+                    persona.huella_template = extract_fingerprint_template(huella)
+            except (OSError, ValueError) as e:
+                errores += 1
+                self.stderr.write(f'Persona {persona.id}: {e}')
+                continue
+            pendientes.append(persona)
+            if len(pendientes) >= options['batch_size']:
+                Persona.objects.bulk_update(pendientes, ['huella_template'])
+                generadas += len(pendientes)
+                pendientes = []
+        if pendientes:
+            Persona.objects.bulk_update(pendientes, ['huella_template'])
+            generadas += len(pendientes)
+
+        self.stdout.write(self.style.SUCCESS(f'Plantillas generadas: {generadas}, errores: {errores}'))
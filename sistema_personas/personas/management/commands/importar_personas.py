@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from personas.bulk import detectar_formato, importar_personas
+
+
+class Command(BaseCommand):
+    help = 'Importa personas desde un archivo CSV o NDJSON, con un ZIP opcional de fotos y huellas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Archivo CSV o NDJSON (una persona por fila)')
+        parser.add_argument('--adjuntos', help='ZIP con las imágenes de las columnas foto y huella_digital')
+        parser.add_argument('--formato', choices=['csv', 'ndjson'],
+                            help='Formato del archivo (por defecto, según la extensión)')
+        parser.add_argument('--batch-size', type=int, help='Personas por lote')
+        parser.add_argument('--workers', type=int, help='Hilos para procesar las imágenes')
+
+    def handle(self, *args, **options):
+        try:
+            formato = detectar_formato(options['archivo'], options['formato'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        def progreso(resultado):
+            self.stdout.write(f'Creadas: {resultado.creadas}, errores: {resultado.total_errores}')
+
+        with open(options['archivo'], 'rb') as archivo:
+            resultado = importar_personas(
+                archivo, formato,
+                adjuntos=options['adjuntos'],
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                progreso=progreso,
+            )
+
+        for error in resultado.errores:
+            self.stderr.write(f'Línea {error["linea"]}: {error["error"]}')
+        if resultado.total_errores > len(resultado.errores):
+            self.stderr.write(f'... y {resultado.total_errores - len(resultado.errores)} errores más')
+        self.stdout.write(self.style.SUCCESS(
+            f'Personas importadas: {resultado.creadas} (errores: {resultado.total_errores})'
+        ))
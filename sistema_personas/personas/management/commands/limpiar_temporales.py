@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from personas.limpieza import limpiar
+
+
+class Command(BaseCommand):
+    help = 'Elimina fotos temporales del registro, huellas en cola abandonadas y, opcionalmente, archivos huérfanos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=float, default=24,
+                            help='Antigüedad mínima de los archivos a eliminar')
+        parser.add_argument('--huerfanos', action='store_true',
+                            help='Eliminar también fotos, huellas y QR que ninguna persona usa')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Archivos por lote de borrado')
+        parser.add_argument('--pausa', type=float, default=0.0, help='Segundos de espera entre lotes')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar, sin eliminar')
+
+    def handle(self, *args, **options):
+        resultado = limpiar(
+            horas=options['horas'],
+            huerfanos=options['huerfanos'],
+            batch_size=options['batch_size'],
+            pausa=options['pausa'],
+            dry_run=options['dry_run'],
+        )
+        accion = 'Se eliminarían' if options['dry_run'] else 'Eliminados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{accion} {resultado.archivos} archivos ({resultado.bytes / 2**20:.1f} MB) '
+            f'en {resultado.segundos:.2f} s'
+        ))
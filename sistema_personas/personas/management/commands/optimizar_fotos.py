@@ -0,0 +1,114 @@
+import posixpath
+
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from personas.cache import invalidar_persona
+from personas.imagenes import (
+    FORMATOS_MINIATURA,
+    TAMANO_PRINCIPAL,
+    crear_miniaturas,
+    generar_miniaturas,
+    nombre_miniatura,
+    nombres_miniaturas,
+    normalizar_foto,
+    tiene_miniaturas,
+)
+from personas.models import Persona, PersonaLista
+
+
+def _requiere_normalizar(archivo):
+    archivo.seek(0)
+    with Image.open(archivo) as img:
+        return img.format != 'JPEG' or img.width > TAMANO_PRINCIPAL[0] or img.height > TAMANO_PRINCIPAL[1]
+
+
+class Command(BaseCommand):
+    help = 'Normaliza las fotos existentes, genera sus miniaturas y reporta los bytes servidos antes y después'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo calcular el ahorro, sin modificar archivos ni registros')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        formato = FORMATOS_MINIATURA[0]
+        totales = dict.fromkeys(('fotos', 'normalizadas', 'errores', 'original', 'principal', 'pequena', 'mediana'), 0)
+
+        personas = Persona.objects.exclude(foto='').exclude(foto__isnull=True).only('id', 'foto')
+        for persona in personas.iterator(chunk_size=500):
+            nombre = persona.foto.name
+            try:
+                with default_storage.open(nombre, 'rb') as archivo:
+                    original = default_storage.size(nombre)
+                    normalizar = _requiere_normalizar(archivo)
+                    # Los nombres anteriores al almacenamiento por contenido se
+                    # vuelven a guardar (tal cual si no hay que normalizarlos)
+                    # para que la foto tenga miniaturas
+                    mover = normalizar or not tiene_miniaturas(nombre)
+                    if normalizar:
+                        contenido = normalizar_foto(archivo)
+                    elif mover:
+                        archivo.seek(0)
+                        contenido = ContentFile(archivo.read(), name=posixpath.basename(nombre))
+                    if dry_run:
+                        if normalizar:
+                            datos = contenido.read()
+                        else:
+                            archivo.seek(0)
+                            datos = archivo.read()
+                        tamanos = {clave: len(miniatura) for clave, miniatura in crear_miniaturas(datos).items()}
+                        principal = len(datos)
+                    elif mover:
+                        nuevo = default_storage.save(persona.foto.field.generate_filename(persona, contenido.name),
+                                                     contenido)
+                        Persona.objects.filter(pk=persona.pk).update(foto=nuevo, fecha_actualizacion=timezone.now())
+                        PersonaLista.objects.filter(persona_id=persona.pk).update(
+                            foto=nuevo, miniaturas=nombres_miniaturas(nuevo))
+                        invalidar_persona(persona.pk)
+                        persona.foto.name = nuevo
+            except (OSError, ValueError) as e:
+                self.stderr.write(f'Persona {persona.pk} ({nombre}): {e}')
+                totales['errores'] += 1
+                continue
+
+            if not dry_run:
+                if mover:
+                    # Libera la referencia a la foto original (ver personas.storage)
+                    default_storage.delete(nombre)
+                generar_miniaturas(persona.foto)
+                principal = default_storage.size(persona.foto.name)
+                tamanos = {
+                    (tamano, fmt): default_storage.size(nombre_miniatura(persona.foto.name, tamano, fmt))
+                    for tamano in ('pequena', 'mediana') for fmt in FORMATOS_MINIATURA
+                }
+
+            totales['fotos'] += 1
+            totales['normalizadas'] += int(normalizar)
+            totales['original'] += original
+            totales['principal'] += principal
+            totales['pequena'] += tamanos[('pequena', formato)]
+            totales['mediana'] += tamanos[('mediana', formato)]
+
+        self._reporte(totales, formato, dry_run)
+
+    def _reporte(self, totales, formato, dry_run):
+        fotos = totales['fotos']
+        if not fotos:
+            self.stdout.write('No hay fotos que procesar')
+            return
+
+        def kb(total):
+            return f'{total / fotos / 1024:.1f} KB'
+
+        self.stdout.write(f'Fotos procesadas: {fotos} (normalizadas: {totales["normalizadas"]}, '
+                          f'errores: {totales["errores"]})')
+        self.stdout.write('Bytes servidos por foto (promedio):')
+        self.stdout.write(f'  listado: {kb(totales["original"])} -> {kb(totales["pequena"])} (miniatura {formato})')
+        self.stdout.write(f'  detalle: {kb(totales["original"])} -> {kb(totales["mediana"])} (miniatura {formato})')
+        self.stdout.write(f'  original: {kb(totales["original"])} -> {kb(totales["principal"])} (JPEG normalizado)')
+        mensaje = 'Simulación: no se modificó ningún archivo' if dry_run else 'Fotos optimizadas'
+        self.stdout.write(self.style.SUCCESS(mensaje))
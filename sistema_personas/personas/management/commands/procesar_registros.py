@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from personas.tasks import ejecutar_worker, procesar_pendientes, recuperar_tareas_abandonadas
+
+
+class Command(BaseCommand):
+    help = 'Worker que procesa la cola de registros pendientes (huella, QR y foto)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar las tareas pendientes y terminar')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos de espera cuando la cola está vacía')
+
+    def handle(self, *args, **options):
+        if options['una_vez']:
+            recuperar_tareas_abandonadas()
+            procesadas = procesar_pendientes()
+            self.stdout.write(self.style.SUCCESS(f'Tareas procesadas: {procesadas}'))
+            return
+
+        self.stdout.write(f'Worker de registros iniciado (intervalo {options["intervalo"]}s)')
+        try:
+            ejecutar_worker(intervalo=options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido')
@@ -0,0 +1,62 @@
+import time
+from datetime import datetime, time as hora
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from personas.eliminacion import cola_eliminacion, purgar_personas
+from personas.models import Persona
+
+REINICIAR_SECUENCIA = {
+    'postgresql': "ALTER SEQUENCE personas_persona_id_seq RESTART WITH 1",
+    'mysql': "ALTER TABLE personas_persona AUTO_INCREMENT = 1",
+    'sqlite': "DELETE FROM sqlite_sequence WHERE name='personas_persona'",
+}
+
+
+class Command(BaseCommand):
+    help = 'Elimina personas y sus archivos por lotes, sin cargar instancias ni emitir señales por fila'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Eliminar todas las personas')
+        parser.add_argument('--antes-de', metavar='AAAA-MM-DD',
+                            help='Eliminar las personas registradas antes de esta fecha')
+        parser.add_argument('--lote', type=int, default=1000, help='Personas por transacción')
+        parser.add_argument('--reiniciar-ids', action='store_true',
+                            help='Reiniciar la secuencia de ids (solo junto con --todas)')
+
+    def handle(self, *args, **options):
+        if options['todas'] == bool(options['antes_de']):
+            raise CommandError('Indique --todas o --antes-de')
+        if options['reiniciar_ids'] and not options['todas']:
+            raise CommandError('--reiniciar-ids solo se admite con --todas')
+
+        personas = Persona.objects.all()
+        if options['antes_de']:
+            try:
+                fecha = datetime.strptime(options['antes_de'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Fecha inválida, use AAAA-MM-DD')
+            personas = personas.filter(
+                fecha_registro__lt=timezone.make_aware(datetime.combine(fecha, hora.min))
+            )
+
+        inicio = time.perf_counter()
+        eliminadas = purgar_personas(
+            personas, lote=options['lote'],
+            progreso=lambda total: self.stdout.write(f'  {total} personas eliminadas'),
+        )
+        filas = time.perf_counter() - inicio
+        cola_eliminacion.esperar()
+        total = time.perf_counter() - inicio
+
+        if options['reiniciar_ids'] and connection.vendor in REINICIAR_SECUENCIA:
+            with connection.cursor() as cursor:
+                cursor.execute(REINICIAR_SECUENCIA[connection.vendor])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Eliminadas {eliminadas} personas en {filas:.1f} s; '
+            f'{cola_eliminacion.eliminados} archivos borrados en {total:.1f} s'
+            + (f' ({cola_eliminacion.errores} con error)' if cola_eliminacion.errores else '')
+        ))
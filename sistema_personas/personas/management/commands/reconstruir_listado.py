@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from personas.listado import proyectar_personas
+from personas.models import Persona
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la proyección de lectura de los listados de personas (PersonaLista)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        total = proyectar_personas(Persona.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Filas de listado reconstruidas: {total}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from personas.models import Persona
+from personas.search import indexar_personas
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo de las personas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        total = indexar_personas(Persona.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Personas indexadas: {total}'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Sum
+
+from personas.models import ArchivoMedia
+
+
+def _formato_bytes(valor):
+    for unidad in ('B', 'KB', 'MB', 'GB'):
+        if valor < 1024:
+            return f'{valor:.1f} {unidad}'
+        valor /= 1024
+    return f'{valor:.1f} TB'
+
+
+class Command(BaseCommand):
+    help = 'Muestra el espacio en disco ahorrado por el almacenamiento deduplicado'
+
+    def handle(self, *args, **options):
+        totales = ArchivoMedia.objects.aggregate(
+            archivos=Count('id'),
+            total_referencias=Sum('referencias'),
+            en_disco=Sum('tamano'),
+            sin_deduplicar=Sum(F('tamano') * F('referencias')),
+        )
+        archivos = totales['archivos']
+        referencias = totales['total_referencias'] or 0
+        en_disco = totales['en_disco'] or 0
+        sin_deduplicar = totales['sin_deduplicar'] or 0
+        ahorro = sin_deduplicar - en_disco
+
+        self.stdout.write(f'Archivos únicos en disco: {archivos}')
+        self.stdout.write(f'Referencias desde personas: {referencias}')
+        self.stdout.write(f'Espacio usado: {_formato_bytes(en_disco)}')
+        self.stdout.write(f'Espacio sin deduplicar: {_formato_bytes(sin_deduplicar)}')
+        porcentaje = (ahorro / sin_deduplicar * 100) if sin_deduplicar else 0
+        self.stdout.write(self.style.SUCCESS(f'Ahorro: {_formato_bytes(ahorro)} ({porcentaje:.1f}%)'))
+
+        for carpeta in ('fotos', 'huellas', 'qr', 'pendientes'):
+            datos = ArchivoMedia.objects.filter(ruta__startswith=f'{carpeta}/').aggregate(
+                archivos=Count('id'), en_disco=Sum('tamano'), sin_deduplicar=Sum(F('tamano') * F('referencias'))
+            )
+            if datos['archivos']:
+                self.stdout.write(
+                    f'  {carpeta}/: {datos["archivos"]} archivos, {_formato_bytes(datos["en_disco"])} '
+                    f'(sin deduplicar {_formato_bytes(datos["sin_deduplicar"])})'
+                )
@@ -0,0 +1,523 @@
+"""
+Motor de identificación 1:N de huellas digitales.
+
+Las plantillas de biometrics.extract_fingerprint_template tienen las
+minucias de la huella y un histograma de pares de minucias. La búsqueda es
+en dos etapas: los histogramas se guardan en una matriz de NumPy y un solo
+producto matriz-vector preselecciona las HUELLA_CANDIDATOS más parecidas;
+después se comparan las minucias de esas candidatas (match_minutiae) y solo
+se acepta la mejor si supera el umbral y la segunda no queda demasiado
+cerca (HUELLA_AMBIGUEDAD).
+"""
+import time
+import heapq
+import logging
+import threading
+from datetime import timedelta
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .biometrics import (
+    TEMPLATE_DIM,
+    decode_template,
+    extract_fingerprint_template,
+    generate_sha256_from_image,
+    get_match_threshold,
+    local_structures,
+    match_minutiae,
+)
+from .models import Persona, PersonaEliminada
+
+logger = logging.getLogger(__name__)
+
+# Candidatas que se verifican por minucias en cada búsqueda
+DEFAULT_CANDIDATES = 20
+# Se descarta el resultado si la segunda candidata alcanza esta fracción de
+# la similitud de la mejor
+DEFAULT_AMBIGUITY = 0.8
+
+
+def get_candidates():
+    """Candidatas por búsqueda (settings.HUELLA_CANDIDATOS)"""
+    return getattr(settings, 'HUELLA_CANDIDATOS', DEFAULT_CANDIDATES)
+
+
+def get_ambiguity():
+    """Fracción de ambigüedad entre la mejor y la segunda candidata (settings.HUELLA_AMBIGUEDAD)"""
+    return getattr(settings, 'HUELLA_AMBIGUEDAD', DEFAULT_AMBIGUITY)
+
+
+class FingerprintIndex:
+    """Índice de plantillas de huella identificadas por id de Persona"""
+
+    def __init__(self, capacity=1024, dimension=TEMPLATE_DIM):
+        self.dimension = dimension
+        self._matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._minutiae = []
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, persona_id):
+        return persona_id in self._rows
+
+    @classmethod
+    def from_templates(cls, pares):
+        """Construye el índice a partir de pares (persona_id, plantilla)"""
+        pares = [(persona_id, template) for persona_id, template in pares if template]
+        index = cls(capacity=max(len(pares), 1))
+        for persona_id, template in pares:
+            index.add(persona_id, template)
+        return index
+
+    def _grow(self):
+        capacity = self._matrix.shape[0] * 2
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        matrix[:len(self)] = self._matrix[:len(self)]
+        ids[:len(self)] = self._ids[:len(self)]
+        self._matrix, self._ids = matrix, ids
+
+    def add(self, persona_id, template):
+        """
+        Agrega o reemplaza la plantilla de una persona. Devuelve False (y
+        quita la anterior) si la plantilla tiene otro formato.
+        """
+        try:
+            vector, minutiae = decode_template(template)
+        except ValueError:
+            logger.warning("Plantilla de huella de la persona %s con formato anterior; "
+                           "regenérela con generar_plantillas", persona_id)
+            self.remove(persona_id)
+            return False
+        row = self._rows.get(persona_id)
+        if row is None:
+            if len(self) == self._matrix.shape[0]:
+                self._grow()
+            row = len(self)
+            self._rows[persona_id] = row
+            self._ids[row] = persona_id
+            self._minutiae.append(minutiae)
+        else:
+            self._minutiae[row] = minutiae
+        self._matrix[row] = vector
+        return True
+
+    def remove(self, persona_id):
+        """Elimina la plantilla de una persona moviendo la última fila a su lugar"""
+        row = self._rows.pop(persona_id, None)
+        if row is None:
+            return False
+        last = len(self)
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = self._ids[last]
+            self._minutiae[row] = self._minutiae[last]
+            self._rows[int(self._ids[row])] = row
+        self._minutiae.pop()
+        return True
+
+    def shortlist(self, vector, candidates):
+        """
+        Las 'candidates' plantillas con el histograma de pares más parecido
+        al dado: tuplas (similitud de histogramas, persona_id, minucias)
+        """
+        total = len(self)
+        if total == 0:
+            return []
+        scores = self._matrix[:total] @ vector
+        candidates = min(candidates, total)
+        rows = np.argpartition(-scores, candidates - 1)[:candidates]
+        return [(float(scores[row]), int(self._ids[row]), self._minutiae[row]) for row in rows]
+
+    def search(self, template, threshold=None, limit=1, candidates=None):
+        """
+        Busca las plantillas que coinciden con la dada: preselecciona por
+        histograma 'candidates' filas y las compara por minucias
+        (verify_candidates).
+
+        Returns:
+            list: Pares (persona_id, similitud) con similitud >= threshold,
+            ordenados de mayor a menor similitud
+        """
+        vector, minutiae = decode_template(template)
+        shortlist = self.shortlist(vector, get_candidates() if candidates is None else candidates)
+        return verify_candidates(minutiae, shortlist, threshold=threshold, limit=limit)
+
+
+def verify_candidates(minutiae, shortlist, threshold=None, limit=1):
+    """
+    Compara por minucias las candidatas de FingerprintIndex.shortlist. Si la
+    segunda alcanza settings.HUELLA_AMBIGUEDAD de la similitud de la mejor,
+    la identificación es ambigua y no se devuelve ninguna.
+
+    Returns:
+        list: Pares (persona_id, similitud) con similitud >= threshold,
+        ordenados de mayor a menor similitud
+    """
+    if threshold is None:
+        threshold = get_match_threshold()
+    if not shortlist:
+        return []
+    structures = local_structures(minutiae)
+    verified = sorted(
+        ((match_minutiae(minutiae, candidate, structures), persona_id) for _, persona_id, candidate in shortlist),
+        reverse=True,
+    )
+    if len(verified) > 1 and verified[0][0] > 0 and verified[1][0] >= verified[0][0] * get_ambiguity():
+        return []
+    return [(persona_id, score) for score, persona_id in verified[:limit] if score >= threshold]
+
+
+def search_database(template, threshold=None, limit=1, chunk_size=5000):
+    """
+    Busca entre todas las plantillas de la base de datos, por bloques de
+    chunk_size: cada bloque se indexa, aporta sus mejores candidatas por
+    histograma y se descarta, de modo que la memoria no crece con la tabla.
+    """
+    vector, minutiae = decode_template(template)
+    candidates = get_candidates()
+    pares = Persona.objects.exclude(huella_template__isnull=True).values_list('id', 'huella_template')
+    shortlist, bloque = [], []
+
+    def agregar_bloque():
+        mejores = shortlist + FingerprintIndex.from_templates(bloque).shortlist(vector, candidates)
+        return heapq.nlargest(candidates, mejores, key=lambda candidata: candidata[0])
+
+    for par in pares.iterator(chunk_size=chunk_size):
+        bloque.append(par)
+        if len(bloque) == chunk_size:
+            shortlist, bloque = agregar_bloque(), []
+    shortlist = agregar_bloque()
+    return verify_candidates(minutiae, shortlist, threshold=threshold, limit=limit)
+
+
+class TemplateCache:
+    """
+    Caché en memoria del proceso con los digests y plantillas de huella.
+
+    Se carga de forma perezosa en el primer uso con las personas más
+    recientes hasta max_entries y desaloja la entrada menos usada cuando se
+    llena. Las señales post_save/post_delete de Persona la mantienen al día
+    dentro del proceso; los cambios y bajas (PersonaEliminada) de otros
+    procesos se incorporan cada refresh_interval segundos, releyendo además
+    los últimos HUELLA_CACHE_MARGEN segundos: una transacción fija su
+    fecha_actualizacion antes de confirmarse y puede hacerse visible después
+    de la sincronización siguiente a esa fecha.
+    """
+
+    def __init__(self, max_entries=None, refresh_interval=None):
+        self._max_entries = max_entries
+        self._refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self.clear()
+
+    @property
+    def max_entries(self):
+        if self._max_entries is None:
+            return getattr(settings, 'HUELLA_CACHE_MAX_ENTRADAS', 20_000)
+        return self._max_entries
+
+    @property
+    def refresh_interval(self):
+        if self._refresh_interval is None:
+            return getattr(settings, 'HUELLA_CACHE_REFRESCO', 5)
+        return self._refresh_interval
+
+    @property
+    def margin(self):
+        return timedelta(seconds=getattr(settings, 'HUELLA_CACHE_MARGEN', 5))
+
+    def clear(self):
+        """Vacía la caché; se volverá a cargar en el siguiente uso"""
+        with self._lock:
+            self._index = FingerprintIndex()
+            self._digests = {}
+            self._entries = OrderedDict()
+            self._loaded = False
+            self._complete = True
+            self._synced_at = None
+            self._last_refresh = 0.0
+            self.hits = self.misses = self.evictions = self.loads = 0
+
+    @property
+    def complete(self):
+        """True si la caché contiene a todas las personas con huella"""
+        return self._complete
+
+    def _rows(self, queryset):
+        return queryset.values_list('id', 'huella_digest', 'huella_template').iterator(chunk_size=5000)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._load()
+        elif time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self._refresh()
+
+    def _load(self):
+        synced_at = timezone.now()
+        queryset = Persona.objects.filter(
+            Q(huella_digest__isnull=False) | Q(huella_template__isnull=False)
+        ).order_by('-id')
+        limite = self.max_entries
+        filas = list(self._rows(queryset[:limite + 1]))
+        # Se insertan de la más antigua a la más reciente para que el LRU
+        # desaloje primero a las antiguas
+        for persona_id, digest, template in reversed(filas[:limite]):
+            self._store(persona_id, digest, template)
+        self._complete = len(filas) <= limite
+        self._synced_at = synced_at
+        self._last_refresh = time.monotonic()
+        self._loaded = True
+        self.loads += 1
+
+    def _refresh(self):
+        """Incorpora las personas guardadas por otros procesos desde la última sincronización"""
+        synced_at = timezone.now()
+        desde = self._synced_at - self.margin
+        queryset = Persona.objects.filter(fecha_actualizacion__gte=desde)
+        for persona_id, digest, template in self._rows(queryset):
+            self._store(persona_id, digest, template)
+        eliminadas = PersonaEliminada.objects.filter(fecha_eliminacion__gte=desde).values_list('persona_id', flat=True)
+        for persona_id in eliminadas:
+            self._discard(persona_id)
+        self._synced_at = synced_at
+        self._last_refresh = time.monotonic()
+
+    def _store(self, persona_id, digest, template):
+        self._discard(persona_id)
+        if digest is None and not template:
+            return
+        self._entries[persona_id] = digest
+        if digest is not None:
+            self._digests[digest] = persona_id
+        if template:
+            self._index.add(persona_id, template)
+        while len(self._entries) > self.max_entries:
+            antiguo, _ = self._entries.popitem(last=False)
+            self._discard(antiguo)
+            self._complete = False
+            self.evictions += 1
+
+    def _discard(self, persona_id):
+        digest = self._entries.pop(persona_id, None)
+        if digest is not None and self._digests.get(digest) == persona_id:
+            del self._digests[digest]
+        self._index.remove(persona_id)
+
+    def _touch(self, persona_id):
+        if persona_id in self._entries:
+            self._entries.move_to_end(persona_id)
+
+    def put(self, persona_id, digest, template):
+        """Agrega o actualiza una persona (solo si la caché ya está cargada)"""
+        with self._lock:
+            if self._loaded:
+                self._store(persona_id, digest, template)
+
+    def discard(self, persona_id):
+        """Elimina a una persona de la caché"""
+        with self._lock:
+            self._discard(persona_id)
+
+    def get_by_digest(self, digest):
+        """
+        Id de la persona con ese digest. Si no está en caché se consulta el
+        índice huella_digest aunque la caché esté completa: la persona puede
+        haberse registrado en otro proceso después de la última sincronización.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            persona_id = self._digests.get(digest)
+            if persona_id is not None:
+                self.hits += 1
+                self._touch(persona_id)
+                return persona_id
+            self.misses += 1
+        fila = Persona.objects.filter(huella_digest=digest).values_list('id', 'huella_digest', 'huella_template').first()
+        if fila is None:
+            return None
+        self.put(*fila)
+        return fila[0]
+
+    def search(self, template, threshold=None, limit=1):
+        """
+        Busca plantillas parecidas en memoria.
+
+        Solo la preselección por histograma se hace con el lock tomado; la
+        verificación por minucias, que es lo costoso, trabaja sobre la copia
+        de las candidatas para no bloquear a los demás hilos. Si la caché
+        está incompleta y no hay coincidencias, repite la búsqueda contra
+        todas las plantillas de la base de datos (search_database).
+        """
+        vector, minutiae = decode_template(template)
+        with self._lock:
+            self._ensure_loaded()
+            shortlist = self._index.shortlist(vector, get_candidates())
+            complete = self._complete
+        resultados = verify_candidates(minutiae, shortlist, threshold=threshold, limit=limit)
+        if resultados or complete:
+            with self._lock:
+                if resultados:
+                    self.hits += 1
+                    for persona_id, _ in resultados:
+                        self._touch(persona_id)
+                else:
+                    self.misses += 1
+            return resultados
+        with self._lock:
+            self.misses += 1
+        resultados = search_database(template, threshold=threshold, limit=limit)
+        for persona_id, _ in resultados:
+            fila = Persona.objects.filter(pk=persona_id).values_list('id', 'huella_digest', 'huella_template').first()
+            if fila:
+                self.put(*fila)
+        return resultados
+
+    def stats(self):
+        """Contadores para dimensionar la caché por worker"""
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'entradas': len(self._entries),
+                'plantillas': len(self._index),
+                'max_entradas': self.max_entries,
+                'completa': self._complete,
+                'cargas': self.loads,
+                'aciertos': self.hits,
+                'fallos': self.misses,
+                'desalojos': self.evictions,
+                'tasa_aciertos': round(self.hits / consultas, 4) if consultas else None,
+                'memoria_bytes': self._index._matrix.nbytes + sum(m.nbytes for m in self._index._minutiae),
+            }
+
+
+template_cache = TemplateCache()
+
+
+def identify_fingerprint(image_file, threshold=None):
+    """
+    Identifica a la persona dueña de una huella.
+
+    Primero intenta una coincidencia exacta por hash (huella_digest); si no
+    existe, busca la plantilla más parecida. Ambas búsquedas empiezan por la
+    caché en memoria del proceso (template_cache) y la persona encontrada se
+    lee de la caché de respuestas (cache.obtener_persona).
+
+    Returns:
+        tuple: (Persona o None, similitud)
+    """
+    from .cache import obtener_persona
+
+    huella_hex = generate_sha256_from_image(image_file)
+    persona_id = template_cache.get_by_digest(huella_hex)
+    if persona_id is not None:
+        persona = obtener_persona(persona_id)
+        if persona:
+            return persona, 1.0
+        # Eliminada por otro proceso
+        template_cache.discard(persona_id)
+
+    try:
+        template = extract_fingerprint_template(image_file)
+    except (OSError, ValueError):
+        # No es una imagen válida: solo era posible la coincidencia exacta
+        return None, 0.0
+    for persona_id, score in template_cache.search(template, threshold=threshold, limit=3):
+        persona = obtener_persona(persona_id)
+        if persona:
+            return persona, score
+        template_cache.discard(persona_id)
+    return None, 0.0
+
+
+async def aidentify_fingerprint(image_file, threshold=None):
+    """
+    Versión asíncrona de identify_fingerprint para las vistas ASGI: el hash y
+    la plantilla se calculan en el executor acotado de personas.asincrono;
+    la caché de plantillas y la de respuestas (que pueden consultar la base
+    de datos) corren en el hilo de sync_to_async.
+
+    Returns:
+        tuple: (Persona o None, similitud)
+    """
+    from asgiref.sync import sync_to_async
+
+    from .asincrono import en_executor
+    from .cache import obtener_persona
+
+    huella_hex = await en_executor(generate_sha256_from_image, image_file)
+    persona_id = await sync_to_async(template_cache.get_by_digest)(huella_hex)
+    if persona_id is not None:
+        persona = await sync_to_async(obtener_persona)(persona_id)
+        if persona:
+            return persona, 1.0
+        template_cache.discard(persona_id)
+
+    try:
+        template = await en_executor(extract_fingerprint_template, image_file)
+    except (OSError, ValueError):
+        return None, 0.0
+    resultados = await sync_to_async(template_cache.search)(template, threshold=threshold, limit=3)
+    for persona_id, score in resultados:
+        persona = await sync_to_async(obtener_persona)(persona_id)
+        if persona:
+            return persona, score
+        template_cache.discard(persona_id)
+    return None, 0.0
+
+
+def _plantilla_o_none(image_file):
+    """Plantilla de la huella o None si el archivo no es una imagen válida"""
+    try:
+        return extract_fingerprint_template(image_file)
+    except (OSError, ValueError):
+        return None
+
+
+def identify_fingerprints(image_files, threshold=None):
+    """
+    Identifica un lote de huellas con el mínimo de consultas.
+
+    Los hash y las plantillas se calculan en paralelo en el executor acotado
+    de personas.asincrono (hashlib y NumPy liberan el GIL), las coincidencias
+    exactas se resuelven con una sola consulta huella_digest__in y las
+    aproximadas con otra por pk__in para todas las candidatas del lote.
+
+    Returns:
+        list: (Persona o None, similitud) por cada archivo, en el mismo orden
+    """
+    from .asincrono import executor
+
+    pool = executor()
+    digests = list(pool.map(generate_sha256_from_image, image_files))
+    exactas = {
+        persona.huella_digest: persona
+        for persona in Persona.objects.filter(huella_digest__in=set(digests))
+    }
+    resultados = [(exactas[digest], 1.0) if digest in exactas else (None, 0.0) for digest in digests]
+
+    pendientes = [i for i, (persona, _) in enumerate(resultados) if persona is None]
+    if not pendientes:
+        return resultados
+    plantillas = pool.map(_plantilla_o_none, [image_files[i] for i in pendientes])
+    candidatas = {}
+    for i, template in zip(pendientes, plantillas):
+        if template is not None:
+            candidatas[i] = template_cache.search(template, threshold=threshold, limit=3)
+    ids = {persona_id for coincidencias in candidatas.values() for persona_id, _ in coincidencias}
+    personas = Persona.objects.in_bulk(ids) if ids else {}
+    for i, coincidencias in candidatas.items():
+        for persona_id, score in coincidencias:
+            if persona_id in personas:
+                resultados[i] = (personas[persona_id], score)
+                break
+            # Eliminada por otro proceso
+            template_cache.discard(persona_id)
+    return resultados
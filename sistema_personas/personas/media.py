@@ -0,0 +1,124 @@
+"""
+Servicio de archivos de MEDIA_ROOT para usuarios autenticados.
+
+Fotos, huellas y QR son datos biométricos, así que no se publican como
+archivos estáticos: esta vista exige sesión iniciada y responde con
+FileResponse sobre el archivo abierto, que el servidor WSGI envía con
+sendfile (wsgi.file_wrapper).
+
+Los archivos guardados por ContentAddressedStorage (<aa>/<sha256>.<ext>) no
+cambian nunca para una URL dada, así que se sirven con ETag fuerte igual al
+hash y Cache-Control immutable de un año; el resto (miniaturas y archivos
+anteriores) usa un ETag de tamaño y fecha de modificación y se revalida.
+Siempre es 'private' para que ningún proxy compartido los guarde.
+"""
+import os
+import re
+import mimetypes
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .storage import ContentAddressedStorage
+
+CACHE_INMUTABLE = 'private, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'private, max-age=3600'
+# Carpetas de trabajo que no se sirven (huellas recibidas aún sin procesar)
+CARPETAS_PRIVADAS = ('pendientes/',)
+TAMANO_FRAGMENTO = 64 * 1024
+
+RANGO_RE = re.compile(r'bytes=(?P<inicio>\d*)-(?P<fin>\d*)')
+
+
+def etag_y_cache(path, stat):
+    """ETag y Cache-Control para un archivo de MEDIA_ROOT"""
+    digest = ContentAddressedStorage.content_digest(path)
+    if digest is not None:
+        return quote_etag(digest), CACHE_INMUTABLE
+    return quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}'), CACHE_REVALIDAR
+
+
+def _rango(cabecera, tamano):
+    """(inicio, fin) inclusivos de un encabezado Range de un solo rango, o None"""
+    coincidencia = RANGO_RE.fullmatch(cabecera.strip())
+    if not coincidencia or not (coincidencia['inicio'] or coincidencia['fin']):
+        return None
+    if coincidencia['inicio']:
+        inicio = int(coincidencia['inicio'])
+        fin = min(int(coincidencia['fin']), tamano - 1) if coincidencia['fin'] else tamano - 1
+    else:
+        # bytes=-N: los últimos N bytes
+        inicio = max(tamano - int(coincidencia['fin']), 0)
+        fin = tamano - 1
+    if inicio > fin:
+        return None
+    return inicio, fin
+
+
+def _leer_rango(archivo, inicio, longitud):
+    try:
+        archivo.seek(inicio)
+        while longitud > 0:
+            fragmento = archivo.read(min(TAMANO_FRAGMENTO, longitud))
+            if not fragmento:
+                break
+            longitud -= len(fragmento)
+            yield fragmento
+    finally:
+        archivo.close()
+
+
+@require_safe
+def servir_media(request, path):
+    """Sirve un archivo de MEDIA_ROOT con caché HTTP y soporte de rangos"""
+    if not request.user.is_authenticated:
+        return HttpResponse('Autenticación requerida', status=401, content_type='text/plain; charset=utf-8')
+
+    path = posixpath.normpath(path).lstrip('/')
+    if path.startswith(CARPETAS_PRIVADAS):
+        raise Http404('Archivo no encontrado')
+    try:
+        ruta = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(ruta)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404('Archivo no encontrado')
+    if not os.path.isfile(ruta):
+        raise Http404('Archivo no encontrado')
+
+    etag, cache_control = etag_y_cache(path, stat)
+    condicional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if condicional is not None:
+        if condicional.status_code == 304:
+            condicional['ETag'] = etag
+        condicional['Cache-Control'] = cache_control
+        return condicional
+
+    rango = None
+    cabecera_rango = request.headers.get('Range')
+    if cabecera_rango and request.headers.get('If-Range', etag) == etag:
+        rango = _rango(cabecera_rango, stat.st_size)
+        if rango is None:
+            respuesta = HttpResponse(status=416)
+            respuesta['Content-Range'] = f'bytes */{stat.st_size}'
+            return respuesta
+
+    archivo = open(ruta, 'rb')
+    if rango:
+        inicio, fin = rango
+        respuesta = StreamingHttpResponse(_leer_rango(archivo, inicio, fin - inicio + 1), status=206)
+        respuesta['Content-Type'] = mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+        respuesta['Content-Length'] = str(fin - inicio + 1)
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{stat.st_size}'
+    else:
+        respuesta = FileResponse(archivo)
+    respuesta['Accept-Ranges'] = 'bytes'
+    respuesta['ETag'] = etag
+    respuesta['Last-Modified'] = http_date(stat.st_mtime)
+    respuesta['Cache-Control'] = cache_control
+    return respuesta
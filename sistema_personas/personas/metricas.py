@@ -0,0 +1,340 @@
+"""
+Métricas de rendimiento por petición en formato de texto de Prometheus.
+
+MetricasMiddleware registra para cada ruta (patrón de URL, no la URL
+concreta) y método:
+
+  - histograma de latencia
+  - consultas a la base de datos y su tiempo, con un execute_wrapper que se
+    instala en cada conexión al abrirse (connection_created), así que
+    también cuenta las consultas del ORM asíncrono
+  - bytes recibidos y enviados
+  - tiempo en trabajo de imágenes: las funciones decoradas con
+    @medir_imagen (biometrics, utils.optimize_image, miniaturas y QR)
+
+Las peticiones más lentas que settings.METRICAS_PETICION_LENTA_MS se
+registran en el log 'personas.metricas' con su lista de consultas. La vista
+exponer_metricas sirve /metrics para Prometheus, junto con los contadores
+de la caché de huellas, de respuestas y de QR.
+
+Todo es por proceso: con varios workers, Prometheus debe consultar a cada
+uno o sumar las series. El costo es de unos pocos microsegundos por
+petición (benchmark metricas).
+"""
+import time
+import logging
+import functools
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_CONSULTAS_REGISTRADAS = 100
+
+_peticion_actual = ContextVar('metricas_peticion', default=None)
+
+
+class _Peticion:
+    """Lo acumulado durante una petición"""
+    __slots__ = ('consultas', 'segundos_db', 'segundos_imagen', 'profundidad_imagen', 'sql')
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos_db = 0.0
+        self.segundos_imagen = 0.0
+        self.profundidad_imagen = 0
+        self.sql = []
+
+
+class _Histograma:
+    __slots__ = ('cubetas', 'suma', 'cantidad')
+
+    def __init__(self):
+        self.cubetas = [0] * (len(LIMITES_LATENCIA) + 1)
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor):
+        self.cubetas[bisect_left(LIMITES_LATENCIA, valor)] += 1
+        self.suma += valor
+        self.cantidad += 1
+
+
+class Registro:
+    """Series acumuladas del proceso, protegidas por un lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.latencias = {}
+            self.por_ruta = {}
+            self.respuestas = {}
+            self.imagen = {}
+            self.lentas = 0
+
+    def registrar_peticion(self, ruta, metodo, estado, segundos, peticion, bytes_entrada, bytes_salida):
+        clave = (ruta, metodo)
+        with self._lock:
+            histograma = self.latencias.get(clave)
+            if histograma is None:
+                histograma = self.latencias[clave] = _Histograma()
+                self.por_ruta[clave] = [0, 0.0, 0.0, 0, 0]
+            histograma.observar(segundos)
+            totales = self.por_ruta[clave]
+            totales[0] += peticion.consultas
+            totales[1] += peticion.segundos_db
+            totales[2] += peticion.segundos_imagen
+            totales[3] += bytes_entrada
+            totales[4] += bytes_salida
+            clave_estado = (ruta, metodo, estado)
+            self.respuestas[clave_estado] = self.respuestas.get(clave_estado, 0) + 1
+
+    def registrar_lenta(self):
+        with self._lock:
+            self.lentas += 1
+
+    def registrar_imagen(self, nombre, segundos):
+        with self._lock:
+            totales = self.imagen.get(nombre)
+            if totales is None:
+                totales = self.imagen[nombre] = [0, 0.0]
+            totales[0] += 1
+            totales[1] += segundos
+
+    def texto(self):
+        """Series en formato de exposición de texto de Prometheus"""
+        with self._lock:
+            latencias = {clave: (list(h.cubetas), h.suma, h.cantidad) for clave, h in self.latencias.items()}
+            por_ruta = {clave: list(valores) for clave, valores in self.por_ruta.items()}
+            respuestas = dict(self.respuestas)
+            imagen = {nombre: list(valores) for nombre, valores in self.imagen.items()}
+            lentas = self.lentas
+
+        lineas = [
+            '# HELP personas_http_request_duration_seconds Latencia de las peticiones por ruta',
+            '# TYPE personas_http_request_duration_seconds histogram',
+        ]
+        for (ruta, metodo), (cubetas, suma, cantidad) in sorted(latencias.items()):
+            etiquetas = f'ruta="{_escapar(ruta)}",metodo="{metodo}"'
+            acumulado = 0
+            for limite, valor in zip(LIMITES_LATENCIA, cubetas):
+                acumulado += valor
+                lineas.append(f'personas_http_request_duration_seconds_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'personas_http_request_duration_seconds_bucket{{{etiquetas},le="+Inf"}} {cantidad}')
+            lineas.append(f'personas_http_request_duration_seconds_sum{{{etiquetas}}} {suma:.6f}')
+            lineas.append(f'personas_http_request_duration_seconds_count{{{etiquetas}}} {cantidad}')
+
+        lineas += [
+            '# HELP personas_http_responses_total Respuestas por ruta y código de estado',
+            '# TYPE personas_http_responses_total counter',
+        ]
+        for (ruta, metodo, estado), valor in sorted(respuestas.items()):
+            lineas.append(
+                f'personas_http_responses_total{{ruta="{_escapar(ruta)}",metodo="{metodo}",estado="{estado}"}} {valor}'
+            )
+
+        series = (
+            ('personas_db_queries_total', 'counter', 'Consultas a la base de datos por ruta', 0, '{}'),
+            ('personas_db_seconds_total', 'counter', 'Tiempo en consultas a la base de datos por ruta', 1, '{:.6f}'),
+            ('personas_image_seconds_total', 'counter', 'Tiempo en trabajo de imágenes por ruta', 2, '{:.6f}'),
+            ('personas_http_request_bytes_total', 'counter', 'Bytes recibidos por ruta', 3, '{}'),
+            ('personas_http_response_bytes_total', 'counter', 'Bytes enviados por ruta', 4, '{}'),
+        )
+        for nombre, tipo, ayuda, indice, formato in series:
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+            for (ruta, metodo), valores in sorted(por_ruta.items()):
+                lineas.append(f'{nombre}{{ruta="{_escapar(ruta)}",metodo="{metodo}"}} {formato.format(valores[indice])}')
+
+        lineas += [
+            '# HELP personas_image_calls_total Llamadas a funciones de imágenes',
+            '# TYPE personas_image_calls_total counter',
+        ]
+        lineas += [f'personas_image_calls_total{{funcion="{nombre}"}} {valores[0]}'
+                   for nombre, valores in sorted(imagen.items())]
+        lineas += [
+            '# HELP personas_image_function_seconds_total Tiempo en funciones de imágenes (incluye llamadas anidadas)',
+            '# TYPE personas_image_function_seconds_total counter',
+        ]
+        lineas += [f'personas_image_function_seconds_total{{funcion="{nombre}"}} {valores[1]:.6f}'
+                   for nombre, valores in sorted(imagen.items())]
+        lineas += [
+            '# HELP personas_slow_requests_total Peticiones más lentas que METRICAS_PETICION_LENTA_MS',
+            '# TYPE personas_slow_requests_total counter',
+            f'personas_slow_requests_total {lentas}',
+        ]
+        return '\n'.join(lineas + _series_caches()) + '\n'
+
+
+registro = Registro()
+
+
+def _escapar(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _series_caches():
+    """Contadores de las cachés de huellas, respuestas y QR como gauges"""
+    from .cache import estadisticas
+    from .matching import template_cache
+    from .qr import cache_stats
+
+    lineas = ['# TYPE personas_cache gauge']
+    fuentes = {'huellas': template_cache.stats(), 'qr': cache_stats()}
+    fuentes.update({f'respuestas_{tipo}': valores for tipo, valores in estadisticas().items()})
+    for cache, valores in sorted(fuentes.items()):
+        planos = {}
+        for nombre, valor in valores.items():
+            if isinstance(valor, dict):
+                planos.update({f'{nombre}_{subnombre}': subvalor for subnombre, subvalor in valor.items()})
+            else:
+                planos[nombre] = valor
+        for nombre, valor in sorted(planos.items()):
+            if isinstance(valor, bool):
+                valor = int(valor)
+            if isinstance(valor, (int, float)):
+                lineas.append(f'personas_cache{{cache="{cache}",serie="{nombre}"}} {valor}')
+    return lineas
+
+
+def _registrar_consulta(execute, sql, params, many, context):
+    peticion = _peticion_actual.get()
+    if peticion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = time.perf_counter() - inicio
+        peticion.consultas += 1
+        peticion.segundos_db += duracion
+        if len(peticion.sql) < MAX_CONSULTAS_REGISTRADAS:
+            peticion.sql.append((sql, duracion))
+
+
+@receiver(connection_created)
+def instalar_contador_consultas(sender, connection, **kwargs):
+    """Agrega el execute_wrapper de métricas a cada conexión (una sola vez)"""
+    if _registrar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_registrar_consulta)
+
+
+def medir_imagen(func):
+    """
+    Decorador para funciones de procesamiento de imágenes: acumula su tiempo
+    por función y, dentro de una petición, en el total de imágenes de la
+    petición (solo la llamada más externa, para no contar dos veces)
+    """
+    nombre = f'{func.__module__.rsplit(".", 1)[-1]}.{func.__name__}'
+
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        peticion = _peticion_actual.get()
+        if peticion is not None:
+            peticion.profundidad_imagen += 1
+        inicio = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duracion = time.perf_counter() - inicio
+            registro.registrar_imagen(nombre, duracion)
+            if peticion is not None:
+                peticion.profundidad_imagen -= 1
+                if not peticion.profundidad_imagen:
+                    peticion.segundos_imagen += duracion
+    return envoltura
+
+
+class MetricasMiddleware:
+    """
+    Mide cada petición (ver el docstring del módulo). Va primero en
+    MIDDLEWARE para incluir el tiempo de los demás middleware; admite
+    vistas síncronas y asíncronas sin cambiar de hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lenta = getattr(settings, 'METRICAS_PETICION_LENTA_MS', 500) / 1000
+        for conexion in connections.all(initialized_only=True):
+            instalar_contador_consultas(None, conexion)
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        peticion = _Peticion()
+        token = _peticion_actual.set(peticion)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion_actual.reset(token)
+        self._registrar(request, response, time.perf_counter() - inicio, peticion)
+        return response
+
+    async def __acall__(self, request):
+        peticion = _Peticion()
+        token = _peticion_actual.set(peticion)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _peticion_actual.reset(token)
+        self._registrar(request, response, time.perf_counter() - inicio, peticion)
+        return response
+
+    def _registrar(self, request, response, segundos, peticion):
+        coincidencia = request.resolver_match
+        ruta = coincidencia.route if coincidencia is not None else 'sin_ruta'
+        try:
+            bytes_entrada = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            bytes_entrada = 0
+        if response.streaming:
+            bytes_salida = int(response.get('Content-Length') or 0)
+        else:
+            bytes_salida = len(response.content)
+        registro.registrar_peticion(ruta, request.method, response.status_code, segundos, peticion,
+                                    bytes_entrada, bytes_salida)
+        if segundos >= self.lenta:
+            registro.registrar_lenta()
+            self._registrar_lenta(request, ruta, response.status_code, segundos, peticion)
+
+    @staticmethod
+    def _registrar_lenta(request, ruta, estado, segundos, peticion):
+        consultas = '\n'.join(f'  {duracion * 1000:.1f} ms  {sql}' for sql, duracion in peticion.sql)
+        logger.warning(
+            "Petición lenta %s %s (%s) %s: %.0f ms, %d consultas en %.0f ms, imágenes %.0f ms\n%s",
+            request.method, request.path, ruta, estado, segundos * 1000, peticion.consultas,
+            peticion.segundos_db * 1000, peticion.segundos_imagen * 1000, consultas,
+        )
+
+
+def exponer_metricas(request):
+    """
+    /metrics en formato de texto de Prometheus. Con settings.METRICAS_TOKEN
+    se exige 'Authorization: Bearer <token>'; sin él, un usuario staff.
+    """
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if token:
+        autorizado = request.headers.get('Authorization', '') == f'Bearer {token}'
+    else:
+        autorizado = request.user.is_authenticated and request.user.is_staff
+    if not autorizado:
+        return HttpResponse('No autorizado', status=401, content_type='text/plain; charset=utf-8')
+    return HttpResponse(registro.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
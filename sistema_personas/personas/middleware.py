@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+
+CLAVE_RENOVACION = '_renovada'
+
+
+class RenovarSesionMiddleware:
+    """
+    Mantiene el vencimiento deslizante de la sesión sin escribirla en cada
+    petición (SESSION_SAVE_EVERY_REQUEST = False): solo la marca como
+    modificada cuando pasó más de la mitad de SESSION_COOKIE_AGE desde la
+    última renovación. Las sesiones vacías (anónimas) no se tocan.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        if session is None or session.is_empty():
+            return response
+        ahora = int(time.time())
+        if ahora - session.get(CLAVE_RENOVACION, 0) > settings.SESSION_COOKIE_AGE // 2:
+            session[CLAVE_RENOVACION] = ahora
+        return response
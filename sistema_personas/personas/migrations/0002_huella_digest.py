@@ -0,0 +1,55 @@
+from django.db import migrations, models
+
+from personas.biometrics import normalize_fingerprint_digest
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_huella_digest(apps, schema_editor):
+    """Copia huella_hex normalizado a huella_digest para los registros existentes.
+
+    Si dos personas comparten el mismo hash, solo la más antigua recibe el
+    digest para no violar la restricción de unicidad.
+    """
+    Persona = apps.get_model('personas', 'Persona')
+    vistos = set()
+    pendientes = []
+    queryset = (
+        Persona.objects.exclude(huella_hex__isnull=True)
+        .order_by('id')
+        .only('id', 'huella_hex')
+    )
+    for persona in queryset.iterator(chunk_size=BATCH_SIZE):
+        digest = normalize_fingerprint_digest(persona.huella_hex)
+        if digest is None or digest in vistos:
+            continue
+        vistos.add(digest)
+        persona.huella_digest = digest
+        pendientes.append(persona)
+        if len(pendientes) >= BATCH_SIZE:
+            Persona.objects.bulk_update(pendientes, ['huella_digest'])
+            pendientes = []
+    if pendientes:
+        Persona.objects.bulk_update(pendientes, ['huella_digest'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='persona',
+            name='huella_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_huella_digest, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='persona',
+            name='huella_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
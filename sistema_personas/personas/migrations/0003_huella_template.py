@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0002_huella_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='persona',
+            name='huella_template',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0003_huella_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='persona',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('completado', 'Completado'), ('error', 'Error')], default='completado', editable=False, max_length=20),
+        ),
+        migrations.CreateModel(
+            name='TareaRegistro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella_temp', models.CharField(max_length=255)),
+                ('foto_temp', models.CharField(blank=True, max_length=255)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completada', 'Completada'), ('error', 'Error')], db_index=True, default='pendiente', max_length=20)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('persona', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tarea_registro', to='personas.persona')),
+            ],
+            options={
+                'verbose_name': 'Tarea de registro',
+                'verbose_name_plural': 'Tareas de registro',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0004_procesamiento_asincrono'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruta', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(max_length=64)),
+                ('tamano', models.PositiveBigIntegerField(default=0)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archivo multimedia',
+                'verbose_name_plural': 'Archivos multimedia',
+            },
+        ),
+    ]
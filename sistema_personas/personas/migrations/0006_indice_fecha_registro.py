@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0005_archivo_media'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='persona',
+            options={'ordering': ['-fecha_registro', '-id'], 'verbose_name': 'Persona', 'verbose_name_plural': 'Personas'},
+        ),
+        migrations.AddIndex(
+            model_name='persona',
+            index=models.Index(fields=['fecha_registro', 'id'], name='persona_fecha_registro_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLA_FTS = 'personas_busqueda_fts'
+TABLA = 'personas_indicebusqueda'
+CAMPOS_BUSQUEDA = ('nombre', 'apellidos', 'correo', 'telefono')
+BATCH_SIZE = 2000
+
+
+def crear_indice_texto(apps, schema_editor):
+    """Índice de texto completo propio de cada motor sobre IndiceBusqueda.contenido"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(contenido, content='{TABLA}', "
+            f"content_rowid='persona_id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON {TABLA} BEGIN "
+            f"INSERT INTO {TABLA_FTS}(rowid, contenido) VALUES (new.persona_id, new.contenido); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON {TABLA} BEGIN "
+            f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, contenido) VALUES ('delete', old.persona_id, old.contenido); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE ON {TABLA} BEGIN "
+            f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, contenido) VALUES ('delete', old.persona_id, old.contenido); "
+            f"INSERT INTO {TABLA_FTS}(rowid, contenido) VALUES (new.persona_id, new.contenido); END"
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE {TABLA} ADD FULLTEXT INDEX {TABLA}_ft (contenido)")
+
+
+def eliminar_indice_texto(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sufijo in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+
+def indexar_existentes(apps, schema_editor):
+    from personas.search import normalizar_texto
+
+    Persona = apps.get_model('personas', 'Persona')
+    IndiceBusqueda = apps.get_model('personas', 'IndiceBusqueda')
+    lote = []
+    for persona in Persona.objects.only('id', *CAMPOS_BUSQUEDA).iterator(chunk_size=BATCH_SIZE):
+        contenido = normalizar_texto(' '.join(str(getattr(persona, campo) or '') for campo in CAMPOS_BUSQUEDA))
+        lote.append(IndiceBusqueda(persona_id=persona.pk, contenido=contenido))
+        if len(lote) >= BATCH_SIZE:
+            IndiceBusqueda.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        IndiceBusqueda.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0006_indice_fecha_registro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusqueda',
+            fields=[
+                ('persona', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='indice_busqueda', serialize=False, to='personas.persona')),
+                ('contenido', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'Índice de búsqueda',
+                'verbose_name_plural': 'Índice de búsqueda',
+            },
+        ),
+        migrations.RunPython(crear_indice_texto, eliminar_indice_texto),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
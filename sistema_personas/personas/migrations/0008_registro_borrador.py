@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0007_indice_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroBorrador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datos', models.JSONField(default=dict)),
+                ('foto_path', models.CharField(blank=True, max_length=255)),
+                ('expira', models.DateTimeField(db_index=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='registro_borrador', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Borrador de registro',
+                'verbose_name_plural': 'Borradores de registro',
+            },
+        ),
+    ]
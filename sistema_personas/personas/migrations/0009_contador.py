@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+def contar_personas(apps, schema_editor):
+    Persona = apps.get_model('personas', 'Persona')
+    Contador = apps.get_model('personas', 'Contador')
+    Contador.objects.create(nombre='personas', valor=Persona.objects.count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0008_registro_borrador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contador',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador',
+                'verbose_name_plural': 'Contadores',
+            },
+        ),
+        migrations.RunPython(contar_personas, migrations.RunPython.noop),
+    ]
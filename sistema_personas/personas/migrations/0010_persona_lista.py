@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def proyectar_personas(apps, schema_editor):
+    Persona = apps.get_model('personas', 'Persona')
+    PersonaLista = apps.get_model('personas', 'PersonaLista')
+    campos = ('id', 'nombre', 'apellidos', 'sexo', 'telefono', 'correo', 'foto', 'fecha_registro')
+    lote = []
+    for persona_id, nombre, apellidos, sexo, telefono, correo, foto, fecha in (
+        Persona.objects.values_list(*campos).iterator(chunk_size=2000)
+    ):
+        lote.append(PersonaLista(
+            persona_id=persona_id, nombre=nombre, apellidos=apellidos, sexo=bool(sexo),
+            sexo_display='Hombre' if sexo else 'Mujer', telefono=telefono, correo=correo,
+            foto=foto or '', fecha_registro=fecha,
+        ))
+        if len(lote) >= 2000:
+            PersonaLista.objects.bulk_create(lote)
+            lote = []
+    PersonaLista.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0009_contador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonaLista',
+            fields=[
+                ('persona', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fila_lista', serialize=False, to='personas.persona')),
+                ('nombre', models.CharField(max_length=100)),
+                ('apellidos', models.CharField(max_length=100)),
+                ('sexo', models.BooleanField(default=False)),
+                ('sexo_display', models.CharField(max_length=10)),
+                ('telefono', models.CharField(max_length=15)),
+                ('correo', models.CharField(max_length=100)),
+                ('foto', models.CharField(blank=True, max_length=100)),
+                ('fecha_registro', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Fila de listado',
+                'verbose_name_plural': 'Filas de listado',
+                'ordering': ['-fecha_registro', '-persona'],
+                'indexes': [models.Index(fields=['fecha_registro', 'persona'], name='lista_fecha_registro_idx')],
+            },
+        ),
+        migrations.RunPython(proyectar_personas, migrations.RunPython.noop),
+    ]
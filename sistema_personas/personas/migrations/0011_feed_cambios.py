@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0010_persona_lista'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonaEliminada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('persona_id', models.BigIntegerField()),
+                ('fecha_eliminacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Persona eliminada',
+                'verbose_name_plural': 'Personas eliminadas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='persona',
+            index=models.Index(fields=['fecha_actualizacion', 'id'], name='persona_fecha_actualiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personaeliminada',
+            index=models.Index(fields=['fecha_eliminacion', 'id'], name='eliminada_fecha_idx'),
+        ),
+    ]
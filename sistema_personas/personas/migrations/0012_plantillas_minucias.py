@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:30
+
+from django.db import migrations
+
+
+def borrar_plantillas(apps, schema_editor):
+    # Las plantillas de orientación de crestas no son compatibles con las de
+    # minucias; se regeneran con python manage.py generar_plantillas
+    Persona = apps.get_model('personas', 'Persona')
+    Persona.objects.exclude(huella_template__isnull=True).update(huella_template=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0011_feed_cambios'),
+    ]
+
+    operations = [
+        migrations.RunPython(borrar_plantillas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:10
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def crear_tabla_cache(apps, schema_editor):
+    # Tabla de DatabaseCache (caché compartida con el worker de procesar_registros);
+    # no hace nada si settings.CACHES no usa la base de datos o la tabla ya existe
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0012_plantillas_minucias'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_tabla_cache, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+from personas.imagenes import nombres_miniaturas
+
+
+BATCH_SIZE = 2000
+
+
+def proyectar_miniaturas(apps, schema_editor):
+    """Calcula los nombres de las miniaturas de las filas de listado con foto"""
+    PersonaLista = apps.get_model('personas', 'PersonaLista')
+    lote = []
+    for fila in PersonaLista.objects.exclude(foto='').only('persona_id', 'foto').iterator(chunk_size=BATCH_SIZE):
+        fila.miniaturas = nombres_miniaturas(fila.foto)
+        lote.append(fila)
+        if len(lote) >= BATCH_SIZE:
+            PersonaLista.objects.bulk_update(lote, ['miniaturas'])
+            lote = []
+    PersonaLista.objects.bulk_update(lote, ['miniaturas'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personas', '0013_tabla_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personalista',
+            name='miniaturas',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(proyectar_miniaturas, migrations.RunPython.noop),
+    ]
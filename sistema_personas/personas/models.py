@@ -1,13 +1,63 @@
-import os
-import sys
+import logging
+
 from django.db import models
-from django.db.models.signals import post_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .biometrics import extract_fingerprint_template, normalize_fingerprint_digest
+
+logger = logging.getLogger(__name__)
+
+# Columnas que muestran los listados (API y web)
+CAMPOS_LISTA = ('id', 'nombre', 'apellidos', 'sexo', 'telefono', 'correo', 'foto', 'fecha_registro')
+
+# Texto de sexo en los listados, precalculado en PersonaLista
+SEXO_DISPLAY = {True: 'Hombre', False: 'Mujer'}
+
+class ContadorPersonasQuerySet(models.QuerySet):
+    def count(self):
+        """
+        El total de la tabla sale del contador mantenido al escribir (ver
+        Contador); con filtros se cuenta en la base de datos
+        """
+        if self._result_cache is None and self._es_tabla_completa():
+            total = Contador.objects.filter(nombre=Contador.PERSONAS).values_list('valor', flat=True).first()
+            if total is not None:
+                return total
+        return super().count()
+
+    def _es_tabla_completa(self):
+        query = self.query
+        return not (query.where or query.is_sliced or query.distinct or query.combinator
+                    or query.group_by is not None)
+
+class PersonaQuerySet(ContadorPersonasQuerySet):
+    def para_lista(self):
+        """
+        Solo las columnas de los listados, con sexo_display calculado en SQL
+        """
+        return self.only(*CAMPOS_LISTA).annotate(
+            sexo_display=models.Case(
+                models.When(sexo=True, then=models.Value(SEXO_DISPLAY[True])),
+                default=models.Value(SEXO_DISPLAY[False]),
+                output_field=models.CharField(),
+            )
+        )
 
 class Persona(models.Model):
+    PROCESAMIENTO_PENDIENTE = 'pendiente'
+    PROCESAMIENTO_COMPLETADO = 'completado'
+    PROCESAMIENTO_ERROR = 'error'
+    ESTADOS_PROCESAMIENTO = [
+        (PROCESAMIENTO_PENDIENTE, 'Pendiente'),
+        (PROCESAMIENTO_COMPLETADO, 'Completado'),
+        (PROCESAMIENTO_ERROR, 'Error'),
+    ]
+
     nombre = models.CharField(max_length=100)
     apellidos = models.CharField(max_length=100)
     sexo = models.BooleanField(default=False, help_text="0=Mujer, 1=Hombre")
@@ -17,114 +67,338 @@ class Persona(models.Model):
     foto = models.ImageField(upload_to='fotos/', null=True, blank=True)
     huella_digital = models.ImageField(upload_to='huellas/', null=True, blank=True)
     huella_hex = models.TextField(null=True, blank=True)
+    # Copia de ancho fijo e indexada de huella_hex para búsquedas exactas
+    huella_digest = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    # Plantilla de minucias para la identificación aproximada (biometrics.encode_template)
+    huella_template = models.BinaryField(null=True, blank=True, editable=False)
     qr_code = models.ImageField(upload_to='qr/', null=True, blank=True)
+    estado_procesamiento = models.CharField(max_length=20, choices=ESTADOS_PROCESAMIENTO,
+                                            default=PROCESAMIENTO_COMPLETADO, editable=False)
     fecha_registro = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    objects = PersonaQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.nombre} {self.apellidos}"
 
-    def delete(self, *args, **kwargs):
+    def save(self, *args, **kwargs):
         """
-        Override delete method to remove associated files
+        Mantiene huella_digest sincronizado con huella_hex y normaliza las
+        fotos nuevas
         """
-        # Debug: Imprimir información detallada
-        print("\n--- DEBUG: Iniciando eliminación de Persona ---")
-        print(f"Nombre: {self.nombre} {self.apellidos}")
-        
-        # Almacenar rutas de archivos antes de eliminar
-        foto_path = None
-        if self.foto:
-            try:
-                # Intentar obtener la ruta absoluta de la foto
-                foto_path = self.foto.path
-                print(f"Ruta de foto detectada: {foto_path}")
-                print(f"¿Existe la foto?: {os.path.exists(foto_path)}")
-            except Exception as e:
-                print(f"Error al obtener ruta de foto: {e}")
-                # También imprimir el valor de self.foto para más contexto
-                print(f"Valor de self.foto: {self.foto}")
-        
-        # Referencia al directorio de medios
-        media_root = settings.MEDIA_ROOT
-        print(f"MEDIA_ROOT: {media_root}")
-
-        # Llamar al método de eliminación del padre
-        super().delete(*args, **kwargs)
-
-        # Eliminar archivo de foto
-        if foto_path:
-            try:
-                # Intentar eliminar usando diferentes métodos
-                if os.path.exists(foto_path):
-                    # Eliminar usando os.remove
-                    try:
-                        os.remove(foto_path)
-                        print(f"Foto eliminada con os.remove: {foto_path}")
-                    except Exception as e:
-                        print(f"Error al eliminar con os.remove: {e}")
-                
-                # Intentar eliminar usando default_storage
-                try:
-                    if default_storage.exists(foto_path):
-                        default_storage.delete(foto_path)
-                        print(f"Foto eliminada con default_storage: {foto_path}")
-                except Exception as e:
-                    print(f"Error al eliminar con default_storage: {e}")
-            except Exception as e:
-                print(f"Error general al eliminar foto: {e}")
-                # Imprimir la traza completa del error
-                import traceback
-                traceback.print_exc(file=sys.stdout)
-
-        print("--- FIN DE DEPURACIÓN DE ELIMINACIÓN ---\n")
+        self.huella_digest = normalize_fingerprint_digest(self.huella_hex)
+        self._actualizar_template()
+        self._normalizar_foto()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'huella_hex' in update_fields:
+                update_fields.add('huella_digest')
+            if 'huella_digital' in update_fields:
+                update_fields.add('huella_template')
+            # El feed de cambios y las cachés dependen de fecha_actualizacion
+            update_fields.add('fecha_actualizacion')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+    def _actualizar_template(self):
+        """
+        Extrae la plantilla de la huella cuando cambia la imagen o aún no existe
+        """
+        huella = self.huella_digital
+        if not huella:
+            self.huella_template = None
+            return
+        if huella._committed and self.huella_template is not None:
+            return
+        try:
+            huella.open('rb')
+            self.huella_template = extract_fingerprint_template(huella)
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo extraer la plantilla de huella: %s", e)
+            self.huella_template = None
+        finally:
+            if huella._committed:
+                huella.close()
+            else:
+                huella.seek(0)
+
+    def _normalizar_foto(self):
+        """
+        Reemplaza una foto recién subida por su versión normalizada (ver
+        personas.imagenes); las miniaturas se generan en post_save
+        """
+        from .imagenes import normalizar_foto
+
+        foto = self.foto
+        if not foto or foto._committed:
+            return
+        try:
+            self.foto = normalizar_foto(foto)
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo normalizar la foto: %s", e)
 
     class Meta:
         verbose_name = "Persona"
         verbose_name_plural = "Personas"
-        ordering = ['-fecha_registro']
+        ordering = ['-fecha_registro', '-id']
+        indexes = [
+            models.Index(fields=['fecha_registro', 'id'], name='persona_fecha_registro_idx'),
+            models.Index(fields=['fecha_actualizacion', 'id'], name='persona_fecha_actualiz_idx'),
+        ]
+
+class PersonaEliminada(models.Model):
+    """
+    Registro (tombstone) de una persona eliminada para el feed de cambios
+    (ver personas.cambios). Se conserva settings.CAMBIOS_RETENCION_DIAS.
+    """
+    persona_id = models.BigIntegerField()
+    fecha_eliminacion = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Persona {self.persona_id} eliminada el {self.fecha_eliminacion}"
+
+    class Meta:
+        verbose_name = "Persona eliminada"
+        verbose_name_plural = "Personas eliminadas"
+        indexes = [
+            models.Index(fields=['fecha_eliminacion', 'id'], name='eliminada_fecha_idx'),
+        ]
+
+class ArchivoMedia(models.Model):
+    """
+    Archivo guardado por ContentAddressedStorage y cuántos campos lo usan.
+    """
+    ruta = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    tamano = models.PositiveBigIntegerField(default=0)
+    referencias = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.ruta} ({self.referencias} referencias)"
+
+    class Meta:
+        verbose_name = "Archivo multimedia"
+        verbose_name_plural = "Archivos multimedia"
+
+class Contador(models.Model):
+    """
+    Totales mantenidos al escribir para no recorrer la tabla con COUNT(*).
+    Las señales de Persona y las operaciones masivas (bulk_create de
+    personas.bulk, purgar_personas) ajustan el de personas en la misma
+    transacción que la escritura. HORIZONTE_BAJAS guarda la fecha (en
+    microsegundos) de la última baja purgada del feed de cambios.
+    """
+    PERSONAS = 'personas'
+    HORIZONTE_BAJAS = 'horizonte_bajas'
+
+    nombre = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+    class Meta:
+        verbose_name = "Contador"
+        verbose_name_plural = "Contadores"
+
+def ajustar_contador_personas(delta, using=None):
+    """Suma delta al total de personas (si el contador existe)"""
+    if delta:
+        Contador.objects.using(using).filter(nombre=Contador.PERSONAS).update(valor=models.F('valor') + delta)
+
+def recontar_personas():
+    """Recalcula el total de personas con COUNT(*) y lo guarda en el contador"""
+    total = models.QuerySet(Persona).count()
+    Contador.objects.update_or_create(nombre=Contador.PERSONAS, defaults={'valor': total})
+    return total
+
+class IndiceBusqueda(models.Model):
+    """
+    Texto normalizado por el que se busca a cada persona (ver personas.search).
+    """
+    persona = models.OneToOneField(Persona, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='indice_busqueda')
+    contenido = models.TextField()
+
+    class Meta:
+        verbose_name = "Índice de búsqueda"
+        verbose_name_plural = "Índice de búsqueda"
+
+class PersonaLista(models.Model):
+    """
+    Proyección de lectura de los listados: una fila por persona con solo las
+    columnas que se muestran y sexo_display ya calculado. Las señales de
+    Persona la mantienen al día (ver personas.listado).
+    """
+    persona = models.OneToOneField(Persona, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='fila_lista')
+    nombre = models.CharField(max_length=100)
+    apellidos = models.CharField(max_length=100)
+    sexo = models.BooleanField(default=False)
+    sexo_display = models.CharField(max_length=10)
+    telefono = models.CharField(max_length=15)
+    correo = models.CharField(max_length=100)
+    foto = models.CharField(max_length=100, blank=True)
+    # {tamaño: {formato: nombre}} de las miniaturas de la foto (ver personas.imagenes)
+    miniaturas = models.JSONField(default=dict, blank=True)
+    fecha_registro = models.DateTimeField()
+
+    # Mismo total que Persona: una fila por persona
+    objects = ContadorPersonasQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Fila de listado"
+        verbose_name_plural = "Filas de listado"
+        ordering = ['-fecha_registro', '-persona']
+        indexes = [
+            models.Index(fields=['fecha_registro', 'persona'], name='lista_fecha_registro_idx'),
+        ]
+
+class RegistroBorrador(models.Model):
+    """
+    Datos del asistente de registro (pasos 1 y 2) aún no enviados, uno por
+    usuario y con vencimiento (ver personas.borradores).
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='registro_borrador')
+    datos = models.JSONField(default=dict)
+    foto_path = models.CharField(max_length=255, blank=True)
+    expira = models.DateTimeField(db_index=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Borrador de registro de {self.usuario}"
+
+    class Meta:
+        verbose_name = "Borrador de registro"
+        verbose_name_plural = "Borradores de registro"
+
+class TareaRegistro(models.Model):
+    """
+    Tarea en cola para procesar la huella, el QR y la foto de un registro.
+
+    La cola vive en la base de datos y la atiende el comando procesar_registros.
+    """
+    PENDIENTE = 'pendiente'
+    PROCESANDO = 'procesando'
+    COMPLETADA = 'completada'
+    ERROR = 'error'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESANDO, 'Procesando'),
+        (COMPLETADA, 'Completada'),
+        (ERROR, 'Error'),
+    ]
+
+    persona = models.OneToOneField(Persona, on_delete=models.CASCADE, related_name='tarea_registro')
+    huella_temp = models.CharField(max_length=255)
+    foto_temp = models.CharField(max_length=255, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE, db_index=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Registro de {self.persona} ({self.estado})"
+
+    class Meta:
+        verbose_name = "Tarea de registro"
+        verbose_name_plural = "Tareas de registro"
+        ordering = ['id']
+
+@receiver(post_save, sender=Persona)
+def actualizar_contador_personas(sender, instance, created=False, using=None, **kwargs):
+    """
+    Receptor de señal para mantener el total de personas y descartar las
+    respuestas en caché de la persona y de los listados (ver personas.cache)
+    """
+    from .cache import invalidar_persona
+
+    if created:
+        ajustar_contador_personas(1, using=using)
+    persona_id = instance.pk
+    transaction.on_commit(lambda: invalidar_persona(persona_id), using=using)
+
+@receiver(post_save, sender=Persona)
+def actualizar_cache_huellas(sender, instance, **kwargs):
+    """
+    Receptor de señal para reflejar la huella guardada en la caché de búsqueda
+    """
+    from .matching import template_cache
+
+    persona_id, digest, template = instance.pk, instance.huella_digest, instance.huella_template
+    transaction.on_commit(lambda: template_cache.put(persona_id, digest, template))
+
+@receiver(post_save, sender=Persona)
+def actualizar_indice_busqueda(sender, instance, **kwargs):
+    """
+    Receptor de señal para mantener el índice de texto completo; al eliminar
+    la persona su entrada se borra en cascada
+    """
+    from .search import indexar_persona
+
+    indexar_persona(instance)
+
+@receiver(post_save, sender=Persona)
+def actualizar_fila_lista(sender, instance, update_fields=None, **kwargs):
+    """
+    Receptor de señal para mantener la proyección de los listados; al
+    eliminar la persona su fila se borra en cascada
+    """
+    from .listado import CAMPOS_PROYECTADOS, proyectar_persona
+
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_PROYECTADOS):
+        return
+    proyectar_persona(instance)
+
+@receiver(post_save, sender=Persona)
+def generar_miniaturas_foto(sender, instance, update_fields=None, **kwargs):
+    """
+    Receptor de señal para pregenerar las miniaturas de la foto guardada
+    """
+    from .imagenes import generar_miniaturas
+
+    if 'foto' in instance.get_deferred_fields() or (update_fields is not None and 'foto' not in update_fields):
+        return
+    try:
+        generar_miniaturas(instance.foto)
+    except (OSError, ValueError) as e:
+        logger.warning("No se pudieron generar las miniaturas de %s: %s", instance.foto.name, e)
 
-# Señal de respaldo para eliminación de archivos
 @receiver(post_delete, sender=Persona)
-def delete_persona_files(sender, instance, **kwargs):
-    """
-    Receptor de señal para eliminar archivos después de eliminar la instancia
-    """
-    def remove_file(field, file_type):
-        if field:
-            try:
-                # Intentar obtener la ruta del archivo
-                try:
-                    file_path = field.path
-                except Exception as e:
-                    print(f"Error al obtener ruta de {file_type}: {e}")
-                    return
-
-                print(f"\n--- Eliminando {file_type} ---")
-                print(f"Ruta del archivo: {file_path}")
-                print(f"¿Existe el archivo?: {os.path.exists(file_path)}")
-                
-                # Intentar eliminar con os.remove
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        print(f"{file_type} eliminado con os.remove")
-                except Exception as e:
-                    print(f"Error al eliminar {file_type} con os.remove: {e}")
-                
-                # Intentar eliminar con default_storage
-                try:
-                    if default_storage.exists(file_path):
-                        default_storage.delete(file_path)
-                        print(f"{file_type} eliminado con default_storage")
-                except Exception as e:
-                    print(f"Error al eliminar {file_type} con default_storage: {e}")
-            except Exception as e:
-                print(f"Error general al eliminar {file_type}: {e}")
-                import traceback
-                traceback.print_exc(file=sys.stdout)
-
-    # Eliminar archivos asociados
-    remove_file(instance.foto, "Foto")
-    remove_file(instance.huella_digital, "Huella digital")
-    remove_file(instance.qr_code, "Código QR")
\ No newline at end of file
+def descontar_persona(sender, instance, using=None, **kwargs):
+    """
+    Receptor de señal para descontar la persona eliminada del total y
+    descartar sus respuestas en caché
+    """
+    from .cache import invalidar_persona
+
+    persona_id = instance.pk
+    ajustar_contador_personas(-1, using=using)
+    transaction.on_commit(lambda: invalidar_persona(persona_id), using=using)
+
+@receiver(post_delete, sender=Persona)
+def registrar_persona_eliminada(sender, instance, using=None, **kwargs):
+    """
+    Receptor de señal para dejar el registro de la eliminación que publica
+    el feed de cambios, en la misma transacción que el borrado
+    """
+    PersonaEliminada.objects.using(using).create(persona_id=instance.pk)
+
+@receiver(post_delete, sender=Persona)
+def delete_persona_files(sender, instance, using=None, **kwargs):
+    """
+    Receptor de señal para liberar los archivos de la persona eliminada. Solo
+    los encola: se borran por lotes en segundo plano cuando se confirma la
+    transacción (ver personas.eliminacion)
+    """
+    from .eliminacion import programar_eliminacion
+    from .matching import template_cache
+
+    persona_id = instance.pk
+    transaction.on_commit(lambda: template_cache.discard(persona_id), using=using)
+    archivos = [campo.name for campo in (instance.foto, instance.huella_digital, instance.qr_code) if campo]
+    programar_eliminacion(archivos, storage=instance.foto.storage, using=using)
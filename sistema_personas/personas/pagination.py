@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PersonaCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre (fecha_registro, id).
+
+    Cada página filtra a partir de la última posición vista usando el índice
+    compuesto de Persona, sin OFFSET ni COUNT(*), así que la página 10,000
+    cuesta lo mismo que la primera.
+    """
+    ordering = ('-fecha_registro', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
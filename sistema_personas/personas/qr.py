@@ -0,0 +1,110 @@
+"""
+Servicio de generación de códigos QR con caché.
+
+El QR de un hash siempre es la misma imagen, así que se genera una sola vez:
+la matriz, el PNG y el SVG se guardan en una caché LRU en memoria indexada
+por el dato y los parámetros de dibujo. No hay caché en disco: el QR de cada
+persona ya se guarda en media/qr. Las salidas SVG y de matriz no pasan por PIL.
+"""
+from io import BytesIO
+from functools import lru_cache
+
+import numpy as np
+import qrcode
+from PIL import Image
+
+from .metricas import medir_imagen
+
+ERROR_CORRECTION = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+# Parámetros con los que siempre se han generado los QR del sistema
+DEFAULT_VERSION = 1
+DEFAULT_ERROR_CORRECTION = 'L'
+DEFAULT_BOX_SIZE = 10
+DEFAULT_BORDER = 4
+
+CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def qr_matrix(data, version=DEFAULT_VERSION, error_correction=DEFAULT_ERROR_CORRECTION, border=DEFAULT_BORDER):
+    """
+    Matriz de módulos del QR (True = negro), incluyendo el borde.
+
+    Returns:
+        tuple: Tupla de filas, cada una una tupla de bool
+    """
+    qr = qrcode.QRCode(
+        version=version,
+        error_correction=ERROR_CORRECTION[error_correction],
+        box_size=1,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(tuple(fila) for fila in qr.get_matrix())
+
+
+@medir_imagen
+def _render_png(matrix, box_size):
+    modulos = np.array(matrix, dtype=bool)
+    pixeles = np.where(modulos, 0, 255).astype(np.uint8)
+    pixeles = np.kron(pixeles, np.ones((box_size, box_size), dtype=np.uint8))
+    buffer = BytesIO()
+    Image.fromarray(pixeles, mode='L').convert('1').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def qr_png(data, version=DEFAULT_VERSION, error_correction=DEFAULT_ERROR_CORRECTION,
+           box_size=DEFAULT_BOX_SIZE, border=DEFAULT_BORDER):
+    """PNG del QR como bytes"""
+    return _render_png(qr_matrix(data, version, error_correction, border), box_size)
+
+
+def qr_png_sin_cache(data, version=DEFAULT_VERSION, error_correction=DEFAULT_ERROR_CORRECTION,
+                     box_size=DEFAULT_BOX_SIZE, border=DEFAULT_BORDER):
+    """
+    PNG del QR sin guardarlo en la caché de PNG, para cargas masivas donde
+    cada hash se usa una sola vez.
+    """
+    return _render_png(qr_matrix(data, version, error_correction, border), box_size)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def qr_svg(data, version=DEFAULT_VERSION, error_correction=DEFAULT_ERROR_CORRECTION,
+           box_size=DEFAULT_BOX_SIZE, border=DEFAULT_BORDER):
+    """SVG del QR construido directamente a partir de la matriz"""
+    matrix = qr_matrix(data, version, error_correction, border)
+    lado = len(matrix) * box_size
+    trazos = ''.join(
+        f'M{x * box_size} {y * box_size}h{box_size}v{box_size}h-{box_size}z'
+        for y, fila in enumerate(matrix)
+        for x, negro in enumerate(fila)
+        if negro
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{lado}" height="{lado}" '
+        f'viewBox="0 0 {lado} {lado}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="#fff"/><path d="{trazos}" fill="#000"/></svg>'
+    )
+
+
+def clear_cache():
+    """Vacía la caché en memoria"""
+    qr_matrix.cache_clear()
+    qr_png.cache_clear()
+    qr_svg.cache_clear()
+
+
+def cache_stats():
+    """Aciertos y fallos de la caché en memoria"""
+    return {
+        nombre: funcion.cache_info()._asdict()
+        for nombre, funcion in (('matriz', qr_matrix), ('png', qr_png), ('svg', qr_svg))
+    }
@@ -0,0 +1,190 @@
+"""
+Búsqueda de texto completo sobre personas.
+
+IndiceBusqueda guarda, por persona, el texto normalizado (minúsculas y sin
+acentos) de nombre, apellidos, correo y teléfono; las señales de Persona lo
+mantienen al día. Sobre esa tabla cada motor usa su propio índice:
+
+  - SQLite: tabla virtual FTS5 (personas_busqueda_fts) sincronizada por triggers
+  - MySQL: índice FULLTEXT sobre contenido; los términos más cortos que
+    innodb_ft_min_token_size no están en ese índice y se buscan por subcadena
+  - Otros: búsqueda por subcadenas sobre el texto normalizado (sin índice)
+
+Todos los términos deben aparecer y cada uno se busca como prefijo, así
+que "jose per" encuentra a "José Pérez".
+"""
+import re
+import unicodedata
+from collections.abc import Sequence
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .biometrics import normalize_fingerprint_digest
+from .models import IndiceBusqueda, Persona
+
+CAMPOS_BUSQUEDA = ('nombre', 'apellidos', 'correo', 'telefono')
+MAX_RESULTADOS = 1000
+TABLA_FTS = 'personas_busqueda_fts'
+# innodb_ft_min_token_size por defecto: MySQL no indexa términos más cortos
+MYSQL_MIN_TOKEN = 3
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin acentos: 'José Pérez' -> 'jose perez'"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    return TOKEN_RE.findall(normalizar_texto(texto))
+
+
+def contenido_de(persona):
+    """Texto indexado de una persona"""
+    return normalizar_texto(' '.join(str(getattr(persona, campo) or '') for campo in CAMPOS_BUSQUEDA))
+
+
+def indexar_persona(persona):
+    """Crea o actualiza la entrada del índice de una persona"""
+    contenido = contenido_de(persona)
+    actualizadas = IndiceBusqueda.objects.filter(persona_id=persona.pk).exclude(contenido=contenido).update(
+        contenido=contenido
+    )
+    if not actualizadas:
+        IndiceBusqueda.objects.get_or_create(persona_id=persona.pk, defaults={'contenido': contenido})
+
+
+def indexar_personas(queryset, batch_size=2000):
+    """Reconstruye el índice de las personas del queryset por lotes"""
+    total = 0
+    lote = []
+    for persona in queryset.only('id', *CAMPOS_BUSQUEDA).iterator(chunk_size=batch_size):
+        lote.append(IndiceBusqueda(persona_id=persona.pk, contenido=contenido_de(persona)))
+        if len(lote) >= batch_size:
+            total += _guardar_lote(lote)
+            lote = []
+    if lote:
+        total += _guardar_lote(lote)
+    return total
+
+
+def _guardar_lote(lote):
+    # Borrar e insertar mantiene sincronizados los triggers de FTS5
+    IndiceBusqueda.objects.filter(persona_id__in=[e.persona_id for e in lote]).delete()
+    IndiceBusqueda.objects.bulk_create(lote)
+    return len(lote)
+
+
+def _consulta_sql(tokens, limite=None):
+    """
+    SQL que devuelve los ids de persona que cumplen todos los términos,
+    ordenados por relevancia, y sus parámetros.
+    """
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        expresion = ' '.join(f'"{token}"*' for token in tokens)
+        sql = f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s ORDER BY rank'
+        params = [expresion]
+    elif vendor == 'mysql':
+        largos = [token for token in tokens if len(token) >= MYSQL_MIN_TOKEN]
+        cortos = [token for token in tokens if len(token) < MYSQL_MIN_TOKEN]
+        tabla = IndiceBusqueda._meta.db_table
+        condiciones = ['contenido LIKE %s'] * len(cortos)
+        params = [f'%{token}%' for token in cortos]
+        orden = 'persona_id DESC'
+        if largos:
+            expresion = ' '.join(f'+{token}*' for token in largos)
+            condiciones.insert(0, 'MATCH(contenido) AGAINST (%s IN BOOLEAN MODE)')
+            params = [expresion, *params, expresion]
+            orden = 'MATCH(contenido) AGAINST (%s IN BOOLEAN MODE) DESC'
+        sql = f'SELECT persona_id FROM {tabla} WHERE {" AND ".join(condiciones)} ORDER BY {orden}'
+    else:
+        tabla = IndiceBusqueda._meta.db_table
+        condiciones = ' AND '.join(['contenido LIKE %s'] * len(tokens))
+        sql = f'SELECT persona_id FROM {tabla} WHERE {condiciones} ORDER BY persona_id DESC'
+        params = [f'%{token}%' for token in tokens]
+    if limite is not None:
+        sql += f' LIMIT {int(limite)}'
+    return sql, params
+
+
+def buscar_ids(query, limite=MAX_RESULTADOS):
+    """Ids de las personas que coinciden con la búsqueda, de más a menos relevante"""
+    tokens = tokenizar(query)
+    if not tokens:
+        return []
+    sql, params = _consulta_sql(tokens, limite)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+class ResultadosBusqueda(Sequence):
+    """
+    Resultados ordenados por relevancia que solo cargan de la base de datos
+    las filas que se piden (por ejemplo, la página actual del Paginator).
+    """
+
+    def __init__(self, queryset, ids, tamano_lote=100):
+        self.queryset = queryset
+        self.ids = ids
+        self.tamano_lote = tamano_lote
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def _cargar(self, ids):
+        # Instancias de modelo o diccionarios de .values() con 'id'
+        filas = {fila['id'] if isinstance(fila, dict) else fila.pk: fila for fila in self.queryset.filter(pk__in=ids)}
+        return [filas[pk] for pk in ids if pk in filas]
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return self._cargar(self.ids[indice])
+        return self._cargar([self.ids[indice]])[0]
+
+    def __iter__(self):
+        for inicio in range(0, len(self.ids), self.tamano_lote):
+            yield from self._cargar(self.ids[inicio:inicio + self.tamano_lote])
+
+
+def buscar(queryset, query, limite=MAX_RESULTADOS):
+    """
+    Personas del queryset que coinciden con la búsqueda, de más a menos
+    relevante. Solo se consideran los primeros `limite` resultados.
+    """
+    return ResultadosBusqueda(queryset, buscar_ids(query, limite))
+
+
+def filtrar(queryset, query):
+    """Filtra el queryset con la búsqueda sin alterar su orden ni limitar resultados"""
+    tokens = tokenizar(query)
+    if not tokens:
+        return queryset
+    sql, params = _consulta_sql(tokens)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+class IndiceBusquedaFilter(filters.SearchFilter):
+    """
+    Reemplazo de SearchFilter que usa el índice de texto completo. Un hash
+    SHA-256 completo se busca además por coincidencia exacta de huella.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+        digest = normalize_fingerprint_digest(query)
+        if digest:
+            # Persona o su proyección de listado (PersonaLista)
+            campo = 'huella_digest' if queryset.model is Persona else 'persona__huella_digest'
+            return queryset.filter(**{campo: digest})
+        return filtrar(queryset, query)
@@ -1,18 +1,48 @@
 from rest_framework import serializers
+from .biometrics import FingerprintQualityError, check_fingerprint_quality
+from .imagenes import urls_miniaturas
 from .models import Persona
 
-class PersonaSerializer(serializers.ModelSerializer):
+class MiniaturasMixin:
+    """Campo foto_miniaturas: {tamaño: {formato: url}} de las miniaturas pregeneradas"""
+
+    def get_foto_miniaturas(self, obj):
+        # Las filas de personas.listado son diccionarios con los nombres de la
+        # foto y de sus miniaturas
+        if isinstance(obj, dict):
+            urls = urls_miniaturas(obj['foto'], obj['miniaturas'])
+        else:
+            urls = urls_miniaturas(obj.foto)
+        request = self.context.get('request')
+        if not urls or request is None:
+            return urls
+        return {
+            tamano: {formato: request.build_absolute_uri(url) for formato, url in formatos.items()}
+            for tamano, formatos in urls.items()
+        }
+
+class PersonaSerializer(MiniaturasMixin, serializers.ModelSerializer):
+    foto_miniaturas = serializers.SerializerMethodField()
+
     class Meta:
         model = Persona
-        fields = '__all__'
+        exclude = ('huella_template',)
         read_only_fields = ('fecha_registro', 'fecha_actualizacion')
 
-class PersonaListSerializer(serializers.ModelSerializer):
-    sexo_display = serializers.SerializerMethodField()
+    def validate_huella_digital(self, huella):
+        # Capturas en blanco, parciales o borrosas no llegan a guardarse
+        if huella:
+            try:
+                check_fingerprint_quality(huella)
+            except FingerprintQualityError as e:
+                raise serializers.ValidationError(str(e))
+        return huella
+
+class PersonaListSerializer(MiniaturasMixin, serializers.ModelSerializer):
+    # Precalculado en PersonaLista (filas de personas.listado.filas_lista)
+    sexo_display = serializers.CharField(read_only=True)
+    foto_miniaturas = serializers.SerializerMethodField()
     
     class Meta:
         model = Persona
-        fields = ('id', 'nombre', 'apellidos', 'sexo', 'sexo_display', 'telefono', 'correo')
-    
-    def get_sexo_display(self, obj):
-        return "Hombre" if obj.sexo else "Mujer"
\ No newline at end of file
+        fields = ('id', 'nombre', 'apellidos', 'sexo', 'sexo_display', 'telefono', 'correo', 'foto_miniaturas')
\ No newline at end of file
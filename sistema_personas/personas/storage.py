@@ -0,0 +1,212 @@
+"""
+Almacenamiento de archivos multimedia direccionado por contenido.
+
+Cada archivo se guarda como <carpeta>/<aa>/<sha256><extensión>, donde <aa>
+son los dos primeros caracteres del hash. Subir dos veces los mismos bytes
+reutiliza el archivo existente y el modelo ArchivoMedia lleva la cuenta de
+referencias, de modo que el archivo solo se borra cuando nadie lo usa.
+
+Los derivados de un archivo (p. ej. miniaturas de fotos) se guardan junto a
+él como <sha256>_<sufijo> y se borran cuando se borra el archivo.
+
+Borrar es release() (descontar referencias en la base de datos) seguido de
+remove() (borrar del disco); ambos aceptan lotes para que la eliminación
+diferida de personas.eliminacion haga pocas consultas y un solo listado por
+carpeta.
+
+Los archivos del registro se escriben una sola vez en pendientes/ y, al
+procesarse, promote() los enlaza en su carpeta definitiva (fotos/, huellas/)
+sin volver a leerlos ni escribirlos.
+"""
+import os
+import re
+import shutil
+import posixpath
+from collections import Counter, defaultdict
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from .biometrics import generate_sha256_from_image
+
+DERIVADO_RE = re.compile(r'(?P<base>.+)_\d+\.\w+')
+CONTENIDO_RE = re.compile(r'(?:.*/)?(?P<prefijo>[0-9a-f]{2})/(?P<digest>[0-9a-f]{64})(?P<extension>\.\w+)')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage que deduplica por SHA-256 y cuenta referencias.
+
+    Si el archivo a guardar trae el atributo sha256 (p. ej. calculado por
+    HashingUploadHandler mientras se recibía) no se vuelve a leer para hashearlo.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def content_name(name, digest):
+        """Ruta direccionada por contenido para un archivo subido como name"""
+        carpeta = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(carpeta, digest[:2], f'{digest}{extension}')
+
+    @staticmethod
+    def content_digest(name):
+        """SHA-256 de un nombre direccionado por contenido, o None"""
+        coincidencia = CONTENIDO_RE.fullmatch(name)
+        if coincidencia and coincidencia['digest'].startswith(coincidencia['prefijo']):
+            return coincidencia['digest']
+        return None
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo depende del contenido y se decide en _save
+        return name
+
+    def _save(self, name, content):
+        from .models import ArchivoMedia
+
+        digest = getattr(content, 'sha256', None) or generate_sha256_from_image(content)
+        name = self.content_name(name, digest)
+        with transaction.atomic():
+            archivo, creado = ArchivoMedia.objects.select_for_update().get_or_create(
+                ruta=name,
+                defaults={'sha256': digest, 'tamano': content.size, 'referencias': 0},
+            )
+            if creado or not os.path.exists(self.path(name)):
+                super()._save(name, content)
+            else:
+                # Al reutilizarlo se actualiza su fecha para que el barrido de
+                # temporales (personas.limpieza) no lo tome por abandonado
+                os.utime(self.path(name))
+            ArchivoMedia.objects.filter(pk=archivo.pk).update(referencias=F('referencias') + 1)
+        return name
+
+    def promote(self, name, folder):
+        """
+        Agrega una referencia en folder a un archivo ya guardado (normalmente
+        en pendientes/) sin copiar sus bytes: un enlace duro con el mismo
+        nombre direccionado por contenido, o una copia si el sistema de
+        archivos no admite enlaces. El original sigue existiendo, así que
+        un reintento puede volver a promoverlo.
+
+        Returns:
+            str: Nombre del archivo en folder
+        """
+        from .models import ArchivoMedia
+
+        digest = self.content_digest(name)
+        if digest is None:
+            raise ValueError(f'{name} no es un archivo direccionado por contenido')
+        destino = self.content_name(posixpath.join(folder, posixpath.basename(name)), digest)
+        origen = self.path(name)
+        with transaction.atomic():
+            archivo, creado = ArchivoMedia.objects.select_for_update().get_or_create(
+                ruta=destino,
+                defaults={'sha256': digest, 'tamano': os.path.getsize(origen), 'referencias': 0},
+            )
+            ruta_destino = self.path(destino)
+            if creado or not os.path.exists(ruta_destino):
+                os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
+                try:
+                    os.link(origen, ruta_destino)
+                except FileExistsError:
+                    pass
+                except OSError:
+                    shutil.copyfile(origen, ruta_destino)
+            ArchivoMedia.objects.filter(pk=archivo.pk).update(referencias=F('referencias') + 1)
+        return destino
+
+    def save_derived(self, name, content):
+        """Guarda un derivado con nombre fijo, sin deduplicar ni contar referencias"""
+        return super()._save(name, content)
+
+    def derived_names(self, name):
+        """Derivados existentes de un archivo"""
+        carpeta = posixpath.dirname(name)
+        base = posixpath.splitext(posixpath.basename(name))[0]
+        try:
+            archivos = self.listdir(carpeta)[1]
+        except FileNotFoundError:
+            return []
+        return [
+            posixpath.join(carpeta, archivo) for archivo in archivos
+            if (derivado := DERIVADO_RE.fullmatch(archivo)) and derivado['base'] == base
+        ]
+
+    def release(self, names):
+        """
+        Libera una referencia por cada nombre (puede repetirse) y devuelve los
+        que ya nadie usa y deben borrarse del disco
+        """
+        from .models import ArchivoMedia
+
+        cuentas = Counter(name for name in names if name)
+        if not cuentas:
+            return []
+        libres = []
+        with transaction.atomic():
+            registros = dict(
+                ArchivoMedia.objects.select_for_update().filter(ruta__in=cuentas).values_list('ruta', 'referencias')
+            )
+            por_descuento = defaultdict(list)
+            eliminar = []
+            for name, cuenta in cuentas.items():
+                referencias = registros.get(name)
+                if referencias is not None and referencias > cuenta:
+                    por_descuento[cuenta].append(name)
+                    continue
+                # Último uso (o archivo anterior a este almacenamiento)
+                if referencias is not None:
+                    eliminar.append(name)
+                libres.append(name)
+            for cuenta, rutas in por_descuento.items():
+                ArchivoMedia.objects.filter(ruta__in=rutas).update(referencias=F('referencias') - cuenta)
+            if eliminar:
+                ArchivoMedia.objects.filter(ruta__in=eliminar).delete()
+        return libres
+
+    def remove(self, names):
+        """
+        Borra del disco archivos ya liberados y sus derivados, listando cada
+        carpeta una sola vez. Devuelve la cantidad de archivos borrados.
+        """
+        por_carpeta = defaultdict(set)
+        for name in names:
+            por_carpeta[posixpath.dirname(name)].add(posixpath.basename(name))
+        borrados = 0
+        for carpeta, nombres in por_carpeta.items():
+            try:
+                archivos = self.listdir(carpeta)[1]
+            except FileNotFoundError:
+                continue
+            bases = {posixpath.splitext(nombre)[0] for nombre in nombres}
+            for archivo in archivos:
+                derivado = DERIVADO_RE.fullmatch(archivo)
+                if archivo in nombres or (derivado and derivado['base'] in bases):
+                    try:
+                        os.remove(self.path(posixpath.join(carpeta, archivo)))
+                    except FileNotFoundError:
+                        continue
+                    borrados += 1
+        return borrados
+
+    def discard_unreferenced(self, names):
+        """
+        Borra del disco, con sus derivados, los archivos de names sin fila en
+        ArchivoMedia: los escritos en una transacción que se revirtió. Los que
+        ya existían conservan su fila y no se tocan.
+        """
+        from .models import ArchivoMedia
+
+        names = {name for name in names if name}
+        registrados = set(ArchivoMedia.objects.filter(ruta__in=names).values_list('ruta', flat=True))
+        return self.remove(names - registrados)
+
+    def delete(self, name):
+        """Libera una referencia y borra el archivo cuando no quedan más"""
+        if not name:
+            return
+        self.remove(self.release([name]))
@@ -0,0 +1,209 @@
+"""
+Cola de procesamiento de registros respaldada por la base de datos.
+
+registro_paso2 guarda la foto ya normalizada en pendientes/ (preparar_foto)
+y registro_paso3 la huella recibida, con el hash calculado mientras se subía,
+y crea una TareaRegistro; el comando procesar_registros (o procesar_registro
+cuando el modo asíncrono está desactivado) genera el QR y promueve los
+archivos de pendientes/ a su carpeta definitiva sin volver a escribirlos.
+"""
+import os
+import time
+import uuid
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .biometrics import generate_sha256_from_image, generate_qr_from_hash
+from .cache import invalidar_persona
+from .imagenes import normalizar_foto
+from .models import Persona, TareaRegistro
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 3
+CARPETA_PENDIENTES = 'pendientes'
+HUELLA_DUPLICADA = 'La huella digital ya está registrada'
+
+
+def procesamiento_asincrono():
+    """Indica si los registros se procesan en segundo plano"""
+    return getattr(settings, 'REGISTRO_PROCESAMIENTO_ASINCRONO', True)
+
+
+def preparar_foto(archivo):
+    """
+    Normaliza la foto del paso 2 y la guarda una sola vez en pendientes/,
+    direccionada por contenido, para promoverla al procesar el registro.
+
+    Returns:
+        str: Ruta relativa a MEDIA_ROOT de la foto preparada
+    """
+    foto = normalizar_foto(archivo)
+    return default_storage.save(f'{CARPETA_PENDIENTES}/{foto.name}', foto)
+
+
+def encolar_registro(persona, huella_content, foto_path=''):
+    """
+    Guarda la persona como pendiente junto con su tarea de procesamiento.
+
+    Args:
+        persona: Instancia de Persona aún sin guardar (con huella_hex, para
+            que el índice único rechace una huella ya registrada al encolar)
+        huella_content: Archivo con la imagen de huella recibida (con el
+            atributo sha256 si ya se calculó al recibirla)
+        foto_path: Ruta relativa a MEDIA_ROOT de la foto del paso 2
+
+    Returns:
+        TareaRegistro: Tarea creada
+
+    Raises:
+        IntegrityError: Si la huella ya está registrada
+    """
+    huella_temp = default_storage.save(f'{CARPETA_PENDIENTES}/huella_{uuid.uuid4().hex}.png', huella_content)
+    try:
+        with transaction.atomic():
+            persona.estado_procesamiento = Persona.PROCESAMIENTO_PENDIENTE
+            persona.save()
+            tarea = TareaRegistro.objects.create(persona=persona, huella_temp=huella_temp, foto_temp=foto_path or '')
+    except IntegrityError:
+        _eliminar_temporal(huella_temp)
+        raise
+    return tarea
+
+
+def reclamar_tarea():
+    """Marca como 'procesando' la siguiente tarea pendiente y la devuelve"""
+    candidatas = TareaRegistro.objects.filter(estado=TareaRegistro.PENDIENTE).values_list('id', flat=True)[:10]
+    for tarea_id in candidatas:
+        reclamada = TareaRegistro.objects.filter(pk=tarea_id, estado=TareaRegistro.PENDIENTE).update(
+            estado=TareaRegistro.PROCESANDO,
+            intentos=F('intentos') + 1,
+            fecha_actualizacion=timezone.now(),
+        )
+        if reclamada:
+            return TareaRegistro.objects.select_related('persona').get(pk=tarea_id)
+    return None
+
+
+def recuperar_tareas_abandonadas(minutos=10):
+    """Devuelve a la cola las tareas que un worker dejó a medias"""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TareaRegistro.objects.filter(
+        estado=TareaRegistro.PROCESANDO, fecha_actualizacion__lt=limite
+    ).update(estado=TareaRegistro.PENDIENTE)
+
+
+def _eliminar_temporal(path):
+    try:
+        if path and default_storage.exists(path):
+            default_storage.delete(path)
+    except Exception as e:
+        logger.warning("Error al eliminar archivo temporal %s: %s", path, e)
+
+
+def procesar_registro(tarea):
+    """
+    Genera el QR y promueve la huella y la foto de pendientes/ a los archivos
+    definitivos de la persona de una tarea.
+
+    Returns:
+        bool: True si la tarea terminó correctamente
+    """
+    persona = tarea.persona
+    guardados = []
+    try:
+        huella_hex = default_storage.content_digest(tarea.huella_temp)
+        if huella_hex:
+            persona.huella_digital = default_storage.promote(tarea.huella_temp, 'huellas')
+        else:
+            # Tarea encolada antes del almacenamiento direccionado por contenido
+            with default_storage.open(tarea.huella_temp, 'rb') as huella:
+                huella_hex = generate_sha256_from_image(huella)
+                persona.huella_digital.save(f'huella_{persona.nombre}.png', huella, save=False)
+        guardados.append(persona.huella_digital.name)
+        persona.huella_hex = huella_hex
+        qr_content = generate_qr_from_hash(huella_hex)
+        persona.qr_code.save(f'qr_{persona.nombre}.png', qr_content, save=False)
+        guardados.append(persona.qr_code.name)
+
+        if tarea.foto_temp and default_storage.content_digest(tarea.foto_temp):
+            persona.foto = default_storage.promote(tarea.foto_temp, 'fotos')
+            guardados.append(persona.foto.name)
+        elif tarea.foto_temp:
+            # Foto sin normalizar de fotos/temp_* (registros anteriores)
+            ruta_completa = os.path.join(settings.MEDIA_ROOT, tarea.foto_temp)
+            if os.path.exists(ruta_completa):
+                with open(ruta_completa, 'rb') as f:
+                    nombre_foto_final = f"foto_{persona.nombre}_{persona.apellidos.split()[0]}.jpg"
+                    persona.foto.save(nombre_foto_final, normalizar_foto(f), save=False)
+                    guardados.append(persona.foto.name)
+            else:
+                logger.warning("No se encontró el archivo de foto en %s", ruta_completa)
+
+        persona.estado_procesamiento = Persona.PROCESAMIENTO_COMPLETADO
+        with transaction.atomic():
+            persona.save()
+            tarea.estado = TareaRegistro.COMPLETADA
+            tarea.error = ''
+            tarea.save(update_fields=['estado', 'error', 'fecha_actualizacion'])
+    except Exception as e:
+        logger.exception("Error al procesar registro %s: %s", tarea.pk, e)
+        # Descartar los archivos definitivos escritos en este intento
+        for path in guardados:
+            _eliminar_temporal(path)
+        duplicada = isinstance(e, IntegrityError)
+        definitivo = duplicada or tarea.intentos >= MAX_INTENTOS
+        if duplicada:
+            # La persona ya está registrada: se descarta el registro (y su
+            # tarea) para que no quede en los listados; el feed publica la baja
+            Persona.objects.filter(pk=persona.pk).delete()
+        else:
+            tarea.estado = TareaRegistro.ERROR if definitivo else TareaRegistro.PENDIENTE
+            tarea.error = str(e)
+            tarea.save(update_fields=['estado', 'error', 'fecha_actualizacion'])
+        if definitivo:
+            if not duplicada:
+                Persona.objects.filter(pk=persona.pk).update(
+                    estado_procesamiento=Persona.PROCESAMIENTO_ERROR, fecha_actualizacion=timezone.now(),
+                )
+                invalidar_persona(persona.pk)
+            _eliminar_temporal(tarea.huella_temp)
+            _eliminar_temporal(tarea.foto_temp)
+        return False
+
+    _eliminar_temporal(tarea.huella_temp)
+    _eliminar_temporal(tarea.foto_temp)
+    return True
+
+
+def procesar_pendientes(limite=None):
+    """Procesa tareas pendientes hasta vaciar la cola o alcanzar el límite"""
+    procesadas = 0
+    while limite is None or procesadas < limite:
+        tarea = reclamar_tarea()
+        if tarea is None:
+            break
+        procesar_registro(tarea)
+        procesadas += 1
+    return procesadas
+
+
+def ejecutar_worker(intervalo=1.0, detener=None):
+    """
+    Bucle del worker: procesa la cola, espera cuando está vacía y limpia los
+    archivos temporales cada settings.LIMPIEZA_INTERVALO segundos
+    """
+    from .limpieza import LimpiezaPeriodica
+
+    limpieza = LimpiezaPeriodica()
+    recuperar_tareas_abandonadas()
+    while detener is None or not detener():
+        if not procesar_pendientes(limite=50):
+            limpieza()
+            time.sleep(intervalo)
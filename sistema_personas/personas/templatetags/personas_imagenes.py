@@ -0,0 +1,31 @@
+from django import template
+from django.utils.html import format_html
+
+from personas.imagenes import FORMATOS_MINIATURA, url_miniatura
+
+register = template.Library()
+
+
+@register.simple_tag
+def miniatura_url(foto, tamano='pequena', formato='jpg'):
+    """URL de una miniatura pregenerada de la foto"""
+    return url_miniatura(foto, tamano, formato)
+
+
+@register.simple_tag
+def foto_responsiva(foto, tamano='pequena', alt='', clase='', estilo='', ancho=None, alto=None, miniaturas=None):
+    """
+    <picture> con la miniatura en WebP y JPEG como respaldo para
+    navegadores sin soporte de WebP. miniaturas son los nombres guardados
+    en las filas de listado.
+    """
+    if not foto:
+        return ''
+    fuente = ''
+    if 'webp' in FORMATOS_MINIATURA:
+        fuente = format_html('<source srcset="{}" type="image/webp">', url_miniatura(foto, tamano, 'webp', miniaturas))
+    dimensiones = format_html(' width="{}" height="{}"', ancho, alto) if ancho and alto else ''
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" class="{}" style="{}" loading="lazy"{}></picture>',
+        fuente, url_miniatura(foto, tamano, 'jpg', miniaturas), alt, clase, estilo, dimensiones,
+    )
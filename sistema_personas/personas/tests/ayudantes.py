@@ -0,0 +1,177 @@
+"""
+Ayudantes compartidos por las pruebas: personas y archivos de prueba, un
+MEDIA_ROOT temporal y capturas sintéticas de huellas y fotos.
+
+Los benchmarks usan los mismos generadores (imagen_huella, foto_sintetica)
+para que pruebas y mediciones trabajen con los mismos datos.
+"""
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO
+from functools import lru_cache
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.test.utils import override_settings
+
+from ..models import Persona
+
+
+def sha256(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+
+def crear_persona(nombre='Ana', huella=None, **campos):
+    """Persona con datos válidos y, si se indica, la imagen de su huella"""
+    datos = {
+        'nombre': nombre,
+        'apellidos': 'Pérez López',
+        'sexo': False,
+        'telefono': '5551234',
+        'correo': f'{nombre.lower()}@example.com',
+        'direccion': 'Calle 1',
+    }
+    if huella is not None:
+        datos['huella_digital'] = ContentFile(huella, name='huella.png')
+        datos['huella_hex'] = sha256(huella)
+    datos.update(campos)
+    return Persona.objects.create(**datos)
+
+
+def imagen_png(pixeles):
+    buffer = BytesIO()
+    Image.fromarray(pixeles).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@contextmanager
+def media_temporal(prefijo='test_media_'):
+    """MEDIA_ROOT temporal (default_storage incluido) que se elimina al salir"""
+    raiz = tempfile.mkdtemp(prefix=prefijo)
+    try:
+        with override_settings(MEDIA_ROOT=raiz):
+            yield raiz
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+class MediaTemporalMixin:
+    """MEDIA_ROOT temporal por prueba, para no escribir en media/"""
+
+    def setUp(self):
+        super().setUp()
+        self.media = self.enterContext(media_temporal())
+
+
+def _campo_orientacion(tipo, lado, rng):
+    """Orientación de crestas de una presilla, un verticilo o un arco, con núcleos y deltas al azar"""
+    y, x = np.mgrid[0:lado, 0:lado].astype(np.float64)
+    z = x + 1j * y
+    cx, cy = lado / 2 + rng.uniform(-20, 20), lado * 0.42 + rng.uniform(-20, 20)
+    if tipo == 'arco':
+        altura, ancho = rng.uniform(40, 90), rng.uniform(60, 110)
+        caida = np.exp(-np.clip(y - cy + 60, 0, None) / 120)
+        return np.arctan(altura * 2 * (x - cx) / ancho ** 2 * np.exp(-(x - cx) ** 2 / ancho ** 2) * caida)
+    if tipo == 'presilla':
+        nucleos = [complex(cx, cy)]
+        deltas = [complex(cx + rng.choice([-1, 1]) * rng.uniform(60, 110), cy + rng.uniform(90, 140))]
+    else:
+        nucleos = [complex(cx + rng.uniform(-15, 15), cy - rng.uniform(5, 18)),
+                   complex(cx + rng.uniform(-15, 15), cy + rng.uniform(5, 18))]
+        deltas = [complex(cx - rng.uniform(80, 120), cy + rng.uniform(90, 140)),
+                  complex(cx + rng.uniform(80, 120), cy + rng.uniform(90, 140))]
+    campo = 0.5 * (sum(np.angle(z - n) for n in nucleos) - sum(np.angle(z - d) for d in deltas))
+    return campo + rng.uniform(-0.2, 0.2)
+
+
+@lru_cache(maxsize=32)
+def _huella_maestra(semilla, lado=400, iteraciones=8, orientaciones=12):
+    """
+    Crestas (-1 a 1) del dedo 'semilla': ruido disperso filtrado varias veces
+    con el filtro de Gabor de la orientación de cada píxel, de modo que las
+    crestas se cortan y bifurcan al azar como las minucias de un dedo real
+    """
+    rng = np.random.default_rng(semilla)
+    tipo = rng.choice(['presilla', 'presilla', 'presilla', 'verticilo', 'verticilo', 'arco'])
+    orientacion = _campo_orientacion(tipo, lado, rng) % np.pi
+    periodo = rng.uniform(8.0, 10.0)
+    fy = np.fft.fftfreq(lado)[:, None]
+    fx = np.fft.rfftfreq(lado)[None, :]
+    sigma, f0 = periodo * 0.5, 1 / periodo
+    filtros = np.empty((orientaciones, lado, lado // 2 + 1), dtype=np.float32)
+    for k in range(orientaciones):
+        nx, ny = -np.sin(np.pi * k / orientaciones) * f0, np.cos(np.pi * k / orientaciones) * f0
+        filtros[k] = (np.exp(-2 * np.pi ** 2 * sigma ** 2 * ((fx - nx) ** 2 + (fy - ny) ** 2))
+                      + np.exp(-2 * np.pi ** 2 * sigma ** 2 * ((fx + nx) ** 2 + (fy + ny) ** 2)))
+    posicion = orientacion / np.pi * orientaciones
+    inferior = np.floor(posicion).astype(np.intp) % orientaciones
+    superior = (inferior + 1) % orientaciones
+    peso = (posicion - np.floor(posicion)).astype(np.float32)
+    crestas = (rng.normal(0, 1, (lado, lado)) * (rng.random((lado, lado)) < 0.02)).astype(np.float32)
+    for _ in range(iteraciones):
+        respuesta = np.fft.irfft2(np.fft.rfft2(crestas)[None] * filtros, s=(lado, lado))
+        crestas = (np.take_along_axis(respuesta, inferior[None], 0)[0] * (1 - peso)
+                   + np.take_along_axis(respuesta, superior[None], 0)[0] * peso)
+        crestas = np.clip(crestas / (crestas.std() + 1e-9) * 1.5, -1, 1).astype(np.float32)
+    return crestas
+
+
+def _ruido_suave(rng, alto, ancho, escala):
+    ruido = rng.normal(0, 1, (alto // escala + 3, ancho // escala + 3)).astype(np.float32)
+    ruido = Image.fromarray(ruido).resize((ancho + 3 * escala, alto + 3 * escala), Image.BICUBIC)
+    return np.asarray(ruido)[:alto, :ancho]
+
+
+def imagen_huella(semilla, captura=0, ruido=0, lado=(400, 300)):
+    """
+    PNG de una captura sintética del dedo 'semilla'. Cada 'captura' distinta
+    de 0 es otra impresión del mismo dedo (rotada hasta 15°, desplazada,
+    con distorsión elástica, presión y humedad propias), con las mismas
+    minucias y distinto hash; 'ruido' agrega ruido de sensor. En 'lado' más
+    grandes que 400x300 el dedo se amplía, como con un sensor de más resolución.
+    """
+    maestra = _huella_maestra(semilla)
+    rng = np.random.default_rng([semilla, captura])
+    alto, ancho = lado
+    escala = min(alto / 400, ancho / 300)
+    angulo = np.deg2rad(rng.uniform(-15, 15)) if captura else 0.0
+    tx, ty = rng.uniform(-20, 20, 2) if captura else (0.0, 0.0)
+    y, x = np.mgrid[0:alto, 0:ancho].astype(np.float32)
+    xc, yc = (x - ancho / 2) / escala, (y - alto / 2) / escala
+    centro = maestra.shape[0] / 2
+    mx = np.cos(angulo) * xc - np.sin(angulo) * yc + centro + tx
+    my = np.sin(angulo) * xc + np.cos(angulo) * yc + centro + ty
+    if captura:
+        mx = mx + 3 * _ruido_suave(rng, alto, ancho, 80)
+        my = my + 3 * _ruido_suave(rng, alto, ancho, 80)
+    x0 = np.clip(np.floor(mx).astype(np.intp), 0, maestra.shape[1] - 2)
+    y0 = np.clip(np.floor(my).astype(np.intp), 0, maestra.shape[0] - 2)
+    fx, fy = np.clip(mx - x0, 0, 1), np.clip(my - y0, 0, 1)
+    valor = (maestra[y0, x0] * (1 - fx) * (1 - fy) + maestra[y0, x0 + 1] * fx * (1 - fy)
+             + maestra[y0 + 1, x0] * (1 - fx) * fy + maestra[y0 + 1, x0 + 1] * fx * fy)
+    # Zona de contacto del dedo: una elipse con presión y humedad de cada captura
+    radio = np.hypot((mx - centro) / (centro * 0.8), (my - centro) / (centro * 0.94))
+    contacto = np.clip((rng.uniform(0.85, 1.0) - radio) * 12, 0, 1)
+    humedad = rng.uniform(-0.3, 0.3) + 0.25 * _ruido_suave(rng, alto, ancho, 60)
+    tinta = 0.5 * (1 + np.tanh(3 * (valor + humedad)))
+    pixeles = 240 - tinta * contacto * rng.uniform(150, 210)
+    if ruido:
+        pixeles = pixeles + rng.normal(0, ruido, pixeles.shape)
+    buffer = BytesIO()
+    Image.fromarray(np.clip(pixeles, 0, 255).astype(np.uint8)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def foto_sintetica(semilla, lado=(1200, 1600), calidad=90):
+    """JPEG con degradados y ruido, comparable a la foto de una cámara"""
+    rng = np.random.default_rng(semilla)
+    alto, ancho = lado
+    base = np.linspace(0, 255, ancho, dtype=np.float32)[None, :, None] * rng.uniform(0.3, 1.0, 3)
+    pixeles = base + np.linspace(0, 60, alto, dtype=np.float32)[:, None, None]
+    pixeles = pixeles + rng.normal(0, 12, (alto, ancho, 3))
+    buffer = BytesIO()
+    Image.fromarray(np.clip(pixeles, 0, 255).astype(np.uint8), mode='RGB').save(buffer, format='JPEG', quality=calidad)
+    return buffer.getvalue()
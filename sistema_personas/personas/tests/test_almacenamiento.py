@@ -0,0 +1,48 @@
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+
+from ..models import ArchivoMedia
+from .ayudantes import MediaTemporalMixin, crear_persona, sha256
+
+
+class AlmacenamientoTests(MediaTemporalMixin, TestCase):
+    def test_nombre_direccionado_por_contenido(self):
+        nombre = default_storage.save('huellas/a.PNG', ContentFile(b'contenido'))
+        digest = sha256(b'contenido')
+        self.assertEqual(nombre, f'huellas/{digest[:2]}/{digest}.png')
+        self.assertEqual(default_storage.content_digest(nombre), digest)
+        self.assertIsNone(default_storage.content_digest('huellas/a.png'))
+
+    def test_mismo_contenido_se_guarda_una_vez(self):
+        primera = default_storage.save('huellas/a.png', ContentFile(b'contenido'))
+        segunda = default_storage.save('huellas/b.png', ContentFile(b'contenido'))
+        self.assertEqual(primera, segunda)
+        self.assertEqual(ArchivoMedia.objects.get(ruta=primera).referencias, 2)
+
+    def test_el_archivo_se_borra_con_la_ultima_referencia(self):
+        nombre = default_storage.save('huellas/a.png', ContentFile(b'contenido'))
+        default_storage.save('huellas/b.png', ContentFile(b'contenido'))
+        default_storage.delete(nombre)
+        self.assertTrue(default_storage.exists(nombre))
+        self.assertEqual(ArchivoMedia.objects.get(ruta=nombre).referencias, 1)
+        default_storage.delete(nombre)
+        self.assertFalse(default_storage.exists(nombre))
+        self.assertFalse(ArchivoMedia.objects.filter(ruta=nombre).exists())
+
+    def test_promover_agrega_una_referencia_sin_copiar(self):
+        pendiente = default_storage.save('pendientes/huella.png', ContentFile(b'contenido'))
+        definitivo = default_storage.promote(pendiente, 'huellas')
+        self.assertTrue(definitivo.startswith('huellas/'))
+        self.assertEqual(os.stat(default_storage.path(definitivo)).st_ino,
+                         os.stat(default_storage.path(pendiente)).st_ino)
+        default_storage.delete(pendiente)
+        self.assertTrue(default_storage.exists(definitivo))
+
+    def test_personas_con_el_mismo_archivo_lo_comparten(self):
+        primera = crear_persona('Ana', qr_code=ContentFile(b'qr', name='qr.png'))
+        segunda = crear_persona('Eva', qr_code=ContentFile(b'qr', name='qr.png'))
+        self.assertEqual(primera.qr_code.name, segunda.qr_code.name)
+        self.assertEqual(ArchivoMedia.objects.get(ruta=primera.qr_code.name).referencias, 2)
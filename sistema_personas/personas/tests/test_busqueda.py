@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .. import search
+from ..search import TABLA_FTS, buscar_ids
+from .ayudantes import crear_persona
+
+
+class BusquedaTextoCompletoTests(TestCase):
+    def setUp(self):
+        self.jose = crear_persona('José', apellidos='Pérez Olmo')
+        self.ana = crear_persona('Ana', apellidos='Li Pereira')
+
+    def test_prefijos_sin_acentos_y_todos_los_terminos(self):
+        self.assertEqual(buscar_ids('jose per'), [self.jose.pk])
+        self.assertEqual(sorted(buscar_ids('PER')), sorted([self.jose.pk, self.ana.pk]))
+        self.assertEqual(buscar_ids('jose pereira'), [])
+        self.assertEqual(buscar_ids('  ,. '), [])
+
+    def test_terminos_cortos(self):
+        self.assertEqual(buscar_ids('li'), [self.ana.pk])
+        self.assertEqual(buscar_ids('an li'), [self.ana.pk])
+
+    def test_el_indice_sigue_a_las_modificaciones_y_bajas(self):
+        self.jose.apellidos = 'Ramírez'
+        self.jose.save()
+        self.assertEqual(buscar_ids('perez'), [])
+        self.assertEqual(buscar_ids('ramirez'), [self.jose.pk])
+        self.jose.delete()
+        self.assertEqual(buscar_ids('jose'), [])
+
+    def test_api_buscar_y_filtro_search(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user('operador'))
+        respuesta = cliente.get(reverse('persona-buscar'), {'q': 'ana'})
+        self.assertEqual([fila['id'] for fila in respuesta.json()], [self.ana.pk])
+        self.assertEqual(cliente.get(reverse('persona-buscar')).status_code, 400)
+        respuesta = cliente.get(reverse('persona-list'), {'search': 'jose'})
+        self.assertEqual([fila['id'] for fila in respuesta.json()['results']], [self.jose.pk])
+
+
+class TriggersFts5Tests(TestCase):
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 solo existe en SQLite')
+
+    def filas_fts(self, termino):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [termino])
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def test_insercion_actualizacion_y_borrado(self):
+        persona = crear_persona('Marta', apellidos='Solís')
+        self.assertEqual(self.filas_fts('solis'), [persona.pk])
+        persona.apellidos = 'Ortega'
+        persona.save()
+        self.assertEqual(self.filas_fts('solis'), [])
+        self.assertEqual(self.filas_fts('ortega'), [persona.pk])
+        persona.delete()
+        self.assertEqual(self.filas_fts('ortega'), [])
+        self.assertEqual(self.filas_fts('marta'), [])
+
+
+class ConsultaMysqlTests(TestCase):
+    def consulta(self, tokens):
+        with mock.patch.object(search, 'connection', mock.Mock(vendor='mysql')):
+            return search._consulta_sql(tokens, limite=10)
+
+    def test_fulltext_con_prefijos_obligatorios(self):
+        sql, params = self.consulta(['jose', 'perez'])
+        self.assertIn('MATCH(contenido) AGAINST (%s IN BOOLEAN MODE)', sql)
+        self.assertNotIn('LIKE', sql)
+        self.assertTrue(sql.endswith('LIMIT 10'))
+        self.assertEqual(params, ['+jose* +perez*', '+jose* +perez*'])
+
+    def test_terminos_cortos_por_subcadena(self):
+        sql, params = self.consulta(['jose', 'li'])
+        self.assertIn('AND contenido LIKE %s', sql)
+        self.assertEqual(params, ['+jose*', '%li%', '+jose*'])
+        self.assertEqual(sql.count('%s'), len(params))
+
+    def test_solo_terminos_cortos(self):
+        sql, params = self.consulta(['an', 'li'])
+        self.assertNotIn('MATCH', sql)
+        self.assertIn('ORDER BY persona_id DESC', sql)
+        self.assertEqual(params, ['%an%', '%li%'])
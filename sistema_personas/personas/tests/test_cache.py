@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ..cache import datos_lista, datos_persona
+from .ayudantes import crear_persona
+
+
+@override_settings(CACHE_RESPUESTAS={'detalle': 300, 'lista': 60})
+class CacheRespuestasTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.construidos = 0
+
+    def construir(self):
+        self.construidos += 1
+        return {'construido': self.construidos}
+
+    def test_detalle_en_cache_hasta_que_la_persona_cambia(self):
+        persona = crear_persona()
+        self.assertEqual(datos_persona(persona.pk, 'prueba', self.construir), {'construido': 1})
+        self.assertEqual(datos_persona(persona.pk, 'prueba', self.construir), {'construido': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            persona.telefono = '5550000'
+            persona.save()
+        self.assertEqual(datos_persona(persona.pk, 'prueba', self.construir), {'construido': 2})
+
+    def test_detalle_se_invalida_al_eliminar(self):
+        persona = crear_persona()
+        datos_persona(persona.pk, 'prueba', self.construir)
+        with self.captureOnCommitCallbacks(execute=True):
+            persona.delete()
+        self.assertEqual(datos_persona(persona.pk, 'prueba', self.construir), {'construido': 2})
+
+    def test_listados_se_invalidan_con_cualquier_alta(self):
+        request = RequestFactory().get('/api/personas/')
+        datos_lista(request, self.construir)
+        self.assertEqual(datos_lista(request, self.construir), {'construido': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_persona()
+        self.assertEqual(datos_lista(request, self.construir), {'construido': 2})
+
+    def test_api_detalle_refleja_la_modificacion(self):
+        persona = crear_persona()
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user('detalle'))
+        url = reverse('persona-detail', args=[persona.pk])
+        self.assertEqual(cliente.get(url).json()['telefono'], '5551234')
+        with self.captureOnCommitCallbacks(execute=True):
+            persona.telefono = '5550000'
+            persona.save()
+        self.assertEqual(cliente.get(url).json()['telefono'], '5550000')
+
+    @override_settings(CACHE_RESPUESTAS={'detalle': 0, 'lista': 0})
+    def test_cero_desactiva_la_cache(self):
+        request = RequestFactory().get('/api/personas/')
+        datos_lista(request, self.construir)
+        self.assertEqual(datos_lista(request, self.construir), {'construido': 2})
+        self.assertEqual(datos_persona(1, 'prueba', self.construir), {'construido': 3})
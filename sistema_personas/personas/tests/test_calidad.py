@@ -0,0 +1,69 @@
+import inspect
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..biometrics import (
+    QUALITY_BLOCK_MIN_STD,
+    TEMPLATE_BLOCK,
+    FingerprintQualityError,
+    _crop_ridge_area,
+    check_fingerprint_quality,
+)
+from .ayudantes import imagen_huella, imagen_png, sha256
+
+
+class CalidadHuellaTests(TestCase):
+    def test_acepta_captura_nitida(self):
+        calidad = check_fingerprint_quality(ContentFile(imagen_huella(31)), min_quality=0.4)
+        self.assertGreaterEqual(calidad.score, 0.4)
+
+    def test_rechaza_captura_en_blanco(self):
+        blanca = imagen_png(np.full((400, 300), 255, dtype=np.uint8))
+        with self.assertRaisesMessage(FingerprintQualityError, 'en blanco'):
+            check_fingerprint_quality(ContentFile(blanca), min_quality=0.4)
+
+    def test_rechaza_ruido(self):
+        ruido = imagen_png(np.random.default_rng(0).integers(0, 256, (400, 300), dtype=np.uint8))
+        with self.assertRaises(FingerprintQualityError) as contexto:
+            check_fingerprint_quality(ContentFile(ruido), min_quality=0.4)
+        self.assertLess(contexto.exception.quality.score, 0.4)
+
+    def test_rechaza_imagen_pequena_o_invalida(self):
+        with self.assertRaisesMessage(FingerprintQualityError, 'demasiado pequeña'):
+            check_fingerprint_quality(ContentFile(imagen_png(np.zeros((32, 32), dtype=np.uint8))), min_quality=0.4)
+        with self.assertRaisesMessage(FingerprintQualityError, 'no es una imagen'):
+            check_fingerprint_quality(ContentFile(b'no es una imagen'), min_quality=0.4)
+
+    def test_control_desactivado(self):
+        self.assertIsNone(check_fingerprint_quality(ContentFile(b'no es una imagen'), min_quality=0))
+
+    @override_settings(HUELLA_CALIDAD_MINIMA=0.4)
+    def test_captura_rechazada_por_el_endpoint(self):
+        url = reverse('capturar_huella')
+        blanca = imagen_png(np.full((400, 300), 255, dtype=np.uint8))
+        respuesta = self.client.post(url, data=blanca, content_type='application/octet-stream')
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertIn('calidad', respuesta.json())
+        respuesta = self.client.post(url, data=imagen_huella(31), content_type='application/octet-stream')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['huella_hex'], sha256(imagen_huella(31)))
+
+
+class RecorteCrestasTests(TestCase):
+    def test_umbral_por_defecto_es_el_del_control_de_calidad(self):
+        self.assertEqual(inspect.signature(_crop_ridge_area).parameters['min_std'].default, QUALITY_BLOCK_MIN_STD)
+
+    def test_recorta_a_los_bloques_con_crestas(self):
+        pixeles = np.full((8 * TEMPLATE_BLOCK, 8 * TEMPLATE_BLOCK), 200.0)
+        fila, columna = 2 * TEMPLATE_BLOCK, 3 * TEMPLATE_BLOCK
+        crestas = np.tile([0.0, 255.0], (2 * TEMPLATE_BLOCK, TEMPLATE_BLOCK))
+        pixeles[fila:fila + 2 * TEMPLATE_BLOCK, columna:columna + 2 * TEMPLATE_BLOCK] = crestas
+        recorte = _crop_ridge_area(pixeles)
+        self.assertEqual(recorte.shape, (2 * TEMPLATE_BLOCK, 2 * TEMPLATE_BLOCK))
+        self.assertTrue(np.array_equal(recorte, crestas))
+        # Sin bloques con varianza suficiente se conserva la imagen completa
+        plana = np.full((4 * TEMPLATE_BLOCK, 4 * TEMPLATE_BLOCK), 200.0)
+        self.assertIs(_crop_ridge_area(plana), plana)
@@ -0,0 +1,92 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..cambios import (
+    FUENTE_MARCA,
+    FUENTE_PERSONA,
+    CursorVencido,
+    cambios_desde,
+    codificar_cursor,
+    decodificar_cursor,
+    generar_ndjson,
+    purgar_eliminaciones,
+)
+from ..models import PersonaEliminada
+from .ayudantes import crear_persona
+
+
+@override_settings(CAMBIOS_MARGEN_SEGUNDOS=0)
+class CambiosTests(TestCase):
+    def lineas(self, cursor=None, limite=100):
+        texto = ''.join(generar_ndjson(cursor, limite, lambda persona: {'nombre': persona.nombre}))
+        return [json.loads(linea) for linea in texto.splitlines()]
+
+    def test_cursor_avanza_sin_repetir(self):
+        ids = [crear_persona(f'P{i}').pk for i in range(3)]
+        primera = self.lineas(limite=2)
+        self.assertEqual([linea['id'] for linea in primera[:-1]], ids[:2])
+        self.assertEqual(primera[-1]['tipo'], 'fin')
+        self.assertTrue(primera[-1]['mas'])
+        segunda = self.lineas(decodificar_cursor(primera[-1]['cursor']))
+        self.assertEqual([linea['id'] for linea in segunda[:-1]], ids[2:])
+        self.assertFalse(segunda[-1]['mas'])
+
+    def test_modificacion_y_baja(self):
+        persona = crear_persona()
+        cursor = decodificar_cursor(self.lineas()[-1]['cursor'])
+        persona.telefono = '5550000'
+        persona.save()
+        lineas = self.lineas(cursor)
+        self.assertEqual([(linea['tipo'], linea['id']) for linea in lineas[:-1]], [('actualizada', persona.pk)])
+        self.assertEqual(lineas[0]['persona'], {'nombre': 'Ana'})
+
+        cursor = decodificar_cursor(lineas[-1]['cursor'])
+        persona_id = persona.pk
+        persona.delete()
+        lineas = self.lineas(cursor)
+        self.assertEqual([(linea['tipo'], linea['id']) for linea in lineas[:-1]], [('eliminada', persona_id)])
+        self.assertNotIn('persona', lineas[0])
+
+    def test_al_dia_el_cursor_es_una_marca(self):
+        crear_persona()
+        fin = self.lineas()[-1]
+        fecha, fuente, _ = decodificar_cursor(fin['cursor'])
+        self.assertEqual(fuente, FUENTE_MARCA)
+        self.assertEqual(self.lineas(decodificar_cursor(fin['cursor']))[:-1], [])
+
+    def test_cambios_desde_respeta_el_limite_superior(self):
+        crear_persona()
+        hasta = timezone.now()
+        crear_persona('Luis')
+        self.assertEqual([objeto.nombre for _, objeto in cambios_desde(hasta=hasta)], ['Ana'])
+
+    def test_cursor_antiguo_valido_sin_bajas_purgadas(self):
+        cursor = codificar_cursor(timezone.now() - timedelta(days=365), FUENTE_MARCA, 0)
+        self.assertIsNotNone(decodificar_cursor(cursor))
+
+    def test_cursor_anterior_al_horizonte_vence(self):
+        anterior = codificar_cursor(timezone.now() - timedelta(days=60), FUENTE_PERSONA, 0)
+        crear_persona().delete()
+        PersonaEliminada.objects.update(fecha_eliminacion=timezone.now() - timedelta(days=40))
+        self.assertEqual(purgar_eliminaciones(), 1)
+        with self.assertRaises(CursorVencido):
+            decodificar_cursor(anterior)
+        self.assertIsNotNone(decodificar_cursor(codificar_cursor(timezone.now(), FUENTE_MARCA, 0)))
+
+    def test_api_cursor_vencido_e_invalido(self):
+        crear_persona().delete()
+        PersonaEliminada.objects.update(fecha_eliminacion=timezone.now() - timedelta(days=40))
+        purgar_eliminaciones()
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user('feed'))
+        url = reverse('persona-cambios')
+        vencido = codificar_cursor(timezone.now() - timedelta(days=60), FUENTE_PERSONA, 0)
+        self.assertEqual(cliente.get(url, {'desde': vencido}).status_code, 410)
+        self.assertEqual(cliente.get(url, {'desde': 'x'}).status_code, 400)
+
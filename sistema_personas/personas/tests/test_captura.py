@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import views
+from .ayudantes import imagen_huella, sha256
+
+
+@override_settings(HUELLA_CALIDAD_MINIMA=0)
+class CapturaHuellaTests(TestCase):
+    def setUp(self):
+        self.url = reverse('capturar_huella')
+        self.huella = imagen_huella(32)
+
+    def capturar(self, **kwargs):
+        return self.client.post(self.url, **kwargs)
+
+    def test_cuerpo_octet_stream(self):
+        respuesta = self.capturar(data=self.huella, content_type='application/octet-stream')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['huella_hex'], sha256(self.huella))
+        self.assertTrue(respuesta.json()['qr_code'].startswith('data:image/png;base64,'))
+
+    def test_octet_stream_vacio(self):
+        respuesta = self.capturar(data=b'', content_type='application/octet-stream')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_multipart_en_imagen_o_huella(self):
+        for campo in ('imagen', 'huella'):
+            with self.subTest(campo=campo):
+                respuesta = self.capturar(data={campo: ContentFile(self.huella, name='huella.png')})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta.json()['huella_hex'], sha256(self.huella))
+
+    def test_multipart_con_formato_qr(self):
+        respuesta = self.capturar(data={'imagen': ContentFile(self.huella, name='huella.png'), 'formato_qr': 'svg'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('<svg', respuesta.json()['qr_code'])
+        respuesta = self.capturar(data={'imagen': ContentFile(self.huella, name='huella.png'), 'formato_qr': 'gif'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_multipart_sin_imagen(self):
+        respuesta = self.capturar(data={'otro': ContentFile(self.huella, name='huella.png')})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_rechaza_cuerpos_demasiado_grandes(self):
+        with mock.patch.object(views, 'MAX_TAMANO_HUELLA', len(self.huella) - 1):
+            respuesta = self.capturar(data=self.huella, content_type='application/octet-stream')
+            self.assertEqual(respuesta.status_code, 413)
+            respuesta = self.capturar(data={'imagen': ContentFile(self.huella, name='huella.png')})
+            self.assertEqual(respuesta.status_code, 413)
+
+    @override_settings(HUELLA_CALIDAD_MINIMA=0.4)
+    def test_con_control_de_calidad_se_evalua_la_imagen_recibida(self):
+        respuesta = self.capturar(data=self.huella, content_type='application/octet-stream')
+        self.assertEqual(respuesta.json()['huella_hex'], sha256(self.huella))
+        respuesta = self.capturar(data={'imagen': ContentFile(self.huella, name='huella.png')})
+        self.assertEqual(respuesta.json()['huella_hex'], sha256(self.huella))
@@ -0,0 +1,155 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import eliminacion
+from ..eliminacion import ColaEliminacion, liberar_archivos, programar_eliminacion, purgar_personas
+from ..models import (
+    Contador,
+    IndiceBusqueda,
+    Persona,
+    PersonaEliminada,
+    PersonaLista,
+    TareaRegistro,
+    recontar_personas,
+)
+from ..search import buscar_ids
+from ..tasks import encolar_registro
+from .ayudantes import MediaTemporalMixin, crear_persona, imagen_huella, sha256
+
+
+class StorageFalso:
+    """Almacenamiento con conteo de referencias que solo registra las llamadas"""
+
+    def __init__(self, fallos=0):
+        self.fallos = fallos
+        self.lotes = []
+
+    def release(self, nombres):
+        if self.fallos:
+            self.fallos -= 1
+            raise OperationalError('database is locked')
+        self.lotes.append(list(nombres))
+        return nombres
+
+    def remove(self, nombres):
+        return len(nombres)
+
+
+class ColaEliminacionTests(TestCase):
+    def test_agrupa_por_lotes(self):
+        storage = StorageFalso()
+        cola = ColaEliminacion(lote=2, workers=1)
+        cola.agregar(['a', '', 'b', 'c', None, 'd', 'e'], storage)
+        self.assertTrue(cola.esperar(timeout=5))
+        self.assertEqual(storage.lotes, [['a', 'b'], ['c', 'd'], ['e']])
+        self.assertEqual((cola.eliminados, cola.errores), (5, 0))
+
+    def test_cuenta_los_errores_y_sigue(self):
+        storage = StorageFalso(fallos=eliminacion.REINTENTOS)
+        cola = ColaEliminacion(lote=2, workers=1)
+        with mock.patch.object(eliminacion.time, 'sleep'), self.assertLogs('personas.eliminacion', 'ERROR'):
+            cola.agregar(['a', 'b', 'c'], storage)
+            self.assertTrue(cola.esperar(timeout=5))
+        self.assertEqual(storage.lotes, [['c']])
+        self.assertEqual((cola.eliminados, cola.errores), (1, 2))
+
+    def test_reintenta_la_base_de_datos_bloqueada(self):
+        storage = StorageFalso(fallos=2)
+        with mock.patch.object(eliminacion.time, 'sleep') as esperar:
+            self.assertEqual(liberar_archivos(storage, ['a', 'b']), 2)
+        self.assertEqual(esperar.call_count, 2)
+        self.assertEqual(storage.lotes, [['a', 'b']])
+
+    def test_solo_se_encola_al_confirmar(self):
+        with mock.patch.object(eliminacion.cola_eliminacion, 'agregar') as agregar:
+            with self.captureOnCommitCallbacks() as callbacks:
+                programar_eliminacion(['fotos/a.jpg', ''])
+            agregar.assert_not_called()
+            for callback in callbacks:
+                callback()
+        agregar.assert_called_once_with(['fotos/a.jpg'], default_storage)
+
+
+class PurgarPersonasTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.personas = [crear_persona(nombre, huella=imagen_huella(semilla))
+                         for semilla, nombre in enumerate(('Ana', 'Eva', 'Luis'), start=60)]
+        recontar_personas()
+
+    def purgar(self, queryset, **kwargs):
+        with mock.patch.object(eliminacion.cola_eliminacion, 'agregar') as agregar:
+            with self.captureOnCommitCallbacks(execute=True), self.assertLogs('personas.eliminacion', 'INFO'):
+                eliminadas = purgar_personas(queryset, **kwargs)
+        return eliminadas, [nombre for llamada in agregar.call_args_list for nombre in llamada.args[0]]
+
+    def test_borra_las_filas_y_hace_el_trabajo_de_las_senales(self):
+        huella = imagen_huella(70)
+        tarea = encolar_registro(Persona(nombre='Raul', huella_hex=sha256(huella)), ContentFile(huella))
+        recontar_personas()
+        progreso = []
+
+        eliminadas, encolados = self.purgar(Persona.objects.all(), lote=2, progreso=progreso.append)
+        self.assertEqual(eliminadas, 4)
+        self.assertEqual(progreso, [2, 4])
+        self.assertFalse(Persona.objects.exists())
+        for modelo in (IndiceBusqueda, PersonaLista, TareaRegistro):
+            self.assertFalse(modelo.objects.exists())
+        self.assertEqual(Contador.objects.get(nombre=Contador.PERSONAS).valor, 0)
+        self.assertEqual(
+            sorted(PersonaEliminada.objects.values_list('persona_id', flat=True)),
+            sorted([persona.pk for persona in self.personas] + [tarea.persona_id]),
+        )
+        self.assertEqual(buscar_ids('ana'), [])
+        archivos = [persona.huella_digital.name for persona in self.personas] + [tarea.huella_temp]
+        self.assertCountEqual(encolados, archivos)
+
+    def test_solo_el_queryset_indicado(self):
+        ana = self.personas[0]
+        eliminadas, encolados = self.purgar(Persona.objects.filter(pk=ana.pk))
+        self.assertEqual(eliminadas, 1)
+        self.assertEqual(encolados, [ana.huella_digital.name])
+        self.assertEqual(Persona.objects.count(), 2)
+
+
+class ComandoPurgarPersonasTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.antigua = crear_persona('Ana')
+        Persona.objects.filter(pk=self.antigua.pk).update(fecha_registro=timezone.now() - timedelta(days=30))
+        self.reciente = crear_persona('Eva')
+        recontar_personas()
+
+    def purgar(self, *args):
+        salida = StringIO()
+        with self.assertLogs('personas.eliminacion', 'INFO'):
+            call_command('purgar_personas', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_argumentos_invalidos(self):
+        for args in ((), ('--todas', '--antes-de', '2024-01-01'), ('--antes-de', '2024-01-01', '--reiniciar-ids'),
+                     ('--antes-de', '01/01/2024')):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                self.purgar(*args)
+        self.assertEqual(Persona.objects.count(), 2)
+
+    def test_antes_de_una_fecha(self):
+        fecha = (timezone.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        salida = self.purgar('--antes-de', fecha)
+        self.assertIn('Eliminadas 1 personas', salida)
+        self.assertEqual(list(Persona.objects.values_list('pk', flat=True)), [self.reciente.pk])
+
+    def test_todas(self):
+        salida = self.purgar('--todas', '--lote', '1')
+        self.assertIn('2 personas eliminadas', salida)
+        self.assertFalse(Persona.objects.exists())
+        self.assertEqual(Persona.objects.count(), 0)
@@ -0,0 +1,204 @@
+import threading
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .. import matching
+from ..biometrics import decode_template, extract_fingerprint_template
+from ..matching import TemplateCache, identify_fingerprint, template_cache, verify_candidates
+from ..models import Persona
+from .ayudantes import MediaTemporalMixin, crear_persona, imagen_huella, sha256
+
+migracion_digest = import_module('personas.migrations.0002_huella_digest')
+
+
+class MigracionDigestTests(TestCase):
+    def test_rellena_el_digest_normalizado(self):
+        huella = 'AB' * 32
+        persona = crear_persona('Ana')
+        Persona.objects.filter(pk=persona.pk).update(huella_hex=f'  {huella}\n', huella_digest=None)
+        migracion_digest.backfill_huella_digest(apps, None)
+        persona.refresh_from_db()
+        self.assertEqual(persona.huella_digest, huella.lower())
+
+    def test_filas_sin_huella_o_con_hash_invalido_quedan_vacias(self):
+        sin_archivo = crear_persona('Ana')
+        invalida = crear_persona('Eva')
+        Persona.objects.filter(pk=invalida.pk).update(huella_hex='no-es-un-hash', huella_digest=None)
+        migracion_digest.backfill_huella_digest(apps, None)
+        for persona in (sin_archivo, invalida):
+            persona.refresh_from_db()
+            self.assertIsNone(persona.huella_digest)
+
+    def test_hash_repetido_solo_en_la_persona_mas_antigua(self):
+        huella = 'cd' * 32
+        antigua, reciente = crear_persona('Ana'), crear_persona('Eva')
+        Persona.objects.filter(pk__in=[antigua.pk, reciente.pk]).update(huella_hex=huella, huella_digest=None)
+        migracion_digest.backfill_huella_digest(apps, None)
+        antigua.refresh_from_db()
+        reciente.refresh_from_db()
+        self.assertEqual(antigua.huella_digest, huella)
+        self.assertIsNone(reciente.huella_digest)
+
+
+class IdentificacionHuellaTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        template_cache.clear()
+        self.addCleanup(template_cache.clear)
+        self.personas = {semilla: crear_persona(f'Dedo{semilla}', huella=imagen_huella(semilla))
+                         for semilla in (11, 12, 13)}
+
+    def test_digest_sincronizado_al_guardar(self):
+        persona = self.personas[11]
+        self.assertEqual(persona.huella_digest, sha256(imagen_huella(11)))
+
+    def test_coincidencia_exacta_por_hash(self):
+        persona, similitud = identify_fingerprint(ContentFile(imagen_huella(12)))
+        self.assertEqual(persona, self.personas[12])
+        self.assertEqual(similitud, 1.0)
+
+    def test_plantilla_extraida_al_guardar(self):
+        for persona in self.personas.values():
+            self.assertIsNotNone(persona.huella_template)
+
+    def test_coincidencia_aproximada_de_otra_captura(self):
+        persona, similitud = identify_fingerprint(ContentFile(imagen_huella(12, captura=1, ruido=10)))
+        self.assertEqual(persona, self.personas[12])
+        self.assertLess(similitud, 1.0)
+
+    def test_huella_desconocida(self):
+        self.assertEqual(identify_fingerprint(ContentFile(imagen_huella(40, captura=1))), (None, 0.0))
+
+    def test_archivo_que_no_es_imagen(self):
+        self.assertEqual(identify_fingerprint(ContentFile(b'no es una imagen')), (None, 0.0))
+
+    def test_resultado_ambiguo_no_identifica(self):
+        _, minucias = decode_template(self.personas[11].huella_template)
+        candidatas = [(1.0, 1, minucias), (1.0, 2, minucias)]
+        self.assertEqual(verify_candidates(minucias, candidatas), [])
+        [(persona_id, similitud)] = verify_candidates(minucias, candidatas[:1])
+        self.assertEqual(persona_id, 1)
+        self.assertGreater(similitud, 0.5)
+
+    def test_serializador_no_expone_la_plantilla(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user('operador'))
+        respuesta = cliente.get(reverse('persona-detail', args=[self.personas[11].pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('huella_template', respuesta.json())
+
+    def test_api_buscar_por_huella(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user('operador'))
+        respuesta = cliente.post(reverse('persona-buscar-por-huella'),
+                                 {'huella': ContentFile(imagen_huella(13), name='huella.png')})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['id'], self.personas[13].pk)
+        self.assertEqual(cliente.post(reverse('persona-buscar-por-huella'), {}).status_code, 400)
+
+    def test_busqueda_huella_redirige_al_detalle(self):
+        self.client.force_login(User.objects.create_user('operador'))
+        respuesta = self.client.post(reverse('busqueda_huella'),
+                                     {'huella': ContentFile(imagen_huella(11), name='huella.png')})
+        self.assertRedirects(respuesta, reverse('persona_detalle', args=[self.personas[11].pk]),
+                             fetch_redirect_response=False)
+
+
+class TemplateCacheTests(MediaTemporalMixin, TestCase):
+    # En TestCase los on_commit no se ejecutan: las escrituras son como las de
+    # otro proceso, que la caché solo conoce al sincronizarse
+
+    def setUp(self):
+        super().setUp()
+        self.huella = imagen_huella(21)
+        self.plantilla = extract_fingerprint_template(ContentFile(self.huella))
+
+    def test_refresco_incorpora_personas_de_otros_procesos(self):
+        cache = TemplateCache(refresh_interval=0)
+        self.assertEqual(cache.search(self.plantilla), [])
+        persona = crear_persona(huella=self.huella)
+        self.assertEqual([pid for pid, _ in cache.search(self.plantilla)], [persona.pk])
+
+    def test_sin_refresco_no_ve_cambios_externos(self):
+        cache = TemplateCache(refresh_interval=3600)
+        self.assertEqual(cache.search(self.plantilla), [])
+        crear_persona(huella=self.huella)
+        self.assertEqual(cache.search(self.plantilla), [])
+
+    def test_refresco_descarta_personas_eliminadas(self):
+        persona = crear_persona(huella=self.huella)
+        cache = TemplateCache(refresh_interval=0)
+        self.assertEqual(len(cache.search(self.plantilla)), 1)
+        persona.delete()
+        self.assertEqual(cache.search(self.plantilla), [])
+        self.assertEqual(cache.stats()['entradas'], 0)
+
+    def test_digest_ausente_se_busca_en_la_base(self):
+        cache = TemplateCache(refresh_interval=3600)
+        self.assertIsNone(cache.get_by_digest(sha256(b'x')))
+        self.assertTrue(cache.complete)
+        persona = crear_persona(huella_hex=sha256(b'x'))
+        self.assertEqual(cache.get_by_digest(sha256(b'x')), persona.pk)
+        self.assertEqual(cache.stats()['entradas'], 1)
+
+    def test_put_y_discard_invalidan(self):
+        cache = TemplateCache(refresh_interval=3600)
+        cache.get_by_digest(sha256(b'y'))
+        cache.put(99, sha256(b'y'), None)
+        self.assertEqual(cache._digests, {sha256(b'y'): 99})
+        cache.discard(99)
+        self.assertEqual(cache._digests, {})
+
+    def test_desaloja_la_menos_usada(self):
+        ids = [crear_persona(f'P{i}', huella_hex=sha256(bytes([i]))).pk for i in range(3)]
+        cache = TemplateCache(max_entries=2, refresh_interval=3600)
+        cache.get_by_digest(sha256(bytes([2])))
+        self.assertFalse(cache.complete)
+        self.assertEqual(list(cache._entries), ids[1:])
+        # La más antigua no está en memoria pero se encuentra en la base
+        self.assertEqual(cache.get_by_digest(sha256(bytes([0]))), ids[0])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_verificacion_por_minucias_sin_el_lock(self):
+        persona = crear_persona(huella=self.huella)
+        cache = TemplateCache(refresh_interval=3600)
+        lock_libre = []
+        original = matching.match_minutiae
+
+        def tomar_lock():
+            tomado = cache._lock.acquire(timeout=1)
+            if tomado:
+                cache._lock.release()
+            lock_libre.append(tomado)
+
+        def verificar(*args):
+            # Otro hilo debe poder tomar el lock mientras se verifica
+            hilo = threading.Thread(target=tomar_lock)
+            hilo.start()
+            hilo.join()
+            return original(*args)
+
+        with mock.patch.object(matching, 'match_minutiae', side_effect=verificar):
+            self.assertEqual([pid for pid, _ in cache.search(self.plantilla)], [persona.pk])
+        self.assertTrue(lock_libre)
+        self.assertTrue(all(lock_libre))
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        CACHE_RESPUESTAS={'detalle': 300, 'lista': 60},
+        HUELLA_CACHE_REFRESCO=3600,
+    )
+    def test_acierto_exacto_sin_consultar_la_persona(self):
+        template_cache.clear()
+        self.addCleanup(template_cache.clear)
+        persona = crear_persona(huella=self.huella)
+        self.assertEqual(identify_fingerprint(ContentFile(self.huella)), (persona, 1.0))
+        with self.assertNumQueries(0):
+            self.assertEqual(identify_fingerprint(ContentFile(self.huella)), (persona, 1.0))
@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .. import views
+from ..matching import template_cache
+from .ayudantes import MediaTemporalMixin, crear_persona, imagen_huella
+
+
+def archivo(datos, nombre='huella.png'):
+    return ContentFile(datos, name=nombre)
+
+
+class IdentificacionLoteTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        template_cache.clear()
+        self.addCleanup(template_cache.clear)
+        self.personas = {semilla: crear_persona(f'Dedo{semilla}', huella=imagen_huella(semilla))
+                         for semilla in (21, 22)}
+        self.url = reverse('persona-buscar-por-huellas')
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(User.objects.create_user('operador'))
+
+    def identificar(self, *archivos):
+        return self.cliente.post(self.url, {'huellas': list(archivos)}, format='multipart')
+
+    def test_requiere_autenticacion(self):
+        respuesta = APIClient().post(self.url, {'huellas': [archivo(imagen_huella(21))]}, format='multipart')
+        self.assertEqual(respuesta.status_code, 403)
+
+    def test_sin_archivos(self):
+        self.assertEqual(self.cliente.post(self.url, {}, format='multipart').status_code, 400)
+
+    @override_settings(HUELLA_LOTE_MAXIMO=2)
+    def test_limite_de_archivos_por_lote(self):
+        huella = imagen_huella(21)
+        self.assertEqual(self.identificar(archivo(huella), archivo(huella)).status_code, 200)
+        respuesta = self.identificar(archivo(huella), archivo(huella), archivo(huella))
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('2', respuesta.json()['error'])
+
+    def test_aciertos_y_fallos_mezclados_en_orden(self):
+        respuesta = self.identificar(
+            archivo(imagen_huella(22), 'exacta.png'),
+            archivo(imagen_huella(40, captura=1), 'desconocida.png'),
+            archivo(imagen_huella(21, captura=1, ruido=10), 'aproximada.png'),
+            archivo(imagen_huella(22), 'repetida.png'),
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual((datos['total'], datos['encontradas']), (4, 3))
+        exacta, desconocida, aproximada, repetida = datos['resultados']
+        self.assertEqual([r['indice'] for r in datos['resultados']], [0, 1, 2, 3])
+        self.assertEqual([r['archivo'] for r in datos['resultados']],
+                         ['exacta.png', 'desconocida.png', 'aproximada.png', 'repetida.png'])
+        self.assertEqual((exacta['persona']['id'], exacta['similitud']), (self.personas[22].pk, 1.0))
+        self.assertEqual(desconocida, {'indice': 1, 'archivo': 'desconocida.png', 'encontrada': False})
+        self.assertEqual(aproximada['persona']['id'], self.personas[21].pk)
+        self.assertLess(aproximada['similitud'], 1.0)
+        self.assertEqual(repetida['persona'], exacta['persona'])
+
+    def test_archivos_invalidos_no_detienen_el_lote(self):
+        huella = imagen_huella(21)
+        with mock.patch.object(views, 'MAX_TAMANO_HUELLA', len(huella)):
+            respuesta = self.identificar(
+                archivo(b'no es una imagen', 'texto.png'),
+                archivo(huella + b'0', 'grande.png'),
+                archivo(b'', 'vacio.png'),
+                archivo(huella, 'valida.png'),
+            )
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual((datos['total'], datos['encontradas']), (4, 1))
+        texto, grande, vacio, valida = datos['resultados']
+        self.assertEqual(texto, {'indice': 0, 'archivo': 'texto.png', 'encontrada': False})
+        self.assertEqual(grande['error'], 'El archivo de huella es demasiado grande')
+        self.assertFalse(grande['encontrada'])
+        self.assertFalse(vacio['encontrada'])
+        self.assertEqual(valida['persona']['id'], self.personas[21].pk)
+
+    def test_consultas_constantes_con_coincidencias_exactas(self):
+        def consultas(cantidad):
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = self.identificar(*[archivo(imagen_huella(21 + i % 2)) for i in range(cantidad)])
+            self.assertEqual(respuesta.json()['encontradas'], cantidad)
+            return len(capturadas)
+
+        self.assertEqual(consultas(1), consultas(6))
@@ -0,0 +1,58 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from PIL import Image
+
+from ..imagenes import FORMATOS_MINIATURA, MINIATURAS, nombre_miniatura, url_miniatura, urls_miniaturas
+from ..models import Persona
+from ..storage import ContentAddressedStorage
+from .ayudantes import MediaTemporalMixin, crear_persona, foto_sintetica
+
+
+class MiniaturasTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.persona = crear_persona(foto=ContentFile(foto_sintetica(1, lado=(1200, 900)), name='foto.jpg'))
+
+    def test_foto_normalizada_con_miniaturas(self):
+        foto = self.persona.foto
+        self.assertIsNotNone(default_storage.content_digest(foto.name))
+        with Image.open(default_storage.path(foto.name)) as imagen:
+            self.assertEqual(imagen.format, 'JPEG')
+            self.assertLessEqual(max(imagen.size), 800)
+        for tamano, lado in MINIATURAS.items():
+            for formato in FORMATOS_MINIATURA:
+                with Image.open(default_storage.path(nombre_miniatura(foto.name, tamano, formato))) as imagen:
+                    self.assertEqual(max(imagen.size), lado)
+
+    def test_urls_sin_consultar_el_disco(self):
+        foto = self.persona.foto
+        with mock.patch.object(ContentAddressedStorage, 'exists', side_effect=AssertionError('exists()')):
+            self.assertEqual(url_miniatura(foto), default_storage.url(nombre_miniatura(foto.name, 'pequena', 'jpg')))
+            self.assertEqual(url_miniatura(foto.name, 'mediana', 'jpg'),
+                             default_storage.url(nombre_miniatura(foto.name, 'mediana', 'jpg')))
+            urls = urls_miniaturas(foto)
+        self.assertEqual(set(urls), set(MINIATURAS))
+        self.assertEqual(set(urls['pequena']), set(FORMATOS_MINIATURA))
+        self.assertIsNone(urls_miniaturas(None))
+
+    def test_foto_con_nombre_anterior_usa_la_foto_completa(self):
+        self.assertEqual(url_miniatura('fotos/foto_ana.jpg'), default_storage.url('fotos/foto_ana.jpg'))
+
+    def test_optimizar_fotos_migra_los_nombres_anteriores(self):
+        anterior = 'fotos/foto_ana.jpg'
+        os.makedirs(default_storage.path('fotos'), exist_ok=True)
+        with open(default_storage.path(anterior), 'wb') as archivo:
+            archivo.write(foto_sintetica(2, lado=(400, 300)))
+        Persona.objects.filter(pk=self.persona.pk).update(foto=anterior)
+
+        call_command('optimizar_fotos', stdout=StringIO())
+        foto = Persona.objects.get(pk=self.persona.pk).foto
+        self.assertIsNotNone(default_storage.content_digest(foto.name))
+        self.assertTrue(default_storage.exists(nombre_miniatura(foto.name, 'pequena', 'jpg')))
+        self.assertFalse(os.path.exists(default_storage.path(anterior)))
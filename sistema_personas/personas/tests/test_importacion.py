@@ -0,0 +1,90 @@
+import io
+import os
+import zipfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.test import TestCase
+
+from ..bulk import exportar_personas, importar_personas
+from ..models import ArchivoMedia, Persona
+from .ayudantes import MediaTemporalMixin, crear_persona, foto_sintetica, imagen_huella, sha256
+
+ENCABEZADO = 'nombre,apellidos,sexo,telefono,correo,direccion,huella_hex'
+
+
+class ImportacionMasivaTests(MediaTemporalMixin, TestCase):
+    def importar(self, filas, **kwargs):
+        texto = ENCABEZADO + '\n' + ''.join(
+            f'{nombre},Pérez,mujer,5551234,{nombre.lower()}@example.com,Calle 1,{huella}\n' for nombre, huella in filas
+        )
+        return importar_personas(io.BytesIO(texto.encode('utf-8')), 'csv', **{'batch_size': 10, 'workers': 1, **kwargs})
+
+    def archivos_en_disco(self):
+        return sorted(
+            os.path.relpath(os.path.join(raiz, nombre), self.media)
+            for raiz, _, nombres in os.walk(self.media) for nombre in nombres
+        )
+
+    def test_duplicadas_en_el_archivo_y_ya_registradas(self):
+        registrada = crear_persona('Eva', huella_hex=sha256(b'eva'))
+        resultado = self.importar([
+            ('Ana', sha256(b'ana')),
+            ('Luis', sha256(b'ana')),
+            ('Eva', sha256(b'eva')),
+            ('Raul', sha256(b'raul')),
+        ])
+        self.assertEqual(resultado.como_dict(), {
+            'creadas': 2,
+            'total_errores': 2,
+            'errores': [
+                {'linea': 3, 'error': 'Huella duplicada en el archivo'},
+                {'linea': 4, 'error': 'La huella digital ya está registrada'},
+            ],
+        })
+        self.assertEqual(Persona.objects.filter(huella_digest=sha256(b'eva')).get(), registrada)
+        self.assertEqual(Persona.objects.count(), 3)
+        self.assertTrue(Persona.objects.get(nombre='Raul').qr_code)
+
+    def test_duplicadas_en_lotes_distintos(self):
+        resultado = self.importar([('Ana', sha256(b'ana')), ('Luis', sha256(b'ana'))], batch_size=1)
+        self.assertEqual(resultado.creadas, 1)
+        self.assertEqual(resultado.errores, [{'linea': 3, 'error': 'La huella digital ya está registrada'}])
+
+    def test_adjuntos_del_zip(self):
+        adjuntos = io.BytesIO()
+        with zipfile.ZipFile(adjuntos, 'w') as zip_adjuntos:
+            zip_adjuntos.writestr('ana.png', imagen_huella(81))
+            zip_adjuntos.writestr('ana.jpg', foto_sintetica(81, lado=(200, 150)))
+        texto = 'nombre,apellidos,sexo,telefono,correo,direccion,huella_digital,foto\n' \
+                'Ana,Pérez,mujer,5551234,ana@example.com,Calle 1,ana.png,ana.jpg\n' \
+                'Eva,Pérez,mujer,5551234,eva@example.com,Calle 1,falta.png,\n'
+        resultado = importar_personas(io.BytesIO(texto.encode('utf-8')), 'csv', adjuntos=adjuntos, workers=1)
+        self.assertEqual(resultado.creadas, 1)
+        self.assertEqual(resultado.errores, [{'linea': 3, 'error': 'falta.png: no existe en el ZIP de adjuntos'}])
+        persona = Persona.objects.get(nombre='Ana')
+        self.assertEqual(persona.huella_digest, sha256(imagen_huella(81)))
+        self.assertIsNotNone(persona.huella_template)
+        for campo in (persona.foto, persona.huella_digital, persona.qr_code):
+            self.assertTrue(default_storage.exists(campo.name))
+
+    def test_lote_fallido_no_deja_archivos_huerfanos(self):
+        previo = default_storage.save('qr/qr.png', ContentFile(b'ya guardado'))
+        with mock.patch.object(Persona.objects, 'bulk_create', side_effect=IntegrityError('falla')):
+            resultado = self.importar([('Ana', sha256(b'ana')), ('Raul', sha256(b'raul'))])
+        self.assertEqual(resultado.creadas, 0)
+        self.assertEqual(resultado.total_errores, 2)
+        # Solo queda el archivo que ya existía, con su referencia intacta
+        self.assertEqual(self.archivos_en_disco(), [previo])
+        self.assertEqual(list(ArchivoMedia.objects.values_list('ruta', 'referencias')), [(previo, 1)])
+
+    def test_exportacion(self):
+        crear_persona('Ana', huella_hex=sha256(b'ana'))
+        crear_persona('Eva')
+        csv = ''.join(exportar_personas(Persona.objects.all(), 'csv'))
+        lineas = csv.splitlines()
+        self.assertEqual(len(lineas), 3)
+        self.assertTrue(lineas[0].startswith('id,nombre,apellidos'))
+        self.assertIn(sha256(b'ana'), lineas[1])
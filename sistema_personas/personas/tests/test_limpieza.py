@@ -0,0 +1,77 @@
+import os
+import time
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+
+from .. import limpieza
+from ..limpieza import barrer_temporales, eliminar_temporales
+from ..models import ArchivoMedia
+from ..utils import remove_temp_files
+from .ayudantes import MediaTemporalMixin
+
+
+class BarridoTemporalesTests(MediaTemporalMixin, TestCase):
+    def envejecer(self, nombre, horas=48):
+        antes = time.time() - horas * 3600
+        os.utime(default_storage.path(nombre), (antes, antes))
+
+    def test_barrido_de_pendientes_libera_las_referencias(self):
+        abandonada = default_storage.save('pendientes/a.png', ContentFile(b'abandonada'))
+        default_storage.save('pendientes/b.png', ContentFile(b'abandonada'))
+        reciente = default_storage.save('pendientes/c.png', ContentFile(b'reciente'))
+        self.envejecer(abandonada)
+
+        self.assertEqual(barrer_temporales().archivos, 1)
+        self.assertFalse(default_storage.exists(abandonada))
+        self.assertFalse(ArchivoMedia.objects.filter(ruta=abandonada).exists())
+        self.assertTrue(default_storage.exists(reciente))
+        self.assertEqual(ArchivoMedia.objects.get(ruta=reciente).referencias, 1)
+        # Volver a subir el contenido empieza de cero
+        default_storage.save('pendientes/d.png', ContentFile(b'abandonada'))
+        self.assertEqual(ArchivoMedia.objects.get(ruta=abandonada).referencias, 1)
+
+    def test_reutilizar_un_archivo_lo_renueva(self):
+        nombre = default_storage.save('pendientes/a.png', ContentFile(b'subida'))
+        self.envejecer(nombre)
+        self.assertEqual(default_storage.save('pendientes/b.png', ContentFile(b'subida')), nombre)
+        self.assertEqual(barrer_temporales().archivos, 0)
+        self.assertEqual(ArchivoMedia.objects.get(ruta=nombre).referencias, 2)
+
+    def test_no_borra_lo_reutilizado_durante_el_recorrido(self):
+        nombre = default_storage.save('pendientes/a.png', ContentFile(b'subida'))
+        self.envejecer(nombre)
+        recorrer = limpieza._recorrer_archivos
+
+        def recorrer_y_reutilizar(directorio):
+            yield from recorrer(directorio)
+            if directorio == default_storage.path('pendientes'):
+                # Un borrador sube el mismo contenido entre el recorrido y el borrado
+                default_storage.save('pendientes/b.png', ContentFile(b'subida'))
+
+        with mock.patch.object(limpieza, '_recorrer_archivos', recorrer_y_reutilizar):
+            self.assertEqual(barrer_temporales().archivos, 0)
+        self.assertTrue(default_storage.exists(nombre))
+        self.assertEqual(ArchivoMedia.objects.get(ruta=nombre).referencias, 2)
+
+    def test_prefijo_exclusiones_y_simulacion(self):
+        viejo = default_storage.save('fotos/temp_a.jpg', ContentFile(b'temporal'))
+        en_uso = default_storage.save('fotos/temp_b.jpg', ContentFile(b'en uso'))
+        otro = default_storage.save('fotos/ana.jpg', ContentFile(b'foto'))
+        for nombre in (viejo, en_uso, otro):
+            self.envejecer(nombre)
+
+        argumentos = {'prefijo': os.path.basename(viejo)[:5], 'excluir': [en_uso]}
+        self.assertEqual(eliminar_temporales('fotos', dry_run=True, **argumentos), (1, len(b'temporal')))
+        self.assertTrue(default_storage.exists(viejo))
+        self.assertEqual(eliminar_temporales('fotos', **argumentos), (1, len(b'temporal')))
+        self.assertFalse(default_storage.exists(viejo))
+        self.assertTrue(default_storage.exists(en_uso))
+        self.assertTrue(default_storage.exists(otro))
+
+    def test_remove_temp_files_delega_en_limpieza(self):
+        with mock.patch.object(limpieza, 'eliminar_temporales', return_value=(0, 0)) as eliminar:
+            self.assertEqual(remove_temp_files('fotos', older_than_hours=6, prefijo='temp_'), (0, 0))
+        eliminar.assert_called_once_with('fotos', horas=6, prefijo='temp_')
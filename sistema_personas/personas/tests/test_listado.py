@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ..imagenes import nombre_miniatura, nombres_miniaturas, urls_miniaturas
+from ..listado import filas_lista, proyectar_persona
+from ..models import Persona, PersonaLista
+from ..storage import ContentAddressedStorage
+from ..templatetags.personas_imagenes import foto_responsiva
+from .ayudantes import MediaTemporalMixin, crear_persona, foto_sintetica
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        self.ids = [crear_persona(f'P{i}').pk for i in range(5)]
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(User.objects.create_user('lista'))
+        self.url = reverse('persona-list')
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        vistos = []
+        url = f'{self.url}?page_size=2'
+        paginas = 0
+        while url:
+            datos = self.cliente.get(url).json()
+            self.assertNotIn('count', datos)
+            vistos.extend(fila['id'] for fila in datos['results'])
+            url = datos['next']
+            paginas += 1
+        self.assertEqual(paginas, 3)
+        self.assertEqual(vistos, self.ids[::-1])
+
+    def test_pagina_anterior(self):
+        primera = self.cliente.get(f'{self.url}?page_size=2').json()
+        segunda = self.cliente.get(primera['next']).json()
+        anterior = self.cliente.get(segunda['previous']).json()
+        self.assertEqual(anterior['results'], primera['results'])
+
+    def test_tamano_maximo_de_pagina(self):
+        datos = self.cliente.get(f'{self.url}?page_size=1000').json()
+        self.assertEqual(len(datos['results']), 5)
+        self.assertIsNone(datos['next'])
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.cliente.get(f'{self.url}?cursor=no-es-un-cursor').status_code, 404)
+
+
+class ProyeccionListadoTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.persona = crear_persona('Eva', foto=ContentFile(foto_sintetica(3, lado=(600, 400)), name='foto.jpg'))
+
+    def fila(self):
+        return PersonaLista.objects.get(persona_id=self.persona.pk)
+
+    def test_guarda_los_nombres_de_las_miniaturas(self):
+        fila = self.fila()
+        self.assertEqual(fila.foto, self.persona.foto.name)
+        self.assertEqual(fila.miniaturas, nombres_miniaturas(self.persona.foto.name))
+        self.assertEqual(fila.miniaturas['pequena']['jpg'], nombre_miniatura(fila.foto, 'pequena', 'jpg'))
+
+    def test_sincronizada_al_guardar_y_eliminar(self):
+        self.persona.nombre = 'Eva María'
+        self.persona.foto = ContentFile(foto_sintetica(4, lado=(600, 400)), name='otra.jpg')
+        self.persona.save()
+        fila = self.fila()
+        self.assertEqual((fila.nombre, fila.foto), ('Eva María', self.persona.foto.name))
+        self.assertEqual(fila.miniaturas, nombres_miniaturas(self.persona.foto.name))
+
+        self.persona.foto = None
+        self.persona.save()
+        self.assertEqual((self.fila().foto, self.fila().miniaturas), ('', {}))
+
+        self.persona.delete()
+        self.assertFalse(PersonaLista.objects.exists())
+
+    def test_listar_no_deriva_nada_por_fila(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user('lista'))
+        fila = filas_lista().get()
+        with mock.patch.object(ContentAddressedStorage, 'content_digest', side_effect=AssertionError('por fila')), \
+                mock.patch.object(ContentAddressedStorage, 'exists', side_effect=AssertionError('exists()')):
+            datos = cliente.get(reverse('persona-list')).json()
+            html = foto_responsiva(fila['foto'], miniaturas=fila['miniaturas'])
+        urls = datos['results'][0]['foto_miniaturas']
+        self.assertTrue(urls['pequena']['jpg'].endswith(default_storage.url(fila['miniaturas']['pequena']['jpg'])))
+        self.assertIn(default_storage.url(fila['miniaturas']['pequena']['jpg']), html)
+
+    def test_foto_con_nombre_anterior_sin_miniaturas(self):
+        Persona.objects.filter(pk=self.persona.pk).update(foto='fotos/foto_eva.jpg')
+        proyectar_persona(Persona.objects.get(pk=self.persona.pk))
+        fila = filas_lista().get()
+        self.assertEqual(fila['miniaturas'], {})
+        self.assertEqual(urls_miniaturas(fila['foto'], fila['miniaturas'])['pequena']['jpg'],
+                         default_storage.url('fotos/foto_eva.jpg'))
@@ -0,0 +1,70 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from django.urls import reverse
+
+from ..media import CACHE_INMUTABLE, CACHE_REVALIDAR
+from .ayudantes import MediaTemporalMixin, sha256
+
+
+class ServirMediaTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.contenido = b'0123456789' * 10
+        self.nombre = default_storage.save('huellas/huella.png', ContentFile(self.contenido))
+        self.url = reverse('media', args=[self.nombre])
+        self.client.force_login(User.objects.create_user('operador'))
+
+    def test_requiere_sesion(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_etag_del_hash_e_inmutable(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido)
+        self.assertEqual(respuesta['ETag'], f'"{sha256(self.contenido)}"')
+        self.assertEqual(respuesta['Cache-Control'], CACHE_INMUTABLE)
+
+    def test_nombres_anteriores_se_revalidan(self):
+        nombre = 'fotos/foto_ana.jpg'
+        os.makedirs(default_storage.path('fotos'), exist_ok=True)
+        with open(default_storage.path(nombre), 'wb') as archivo:
+            archivo.write(self.contenido)
+        respuesta = self.client.get(reverse('media', args=[nombre]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], f'"{sha256(self.contenido)}"')
+        self.assertEqual(respuesta['Cache-Control'], CACHE_REVALIDAR)
+
+    def test_if_none_match_devuelve_304(self):
+        etag = self.client.get(self.url)['ETag']
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+        self.assertEqual(respuesta.content, b'')
+
+    def test_rango_parcial(self):
+        respuesta = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(respuesta['Content-Range'], f'bytes 10-19/{len(self.contenido)}')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido[10:20])
+        respuesta = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido[-5:])
+
+    def test_rango_con_if_range_obsoleto_devuelve_todo(self):
+        respuesta = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"otro"')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido)
+
+    def test_rango_no_satisfacible_devuelve_416(self):
+        respuesta = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.contenido)}-')
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], f'bytes */{len(self.contenido)}')
+
+    def test_carpetas_privadas_y_rutas_fuera_de_media(self):
+        pendiente = default_storage.save('pendientes/huella.png', ContentFile(b'pendiente'))
+        self.assertEqual(self.client.get(reverse('media', args=[pendiente])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['../settings.py'])).status_code, 404)
@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ..metricas import MetricasMiddleware, _registrar_consulta, instalar_contador_consultas, registro
+
+
+@override_settings(METRICAS_TOKEN='')
+class ExponerMetricasTests(TestCase):
+    def setUp(self):
+        self.url = reverse('metricas')
+
+    def test_anonimo_y_usuario_sin_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.force_login(User.objects.create_user('operador'))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_staff(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_con_token_solo_el_bearer_correcto(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        for cabecera in ('Bearer otro', 'secreto', 'Basic secreto', 'Bearer secreto '):
+            with self.subTest(cabecera=cabecera):
+                self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=cabecera).status_code, 401)
+        # Con token configurado la sesión de staff no basta
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+
+class ContadorConsultasTests(TestCase):
+    def setUp(self):
+        registro.reiniciar()
+        self.addCleanup(registro.reiniciar)
+
+    def instalados(self):
+        return connection.execute_wrappers.count(_registrar_consulta)
+
+    def test_se_instala_una_sola_vez_por_conexion(self):
+        while _registrar_consulta in connection.execute_wrappers:
+            connection.execute_wrappers.remove(_registrar_consulta)
+        connection_created.send(sender=connection.__class__, connection=connection)
+        connection_created.send(sender=connection.__class__, connection=connection)
+        instalar_contador_consultas(None, connection)
+        MetricasMiddleware(lambda request: HttpResponse())
+        self.assertEqual(self.instalados(), 1)
+
+    def test_cuenta_las_consultas_de_la_peticion(self):
+        instalar_contador_consultas(None, connection)
+
+        def vista(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/prueba/')
+        request.resolver_match = None
+        MetricasMiddleware(vista)(request)
+        # Fuera de una petición las consultas no se cuentan
+        list(User.objects.all())
+        self.assertIn('personas_db_queries_total{ruta="sin_ruta",metodo="GET"} 2', registro.texto().splitlines())
@@ -0,0 +1,96 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import tasks
+from ..models import ArchivoMedia, Persona, PersonaEliminada, TareaRegistro
+from ..tasks import (
+    MAX_INTENTOS,
+    encolar_registro,
+    procesar_pendientes,
+    procesar_registro,
+    reclamar_tarea,
+    recuperar_tareas_abandonadas,
+)
+from .ayudantes import MediaTemporalMixin, crear_persona, imagen_huella, sha256
+
+
+class ColaRegistroTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.huella = imagen_huella(52)
+        self.tarea = encolar_registro(Persona(nombre='Luis', apellidos='Gómez', huella_hex=sha256(self.huella)),
+                                      ContentFile(self.huella))
+
+    def test_reclamar_marca_la_tarea_y_cuenta_el_intento(self):
+        tarea = reclamar_tarea()
+        self.assertEqual(tarea.pk, self.tarea.pk)
+        self.assertEqual(tarea.estado, TareaRegistro.PROCESANDO)
+        self.assertEqual(tarea.intentos, 1)
+        # Ya reclamada: otro worker no la obtiene
+        self.assertIsNone(reclamar_tarea())
+
+    def test_procesar_promueve_la_huella_y_genera_el_qr(self):
+        self.assertEqual(procesar_pendientes(), 1)
+        persona = Persona.objects.get(pk=self.tarea.persona_id)
+        self.assertEqual(persona.estado_procesamiento, Persona.PROCESAMIENTO_COMPLETADO)
+        self.assertEqual(persona.huella_hex, sha256(self.huella))
+        self.assertTrue(persona.huella_digital.name.startswith('huellas/'))
+        self.assertTrue(default_storage.exists(persona.qr_code.name))
+        self.assertFalse(default_storage.exists(self.tarea.huella_temp))
+        self.assertEqual(TareaRegistro.objects.get(pk=self.tarea.pk).estado, TareaRegistro.COMPLETADA)
+
+    def test_error_reintenta_hasta_el_maximo(self):
+        with mock.patch.object(tasks, 'generate_qr_from_hash', side_effect=RuntimeError('sin QR')), \
+                self.assertLogs('personas.tasks', 'ERROR'):
+            for intento in range(1, MAX_INTENTOS + 1):
+                tarea = reclamar_tarea()
+                self.assertEqual(tarea.intentos, intento)
+                self.assertFalse(procesar_registro(tarea))
+                tarea.refresh_from_db()
+                self.assertEqual(tarea.error, 'sin QR')
+                if intento < MAX_INTENTOS:
+                    self.assertEqual(tarea.estado, TareaRegistro.PENDIENTE)
+                    self.assertTrue(default_storage.exists(tarea.huella_temp))
+        self.assertEqual(tarea.estado, TareaRegistro.ERROR)
+        self.assertIsNone(reclamar_tarea())
+        persona = Persona.objects.get(pk=tarea.persona_id)
+        self.assertEqual(persona.estado_procesamiento, Persona.PROCESAMIENTO_ERROR)
+        self.assertFalse(default_storage.exists(tarea.huella_temp))
+
+    def test_tareas_abandonadas_vuelven_a_la_cola(self):
+        reclamar_tarea()
+        self.assertEqual(recuperar_tareas_abandonadas(), 0)
+        TareaRegistro.objects.filter(pk=self.tarea.pk).update(
+            fecha_actualizacion=timezone.now() - timedelta(minutes=11))
+        self.assertEqual(recuperar_tareas_abandonadas(), 1)
+        self.assertEqual(reclamar_tarea().intentos, 2)
+
+
+@override_settings(REGISTRO_PROCESAMIENTO_ASINCRONO=False)
+class RegistroDuplicadoTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.huella = imagen_huella(51)
+        self.registrada = crear_persona(huella=self.huella)
+
+    def test_el_indice_unico_rechaza_la_huella_al_encolar(self):
+        with self.assertRaises(IntegrityError):
+            encolar_registro(Persona(nombre='Luis', huella_hex=sha256(self.huella)), ContentFile(self.huella))
+        self.assertFalse(ArchivoMedia.objects.filter(ruta__startswith='pendientes/').exists())
+
+    def test_el_worker_descarta_el_registro_duplicado(self):
+        # Tarea encolada sin huella_hex, como las anteriores a la comprobación
+        tarea = encolar_registro(Persona(nombre='Luis', apellidos='Gómez'), ContentFile(self.huella))
+        persona_id = tarea.persona_id
+        with self.assertLogs('personas.tasks', 'ERROR'):
+            self.assertFalse(procesar_registro(tarea))
+        self.assertFalse(Persona.objects.filter(pk=persona_id).exists())
+        self.assertFalse(TareaRegistro.objects.filter(pk=tarea.pk).exists())
+        self.assertTrue(PersonaEliminada.objects.filter(persona_id=persona_id).exists())
+        self.assertFalse(default_storage.exists(tarea.huella_temp))
@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import views
+from ..borradores import guardar_borrador
+from ..models import Persona, TareaRegistro
+from ..uploadhandlers import HashingUploadHandler
+from .ayudantes import MediaTemporalMixin, imagen_huella, sha256
+
+TOKEN_CSRF = 'a' * 32
+
+
+@override_settings(REGISTRO_PROCESAMIENTO_ASINCRONO=False)
+class RegistroPaso3Tests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('operador')
+        guardar_borrador(self.usuario, datos={
+            'nombre': 'Luis', 'apellidos': 'Gómez', 'sexo': True, 'telefono': '5551234',
+            'correo': 'luis@example.com', 'direccion': 'Calle 1',
+        })
+        self.huella = imagen_huella(53)
+        self.cliente = Client(enforce_csrf_checks=True)
+        self.cliente.force_login(self.usuario)
+        self.cliente.cookies['csrftoken'] = TOKEN_CSRF
+
+    def enviar(self, **datos):
+        return self.cliente.post(reverse('registro_paso3'), {'huella': ContentFile(self.huella, name='huella.png'),
+                                                              **datos})
+
+    def test_sin_token_csrf_responde_403(self):
+        respuesta = self.enviar()
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertFalse(Persona.objects.exists())
+        self.assertFalse(TareaRegistro.objects.exists())
+
+    def test_digest_guardado_es_el_sha256_de_la_subida(self):
+        # El hash sale del manejador de subida, sin volver a leer el archivo
+        with mock.patch.object(views, 'generate_sha256_from_image', side_effect=AssertionError('releído')), \
+                self.assertLogs('personas.views', 'INFO'):
+            respuesta = self.enviar(csrfmiddlewaretoken=TOKEN_CSRF)
+        persona = Persona.objects.get()
+        self.assertRedirects(respuesta, reverse('registro_estado', args=[persona.pk]), fetch_redirect_response=False)
+        self.assertEqual(persona.huella_hex, sha256(self.huella))
+        self.assertEqual(persona.huella_digest, sha256(self.huella))
+        self.assertEqual(persona.estado_procesamiento, Persona.PROCESAMIENTO_COMPLETADO)
+
+    def test_manejador_instalado_antes_de_leer_el_cuerpo(self):
+        instalados = []
+
+        class Espia(HashingUploadHandler):
+            def __init__(self, request=None, **kwargs):
+                # Si el cuerpo ya se hubiera leído, request._files existiría
+                instalados.append(hasattr(request, '_files'))
+                super().__init__(request, **kwargs)
+
+        with mock.patch.object(views, 'HashingUploadHandler', Espia), self.assertLogs('personas.views', 'INFO'):
+            self.enviar(csrfmiddlewaretoken=TOKEN_CSRF)
+        self.assertEqual(instalados, [False])
+        self.assertEqual(Persona.objects.get().huella_digest, sha256(self.huella))
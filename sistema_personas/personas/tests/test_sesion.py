@@ -0,0 +1,84 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from .. import middleware
+from ..borradores import guardar_borrador, obtener_borrador, purgar_borradores_vencidos
+from ..middleware import CLAVE_RENOVACION, RenovarSesionMiddleware
+from ..models import RegistroBorrador
+from .ayudantes import MediaTemporalMixin
+
+
+class RenovarSesionTests(TestCase):
+    def setUp(self):
+        self.middleware = RenovarSesionMiddleware(lambda request: HttpResponse())
+        self.sesion = SessionStore()
+        self.sesion['_auth_user_id'] = '1'
+        self.sesion.save()
+        self.sesion = SessionStore(self.sesion.session_key)
+
+    def procesar(self, ahora):
+        request = RequestFactory().get('/')
+        request.session = self.sesion
+        with mock.patch.object(middleware.time, 'time', return_value=ahora):
+            self.middleware(request)
+        return self.sesion.modified
+
+    def test_renueva_solo_despues_de_media_vida(self):
+        media_vida = settings.SESSION_COOKIE_AGE // 2
+        inicio = 1_000_000
+        self.assertTrue(self.procesar(inicio))
+        self.assertEqual(self.sesion[CLAVE_RENOVACION], inicio)
+        self.sesion.save()
+        self.sesion = SessionStore(self.sesion.session_key)
+
+        self.assertFalse(self.procesar(inicio + media_vida))
+        self.assertTrue(self.procesar(inicio + media_vida + 1))
+        self.assertEqual(self.sesion[CLAVE_RENOVACION], inicio + media_vida + 1)
+
+    def test_no_toca_las_sesiones_vacias(self):
+        self.sesion = SessionStore()
+        self.assertFalse(self.procesar(1_000_000))
+        self.assertIsNone(self.sesion.session_key)
+
+
+class BorradoresTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('operador')
+
+    def vencer(self, usuario):
+        RegistroBorrador.objects.filter(usuario=usuario).update(expira=timezone.now() - timedelta(seconds=1))
+
+    def test_borrador_vencido_no_se_devuelve(self):
+        guardar_borrador(self.usuario, datos={'nombre': 'Ana'})
+        self.assertEqual(obtener_borrador(self.usuario).datos, {'nombre': 'Ana'})
+        self.vencer(self.usuario)
+        self.assertIsNone(obtener_borrador(self.usuario))
+
+    def test_purga_los_vencidos_y_sus_fotos(self):
+        foto = default_storage.save('pendientes/foto.jpg', ContentFile(b'foto temporal'))
+        guardar_borrador(self.usuario, datos={'nombre': 'Ana'}, foto_path=foto)
+        vigente = User.objects.create_user('otro')
+        guardar_borrador(vigente, datos={'nombre': 'Eva'})
+        self.vencer(self.usuario)
+
+        self.assertEqual(purgar_borradores_vencidos(), 1)
+        self.assertFalse(RegistroBorrador.objects.filter(usuario=self.usuario).exists())
+        self.assertFalse(default_storage.exists(foto))
+        self.assertIsNotNone(obtener_borrador(vigente))
+
+    def test_iniciar_un_registro_purga_los_abandonados(self):
+        abandonado = User.objects.create_user('otro')
+        guardar_borrador(abandonado, datos={'nombre': 'Eva'})
+        self.vencer(abandonado)
+        guardar_borrador(self.usuario, datos={'nombre': 'Ana'})
+        self.assertEqual(list(RegistroBorrador.objects.values_list('usuario', flat=True)), [self.usuario.pk])
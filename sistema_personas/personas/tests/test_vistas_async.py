@@ -0,0 +1,104 @@
+import json
+import base64
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, TestCase, override_settings
+
+from .. import views, views_async
+from ..asincrono import en_executor
+from .ayudantes import MediaTemporalMixin, crear_persona, imagen_huella, sha256
+
+
+def ejecutar(vista, request):
+    return async_to_sync(vista)(request)
+
+
+@override_settings(HUELLA_CALIDAD_MINIMA=0)
+class CapturaHuellaAsyncTests(TestCase):
+    def setUp(self):
+        self.huella = imagen_huella(33)
+        self.en_executor = []
+
+    async def registrar_executor(self, func, *args, **kwargs):
+        self.en_executor.append(func)
+        return await en_executor(func, *args, **kwargs)
+
+    def capturar(self, *args, **kwargs):
+        request = RequestFactory().post('/api/capturar-huella/', *args, **kwargs)
+        with mock.patch.object(views_async, 'en_executor', self.registrar_executor):
+            return ejecutar(views_async.capturar_huella, request)
+
+    def test_octet_stream_lee_el_cuerpo_en_la_corrutina(self):
+        respuesta = self.capturar(data=self.huella, content_type='application/octet-stream')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(json.loads(respuesta.content)['huella_hex'], sha256(self.huella))
+        self.assertEqual(self.en_executor, [views_async.comprobar_huella_capturada, views_async.codigo_qr])
+
+    def test_multipart_y_json(self):
+        respuesta = self.capturar(data={'imagen': ContentFile(self.huella, name='huella.png'), 'formato_qr': 'svg'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(b'<svg', respuesta.content)
+        datos = 'data:image/png;base64,' + base64.b64encode(self.huella).decode()
+        respuesta = self.capturar(data={'imagen': datos}, content_type='application/json')
+        self.assertEqual(json.loads(respuesta.content)['huella_hex'], sha256(self.huella))
+
+    def test_errores_antes_del_executor(self):
+        with mock.patch.object(views, 'MAX_TAMANO_HUELLA', len(self.huella) - 1):
+            respuesta = self.capturar(data=self.huella, content_type='application/octet-stream')
+        self.assertEqual(respuesta.status_code, 413)
+        respuesta = self.capturar(data=self.huella, content_type='application/octet-stream',
+                                  QUERY_STRING='formato_qr=gif')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.en_executor, [])
+        respuesta = ejecutar(views_async.capturar_huella, RequestFactory().get('/api/capturar-huella/'))
+        self.assertEqual(respuesta.status_code, 405)
+
+    @override_settings(HUELLA_CALIDAD_MINIMA=0.4)
+    def test_control_de_calidad_en_el_executor(self):
+        respuesta = self.capturar(data=self.huella, content_type='application/octet-stream')
+        self.assertEqual(json.loads(respuesta.content)['huella_hex'], sha256(self.huella))
+        respuesta = self.capturar(data=b'no es una imagen', content_type='application/octet-stream')
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertIn(views_async.comprobar_huella_capturada, self.en_executor)
+
+
+class BuscarPorHuellaAsyncTests(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.huella = imagen_huella(34)
+        self.persona = crear_persona(huella=self.huella)
+        self.usuario = User.objects.create_user('operador')
+
+    def buscar(self, data=None, usuario=None, metodo='post', csrf=False):
+        request = getattr(RequestFactory(), metodo)('/api/personas/buscar_por_huella/', data or {})
+        request.user = usuario or AnonymousUser()
+        request._dont_enforce_csrf_checks = not csrf
+        return ejecutar(views_async.buscar_por_huella, request)
+
+    def test_anonimo_rechazado_por_drf(self):
+        respuesta = self.buscar({'huella': ContentFile(self.huella, name='huella.png')})
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertIn('detail', json.loads(respuesta.content))
+
+    def test_sesion_sin_token_csrf(self):
+        respuesta = self.buscar({'huella': ContentFile(self.huella, name='huella.png')}, self.usuario, csrf=True)
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertIn('CSRF', json.loads(respuesta.content)['detail'])
+
+    def test_metodo_no_permitido(self):
+        self.assertEqual(self.buscar(usuario=self.usuario, metodo='get').status_code, 405)
+
+    def test_encontrada_no_encontrada_y_sin_archivo(self):
+        respuesta = self.buscar({'huella': ContentFile(self.huella, name='huella.png')}, self.usuario)
+        self.assertEqual(respuesta.status_code, 200)
+        datos = json.loads(respuesta.content)
+        self.assertEqual(datos['id'], self.persona.pk)
+        self.assertEqual(datos['similitud'], 1.0)
+        self.assertNotIn('huella_template', datos)
+
+        respuesta = self.buscar({'huella': ContentFile(b'no es una imagen', name='huella.png')}, self.usuario)
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertEqual(self.buscar({}, self.usuario).status_code, 400)
@@ -0,0 +1,36 @@
+"""
+Manejadores de subida que procesan los archivos mientras se reciben.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Calcula el SHA-256 de cada archivo subido conforme llegan sus fragmentos.
+
+    Con discard=True los fragmentos no se pasan a los siguientes manejadores,
+    así que el archivo nunca se guarda en memoria ni en disco; los hashes
+    quedan en self.digests y los tamaños en self.sizes, por nombre de campo.
+    """
+
+    def __init__(self, request=None, discard=False):
+        super().__init__(request)
+        self.discard = discard
+        self.digests = {}
+        self.sizes = {}
+        self._hasher = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hasher.update(raw_data)
+        return None if self.discard else raw_data
+
+    def file_complete(self, file_size):
+        self.digests[self.field_name] = self._hasher.hexdigest()
+        self.sizes[self.field_name] = file_size
+        return None
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
@@ -6,8 +7,20 @@ from . import views
 router = DefaultRouter()
 router.register(r'personas', views.PersonaViewSet)
 
+# Endpoints biométricos: variantes asíncronas cuando se despliega con ASGI
+if settings.VISTAS_ASYNC:
+    from . import views_async as vistas_huella
+    api_async = [
+        # Antes del router para reemplazar la acción buscar_por_huella de PersonaViewSet
+        path('api/personas/buscar_por_huella/', vistas_huella.buscar_por_huella, name='persona-buscar-por-huella'),
+    ]
+else:
+    vistas_huella = views
+    api_async = []
+
 urlpatterns = [
     # API endpoints
+    *api_async,
     path('api/', include(router.urls)),
     
     # Vistas de la interfaz web
@@ -21,10 +34,11 @@ urlpatterns = [
     path('registro/paso1/', views.registro_paso1, name='registro_paso1'),
     path('registro/paso2/', views.registro_paso2, name='registro_paso2'),
     path('registro/paso3/', views.registro_paso3, name='registro_paso3'),
+    path('registro/<int:pk>/estado/', views.registro_estado, name='registro_estado'),
     
     # Búsqueda por huella
-    path('busqueda/', views.busqueda_huella, name='busqueda_huella'),
+    path('busqueda/', vistas_huella.busqueda_huella, name='busqueda_huella'),
     
     # Endpoint para capturar huella
-    path('api/capturar-huella/', views.capturar_huella, name='capturar_huella'),
+    path('api/capturar-huella/', vistas_huella.capturar_huella, name='capturar_huella'),
 ]
\ No newline at end of file
@@ -1,11 +1,14 @@
 import os
 import uuid
 import hashlib
-from PIL import Image
+from PIL import Image, ImageOps
 from io import BytesIO
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 
+from .metricas import medir_imagen
+
+@medir_imagen
 def optimize_image(image, max_size=(800, 800), quality=85, format='JPEG'):
     """
     Optimiza una imagen para reducir su tamaño, manteniendo una buena calidad.
@@ -22,8 +25,10 @@ def optimize_image(image, max_size=(800, 800), quality=85, format='JPEG'):
     if not image:
         return None
         
-    # Abrir imagen
-    img = Image.open(image)
+    # Abrir imagen y aplicar la orientación EXIF (fotos de cámaras y teléfonos)
+    if hasattr(image, 'seek'):
+        image.seek(0)
+    img = ImageOps.exif_transpose(Image.open(image))
     
     # Convertir a RGB si es necesario (para evitar problemas con RGBA)
     if img.mode not in ('L', 'RGB'):
@@ -100,12 +105,18 @@ def validate_file_size(file, max_size_mb=5):
         
     return file.size <= max_size_mb * 1024 * 1024
 
-def remove_temp_files(temp_dir='temp', older_than_hours=24):
+def remove_temp_files(temp_dir='temp', older_than_hours=24, **kwargs):
     """
     Elimina archivos temporales del almacenamiento.
     
     Args:
-        temp_dir: Directorio temporal
+        temp_dir: Directorio temporal, relativo a MEDIA_ROOT
         older_than_hours: Eliminar archivos más antiguos que estas horas
+        **kwargs: Opciones de personas.limpieza.eliminar_temporales
+
+    Returns:
+        tuple: (archivos eliminados, bytes liberados)
     """
-    pass  # Implementación depende del almacenamiento específico
\ No newline at end of file
+    from .limpieza import eliminar_temporales
+
+    return eliminar_temporales(temp_dir, horas=older_than_hours, **kwargs)
@@ -1,45 +1,88 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import IntegrityError
 from django.db.models import Q
 
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.permissions import IsAdminUser
 
 import json
+import logging
+import tempfile
 import base64
-import qrcode
-import hashlib
-from io import BytesIO
-from PIL import Image
+import zipfile
 
-from .models import Persona
+from .models import Persona, TareaRegistro
+from .borradores import eliminar_borrador, guardar_borrador, obtener_borrador
+from .listado import filas_lista
+from .cache import datos_lista, datos_persona, obtener_persona, estadisticas as estadisticas_cache
+from .bulk import detectar_formato, exportar_personas, importar_personas
+from .cambios import CursorVencido, decodificar_cursor, generar_ndjson
+from .pagination import PersonaCursorPagination
+from .search import IndiceBusquedaFilter, buscar
 from .serializers import PersonaSerializer, PersonaListSerializer
-from .biometrics import process_fingerprint, compare_fingerprint
+from .biometrics import (
+    FingerprintQualityError,
+    check_fingerprint_quality,
+    generate_sha256_from_image,
+    generate_sha256_from_stream,
+    get_min_quality,
+)
+from .matching import identify_fingerprint, identify_fingerprints, template_cache
+from .qr import qr_matrix, qr_png, qr_svg
+from .uploadhandlers import HashingUploadHandler
+from .tasks import HUELLA_DUPLICADA, encolar_registro, preparar_foto, procesamiento_asincrono, procesar_registro
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
+# Tamaño máximo aceptado para una imagen de huella (igual que HuellaDigitalForm)
+MAX_TAMANO_HUELLA = 5 * 1024 * 1024
+
 # API REST ViewSets
 class PersonaViewSet(viewsets.ModelViewSet):
     queryset = Persona.objects.all()
     serializer_class = PersonaSerializer
     parser_classes = (MultiPartParser, FormParser)
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [IndiceBusquedaFilter]
     search_fields = ['nombre', 'apellidos', 'correo', 'huella_hex']
+    pagination_class = PersonaCursorPagination
+
+    def get_queryset(self):
+        if self.action == 'list':
+            # Proyección de lectura: diccionarios sin instanciar modelos
+            return filas_lista()
+        return super().get_queryset()
 
     def get_serializer_class(self):
         if self.action == 'list':
             return PersonaListSerializer
         return PersonaSerializer
 
+    def list(self, request, *args, **kwargs):
+        # Páginas en caché por generación de personas (ver personas.cache)
+        return Response(datos_lista(request, lambda: super(PersonaViewSet, self).list(request, *args, **kwargs).data))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Datos serializados en caché por versión de la persona; las URLs son absolutas
+        datos = datos_persona(
+            self.kwargs[self.lookup_url_kwarg or self.lookup_field], f'api:{request.get_host()}',
+            lambda: super(PersonaViewSet, self).retrieve(request, *args, **kwargs).data,
+        )
+        return Response(datos)
+
     @action(detail=False, methods=['post'])
     def buscar_por_huella(self, request):
         if 'huella' not in request.FILES:
@@ -47,15 +90,129 @@ class PersonaViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_400_BAD_REQUEST)
         
         huella_image = request.FILES['huella']
-        huella_hex = process_fingerprint(huella_image)[0]
         
-        persona = Persona.objects.filter(huella_hex=huella_hex).first()
+        # Coincidencia exacta por huella_digest o aproximada por plantilla
+        persona, similitud = identify_fingerprint(huella_image)
         if persona:
             serializer = self.get_serializer(persona)
-            return Response(serializer.data)
+            data = serializer.data
+            data['similitud'] = round(similitud, 4)
+            return Response(data)
         return Response({"message": "No se encontró ninguna persona con esa huella digital"}, 
                         status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=False, methods=['post'])
+    def buscar_por_huellas(self, request):
+        """
+        Identificación por lotes: hasta HUELLA_LOTE_MAXIMO archivos en el campo
+        'huellas', resueltos con una consulta por lote en lugar de una por
+        huella. Devuelve un resultado por archivo, en el orden recibido.
+        """
+        archivos = request.FILES.getlist('huellas')
+        if not archivos:
+            return Response({"error": "No se proporcionaron archivos de huella digital"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        maximo = getattr(settings, 'HUELLA_LOTE_MAXIMO', 50)
+        if len(archivos) > maximo:
+            return Response({"error": f"Se admiten como máximo {maximo} huellas por petición"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        validos = [archivo for archivo in archivos if archivo.size <= MAX_TAMANO_HUELLA]
+        identificadas = iter(identify_fingerprints(validos))
+        serializadas = {}
+        resultados = []
+        for indice, archivo in enumerate(archivos):
+            resultado = {'indice': indice, 'archivo': archivo.name, 'encontrada': False}
+            if archivo.size > MAX_TAMANO_HUELLA:
+                resultado['error'] = "El archivo de huella es demasiado grande"
+                resultados.append(resultado)
+                continue
+            persona, similitud = next(identificadas)
+            if persona:
+                if persona.pk not in serializadas:
+                    serializadas[persona.pk] = self.get_serializer(persona).data
+                resultado.update(encontrada=True, similitud=round(similitud, 4), persona=serializadas[persona.pk])
+            resultados.append(resultado)
+        return Response({
+            'total': len(resultados),
+            'encontradas': sum(1 for resultado in resultados if resultado['encontrada']),
+            'resultados': resultados,
+        })
+
+    @action(detail=True, methods=['get'])
+    def estado(self, request, pk=None):
+        """Estado del procesamiento en segundo plano de un registro"""
+        persona = self.get_object()
+        tarea = TareaRegistro.objects.filter(persona=persona).only('estado', 'error').first()
+        return Response({
+            'id': persona.id,
+            'estado_procesamiento': persona.estado_procesamiento,
+            'error': tarea.error if tarea else '',
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_huellas(self, request):
+        """Contadores de la caché de huellas de este proceso"""
+        return Response(template_cache.stats())
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_respuestas(self, request):
+        """Aciertos y fallos de la caché de detalle y listados de este proceso"""
+        return Response(estadisticas_cache())
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def importar(self, request):
+        """
+        Importación masiva desde CSV o NDJSON ('archivo') con un ZIP opcional
+        de fotos y huellas ('adjuntos'). Ver personas.bulk.
+        """
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({"error": "No se proporcionó el archivo a importar"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            formato = detectar_formato(archivo.name, request.data.get('formato'))
+            resultado = importar_personas(archivo, formato, adjuntos=request.FILES.get('adjuntos'))
+        except (ValueError, zipfile.BadZipFile) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado.como_dict())
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def exportar(self, request):
+        """Exportación en CSV o NDJSON (?formato=) enviada por partes; admite ?search="""
+        try:
+            formato = detectar_formato('', request.query_params.get('formato', 'csv'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(Persona.objects.all())
+        content_type = 'text/csv; charset=utf-8' if formato == 'csv' else 'application/x-ndjson; charset=utf-8'
+        response = StreamingHttpResponse(exportar_personas(queryset, formato), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="personas.{formato}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def cambios(self, request):
+        """
+        Feed de cambios en NDJSON para la sincronización incremental: altas,
+        modificaciones y bajas posteriores al cursor ?desde= (vacío = todo),
+        como mucho ?limite= (1000). Ver personas.cambios.
+        """
+        try:
+            limite = int(request.query_params.get('limite', 1000))
+        except ValueError:
+            return Response({"error": "limite debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            cursor = decodificar_cursor(request.query_params.get('desde'))
+        except CursorVencido as e:
+            return Response({"error": str(e)}, status=status.HTTP_410_GONE)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        limite = max(1, min(limite, getattr(settings, 'CAMBIOS_LIMITE_MAXIMO', 10000)))
+        # Un solo serializador: instanciarlo por persona copia sus campos cada vez
+        serializador = PersonaSerializer(context=self.get_serializer_context())
+        lineas = generar_ndjson(cursor, limite, serializador.to_representation)
+        return StreamingHttpResponse(lineas, content_type='application/x-ndjson; charset=utf-8')
+
     @action(detail=False, methods=['get'])
     def buscar(self, request):
         query = request.query_params.get('q', '')
@@ -63,14 +220,10 @@ class PersonaViewSet(viewsets.ModelViewSet):
             return Response({"error": "Se requiere un término de búsqueda"}, 
                             status=status.HTTP_400_BAD_REQUEST)
         
-        personas = Persona.objects.filter(
-            Q(nombre__icontains=query) | 
-            Q(apellidos__icontains=query) | 
-            Q(correo__icontains=query) |
-            Q(telefono__icontains=query)
-        )
+        # Índice de texto completo: por prefijo, sin acentos y por relevancia
+        personas = buscar(filas_lista(), query)
         
-        serializer = PersonaListSerializer(personas, many=True)
+        serializer = PersonaListSerializer(personas, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
 # Vistas para la interfaz web
@@ -89,22 +242,18 @@ class PersonaListView(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = filas_lista()
         busqueda = self.request.GET.get('q')
         if busqueda:
-            queryset = queryset.filter(
-                Q(nombre__icontains=busqueda) | 
-                Q(apellidos__icontains=busqueda) | 
-                Q(correo__icontains=busqueda) |
-                Q(telefono__icontains=busqueda)
-            )
+            queryset = buscar(queryset, busqueda)
         return queryset
 
 @login_required
 def registro_paso1(request):
+    borrador = obtener_borrador(request.user)
     if request.method == 'POST':
-        # Guardar datos básicos en sesión, incluyendo los nuevos campos de dirección
-        request.session['registro_persona'] = {
+        # Guardar datos básicos en el borrador, incluyendo los nuevos campos de dirección
+        guardar_borrador(request.user, datos={
             'nombre': request.POST.get('nombre'),
             'apellidos': request.POST.get('apellidos'),
             'sexo': request.POST.get('sexo') == '1',
@@ -117,133 +266,91 @@ def registro_paso1(request):
             'municipio': request.POST.get('municipio'),
             'colonia': request.POST.get('colonia'),
             'calle_numero': request.POST.get('calle_numero')
-        }
+        })
         return redirect('registro_paso2')
     
-    return render(request, 'personas/registro_paso1.html')
+    return render(request, 'personas/registro_paso1.html', {'borrador': borrador.datos if borrador else {}})
 
 @login_required
 def registro_paso2(request):
     """
     Vista para el paso 2 del registro: Captura de fotografía.
-    Guarda la imagen ya sea cargada o capturada con la cámara.
+    Normaliza la imagen, ya sea cargada o capturada con la cámara, y la
+    guarda una sola vez en pendientes/ (ver tasks.preparar_foto).
     """
-    if 'registro_persona' not in request.session:
+    borrador = obtener_borrador(request.user)
+    if borrador is None:
         return redirect('registro_paso1')
     
     if request.method == 'POST':
-        foto_guardada = False
+        foto = None
+        origen = ''
         
         # Verificar si se ha cargado un archivo
         if 'foto' in request.FILES and request.FILES['foto']:
-            try:
-                # Guardar el archivo físicamente para verificar después
-                from django.core.files.storage import FileSystemStorage
-                import os
-                from django.conf import settings
-                
-                # Crear directorio si no existe
-                os.makedirs(os.path.join(settings.MEDIA_ROOT, 'fotos'), exist_ok=True)
-                
-                # Guardar el archivo directamente
-                foto = request.FILES['foto']
-                
-                # Guardar el archivo en memoria para usarlo en paso 3
-                request.session['registro_persona']['foto_temp'] = {
-                    'nombre': foto.name,
-                    'content_type': foto.content_type,
-                    'size': foto.size
-                }
-                
-                # También guardamos una copia en disco para respaldo
-                fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'fotos'))
-                filename = fs.save(f"temp_{request.user.id}_{foto.name}", foto)
-                
-                # Guardar la información en la sesión
-                request.session['registro_persona']['foto_path'] = os.path.join('fotos', filename)
-                request.session.modified = True  # Forzar actualización de la sesión
-                
-                foto_guardada = True
-                print(f"Foto cargada desde archivo y guardada en: {request.session['registro_persona']['foto_path']}")
-                
-            except Exception as e:
-                print(f"Error al guardar la foto desde archivo: {str(e)}")
-                return render(request, 'personas/registro_paso2.html', {
-                    'error': f'Error al procesar la imagen: {str(e)}'
-                })
+            foto = request.FILES['foto']
+            origen = 'archivo'
         
         # Verificar si se ha capturado una foto con la cámara
         elif request.POST.get('foto_base64'):
+            origen = 'cámara'
             try:
-                # Si se capturó con la cámara
                 img_data = request.POST.get('foto_base64').split(',')[1]
-                img_binary = base64.b64decode(img_data)
-                
-                # Guardar en disco para respaldo
-                from django.core.files.storage import FileSystemStorage
-                import os
-                import uuid
-                from django.conf import settings
-                
-                # Crear directorio si no existe
-                os.makedirs(os.path.join(settings.MEDIA_ROOT, 'fotos'), exist_ok=True)
-                
-                # Guardar la imagen con un nombre único
-                filename = f"temp_camera_{request.user.id}_{uuid.uuid4()}.png"
-                fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'fotos'))
-                
-                # Guardamos archivo en disco
-                from django.core.files.base import ContentFile
-                temp_file = ContentFile(img_binary)
-                filename = fs.save(filename, temp_file)
-                
-                # Guardar la información en la sesión
-                request.session['registro_persona']['foto_path'] = os.path.join('fotos', filename)
-                request.session['registro_persona']['foto_from_camera'] = True
-                request.session.modified = True  # Forzar actualización de la sesión
-                
-                foto_guardada = True
-                print(f"Foto capturada desde cámara y guardada en: {request.session['registro_persona']['foto_path']}")
-                
-            except Exception as e:
-                print(f"Error al guardar la foto desde cámara: {str(e)}")
+                foto = ContentFile(base64.b64decode(img_data), name='camara.png')
+            except (IndexError, ValueError) as e:
+                logger.warning("Foto de cámara inválida: %s", e)
                 return render(request, 'personas/registro_paso2.html', {
                     'error': f'Error al procesar la imagen de la cámara: {str(e)}'
                 })
         
-        # Si no se guardó ninguna foto, mostrar un error
-        if not foto_guardada:
+        # Si no se recibió ninguna foto, mostrar un error
+        if foto is None:
             return render(request, 'personas/registro_paso2.html', {
                 'error': 'Por favor, seleccione una imagen o capture una foto con la cámara.'
             })
         
-        # Verificar que la información se guardó en la sesión
-        if 'foto_path' in request.session['registro_persona']:
-            print(f"Avanzando al paso 3 con foto_path: {request.session['registro_persona']['foto_path']}")
-            return redirect('registro_paso3')
-        else:
-            # Si la foto no se guardó correctamente, mostrar un error
+        try:
+            # La foto normalizada se escribe una sola vez y se promueve al procesar el registro
+            borrador = guardar_borrador(request.user, foto_path=preparar_foto(foto))
+            logger.debug("Foto desde %s preparada en: %s", origen, borrador.foto_path)
+        except Exception as e:
+            logger.exception("Error al guardar la foto desde %s", origen)
+            mensaje = 'Error al procesar la imagen de la cámara' if origen == 'cámara' else 'Error al procesar la imagen'
             return render(request, 'personas/registro_paso2.html', {
-                'error': 'No se pudo guardar la foto. Por favor, inténtelo de nuevo.'
+                'error': f'{mensaje}: {str(e)}'
             })
+        
+        logger.debug("Avanzando al paso 3 con foto_path: %s", borrador.foto_path)
+        return redirect('registro_paso3')
     
     return render(request, 'personas/registro_paso2.html')
 
 @login_required
+@csrf_exempt
 def registro_paso3(request):
     """
     Vista para el paso 3 del registro: Captura de huella digital.
     
-    Procesa la huella digital capturada, genera el hash SHA-256 y el código QR,
-    y guarda la información en la base de datos.
+    El SHA-256 de la huella subida se calcula mientras se recibe
+    (HashingUploadHandler), antes de que CsrfViewMiddleware lea el cuerpo;
+    la verificación CSRF se hace después, en _registro_paso3.
+    """
+    hashing = HashingUploadHandler(request)
+    request.upload_handlers.insert(0, hashing)
+    return _registro_paso3(request, hashing)
+
+@csrf_protect
+def _registro_paso3(request, hashing):
     """
-    if 'registro_persona' not in request.session:
+    Guarda la persona con la huella digital capturada y encola la generación
+    del código QR y los archivos definitivos (personas.tasks).
+    """
+    borrador = obtener_borrador(request.user)
+    if borrador is None:
         return redirect('registro_paso1')
     
-    # Obtener datos de la sesión para depuración
-    datos_persona = request.session.get('registro_persona', {})
-    if 'foto_path' in datos_persona:
-        print(f"En paso3, foto_path: {datos_persona['foto_path']}")
+    if borrador.foto_path:
+        logger.debug("En paso3, foto_path: %s", borrador.foto_path)
     
     if request.method == 'POST':
         # Verificar si se recibió la huella digital
@@ -256,36 +363,26 @@ def registro_paso3(request):
         # Si tenemos huella_base64 del SDK o un archivo subido manualmente
         if (huella_hex and huella_base64) or huella_file:
             try:
-                # Si tenemos un archivo subido manualmente, procesarlo
+                # Si tenemos un archivo subido manualmente, se encola tal cual
                 if huella_file:
-                    # Leer el archivo y generar el hash
-                    huella_content = huella_file.read()
-                    hasher = hashlib.sha256()
-                    hasher.update(huella_content)
-                    huella_hex = hasher.hexdigest()
-                    huella_content_file = ContentFile(huella_content)
+                    huella_content = huella_file
+                    huella_content.sha256 = hashing.digests.get('huella')
                 else:
                     # Si tenemos los datos del SDK, decodificar el base64
-                    huella_content = base64.b64decode(huella_base64)
-                    huella_content_file = ContentFile(huella_content)
-                
-                # Generar QR a partir del hash
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_L,
-                    box_size=10,
-                    border=4,
-                )
-                qr.add_data(huella_hex)
-                qr.make(fit=True)
+                    huella_content = ContentFile(base64.b64decode(huella_base64))
                 
-                qr_img = qr.make_image(fill_color="black", back_color="white")
-                qr_buffer = BytesIO()
-                qr_img.save(qr_buffer, format="PNG")
-                qr_content = ContentFile(qr_buffer.getvalue())
+                # Rechazar capturas en blanco, parciales o borrosas antes de guardar nada
+                check_fingerprint_quality(huella_content)
+
+                # Una huella ya registrada no llega a encolarse
+                if not getattr(huella_content, 'sha256', None):
+                    huella_content.sha256 = generate_sha256_from_image(huella_content)
+                if Persona.objects.filter(huella_digest=huella_content.sha256).exists():
+                    raise IntegrityError(HUELLA_DUPLICADA)
                 
-                # Crear persona con todos los datos
-                datos_persona = request.session['registro_persona']
+                # Crear persona con los datos del formulario; el hash, el QR y
+                # los archivos se generan en segundo plano (personas.tasks)
+                datos_persona = borrador.datos
                 persona = Persona(
                     nombre=datos_persona['nombre'],
                     apellidos=datos_persona['apellidos'],
@@ -293,59 +390,32 @@ def registro_paso3(request):
                     telefono=datos_persona['telefono'],
                     correo=datos_persona['correo'],
                     direccion=datos_persona['direccion'],
-                    huella_hex=huella_hex
+                    huella_hex=huella_content.sha256,
                 )
+                tarea = encolar_registro(persona, huella_content, borrador.foto_path)
+                if not procesamiento_asincrono():
+                    procesar_registro(tarea)
+                logger.info("Persona registrada. ID: %s, procesamiento en cola", persona.id)
                 
-                # MÉTODO MEJORADO: Asignar foto si existe
-                if 'foto_path' in datos_persona and datos_persona['foto_path']:
-                    import os
-                    from django.conf import settings
-                    from django.core.files import File
-                    
-                    # La ruta completa al archivo
-                    ruta_completa = os.path.join(settings.MEDIA_ROOT, datos_persona['foto_path'])
-                    
-                    if os.path.exists(ruta_completa):
-                        try:
-                            with open(ruta_completa, 'rb') as f:
-                                # Crear un nombre para la foto final basado en el nombre de la persona
-                                nombre_foto_final = f"foto_{persona.nombre}_{persona.apellidos.split()[0]}.jpg"
-                                
-                                # Guardar el archivo con un nuevo nombre
-                                persona.foto.save(nombre_foto_final, File(f), save=False)
-                                
-                                print(f"Foto asignada al modelo desde {ruta_completa}")
-                            
-                            # NUEVO: Eliminar el archivo temporal
-                            try:
-                                os.remove(ruta_completa)
-                                print(f"Archivo temporal eliminado: {ruta_completa}")
-                            except Exception as e:
-                                print(f"Error al eliminar archivo temporal: {e}")
-                        
-                        except Exception as e:
-                            print(f"Error al procesar foto: {e}")
-                            # Opcional: manejar el error si no se puede abrir/procesar el archivo
-                    else:
-                        print(f"Advertencia: No se encontró el archivo de foto en {ruta_completa}")
-                
-                # Guardar huella y QR
-                persona.huella_digital.save(f'huella_{persona.nombre}.png', huella_content_file)
-                persona.qr_code.save(f'qr_{persona.nombre}.png', qr_content)
-                
-                print("Guardando persona en la base de datos...")
-                persona.save()
-                print(f"Persona guardada. ID: {persona.id}, Foto: {persona.foto}")
+                # La foto temporal ahora pertenece a la tarea
+                eliminar_borrador(borrador, conservar_foto=True)
                 
-                # Limpiar sesión
-                del request.session['registro_persona']
-                
-                return redirect('lista_personas')
+                return redirect('registro_estado', pk=persona.id)
+            except FingerprintQualityError as e:
+                return render(
+                    request,
+                    'personas/registro_paso3.html',
+                    {'error': f'{e}. Por favor, capture su huella nuevamente.'}
+                )
+            except IntegrityError:
+                return render(
+                    request,
+                    'personas/registro_paso3.html',
+                    {'error': f'{HUELLA_DUPLICADA}. Busque a la persona por su huella en lugar de registrarla de nuevo.'}
+                )
             except Exception as e:
                 # Log del error y mensaje para el usuario
-                import traceback
-                print(f"Error al procesar huella: {str(e)}")
-                print(traceback.format_exc())
+                logger.exception("Error al procesar huella")
                 return render(
                     request, 
                     'personas/registro_paso3.html', 
@@ -361,13 +431,22 @@ def registro_paso3(request):
     
     return render(request, 'personas/registro_paso3.html')
 
+@login_required
+def registro_estado(request, pk):
+    """
+    Muestra el avance del procesamiento de un registro recién enviado.
+    La plantilla consulta periódicamente /api/personas/<pk>/estado/.
+    """
+    persona = get_object_or_404(Persona, pk=pk)
+    if persona.estado_procesamiento == Persona.PROCESAMIENTO_COMPLETADO:
+        return redirect('persona_detalle', pk=persona.id)
+    return render(request, 'personas/registro_estado.html', {'persona': persona})
+
 @login_required
 def busqueda_huella(request):
     if request.method == 'POST' and 'huella' in request.FILES:
         huella = request.FILES['huella']
-        huella_hex = process_fingerprint(huella)[0]
-        
-        persona = Persona.objects.filter(huella_hex=huella_hex).first()
+        persona, _ = identify_fingerprint(huella)
         if persona:
             return redirect('persona_detalle', pk=persona.id)
         else:
@@ -380,6 +459,12 @@ class PersonaDetailView(LoginRequiredMixin, DetailView):
     template_name = 'personas/persona_detalle.html'
     context_object_name = 'persona'
 
+    def get_object(self, queryset=None):
+        persona = obtener_persona(self.kwargs[self.pk_url_kwarg])
+        if persona is None:
+            raise Http404("No se encontró la persona")
+        return persona
+
 class PersonaUpdateView(LoginRequiredMixin, UpdateView):
     model = Persona
     template_name = 'personas/persona_editar.html'
@@ -391,30 +476,141 @@ class PersonaDeleteView(LoginRequiredMixin, DeleteView):
     template_name = 'personas/persona_eliminar.html'
     success_url = reverse_lazy('lista_personas')
 
+def codigo_qr(huella_hex, formato_qr):
+    """QR del hash en el formato pedido; SVG y matriz no pasan por PIL"""
+    if formato_qr == 'svg':
+        return qr_svg(huella_hex)
+    if formato_qr == 'matriz':
+        return qr_matrix(huella_hex)
+    return f'data:image/png;base64,{base64.b64encode(qr_png(huella_hex)).decode("utf-8")}'
+
+def leer_huella_capturada(request):
+    """
+    Hash de la huella enviada a capturar_huella y formato de QR pedido.
+
+    Acepta tres formatos de envío:
+      - application/octet-stream: la imagen en crudo como cuerpo de la petición
+      - multipart/form-data: la imagen en el campo 'imagen' (o 'huella')
+      - application/json: {"imagen": "data:image/png;base64,..."}
+
+    Los dos primeros calculan el hash mientras se recibe el cuerpo y nunca
+    tienen en memoria más de un fragmento: con el control de calidad activo
+    (settings.HUELLA_CALIDAD_MINIMA) la imagen se escribe a un temporal en
+    disco para evaluarla antes de generar el QR; sin él no se guarda. El formato del QR se elige con
+    formato_qr (png, svg o matriz) en el JSON o en la query string.
+
+    Se divide en recibir_huella_capturada (lectura del cuerpo) y
+    comprobar_huella_capturada (decodificación y control de calidad) para
+    que la variante asíncrona envíe solo la segunda al executor.
+
+    Returns:
+        tuple | JsonResponse: (huella_hex, formato_qr) o la respuesta de error
+    """
+    recibida = recibir_huella_capturada(request)
+    if isinstance(recibida, JsonResponse):
+        return recibida
+    return comprobar_huella_capturada(*recibida)
+
+
+def recibir_huella_capturada(request):
+    """
+    Lee el cuerpo de la petición de capturar_huella (ver leer_huella_capturada).
+
+    Returns:
+        tuple | JsonResponse: (huella_hex, formato_qr, imagen) o la respuesta
+            de error. Para el JSON huella_hex es None e imagen el texto en
+            base64, que decodifica comprobar_huella_capturada
+    """
+    formato_qr = request.GET.get('formato_qr', 'png')
+    controlar_calidad = get_min_quality() > 0
+    imagen = None
+
+    if request.content_type == 'application/octet-stream':
+        if controlar_calidad:
+            imagen = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+        try:
+            huella_hex, tamano = generate_sha256_from_stream(request, max_size=MAX_TAMANO_HUELLA, destination=imagen)
+        except ValueError:
+            return JsonResponse({'error': 'El archivo de huella es demasiado grande'}, status=413)
+        if not tamano:
+            return JsonResponse({'error': 'No se proporcionó imagen de huella'}, status=400)
+    elif request.content_type == 'multipart/form-data':
+        hasher = HashingUploadHandler(request, discard=not controlar_calidad)
+        request.upload_handlers = [hasher, TemporaryFileUploadHandler(request)] if controlar_calidad else [hasher]
+        formato_qr = request.POST.get('formato_qr', formato_qr)
+        campo = next((c for c in ('imagen', 'huella') if c in hasher.digests), None)
+        if campo is None:
+            return JsonResponse({'error': 'No se proporcionó imagen de huella'}, status=400)
+        if hasher.sizes[campo] > MAX_TAMANO_HUELLA:
+            return JsonResponse({'error': 'El archivo de huella es demasiado grande'}, status=413)
+        huella_hex = hasher.digests[campo]
+        imagen = request.FILES.get(campo)
+    else:
+        data = json.loads(request.body)
+        imagen = data.get('imagen')
+        formato_qr = data.get('formato_qr', formato_qr)
+        huella_hex = None
+
+        if not imagen:
+            return JsonResponse({'error': 'No se proporcionó imagen de huella'}, status=400)
+
+    if formato_qr not in ('png', 'svg', 'matriz'):
+        if hasattr(imagen, 'close'):
+            imagen.close()
+        return JsonResponse({'error': 'formato_qr debe ser png, svg o matriz'}, status=400)
+    return huella_hex, formato_qr, imagen
+
+
+def comprobar_huella_capturada(huella_hex, formato_qr, imagen):
+    """
+    Decodifica la imagen recibida en base64 y aplica el control de calidad;
+    no lee la petición, así que puede correr en el executor.
+
+    Returns:
+        tuple | JsonResponse: (huella_hex, formato_qr) o la respuesta de error
+    """
+    if huella_hex is None:
+        # Convertir base64 a imagen
+        imagen = ContentFile(base64.b64decode(imagen.split(',')[1]))
+        huella_hex = generate_sha256_from_image(imagen)
+
+    if get_min_quality() > 0:
+        try:
+            check_fingerprint_quality(imagen)
+        except FingerprintQualityError as e:
+            return respuesta_calidad_huella(e)
+        finally:
+            imagen.close()
+    return huella_hex, formato_qr
+
+
+def respuesta_calidad_huella(error):
+    """Respuesta 422 para una captura rechazada por el control de calidad"""
+    datos = {'error': str(error)}
+    if error.quality is not None:
+        datos['calidad'] = error.quality.as_dict()
+    return JsonResponse(datos, status=422)
+
 @csrf_exempt
 def capturar_huella(request):
-    """Endpoint para recibir datos de la huella digital desde el lector"""
+    """
+    Endpoint para recibir datos de la huella digital desde el lector; ver
+    leer_huella_capturada para los formatos aceptados.
+    """
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            imagen_base64 = data.get('imagen')
-            
-            if not imagen_base64:
-                return JsonResponse({'error': 'No se proporcionó imagen de huella'}, status=400)
-            
-            # Convertir base64 a imagen
-            imagen_data = base64.b64decode(imagen_base64.split(',')[1])
-            
-            # Procesamiento de huella
-            huella = ContentFile(imagen_data)
-            huella_hex, qr_image = process_fingerprint(huella)
-            
+            resultado = leer_huella_capturada(request)
+            if isinstance(resultado, JsonResponse):
+                return resultado
+            huella_hex, formato_qr = resultado
             return JsonResponse({
                 'huella_hex': huella_hex,
-                'qr_code': f'data:image/png;base64,{base64.b64encode(qr_image.read()).decode("utf-8")}'
+                'qr_code': codigo_qr(huella_hex, formato_qr)
             })
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
     
-    return JsonResponse({'error': 'Método no permitido'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
@@ -0,0 +1,105 @@
+"""
+Variantes asíncronas (ASGI) de los endpoints biométricos.
+
+Con settings.VISTAS_ASYNC, personas.urls las sirve en las mismas URLs que
+las de views.py. Pensadas para un servidor ASGI (ver
+sistema_personas/asgi.py); bajo WSGI también funcionan, pero cada petición
+crea su propio bucle de eventos.
+
+El cuerpo de la petición se lee en la corrutina (bajo ASGI ya está en un
+archivo temporal); solo la decodificación de imágenes, las plantillas y el
+QR corren en el executor acotado de personas.asincrono. Las consultas usan
+el ORM asíncrono, y lo que necesita el hilo de sync_to_async (autenticación
+y permisos de DRF, plantillas con request.user) corre ahí.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.csrf import csrf_exempt
+
+from .asincrono import en_executor
+from .matching import aidentify_fingerprint
+from .views import PersonaViewSet, codigo_qr, comprobar_huella_capturada, recibir_huella_capturada
+
+
+@csrf_exempt
+async def capturar_huella(request):
+    """Versión asíncrona de views.capturar_huella"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    try:
+        recibida = recibir_huella_capturada(request)
+        if isinstance(recibida, JsonResponse):
+            return recibida
+        resultado = await en_executor(comprobar_huella_capturada, *recibida)
+        if isinstance(resultado, JsonResponse):
+            return resultado
+        huella_hex, formato_qr = resultado
+        return JsonResponse({
+            'huella_hex': huella_hex,
+            'qr_code': await en_executor(codigo_qr, huella_hex, formato_qr),
+        })
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+async def busqueda_huella(request):
+    """Versión asíncrona de views.busqueda_huella"""
+    if request.method == 'POST':
+        archivos = request.FILES
+        if 'huella' in archivos:
+            persona, _ = await aidentify_fingerprint(archivos['huella'])
+            if persona:
+                return redirect('persona_detalle', pk=persona.id)
+            return await sync_to_async(render)(
+                request, 'personas/busqueda.html', {'error': 'No se encontró ninguna persona con esa huella digital'}
+            )
+    return await sync_to_async(render)(request, 'personas/busqueda.html')
+
+
+def _vista_api(request):
+    """
+    PersonaViewSet preparada para la acción buscar_por_huella: sus clases de
+    autenticación, permisos y throttling (y la verificación CSRF de la sesión)
+    se aplican igual que en la versión síncrona.
+
+    Returns:
+        tuple: (vista, respuesta de error ya renderizada o None)
+    """
+    vista = PersonaViewSet(action_map={'post': 'buscar_por_huella'})
+    vista.setup(request)
+    vista.format_kwarg = None
+    vista.headers = {}
+    vista.request = vista.initialize_request(request)
+    try:
+        vista.initial(vista.request)
+        if vista.action is None:
+            vista.http_method_not_allowed(vista.request)
+    except Exception as exc:
+        respuesta = vista.finalize_response(vista.request, vista.handle_exception(exc))
+        return vista, respuesta.render()
+    return vista, None
+
+
+@csrf_exempt
+async def buscar_por_huella(request):
+    """Versión asíncrona de PersonaViewSet.buscar_por_huella"""
+    vista, error = await sync_to_async(_vista_api)(request)
+    if error is not None:
+        return error
+
+    archivos = request.FILES
+    if 'huella' not in archivos:
+        return JsonResponse({"error": "No se proporcionó archivo de huella digital"}, status=400)
+
+    # Coincidencia exacta por huella_digest o aproximada por plantilla
+    persona, similitud = await aidentify_fingerprint(archivos['huella'])
+    if persona:
+        data = await en_executor(lambda: dict(vista.get_serializer(persona).data))
+        data['similitud'] = round(similitud, 4)
+        return JsonResponse(data)
+    return JsonResponse({"message": "No se encontró ninguna persona con esa huella digital"}, status=404)
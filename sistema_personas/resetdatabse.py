@@ -1,18 +1,4 @@
-from django.db import connection
-from personas.models import Persona
+from django.core.management import call_command
 
-# Eliminar todos los registros
-Persona.objects.all().delete()
-
-# Reiniciar secuencia (PostgreSQL)
-if connection.vendor == 'postgresql':
-    with connection.cursor() as cursor:
-        cursor.execute("ALTER SEQUENCE personas_persona_id_seq RESTART WITH 1;")
-# Para MySQL
-elif connection.vendor == 'mysql':
-    with connection.cursor() as cursor:
-        cursor.execute("ALTER TABLE personas_persona AUTO_INCREMENT = 1;")
-# Para SQLite
-elif connection.vendor == 'sqlite':
-    with connection.cursor() as cursor:
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='personas_persona';")
\ No newline at end of file
+# Eliminar todos los registros (y sus archivos) por lotes y reiniciar la secuencia de ids
+call_command('purgar_personas', todas=True, reiniciar_ids=True)
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+Con VISTAS_ASYNC=True la captura y la búsqueda por huella usan las vistas
+asíncronas de personas.views_async:
+
+    VISTAS_ASYNC=True gunicorn sistema_personas.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
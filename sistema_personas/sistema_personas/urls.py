@@ -18,16 +18,17 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 
+from personas.media import servir_media
+from personas.metricas import exponer_metricas
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', exponer_metricas, name='metricas'),
     path('', include('personas.urls')),
     path('accounts/login/', auth_views.LoginView.as_view(template_name='personas/login.html'), name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(next_page='login'), name='logout'),
-]
-
-# Servir archivos media en desarrollo
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Archivos media (fotos, huellas y QR) solo para usuarios autenticados, en desarrollo y producción
+    path(f'{settings.MEDIA_URL.strip("/")}/<path:path>', servir_media, name='media'),
+]
\ No newline at end of file